@@ -3,6 +3,7 @@ AI Service Configuration
 """
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Dict, List
 import os
 from dotenv import load_dotenv
 
@@ -41,6 +42,12 @@ class AIServiceSettings(BaseSettings):
     max_user_preferences: int = 100
     personalization_cache_ttl: int = 1800  # 30 minutes
 
+    # Course recommendations
+    recommendation_max_courses: int = 2000
+    recommendation_content_weight: float = 0.5  # rest is co-enrollment
+    recommendation_refresh_seconds: int = 300
+    recommendation_full_refresh_seconds: int = 86400
+
     # Enhancement settings
     max_enhancement_input_length: int = 5000
     enhancement_cache_ttl: int = 7200  # 2 hours
@@ -62,6 +69,11 @@ class AIServiceSettings(BaseSettings):
     enable_caching: bool = True
     enable_request_logging: bool = True
 
+    # Request batching
+    enable_batching: bool = True
+    batch_window_ms: int = 5  # how long the first request waits for others
+    batch_max_size: int = 100
+
     # Quality settings
     min_confidence_score: float = 0.7
     max_retries: int = 3
@@ -69,7 +81,20 @@ class AIServiceSettings(BaseSettings):
 
     # Cost management
     max_cost_per_request: float = 0.10  # $0.10 per request
-    daily_cost_limit: float = 50.0  # $50 per day
+    daily_cost_limit: float = 50.0  # $50 per day per tenant
+    # $ per 1K prompt and completion tokens
+    model_token_prices: Dict[str, List[float]] = {
+        "gemini-1.5-flash": [0.000075, 0.0003],
+        "gemini-1.5-pro": [0.00125, 0.005],
+        "gpt-4": [0.03, 0.06],
+        "gpt-3.5-turbo": [0.0005, 0.0015]
+    }
+    default_token_price: List[float] = [0.01, 0.01]
+
+    # Token budgets (per UTC day)
+    user_daily_token_budget: int = 200000
+    tenant_daily_token_budget: int = 5000000
+    usage_flush_interval_seconds: int = 30
 
     class Config:
         env_file = str(Path(__file__).parent.parent.parent.parent / '.env')
@@ -8,6 +8,7 @@ import json
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.database import mongo_metrics_listener
 from shared.common.errors import DatabaseError, NotFoundError
 from config.config import ai_service_settings
 
@@ -50,7 +51,7 @@ class AIDatabase:
             return
 
         try:
-            self.client = AsyncIOMotorClient(settings.mongo_url)
+            self.client = AsyncIOMotorClient(settings.mongo_url, event_listeners=[mongo_metrics_listener])
             self.db = self.client[settings.db_name]
             await self._create_indexes()
             await self.cache.init_cache()
@@ -87,9 +88,13 @@ class AIDatabase:
             await self.db.user_ai_preferences.create_index("user_id", unique=True)
             await self.db.user_ai_preferences.create_index("updated_at")
 
-            # Content Cache indexes
+            # Content Cache indexes (entries are read and written by shared.common.llm_cache)
             await self.db.ai_content_cache.create_index("content_hash", unique=True)
-            await self.db.ai_content_cache.create_index("created_at")
+            await self.db.ai_content_cache.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+            await self.db.ai_content_cache.create_index("last_hit_at")
+
+            # Daily token usage per user and tenant (flushed by utils.token_budget)
+            await self.db.ai_usage.create_index([("scope", 1), ("subject", 1), ("day", -1)])
 
             logger.info("Database indexes created successfully")
         except Exception as e:
@@ -110,6 +115,16 @@ class AIDatabase:
             logger.error("Failed to log AI request", extra={"error": str(e)})
             raise DatabaseError("log_ai_request", f"AI request logging failed: {str(e)}")
 
+    async def log_ai_requests(self, requests: List[Dict[str, Any]]):
+        """Log a batch of AI requests in one write"""
+        if not requests:
+            return
+        try:
+            await self.db.ai_requests.insert_many(requests, ordered=False)
+        except Exception as e:
+            logger.error("Failed to log AI requests", extra={"count": len(requests), "error": str(e)})
+            raise DatabaseError("log_ai_requests", f"AI request logging failed: {str(e)}")
+
     async def get_user_requests(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get user's AI requests"""
         try:
@@ -140,6 +155,16 @@ class AIDatabase:
             logger.error("Failed to save AI result", extra={"error": str(e)})
             raise DatabaseError("save_ai_result", f"AI result saving failed: {str(e)}")
 
+    async def save_ai_results(self, results: List[Dict[str, Any]]):
+        """Save a batch of AI results in one write"""
+        if not results:
+            return
+        try:
+            await self.db.ai_results.insert_many(results, ordered=False)
+        except Exception as e:
+            logger.error("Failed to save AI results", extra={"count": len(results), "error": str(e)})
+            raise DatabaseError("save_ai_results", f"AI result saving failed: {str(e)}")
+
     async def get_ai_result(self, result_id: str) -> Optional[Dict[str, Any]]:
         """Get AI result"""
         try:
@@ -186,34 +211,6 @@ class AIDatabase:
             })
             raise DatabaseError("update_user_preferences", f"User preferences update failed: {str(e)}")
 
-    # Content Cache operations
-    async def get_cached_content(self, content_hash: str) -> Optional[Dict[str, Any]]:
-        """Get cached content"""
-        try:
-            cached = await self.db.ai_content_cache.find_one({"content_hash": content_hash})
-            return cached
-
-        except Exception as e:
-            logger.error("Failed to get cached content", extra={
-                "content_hash": content_hash,
-                "error": str(e)
-            })
-            raise DatabaseError("get_cached_content", f"Cached content retrieval failed: {str(e)}")
-
-    async def save_cached_content(self, content_data: Dict[str, Any]) -> str:
-        """Save cached content"""
-        try:
-            content_data["created_at"] = datetime.now(timezone.utc)
-            result = await self.db.ai_content_cache.insert_one(content_data)
-            cache_id = str(result.inserted_id)
-
-            logger.info("Content cached", extra={"cache_id": cache_id})
-            return cache_id
-
-        except Exception as e:
-            logger.error("Failed to save cached content", extra={"error": str(e)})
-            raise DatabaseError("save_cached_content", f"Cached content saving failed: {str(e)}")
-
     # Analytics operations
     async def get_usage_stats(self, user_id: Optional[str] = None, days: int = 30) -> Dict[str, Any]:
         """Get AI usage statistics"""
@@ -231,20 +228,30 @@ class AIDatabase:
                 {"$group": {
                     "_id": "$request_type",
                     "count": {"$sum": 1},
-                    "total_tokens": {"$sum": "$tokens_used"}
+                    "total_tokens": {"$sum": "$tokens_used"},
+                    "total_cost": {"$sum": "$cost"}
                 }}
             ]
 
             stats_result = await self.db.ai_requests.aggregate(pipeline).to_list(10)
+            top_models = await self.db.ai_requests.aggregate([
+                {"$match": query},
+                {"$group": {"_id": "$model", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 1}
+            ]).to_list(1)
 
             # Get total requests
             total_requests = await self.db.ai_requests.count_documents(query)
+            total_cost = sum(item.get("total_cost", 0) for item in stats_result)
 
             return {
                 "total_requests": total_requests,
                 "requests_by_type": {item["_id"]: item["count"] for item in stats_result},
                 "total_tokens_used": sum(item.get("total_tokens", 0) for item in stats_result),
-                "period_days": days
+                "period_days": days,
+                "average_cost_per_request": round(total_cost / total_requests, 6) if total_requests else None,
+                "most_used_model": top_models[0]["_id"] if top_models else None
             }
 
         except Exception as e:
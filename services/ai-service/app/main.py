@@ -8,8 +8,12 @@ import uvicorn
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.monitoring import setup_metrics
+from shared.common.tracing import setup_tracing
 from shared.common.database import get_database, close_connection
 from shared.common.cache import close_connection as close_cache
+from shared.common.llm import llm_client
+from shared.common.llm_cache import llm_cache
 # Temporarily disabled middleware imports due to FastAPI version compatibility issues
 # from shared.common.middleware import (
 #     create_cors_middleware,
@@ -17,11 +21,14 @@ from shared.common.cache import close_connection as close_cache
 #     RateLimitMiddleware
 # )
 
+from config.config import ai_service_settings
 from routes.generation import router as generation_router
 from routes.enhancement import router as enhancement_router
 from routes.analysis import router as analysis_router
 from routes.personalization import router as personalization_router
 from routes.health import router as health_router
+from utils.recommender import course_recommender
+from utils.token_budget import metered_llm, token_budget
 
 # Initialize logger
 logger = get_logger("ai-service")
@@ -41,26 +48,34 @@ async def lifespan(app: FastAPI):
         db = await get_database()
         await db.command('ping')
         logger.info("Database connection established")
+        await llm_cache.attach(db.ai_content_cache)
+        # Cache misses go through the metered client, which enforces token budgets
+        llm_cache.llm = metered_llm
+        token_budget.start(db.ai_usage)
     except Exception as e:
         logger.error("Database connection failed", extra={"error": str(e)})
         raise
 
-    # Test AI model availability
+    # Recommendations are served from an in-memory index kept fresh in the background
     try:
-        # Import AI module to test configuration
-        import google.generativeai as genai
-        if settings.gemini_api_key:
-            genai.configure(api_key=settings.gemini_api_key)
-            logger.info("AI model configured successfully")
-        else:
-            logger.warning("AI API key not configured")
+        await course_recommender.refresh(full=True)
     except Exception as e:
-        logger.warning("AI model configuration failed", extra={"error": str(e)})
+        logger.warning("Recommendation index not built at startup", extra={"error": str(e)})
+    course_recommender.start(ai_service_settings.recommendation_refresh_seconds)
+
+    # The shared LLM client connects lazily on first use
+    if llm_client.configured:
+        logger.info("AI model configured", extra={"model": llm_client.model, "max_concurrency": llm_client.max_concurrency})
+    else:
+        logger.warning("AI API key not configured")
 
     yield
 
     # Shutdown
     logger.info("Shutting down AI Service")
+    await course_recommender.stop()
+    await token_budget.stop()
+    await llm_client.close()
     await close_connection()
     await close_cache()
 
@@ -85,6 +100,12 @@ def create_application() -> FastAPI:
     # if settings.environment == "production":
     #     app.add_middleware(RateLimitMiddleware, requests_per_minute=100)
 
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "ai-service")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "ai-service")
+
     # Include routers
     app.include_router(generation_router, prefix="/ai", tags=["Content Generation"])
     app.include_router(enhancement_router, prefix="/ai", tags=["Content Enhancement"])
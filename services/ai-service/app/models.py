@@ -38,6 +38,7 @@ class AIRequestBase(BaseModel):
 class AIRequestCreate(AIRequestBase):
     """Model for creating AI request"""
     user_id: str = Field(..., description="User ID")
+    tenant_id: Optional[str] = Field(None, description="Tenant whose budget the request counts against")
 
 class AIRequest(AIRequestBase):
     """Complete AI request model"""
@@ -4,79 +4,26 @@ Content enhancement routes for AI Service
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends
 
-from shared.config.config import settings
 from shared.common.auth import get_current_user, require_admin
 from shared.common.database import DatabaseOperations
-from shared.common.errors import ValidationError, AuthorizationError
+from shared.common.errors import ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError
 from shared.common.logging import get_logger
+from shared.common.llm_cache import llm_cache
+
+from config.config import ai_service_settings
+from utils.ai_utils import stream_completion
+from utils.token_budget import budgeted_user, fit_prompt
 
 logger = get_logger("ai-service")
 router = APIRouter()
 
-# AI integrations
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-def _get_ai():
-    """Get AI model instance"""
-    if genai is None:
-        raise HTTPException(
-            status_code=500,
-            detail="AI dependency not installed. Please install google-generativeai.",
-        )
-    if not settings.gemini_api_key:
-        raise HTTPException(
-            status_code=500,
-            detail="No AI key configured. Set GEMINI_API_KEY in backend/.env",
-        )
-    genai.configure(api_key=settings.gemini_api_key)
-    return genai.GenerativeModel(settings.default_llm_model)
-
-async def _current_user(token: str = None):
-    """Get current authenticated user"""
-    if not token:
-        raise HTTPException(401, "No authentication token provided")
-
-    try:
-        import jwt
-        from shared.config.config import settings
-
-        # Decode and validate JWT token
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-
-        # Verify token hasn't expired
-        if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(401, "Token has expired")
-
-        # Get user from database
-        users_db = DatabaseOperations("users")
-        user = await users_db.find_one({"_id": payload.get("sub")})
-        if not user:
-            raise HTTPException(401, "User not found")
-
-        return {
-            "id": user["_id"],
-            "role": user.get("role", "student"),
-            "email": user.get("email", ""),
-            "name": user.get("name", "")
-        }
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, "Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, "Invalid token")
-    except Exception as e:
-        raise HTTPException(401, f"Authentication failed: {str(e)}")
-
 def _require_role(user, allowed: list[str]):
     """Check if user has required role"""
     if user.get("role") not in allowed:
         raise HTTPException(403, "Insufficient permissions")
 
 @router.post("/enhance-content")
-async def enhance_content(request: dict, user=Depends(_current_user)):
+async def enhance_content(request: dict, user=Depends(budgeted_user)):
     """
     Enhance existing lesson content using AI.
 
@@ -105,58 +52,65 @@ async def enhance_content(request: dict, user=Depends(_current_user)):
             "user_id": user["id"]
         })
 
-        prompts = {
-            "comprehensive": f"""
-            Enhance this lesson content comprehensively:
-
-            Original Content: {content}
-            Target Audience: {target_audience}
-            Difficulty Level: {difficulty_level}
-
-            Add:
-            1. Real-world examples and case studies
-            2. Step-by-step explanations
-            3. Visual descriptions and analogies
-            4. Common misconceptions and clarifications
-            5. Practical applications
-            6. Assessment questions with answers
-
-            Make the content 2-3 times more detailed while maintaining clarity.
-            """,
-
-            "examples": f"""
-            Add comprehensive real-world examples to this content:
-
-            Original Content: {content}
-            Target Audience: {target_audience}
-
-            Add 4-6 detailed examples including:
-            - Industry case studies
-            - Historical examples
-            - Personal success stories
-            - Common problem-solving scenarios
-            """,
-
-            "practical": f"""
-            Add practical exercises and implementations to this lesson:
-
-            Original Content: {content}
-            Difficulty Level: {difficulty_level}
-
-            Add:
-            1. Hands-on exercises
-            2. Code examples (if applicable)
-            3. Step-by-step tutorials
-            4. Practice problems with solutions
-            5. Project ideas
-            6. Implementation checklists
-            """
-        }
+        def build_prompt(content: str) -> str:
+            prompts = {
+                "comprehensive": f"""
+                Enhance this lesson content comprehensively:
+
+                Original Content: {content}
+                Target Audience: {target_audience}
+                Difficulty Level: {difficulty_level}
+
+                Add:
+                1. Real-world examples and case studies
+                2. Step-by-step explanations
+                3. Visual descriptions and analogies
+                4. Common misconceptions and clarifications
+                5. Practical applications
+                6. Assessment questions with answers
+
+                Make the content 2-3 times more detailed while maintaining clarity.
+                """,
+
+                "examples": f"""
+                Add comprehensive real-world examples to this content:
+
+                Original Content: {content}
+                Target Audience: {target_audience}
+
+                Add 4-6 detailed examples including:
+                - Industry case studies
+                - Historical examples
+                - Personal success stories
+                - Common problem-solving scenarios
+                """,
+
+                "practical": f"""
+                Add practical exercises and implementations to this lesson:
+
+                Original Content: {content}
+                Difficulty Level: {difficulty_level}
+
+                Add:
+                1. Hands-on exercises
+                2. Code examples (if applicable)
+                3. Step-by-step tutorials
+                4. Practice problems with solutions
+                5. Project ideas
+                6. Implementation checklists
+                """
+            }
+            return prompts.get(enhancement_type, prompts["comprehensive"])
 
-        prompt = prompts.get(enhancement_type, prompts["comprehensive"])
+        # Long content is trimmed so the whole prompt stays within the per-request token limit
+        prompt, content = fit_prompt(build_prompt, content)
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await llm_cache.generate("enhancement.enhance_content", prompt, {
+            "content": content,
+            "enhancement_type": enhancement_type if enhancement_type in ("comprehensive", "examples", "practical") else "comprehensive",
+            "target_audience": target_audience,
+            "difficulty_level": difficulty_level
+        }, ttl=ai_service_settings.enhancement_cache_ttl, semantic_field="content")
 
         result = {
             "enhanced_content": response.text,
@@ -182,7 +136,7 @@ async def enhance_content(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Content enhancement failed", extra={
@@ -193,7 +147,7 @@ async def enhance_content(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, "Content enhancement failed")
 
 @router.post("/enhance-lesson")
-async def enhance_lesson(request: dict, user=Depends(_current_user)):
+async def enhance_lesson(request: dict, stream: bool = False, user=Depends(budgeted_user)):
     """
     Enhance a complete lesson using AI.
 
@@ -202,6 +156,7 @@ async def enhance_lesson(request: dict, user=Depends(_current_user)):
     - **learning_objectives**: Learning objectives
     - **target_audience**: Target audience
     - **difficulty_level**: Difficulty level
+    - **stream** (query): Stream the text as Server-Sent Events instead of one JSON reply
     """
     try:
         # Check permissions
@@ -224,7 +179,8 @@ async def enhance_lesson(request: dict, user=Depends(_current_user)):
             "user_id": user["id"]
         })
 
-        prompt = f"""
+        # Long content is trimmed so the whole prompt stays within the per-request token limit
+        prompt, lesson_content = fit_prompt(lambda lesson_content: f"""
         Enhance this complete lesson:
 
         Lesson Title: {lesson_title}
@@ -244,10 +200,22 @@ async def enhance_lesson(request: dict, user=Depends(_current_user)):
         8. Summary and key takeaways
 
         Make the lesson more engaging, comprehensive, and effective for learning.
-        """
+        """, lesson_content)
+
+        params = {
+            "lesson_title": lesson_title,
+            "lesson_content": lesson_content,
+            "learning_objectives": learning_objectives,
+            "target_audience": target_audience,
+            "difficulty_level": difficulty_level
+        }
+        if stream:
+            return stream_completion(
+                llm_cache.stream("enhancement.enhance_lesson", prompt, params, ttl=ai_service_settings.enhancement_cache_ttl, semantic_field="lesson_content"),
+                {"title": lesson_title, "generated_by": user["id"]}
+            )
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await llm_cache.generate("enhancement.enhance_lesson", prompt, params, ttl=ai_service_settings.enhancement_cache_ttl, semantic_field="lesson_content")
 
         result = {
             "enhanced_lesson": {
@@ -276,7 +244,7 @@ async def enhance_lesson(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Lesson enhancement failed", extra={
@@ -287,7 +255,7 @@ async def enhance_lesson(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, "Lesson enhancement failed")
 
 @router.post("/generate-exercises")
-async def generate_exercises(request: dict, user=Depends(_current_user)):
+async def generate_exercises(request: dict, user=Depends(budgeted_user)):
     """
     Generate practice exercises for a topic using AI.
 
@@ -335,8 +303,12 @@ async def generate_exercises(request: dict, user=Depends(_current_user)):
         4. Solution approach (for instructors)
         """
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await llm_cache.generate("enhancement.generate_exercises", prompt, {
+            "topic": topic,
+            "difficulty": difficulty,
+            "exercise_count": exercise_count,
+            "exercise_type": exercise_type
+        }, ttl=ai_service_settings.enhancement_cache_ttl)
 
         result = {
             "exercises": response.text,
@@ -356,7 +328,7 @@ async def generate_exercises(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Exercise generation failed", extra={
@@ -367,7 +339,7 @@ async def generate_exercises(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, "Exercise generation failed")
 
 @router.post("/improve-assessment")
-async def improve_assessment(request: dict, user=Depends(_current_user)):
+async def improve_assessment(request: dict, user=Depends(budgeted_user)):
     """
     Improve assessment questions using AI.
 
@@ -410,8 +382,11 @@ async def improve_assessment(request: dict, user=Depends(_current_user)):
         7. Additional question variations
         """
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await llm_cache.generate("enhancement.improve_assessment", prompt, {
+            "assessment_content": assessment_content,
+            "assessment_type": assessment_type,
+            "target_difficulty": target_difficulty
+        }, ttl=ai_service_settings.enhancement_cache_ttl, semantic_field="assessment_content")
 
         result = {
             "improved_assessment": response.text,
@@ -435,7 +410,7 @@ async def improve_assessment(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Assessment improvement failed", extra={
@@ -9,33 +9,14 @@ import re
 from shared.config.config import settings
 from shared.common.auth import get_current_user, require_admin
 from shared.common.database import DatabaseOperations
-from shared.common.errors import ValidationError, AuthorizationError
+from shared.common.errors import ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError
 from shared.common.logging import get_logger
 
+from utils.token_budget import budgeted_user, metered_llm
+
 logger = get_logger("ai-service")
 router = APIRouter()
 
-# AI integrations
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-def _get_ai():
-    """Get AI model instance"""
-    if genai is None:
-        raise HTTPException(
-            status_code=500,
-            detail="AI dependency not installed. Please install google-generativeai.",
-        )
-    if not settings.gemini_api_key:
-        raise HTTPException(
-            status_code=500,
-            detail="No AI key configured. Set GEMINI_API_KEY in backend/.env",
-        )
-    genai.configure(api_key=settings.gemini_api_key)
-    return genai.GenerativeModel(settings.default_llm_model)
-
 def _safe_json_extract(text: str) -> dict:
     """Extract JSON from AI response safely"""
     if not isinstance(text, str):
@@ -52,49 +33,13 @@ def _safe_json_extract(text: str) -> dict:
         pass
     raise ValueError("Could not parse JSON from AI response")
 
-async def _current_user(token: str = None):
-    """Get current authenticated user"""
-    if not token:
-        raise HTTPException(401, "No authentication token provided")
-
-    try:
-        import jwt
-        from shared.config.config import settings
-
-        # Decode and validate JWT token
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-
-        # Verify token hasn't expired
-        if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(401, "Token has expired")
-
-        # Get user from database
-        users_db = DatabaseOperations("users")
-        user = await users_db.find_one({"_id": payload.get("sub")})
-        if not user:
-            raise HTTPException(401, "User not found")
-
-        return {
-            "id": user["_id"],
-            "role": user.get("role", "student"),
-            "email": user.get("email", ""),
-            "name": user.get("name", "")
-        }
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, "Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, "Invalid token")
-    except Exception as e:
-        raise HTTPException(401, f"Authentication failed: {str(e)}")
-
 def _require_role(user, allowed: list[str]):
     """Check if user has required role"""
     if user.get("role") not in allowed:
         raise HTTPException(403, "Insufficient permissions")
 
 @router.post("/generate-course")
-async def generate_course(request: dict, user=Depends(_current_user)):
+async def generate_course(request: dict, user=Depends(budgeted_user)):
     """
     Generate a complete course using AI.
 
@@ -160,7 +105,7 @@ async def generate_course(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("AI course generation failed", extra={
@@ -201,8 +146,7 @@ async def _generate_course_structure(topic: str, audience: str, difficulty: str,
     """
 
     try:
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await metered_llm.generate(prompt)
         return _safe_json_extract(response.text)
     except Exception as e:
         logger.error("Course structure generation failed", extra={"error": str(e)})
@@ -233,8 +177,7 @@ async def _generate_detailed_lesson(lesson_outline: dict, topic: str, audience:
     """
 
     try:
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await metered_llm.generate(prompt)
 
         return {
             "id": lesson_outline.get("id", f"lesson_{lesson_number}"),
@@ -276,8 +219,7 @@ async def _generate_course_quizzes(lessons: list, topic: str, difficulty: str) -
     """
 
     try:
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await metered_llm.generate(prompt)
         quiz_data = _safe_json_extract(response.text)
 
         quizzes = []
@@ -303,7 +245,7 @@ async def _generate_course_quizzes(lessons: list, topic: str, difficulty: str) -
         return []
 
 @router.post("/generate-quiz")
-async def generate_quiz(request: dict, user=Depends(_current_user)):
+async def generate_quiz(request: dict, user=Depends(budgeted_user)):
     """
     Generate quiz questions using AI.
 
@@ -335,8 +277,7 @@ async def generate_quiz(request: dict, user=Depends(_current_user)):
         Include explanations for all correct answers.
         """
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await metered_llm.generate(prompt)
 
         logger.info("AI quiz generation completed", extra={
             "topic": topic,
@@ -354,7 +295,7 @@ async def generate_quiz(request: dict, user=Depends(_current_user)):
             "generated_by": user["id"]
         }
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("AI quiz generation failed", extra={
@@ -365,7 +306,7 @@ async def generate_quiz(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, f"AI quiz generation failed: {str(e)}")
 
 @router.get("/models")
-async def get_available_models(user=Depends(_current_user)):
+async def get_available_models(user=Depends(get_current_user)):
     """
     Get available AI models for content generation.
     """
@@ -5,6 +5,8 @@ from fastapi import APIRouter, HTTPException
 from shared.common.database import health_check as db_health
 from shared.common.cache import health_check as cache_health
 from shared.common.logging import get_logger
+from shared.common.llm import llm_client
+from shared.common.llm_cache import llm_cache
 from shared.config.config import settings
 
 logger = get_logger("ai-service")
@@ -31,18 +33,16 @@ async def detailed_health_check():
         cache_status = await cache_health()
 
         # Check AI model availability
-        ai_status = {"status": "unknown", "model": settings.default_llm_model}
-        try:
-            import google.generativeai as genai
-            if settings.gemini_api_key:
-                genai.configure(api_key=settings.gemini_api_key)
-                # Test AI model with a simple request
-                model = genai.GenerativeModel(settings.default_llm_model)
-                ai_status = {"status": "healthy", "model": settings.default_llm_model}
-            else:
-                ai_status = {"status": "unhealthy", "error": "AI API key not configured"}
-        except Exception as e:
-            ai_status = {"status": "unhealthy", "error": str(e)}
+        if llm_client.configured:
+            ai_status = {
+                "status": "healthy",
+                "model": llm_client.model,
+                "in_flight": llm_client.in_flight,
+                "waiting": llm_client.waiting,
+                "cache": llm_cache.stats()
+            }
+        else:
+            ai_status = {"status": "unhealthy", "error": "AI API key not configured"}
 
         # Overall status
         overall_status = "healthy"
@@ -4,79 +4,27 @@ Learning personalization routes for AI Service
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends
 
-from shared.config.config import settings
 from shared.common.auth import get_current_user, require_admin
 from shared.common.database import DatabaseOperations
-from shared.common.errors import ValidationError, AuthorizationError
+from shared.common.errors import ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError
 from shared.common.logging import get_logger
+from shared.common.llm_cache import llm_cache
+
+from config.config import ai_service_settings
+from utils.ai_utils import stream_completion
+from utils.recommender import course_recommender
+from utils.token_budget import budgeted_user, fit_prompt
 
 logger = get_logger("ai-service")
 router = APIRouter()
 
-# AI integrations
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-def _get_ai():
-    """Get AI model instance"""
-    if genai is None:
-        raise HTTPException(
-            status_code=500,
-            detail="AI dependency not installed. Please install google-generativeai.",
-        )
-    if not settings.gemini_api_key:
-        raise HTTPException(
-            status_code=500,
-            detail="No AI key configured. Set GEMINI_API_KEY in backend/.env",
-        )
-    genai.configure(api_key=settings.gemini_api_key)
-    return genai.GenerativeModel(settings.default_llm_model)
-
-async def _current_user(token: str = None):
-    """Get current authenticated user"""
-    if not token:
-        raise HTTPException(401, "No authentication token provided")
-
-    try:
-        import jwt
-        from shared.config.config import settings
-
-        # Decode and validate JWT token
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-
-        # Verify token hasn't expired
-        if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(401, "Token has expired")
-
-        # Get user from database
-        users_db = DatabaseOperations("users")
-        user = await users_db.find_one({"_id": payload.get("sub")})
-        if not user:
-            raise HTTPException(401, "User not found")
-
-        return {
-            "id": user["_id"],
-            "role": user.get("role", "student"),
-            "email": user.get("email", ""),
-            "name": user.get("name", "")
-        }
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, "Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, "Invalid token")
-    except Exception as e:
-        raise HTTPException(401, f"Authentication failed: {str(e)}")
-
 def _require_role(user, allowed: list[str]):
     """Check if user has required role"""
     if user.get("role") not in allowed:
         raise HTTPException(403, "Insufficient permissions")
 
 @router.post("/personalize-learning")
-async def personalize_learning(request: dict, user=Depends(_current_user)):
+async def personalize_learning(request: dict, stream: bool = False, user=Depends(budgeted_user)):
     """
     Generate personalized learning recommendations using AI.
 
@@ -85,6 +33,7 @@ async def personalize_learning(request: dict, user=Depends(_current_user)):
     - **current_level**: Current skill level
     - **preferred_style**: Preferred learning style
     - **time_available**: Time available per week
+    - **stream** (query): Stream the text as Server-Sent Events instead of one JSON reply
     """
     try:
         # Check permissions (can personalize own learning or admin/instructor can personalize for others)
@@ -148,8 +97,23 @@ async def personalize_learning(request: dict, user=Depends(_current_user)):
         7. Learning style adaptations
         """
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        # The prompt carries only these aggregates, so learners with the same profile share an answer
+        params = {
+            "learning_goals": learning_goals,
+            "current_level": current_level,
+            "preferred_style": preferred_style,
+            "time_available": time_available,
+            "completed_courses": completed_courses,
+            "avg_progress": round(avg_progress, 1),
+            "avg_grade": round(avg_grade, 1)
+        }
+        if stream:
+            return stream_completion(
+                llm_cache.stream("personalization.personalize_learning", prompt, params, ttl=ai_service_settings.personalization_cache_ttl),
+                {"personalized_for": target_user_id, "generated_by": user["id"]}
+            )
+
+        response = await llm_cache.generate("personalization.personalize_learning", prompt, params, ttl=ai_service_settings.personalization_cache_ttl)
 
         result = {
             "personalized_plan": response.text,
@@ -181,7 +145,7 @@ async def personalize_learning(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Learning personalization failed", extra={
@@ -192,7 +156,7 @@ async def personalize_learning(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, "Learning personalization failed")
 
 @router.post("/adapt-content")
-async def adapt_content(request: dict, user=Depends(_current_user)):
+async def adapt_content(request: dict, user=Depends(budgeted_user)):
     """
     Adapt content based on user's learning profile.
 
@@ -230,7 +194,8 @@ async def adapt_content(request: dict, user=Depends(_current_user)):
 
         preferred_style = user_profile.get("preferred_learning_style", learning_style) if user_profile else learning_style
 
-        prompt = f"""
+        # Long content is trimmed so the whole prompt stays within the per-request token limit
+        prompt, content = fit_prompt(lambda content: f"""
         Adapt this content for a learner:
 
         Original Content: {content}
@@ -247,10 +212,13 @@ async def adapt_content(request: dict, user=Depends(_current_user)):
         4. Visual/auditory/kinesthetic elements
         5. Pacing recommendations
         6. Supplementary resources
-        """
+        """, content)
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await llm_cache.generate("personalization.adapt_content", prompt, {
+            "content": content,
+            "preferred_style": preferred_style,
+            "difficulty_preference": difficulty_preference
+        }, ttl=ai_service_settings.personalization_cache_ttl, semantic_field="content")
 
         result = {
             "adapted_content": response.text,
@@ -278,7 +246,7 @@ async def adapt_content(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Content adaptation failed", extra={
@@ -289,7 +257,7 @@ async def adapt_content(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, "Content adaptation failed")
 
 @router.post("/recommend-courses")
-async def recommend_courses(request: dict, user=Depends(_current_user)):
+async def recommend_courses(request: dict, user=Depends(budgeted_user)):
     """
     Recommend courses based on user's profile and goals.
 
@@ -297,6 +265,8 @@ async def recommend_courses(request: dict, user=Depends(_current_user)):
     - **goals**: Learning goals
     - **current_level**: Current skill level
     - **preferred_topics**: Preferred subject areas
+    - **limit**: Number of courses to return (default 5, at most 20)
+    - **explain**: Also have the AI model phrase why each course was picked
     """
     try:
         # Check permissions
@@ -319,55 +289,61 @@ async def recommend_courses(request: dict, user=Depends(_current_user)):
             "requested_by": user["id"]
         })
 
-        # Get user's learning history
-        progress_db = DatabaseOperations("course_progress")
-        user_progress = await progress_db.find_many({"user_id": target_user_id}, limit=20)
-
-        # Get available courses
-        courses_db = DatabaseOperations("courses")
-        available_courses = await courses_db.find_many({"published": True}, limit=50)
-
-        # Calculate user preferences and performance
-        completed_course_ids = [p["course_id"] for p in user_progress if p.get("completed")]
-        avg_progress = sum([p.get("overall_progress", 0) for p in user_progress]) / max(len(user_progress), 1)
-
-        prompt = f"""
-        Recommend courses for this learner:
+        # Rank from the precomputed index; the model only phrases the explanation
+        if not course_recommender.size:
+            await course_recommender.refresh()
+        limit = min(int(request.get("limit", 5)), 20)
+        recommendations = course_recommender.recommend(
+            target_user_id, k=limit, level=current_level, topics=[*preferred_topics, *goals]
+        )
+        history = course_recommender.interactions.get(target_user_id, {})
+        completed_courses = sum(1 for weight in history.values() if weight >= 1.0)
+
+        explanation = None
+        if request.get("explain") and recommendations:
+            course_lines = "\n".join(
+                f"- {r['title']} ({r['difficulty']}); similar to: {', '.join(r['because_of']) or 'n/a'}; "
+                f"topics: {', '.join(r['matched_topics']) or 'n/a'}"
+                for r in recommendations
+            )
+            prompt = f"""
+        Explain to this learner, in a few friendly sentences per course, why these courses were recommended:
 
         Learner Profile:
         - Current Level: {current_level}
         - Learning Goals: {', '.join(goals) if goals else 'General skill development'}
         - Preferred Topics: {', '.join(preferred_topics) if preferred_topics else 'Open to suggestions'}
-        - Completed Courses: {len(completed_course_ids)}
-        - Average Progress: {avg_progress:.1f}%
-
-        Available Courses: {len(available_courses)} courses
 
-        Provide:
-        1. Top 5 course recommendations with reasons
-        2. Learning path suggestions
-        3. Prerequisites and preparation needed
-        4. Expected time commitment
-        5. Skill development trajectory
+        Recommended Courses:
+{course_lines}
         """
-
-        model = _get_ai()
-        response = model.generate_content(prompt)
+            response = await llm_cache.generate("personalization.recommend_courses", prompt, {
+                "current_level": current_level,
+                "goals": goals,
+                "preferred_topics": preferred_topics,
+                # The prompt names the learner's own courses behind each pick, so they are part of the key
+                "courses": [
+                    {"course_id": r["course_id"], "because_of": r["because_of"], "matched_topics": r["matched_topics"]}
+                    for r in recommendations
+                ]
+            }, ttl=ai_service_settings.personalization_cache_ttl)
+            explanation = response.text
 
         result = {
-            "recommendations": response.text,
+            "recommendations": recommendations,
+            "explanation": explanation,
             "learner_profile": {
                 "current_level": current_level,
                 "goals": goals,
                 "preferred_topics": preferred_topics,
-                "completed_courses": len(completed_course_ids),
-                "average_progress": round(avg_progress, 1)
+                "courses_taken": len(history),
+                "completed_courses": completed_courses
             },
             "recommendation_criteria": {
-                "skill_alignment": "High priority",
-                "difficulty_appropriateness": "Medium priority",
-                "interest_alignment": "High priority",
-                "career_relevance": "Medium priority"
+                "similar_learners": "Courses taken together with yours",
+                "content_similarity": "Topics, tags and descriptions",
+                "topic_alignment": "Goals and preferred topics",
+                "difficulty_appropriateness": "Closest to the current level"
             },
             "generated_at": datetime.now(timezone.utc).isoformat(),
             "recommended_for": target_user_id,
@@ -376,13 +352,13 @@ async def recommend_courses(request: dict, user=Depends(_current_user)):
 
         logger.info("Course recommendations completed", extra={
             "target_user_id": target_user_id,
-            "recommendations_count": 5,  # Assuming 5 recommendations
+            "recommendations_count": len(recommendations),
             "requested_by": user["id"]
         })
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Course recommendation failed", extra={
@@ -393,7 +369,7 @@ async def recommend_courses(request: dict, user=Depends(_current_user)):
         raise HTTPException(500, "Course recommendation failed")
 
 @router.post("/generate-study-plan")
-async def generate_study_plan(request: dict, user=Depends(_current_user)):
+async def generate_study_plan(request: dict, stream: bool = False, user=Depends(budgeted_user)):
     """
     Generate a detailed study plan based on user's goals and schedule.
 
@@ -402,6 +378,7 @@ async def generate_study_plan(request: dict, user=Depends(_current_user)):
     - **timeframe**: Study timeframe (weeks)
     - **daily_hours**: Hours available per day
     - **preferred_times**: Preferred study times
+    - **stream** (query): Stream the text as Server-Sent Events instead of one JSON reply
     """
     try:
         # Check permissions
@@ -450,8 +427,20 @@ async def generate_study_plan(request: dict, user=Depends(_current_user)):
         7. Motivation techniques
         """
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        params = {
+            "goals": goals,
+            "timeframe": timeframe,
+            "daily_hours": daily_hours,
+            "preferred_times": preferred_times,
+            "avg_progress": round(avg_progress, 1)
+        }
+        if stream:
+            return stream_completion(
+                llm_cache.stream("personalization.generate_study_plan", prompt, params, ttl=ai_service_settings.personalization_cache_ttl),
+                {"generated_for": target_user_id, "generated_by": user["id"]}
+            )
+
+        response = await llm_cache.generate("personalization.generate_study_plan", prompt, params, ttl=ai_service_settings.personalization_cache_ttl)
 
         result = {
             "study_plan": response.text,
@@ -480,7 +469,7 @@ async def generate_study_plan(request: dict, user=Depends(_current_user)):
 
         return result
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError, RateLimitError):
         raise
     except Exception as e:
         logger.error("Study plan generation failed", extra={
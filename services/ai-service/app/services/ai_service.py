@@ -1,13 +1,17 @@
 """
 AI Service Business Logic Layer
 """
-import hashlib
+import asyncio
 import json
+import uuid
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 
 from shared.common.logging import get_logger
-from shared.common.errors import ValidationError, DatabaseError, ServiceUnavailableError
+from shared.common.errors import ValidationError, DatabaseError, ServiceUnavailableError, RateLimitError
+from shared.common.batching import MicroBatcher
+from shared.common.llm_cache import CacheKey, llm_cache, make_key
+from shared.common.metrics import metrics_collector
 
 from database.database import ai_db
 from models import (
@@ -24,14 +28,35 @@ from models import (
     PerformancePredictionRequest, PerformancePredictionResponse
 )
 from config.config import ai_service_settings
+from utils.text_analytics import text_analytics
+from utils.token_budget import Usage, count_tokens, token_budget
 
 logger = get_logger("ai-service")
 
+# Request types that call the model; analysis runs on local text analytics
+MODEL_REQUEST_TYPES = {"generation", "enhancement", "personalization"}
+
+# Result cache TTL per request type; personalization results are not cached
+CACHE_TTLS = {
+    "analysis": lambda: ai_service_settings.analysis_cache_ttl,
+    "generation": lambda: llm_cache.ttl_seconds,
+    "enhancement": lambda: ai_service_settings.enhancement_cache_ttl
+}
+
 class AIService:
     """AI service business logic"""
 
     def __init__(self):
         self.db = ai_db
+        self.batcher: Optional[MicroBatcher] = None
+        if ai_service_settings.enable_batching:
+            self.batcher = MicroBatcher(
+                self.process_batch,
+                window=ai_service_settings.batch_window_ms / 1000,
+                max_batch=ai_service_settings.batch_max_size,
+                name="ai_requests"
+            )
+            metrics_collector.register_collector(self.batcher.collect_metrics)
 
     # Core AI operations
     async def process_ai_request(self, request_data: AIRequestCreate) -> AIResult:
@@ -40,41 +65,16 @@ class AIService:
             # Validate request
             self._validate_request(request_data)
 
-            # Check rate limits
-            await self._check_rate_limits(request_data.user_id, request_data.request_type.value)
-
-            # Log request
-            request_id = await self.db.log_ai_request({
-                "user_id": request_data.user_id,
-                "request_type": request_data.request_type.value,
-                "input_text": request_data.input_text,
-                "parameters": request_data.parameters,
-                "model": request_data.model.value if request_data.model else ai_service_settings.default_model
-            })
-
-            # Process based on request type
-            result = await self._process_request_type(request_data, request_id)
-
-            # Save result
-            result_id = await self.db.save_ai_result({
-                "request_id": request_id,
-                "user_id": request_data.user_id,
-                "result_type": result.result_type.value,
-                "content": result.content,
-                "confidence_score": result.confidence_score,
-                "metadata": result.metadata
-            })
-
-            logger.info("AI request processed", extra={
-                "request_id": request_id,
-                "user_id": request_data.user_id,
-                "request_type": request_data.request_type.value,
-                "result_id": result_id
-            })
-
+            # Requests arriving together are processed as one batch; token
+            # budgets are checked per batch so waiting on Redis doesn't split it
+            if self.batcher is not None:
+                return await self.batcher.submit(request_data)
+            result = (await self.process_batch([request_data]))[0]
+            if isinstance(result, RateLimitError):
+                raise result
             return result
 
-        except (ValidationError, DatabaseError, ServiceUnavailableError):
+        except (ValidationError, DatabaseError, ServiceUnavailableError, RateLimitError):
             raise
         except Exception as e:
             logger.error("Failed to process AI request", extra={
@@ -84,127 +84,202 @@ class AIService:
             })
             raise ServiceUnavailableError("ai-service", f"AI processing failed: {str(e)}")
 
-    async def _process_request_type(self, request_data: AIRequestCreate, request_id: str) -> AIResult:
-        """Process request based on type"""
-        if request_data.request_type.value == "analysis":
-            return await self._analyze_content(request_data, request_id)
-        elif request_data.request_type.value == "generation":
-            return await self._generate_content(request_data, request_id)
-        elif request_data.request_type.value == "enhancement":
-            return await self._enhance_content(request_data, request_id)
-        elif request_data.request_type.value == "personalization":
-            return await self._personalize_content(request_data, request_id)
-        else:
-            raise ValidationError("Unsupported request type", "request_type")
-
-    # Content Analysis
-    async def _analyze_content(self, request_data: AIRequestCreate, request_id: str) -> AIResult:
-        """Analyze content using AI"""
-        try:
-            # Check cache first
-            content_hash = self._generate_content_hash(request_data.input_text)
-            cached_result = await self.db.get_cached_content(content_hash)
-
-            if cached_result and ai_service_settings.enable_caching:
-                logger.info("Using cached analysis result", extra={"request_id": request_id})
-                return AIResult(**cached_result["content"])
-
-            # Perform analysis (simplified - would call actual AI API)
-            analysis_result = await self._perform_content_analysis(request_data.input_text)
-
-            # Save result to database and return it
-            result_id = await self.db.save_ai_result({
-                "request_id": request_id,
-                "user_id": request_data.user_id,
-                "result_type": "analysis_report",
-                "content": analysis_result.dict(),
-                "confidence_score": analysis_result.quality_score
-            })
-
-            # Get the saved result
-            saved_result = await self.db.get_ai_result(result_id)
-            if not saved_result:
-                raise DatabaseError("save_ai_result", "Failed to retrieve saved result")
-
-            # Cache result
-            if ai_service_settings.enable_caching:
-                await self.db.save_cached_content({
-                    "content_hash": content_hash,
-                    "content": saved_result,
-                    "request_type": "analysis"
-                })
-
-            return AIResult(**saved_result)
+    async def process_batch(self, requests: List[AIRequestCreate]) -> List[Union[AIResult, RateLimitError]]:
+        """Process a batch of AI requests with one write per collection.
 
-        except Exception as e:
-            logger.error("Content analysis failed", extra={
-                "request_id": request_id,
-                "error": str(e)
+        Token budgets are checked for the whole batch in one round trip;
+        requests over budget get their RateLimitError in place of a result.
+        Identical requests are computed once, cached results are reused,
+        and the request log and results are each written with insert_many.
+        """
+        errors = await self._check_rate_limits(requests)
+        admitted = [request for request, error in zip(requests, errors) if error is None]
+        results = iter(await self._process_admitted(admitted) if admitted else [])
+        return [error if error is not None else next(results) for error in errors]
+
+    async def _process_admitted(self, requests: List[AIRequestCreate]) -> List[AIResult]:
+        now = datetime.now(timezone.utc)
+        keys = [self._cache_key(request) for request in requests]
+
+        # One computation per distinct key, from the cache where possible
+        unique: Dict[str, AIRequestCreate] = {}
+        for key, request in zip(keys, requests):
+            unique.setdefault(key.key, request)
+        key_by_id = {key.key: key for key in keys}
+        bodies: Dict[str, Dict[str, Any]] = {}
+        cacheable = ai_service_settings.enable_caching
+        if cacheable:
+            lookups = await asyncio.gather(*(
+                llm_cache.lookup(key_by_id[key_id]) for key_id, request in unique.items()
+                if request.request_type.value in CACHE_TTLS
+            ))
+            cached_ids = [key_id for key_id, request in unique.items() if request.request_type.value in CACHE_TTLS]
+            bodies.update({key_id: found[0] for key_id, found in zip(cached_ids, lookups) if found is not None})
+
+        missing = {key_id: request for key_id, request in unique.items() if key_id not in bodies}
+        computed = await self._compute_results(list(missing.values()))
+        bodies.update(zip(missing.keys(), computed))
+
+        # Tokens each model call needs; only computed results are charged
+        output_tokens = {
+            key_id: count_tokens(json.dumps(body.get("content"), default=str))
+            for key_id, body in bodies.items() if unique[key_id].request_type.value in MODEL_REQUEST_TYPES
+        }
+        usages: Dict[str, Usage] = {}
+        for key_id, request in missing.items():
+            if key_id in output_tokens:
+                model = request.model.value if request.model else ai_service_settings.default_model
+                usages[key_id] = Usage(request.user_id, request.tenant_id, model, count_tokens(request.input_text), output_tokens[key_id])
+
+        # Log requests and save results in two bulk writes
+        request_docs = []
+        result_docs = []
+        charged = set()
+        for key, request in zip(keys, requests):
+            model = request.model.value if request.model else ai_service_settings.default_model
+            # Duplicates within the batch reuse the first request's result for free
+            usage = usages.get(key.key) if key.key not in charged else None
+            charged.add(key.key)
+            if usage:
+                tokens_used = usage.tokens
+            elif key.key in output_tokens:
+                tokens_used = count_tokens(request.input_text) + output_tokens[key.key]
+            else:
+                tokens_used = 0
+            request_doc = {
+                "_id": str(uuid.uuid4()),
+                "user_id": request.user_id,
+                "request_type": request.request_type.value,
+                "input_text": request.input_text,
+                "parameters": request.parameters,
+                "model": model,
+                "tenant_id": request.tenant_id,
+                "tokens_used": tokens_used,
+                "cost": usage.cost if usage else 0.0,
+                "status": "completed",
+                "created_at": now,
+                "completed_at": now
+            }
+            request_docs.append(request_doc)
+            result_docs.append({
+                "_id": str(uuid.uuid4()),
+                "request_id": request_doc["_id"],
+                "user_id": request.user_id,
+                **bodies[key.key],
+                "created_at": now
             })
-            raise ServiceUnavailableError("ai-service", f"Content analysis failed: {str(e)}")
-
-    async def _perform_content_analysis(self, content: str) -> ContentAnalysisResult:
-        """Perform actual content analysis"""
-        # This would integrate with OpenAI/Anthropic APIs
-        # For now, return mock analysis
-        word_count = len(content.split())
-        readability_score = min(100, max(0, 100 - (word_count / 10)))
-
-        return ContentAnalysisResult(
-            readability_score=readability_score,
-            complexity_level="intermediate",
-            key_topics=["programming", "education"],
-            suggestions=["Add more examples", "Include code snippets"],
-            word_count=word_count,
-            estimated_reading_time=max(1, word_count // 200),
-            quality_score=0.85
+        await asyncio.gather(
+            self.db.log_ai_requests(request_docs),
+            self.db.save_ai_results(result_docs),
+            token_budget.record(list(usages.values()))
         )
 
-    # Content Generation
-    async def _generate_content(self, request_data: AIRequestCreate, request_id: str) -> AIResult:
-        """Generate content using AI"""
-        try:
-            # Check cache
-            content_hash = self._generate_content_hash(str(request_data.dict()))
-            cached_result = await self.db.get_cached_content(content_hash)
-
-            if cached_result and ai_service_settings.enable_caching:
-                logger.info("Using cached generation result", extra={"request_id": request_id})
-                return AIResult(**cached_result["content"])
-
-            # Generate content (simplified)
-            generation_result = await self._perform_content_generation(request_data)
-
-            # Save result to database
-            result_id = await self.db.save_ai_result({
-                "request_id": request_id,
-                "user_id": request_data.user_id,
-                "result_type": "course_content",
-                "content": generation_result.dict()
-            })
+        if cacheable:
+            for key_id, request in missing.items():
+                ttl = CACHE_TTLS.get(request.request_type.value)
+                if ttl is not None:
+                    await llm_cache.store(
+                        key_by_id[key_id], bodies[key_id],
+                        tokens=usages[key_id].tokens if key_id in usages else 0,
+                        ttl=ttl()
+                    )
+
+        logger.info("AI requests processed", extra={
+            "requests": len(requests),
+            "computed": len(missing),
+            "deduplicated": len(requests) - len(unique)
+        })
+        return [AIResult(**doc) for doc in result_docs]
+
+    def _cache_key(self, request_data: AIRequestCreate) -> CacheKey:
+        """Identity of a request's result; only personalization depends on the user"""
+        request_type = request_data.request_type.value
+        model = request_data.model.value if request_data.model else ai_service_settings.default_model
+        if request_type == "analysis":
+            return make_key("ai_service.analysis", {"input_text": request_data.input_text})
+        params = {"input_text": request_data.input_text, "parameters": request_data.parameters or {}}
+        if request_type == "personalization":
+            params["user_id"] = request_data.user_id
+        return make_key(f"ai_service.{request_type}", params, model=model)
+
+    async def _compute_results(self, requests: List[AIRequestCreate]) -> List[Dict[str, Any]]:
+        """Result bodies (type, content, confidence) for distinct requests, in order"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+
+        analyses = [i for i, request in enumerate(requests) if request.request_type.value == "analysis"]
+        if analyses:
+            # Only lesson content joins the corpus the keyword IDF is computed over;
+            # one entry per lesson, replaced when the lesson is analysed again
+            lessons = {}
+            for i in analyses:
+                lesson_id = (requests[i].parameters or {}).get("lesson_id")
+                if lesson_id:
+                    lessons[str(lesson_id)] = requests[i].input_text
+            if lessons:
+                text_analytics.add_documents(lessons)
+            scored = self._score_content_batch([requests[i].input_text for i in analyses])
+            for i, analysis in zip(analyses, scored):
+                results[i] = {
+                    "result_type": "analysis_report",
+                    "content": analysis.dict(),
+                    "confidence_score": analysis.quality_score
+                }
 
-            # Get the saved result
-            saved_result = await self.db.get_ai_result(result_id)
-            if not saved_result:
-                raise DatabaseError("save_ai_result", "Failed to retrieve saved result")
+        async def compute(i: int):
+            request = requests[i]
+            request_type = request.request_type.value
+            if request_type == "generation":
+                generated = await self._perform_content_generation(request)
+                results[i] = {"result_type": "course_content", "content": generated.dict()}
+            elif request_type == "enhancement":
+                enhanced = await self._perform_content_enhancement(request)
+                results[i] = {
+                    "result_type": "enhanced_content",
+                    "content": enhanced.dict(),
+                    "confidence_score": enhanced.confidence_score
+                }
+            elif request_type == "personalization":
+                personalized = await self._perform_content_personalization(request)
+                results[i] = {
+                    "result_type": "recommendations",
+                    "content": personalized.dict(),
+                    "confidence_score": personalized.confidence_score
+                }
+            else:
+                raise ValidationError("Unsupported request type", "request_type")
 
-            # Cache result
-            if ai_service_settings.enable_caching:
-                await self.db.save_cached_content({
-                    "content_hash": content_hash,
-                    "content": saved_result,
-                    "request_type": "generation"
-                })
+        await asyncio.gather(*(compute(i) for i, result in enumerate(results) if result is None))
+        return results
 
-            return AIResult(**saved_result)
+    # Content Analysis
+    def _score_content_batch(self, contents: List[str]) -> List[ContentAnalysisResult]:
+        """Score a batch of texts at once"""
+        # Readability, topics and reading time come from local text analytics;
+        # suggestions and quality would come from the model
+        stats = text_analytics.analyze(contents, max_keywords=5)
+
+        return [
+            ContentAnalysisResult(
+                readability_score=round(float(stats.readability[i]), 2),
+                complexity_level=self._complexity_level(stats.readability[i]),
+                key_topics=stats.keywords[i],
+                suggestions=["Add more examples", "Include code snippets"],
+                word_count=int(stats.word_counts[i]),
+                estimated_reading_time=int(stats.reading_minutes[i]),
+                quality_score=0.85
+            )
+            for i in range(len(contents))
+        ]
 
-        except Exception as e:
-            logger.error("Content generation failed", extra={
-                "request_id": request_id,
-                "error": str(e)
-            })
-            raise ServiceUnavailableError("ai-service", f"Content generation failed: {str(e)}")
+    @staticmethod
+    def _complexity_level(readability: float) -> str:
+        if readability >= 60:
+            return "beginner"
+        if readability >= 30:
+            return "intermediate"
+        return "advanced"
 
+    # Content Generation
     async def _perform_content_generation(self, request_data: AIRequestCreate) -> ContentGenerationResult:
         """Perform actual content generation"""
         # This would integrate with AI APIs
@@ -222,34 +297,6 @@ class AIService:
         )
 
     # Content Enhancement
-    async def _enhance_content(self, request_data: AIRequestCreate, request_id: str) -> AIResult:
-        """Enhance content using AI"""
-        try:
-            enhancement_result = await self._perform_content_enhancement(request_data)
-
-            # Save result to database
-            result_id = await self.db.save_ai_result({
-                "request_id": request_id,
-                "user_id": request_data.user_id,
-                "result_type": "enhanced_content",
-                "content": enhancement_result.dict(),
-                "confidence_score": enhancement_result.confidence_score
-            })
-
-            # Get the saved result
-            saved_result = await self.db.get_ai_result(result_id)
-            if not saved_result:
-                raise DatabaseError("save_ai_result", "Failed to retrieve saved result")
-
-            return AIResult(**saved_result)
-
-        except Exception as e:
-            logger.error("Content enhancement failed", extra={
-                "request_id": request_id,
-                "error": str(e)
-            })
-            raise ServiceUnavailableError("ai-service", f"Content enhancement failed: {str(e)}")
-
     async def _perform_content_enhancement(self, request_data: AIRequestCreate) -> ContentEnhancementResult:
         """Perform actual content enhancement"""
         original_content = request_data.input_text
@@ -267,34 +314,6 @@ class AIService:
         )
 
     # Personalization
-    async def _personalize_content(self, request_data: AIRequestCreate, request_id: str) -> AIResult:
-        """Personalize content using AI"""
-        try:
-            personalization_result = await self._perform_content_personalization(request_data)
-
-            # Save result to database
-            result_id = await self.db.save_ai_result({
-                "request_id": request_id,
-                "user_id": request_data.user_id,
-                "result_type": "recommendations",
-                "content": personalization_result.dict(),
-                "confidence_score": personalization_result.confidence_score
-            })
-
-            # Get the saved result
-            saved_result = await self.db.get_ai_result(result_id)
-            if not saved_result:
-                raise DatabaseError("save_ai_result", "Failed to retrieve saved result")
-
-            return AIResult(**saved_result)
-
-        except Exception as e:
-            logger.error("Content personalization failed", extra={
-                "request_id": request_id,
-                "error": str(e)
-            })
-            raise ServiceUnavailableError("ai-service", f"Content personalization failed: {str(e)}")
-
     async def _perform_content_personalization(self, request_data: AIRequestCreate) -> PersonalizationResult:
         """Perform actual content personalization"""
         # Mock personalization based on user preferences
@@ -386,18 +405,15 @@ class AIService:
         if request_data.parameters and len(str(request_data.parameters)) > 1000:
             raise ValidationError("Parameters too complex", "parameters")
 
-    async def _check_rate_limits(self, user_id: str, request_type: str) -> None:
-        """Check rate limits for user"""
-        # This would implement actual rate limiting logic
-        # For now, just log the check
-        logger.info("Rate limit check", extra={
-            "user_id": user_id,
-            "request_type": request_type
-        })
-
-    def _generate_content_hash(self, content: str) -> str:
-        """Generate hash for content caching"""
-        return hashlib.md5(content.encode()).hexdigest()
+    async def _check_rate_limits(self, requests: List[AIRequestCreate]) -> List[Optional[RateLimitError]]:
+        """Check each model request against its user's and tenant's daily token budgets"""
+        calls = [request for request in requests if request.request_type.value in MODEL_REQUEST_TYPES]
+        errors = iter(await token_budget.check_many([
+            (request.user_id, request.tenant_id, count_tokens(request.input_text),
+             request.model.value if request.model else ai_service_settings.default_model)
+            for request in calls
+        ]) if calls else [])
+        return [next(errors) if request.request_type.value in MODEL_REQUEST_TYPES else None for request in requests]
 
     # Performance Analysis Methods
     async def analyze_performance(self, user_id: str, course_id: Optional[str] = None,
@@ -4,11 +4,15 @@ AI Service Utility Functions
 import hashlib
 import json
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
 
 from shared.common.logging import get_logger
-from shared.common.errors import ValidationError
+from shared.common.errors import APIError, ValidationError
 from config.config import ai_service_settings
+from utils.text_analytics import text_analytics
+from utils.token_budget import count_tokens, estimate_cost as estimate_model_cost
 
 logger = get_logger("ai-service-utils")
 
@@ -28,19 +32,12 @@ def validate_ai_request(request_data: Dict[str, Any]) -> None:
         raise ValidationError("Parameters too complex", "parameters")
 
 def calculate_tokens(text: str) -> int:
-    """Calculate approximate token count for text"""
-    # Simple approximation: 1 token ≈ 4 characters
-    return len(text) // 4
+    """Calculate token count for text"""
+    return count_tokens(text)
 
 def estimate_cost(tokens: int, model: str) -> float:
     """Estimate cost for AI request"""
-    # Simplified cost calculation
-    if model == "gpt-4":
-        return (tokens / 1000) * 0.03  # $0.03 per 1K tokens
-    elif model == "gpt-3.5-turbo":
-        return (tokens / 1000) * 0.002  # $0.002 per 1K tokens
-    else:
-        return (tokens / 1000) * 0.01  # Default rate
+    return estimate_model_cost(model, tokens)
 
 def check_rate_limit(user_id: str, request_type: str) -> bool:
     """Check if user has exceeded rate limits"""
@@ -71,64 +68,46 @@ def format_ai_response(result: Dict[str, Any], result_type: str) -> Dict[str, An
     }
 
 def extract_keywords(text: str, max_keywords: int = 10) -> list:
-    """Extract keywords from text"""
-    # Simple keyword extraction (would use NLP in production)
-    words = text.lower().split()
-    keywords = []
-
-    # Filter out common stop words
-    stop_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by"}
-    filtered_words = [word for word in words if word not in stop_words and len(word) > 3]
-
-    # Count frequency
-    word_count = {}
-    for word in filtered_words:
-        word_count[word] = word_count.get(word, 0) + 1
-
-    # Sort by frequency
-    sorted_words = sorted(word_count.items(), key=lambda x: x[1], reverse=True)
-
-    # Return top keywords
-    keywords = [word for word, count in sorted_words[:max_keywords]]
-
-    return keywords
+    """Extract keywords from text, ranked by TF-IDF over the lesson corpus"""
+    return text_analytics.analyze([text], max_keywords).keywords[0]
 
 def calculate_readability_score(text: str) -> float:
     """Calculate readability score for text"""
-    sentences = text.split('.')
-    words = text.split()
-    syllables = sum(count_syllables(word) for word in words)
-
-    if not sentences or not words:
-        return 0.0
-
-    # Flesch Reading Ease formula
-    score = 206.835 - 1.015 * (len(words) / len(sentences)) - 84.6 * (syllables / len(words))
-
-    return max(0.0, min(100.0, score))
-
-def count_syllables(word: str) -> int:
-    """Count syllables in a word"""
-    word = word.lower()
-    count = 0
-    vowels = "aeiouy"
-
-    if word[0] in vowels:
-        count += 1
-
-    for i in range(1, len(word)):
-        if word[i] in vowels and word[i - 1] not in vowels:
-            count += 1
-
-    if word.endswith("e"):
-        count -= 1
-
-    return max(1, count)
+    return float(text_analytics.analyze([text], 0).readability[0])
 
 def generate_cache_key(user_id: str, content_hash: str, operation: str) -> str:
     """Generate cache key for AI operations"""
     return f"ai:{user_id}:{operation}:{content_hash}"
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def stream_completion(chunks: AsyncIterator[str], done: Dict[str, Any]) -> StreamingResponse:
+    """Relay LLM text chunks as Server-Sent Events.
+
+    Each chunk is a `chunk` event; the stream ends with a `done` event
+    carrying `done` plus the total length, or an `error` event. When the
+    client disconnects the relay is cancelled, which closes `chunks` and
+    aborts the upstream generation.
+    """
+    async def events():
+        length = 0
+        try:
+            async for chunk in chunks:
+                length += len(chunk)
+                yield sse_event("chunk", {"text": chunk})
+        except APIError as e:
+            logger.warning("AI stream failed", extra={"error": e.detail, "streamed_length": length})
+            yield sse_event("error", e.detail)
+            return
+        yield sse_event("done", {**done, "length": length})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 def validate_model_compatibility(model: str, operation: str) -> bool:
     """Validate if model is compatible with operation"""
     compatible_models = {
@@ -0,0 +1,381 @@
+"""
+Course recommendation index
+
+Courses are described by hashed feature vectors (TF-IDF of the title and
+description plus topic, tags, audience and difficulty), and learners by
+their `course_progress` documents. Item-item similarity blends content
+cosine with co-enrollment cosine and is kept precomputed in one dense
+matrix, so a top-k query is a handful of row lookups. Course edits and
+progress updates only recompute the rows of the courses they touch.
+"""
+import asyncio
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from shared.common.database import DatabaseOperations
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+from config.config import ai_service_settings
+from utils.text_analytics import STOP_WORDS, tokenize
+
+logger = get_logger("ai-service-recommender")
+
+LEVELS = {"beginner": 0, "intermediate": 1, "advanced": 2}
+COURSE_FIELDS = {"title": 1, "description": 1, "topic": 1, "tags": 1, "audience": 1, "difficulty": 1, "published": 1, "updated_at": 1}
+PROGRESS_FIELDS = {"user_id": 1, "course_id": 1, "overall_progress": 1, "completed": 1, "updated_at": 1}
+
+
+def _bucket(feature: str, dimensions: int) -> int:
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(feature.encode("utf-8")) % dimensions
+
+
+def interaction_weight(progress: Dict[str, Any]) -> float:
+    """How strongly a progress document ties a learner to a course"""
+    if progress.get("completed"):
+        return 1.0
+    return 0.2 + 0.6 * min(max(float(progress.get("overall_progress") or 0), 0.0), 100.0) / 100
+
+
+class CourseRecommender:
+    """Precomputed item-item similarity over published courses.
+
+    Arrays are sized for `max_courses` slots up front; removed courses leave
+    their slot inactive until the next full `load`.
+    """
+
+    def __init__(
+        self,
+        max_courses: int = 2000,
+        text_dimensions: int = 1024,
+        tag_dimensions: int = 256,
+        content_weight: float = 0.5,
+        full_refresh_seconds: float = 86400
+    ):
+        self.max_courses = max_courses
+        self.text_dimensions = text_dimensions
+        self.tag_dimensions = tag_dimensions
+        self.content_weight = content_weight
+        self.full_refresh_seconds = full_refresh_seconds
+        self._reset()
+        self.collection_refreshed_at: Optional[datetime] = None
+        self.built_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.queries = 0
+
+    def _reset(self):
+        n = self.max_courses
+        self.course_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.courses: List[Dict[str, Any]] = []
+        self._active = np.zeros(n, dtype=bool)
+        self._levels = np.ones(n, dtype=np.int64)
+        self._tf = np.zeros((n, self.text_dimensions), dtype=np.float32)
+        self._tags = np.zeros((n, self.tag_dimensions), dtype=np.float32)
+        self._df = np.zeros(self.text_dimensions, dtype=np.float32)
+        self._features = np.zeros((n, self.text_dimensions + self.tag_dimensions), dtype=np.float32)
+        self._cooccurrence = np.zeros((n, n), dtype=np.float32)
+        self.similarity = np.zeros((n, n), dtype=np.float32)
+        self.interactions: Dict[str, Dict[int, float]] = {}
+
+    @property
+    def size(self) -> int:
+        return int(self._active.sum())
+
+    # Features
+    def _text_vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.text_dimensions, dtype=np.float32)
+        terms = Counter(t for t in tokenize(text) if len(t) > 2 and t not in STOP_WORDS)
+        for term, count in terms.items():
+            vector[_bucket(term, self.text_dimensions)] += 1 + np.log(count)
+        return vector
+
+    def _tag_vector(self, topics: Iterable[str], audience: Optional[str] = None, difficulty: Optional[str] = None) -> np.ndarray:
+        vector = np.zeros(self.tag_dimensions, dtype=np.float32)
+        for topic in topics:
+            vector[_bucket(f"topic:{topic.strip().lower()}", self.tag_dimensions)] += 2.0
+        if audience:
+            vector[_bucket(f"audience:{audience.strip().lower()}", self.tag_dimensions)] += 1.0
+        if difficulty:
+            vector[_bucket(f"difficulty:{difficulty.strip().lower()}", self.tag_dimensions)] += 1.0
+        return vector
+
+    @staticmethod
+    def _topics(course: Dict[str, Any]) -> List[str]:
+        topics = list(course.get("tags") or [])
+        if course.get("topic"):
+            topics.append(course["topic"])
+        return topics
+
+    def _refresh_features(self):
+        """Re-weight every row with the current IDF and normalize.
+
+        Similarity rows that are not recomputed keep the IDF they were built
+        with until the next full load.
+        """
+        n = len(self.course_ids)
+        idf = np.log((1 + n) / (1 + self._df)) + 1
+        features = np.hstack([self._tf[:n] * idf, self._tags[:n]])
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        self._features[:n] = np.divide(features, norms, out=np.zeros_like(features), where=norms > 0)
+
+    def _set_course(self, course: Dict[str, Any]) -> int:
+        course_id = str(course["_id"])
+        i = self.index.get(course_id)
+        if i is None:
+            if len(self.course_ids) >= self.max_courses:
+                raise ValueError(f"Recommendation index is full ({self.max_courses} courses)")
+            i = len(self.course_ids)
+            self.course_ids.append(course_id)
+            self.courses.append({})
+            self.index[course_id] = i
+        elif self._active[i]:
+            self._df -= self._tf[i] > 0
+
+        self._tf[i] = self._text_vector(f"{course.get('title', '')} {course.get('description') or ''}")
+        self._tags[i] = self._tag_vector(self._topics(course), course.get("audience"), course.get("difficulty"))
+        self._df += self._tf[i] > 0
+        self._levels[i] = LEVELS.get(str(course.get("difficulty", "")).lower(), 1)
+        self._active[i] = True
+        self.courses[i] = {
+            "course_id": course_id,
+            "title": course.get("title", ""),
+            "difficulty": course.get("difficulty"),
+            "topics": self._topics(course)
+        }
+        return i
+
+    def _recompute(self, rows: Iterable[int]):
+        """Recompute similarity rows (and the matching columns) for some courses"""
+        rows = np.fromiter(sorted(set(rows)), dtype=np.int64)
+        n = len(self.course_ids)
+        if not len(rows) or not n:
+            return
+        content = self._features[rows] @ self._features[:n].T
+        diagonal = np.diag(self._cooccurrence)[:n]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            collaborative = self._cooccurrence[rows, :n] / np.sqrt(np.outer(diagonal[rows], diagonal))
+        collaborative = np.nan_to_num(collaborative, nan=0.0, posinf=0.0)
+        blended = self.content_weight * content + (1 - self.content_weight) * collaborative
+        blended[:, ~self._active[:n]] = 0
+        blended[~self._active[rows]] = 0
+        self.similarity[rows, :n] = blended
+        self.similarity[:n, rows] = blended.T
+        self.similarity[rows, rows] = 0
+
+    def _apply_interactions(self, user_id: str, weights: Dict[int, float]) -> Set[int]:
+        """Replace a learner's interactions, updating co-occurrence; returns the courses touched"""
+        old = self.interactions.get(user_id, {})
+        for items, sign in ((old, -1.0), (weights, 1.0)):
+            if items:
+                idx = np.fromiter(items.keys(), dtype=np.int64)
+                w = np.fromiter(items.values(), dtype=np.float32)
+                self._cooccurrence[np.ix_(idx, idx)] += sign * np.outer(w, w)
+        if weights:
+            self.interactions[user_id] = weights
+        else:
+            self.interactions.pop(user_id, None)
+        return set(old) | set(weights)
+
+    # Index maintenance
+    def load(self, courses: Iterable[Dict[str, Any]], progress: Iterable[Dict[str, Any]]):
+        """Rebuild the whole index"""
+        start = time.perf_counter()
+        self._reset()
+        for course in courses:
+            if course.get("published", True):
+                self._set_course(course)
+        self._refresh_features()
+        users: Dict[str, Dict[int, float]] = {}
+        for doc in progress:
+            i = self.index.get(str(doc.get("course_id")))
+            if i is not None and doc.get("user_id"):
+                users.setdefault(doc["user_id"], {})[i] = interaction_weight(doc)
+        for user_id, weights in users.items():
+            self._apply_interactions(user_id, weights)
+        self._recompute(range(len(self.course_ids)))
+        self.built_at = time.time()
+        metrics_collector.observe("recommender_build_seconds", time.perf_counter() - start)
+        logger.info("Recommendation index built", extra={"courses": self.size, "learners": len(self.interactions)})
+
+    def upsert_courses(self, courses: Iterable[Dict[str, Any]]):
+        """Add, update or (when unpublished) remove courses"""
+        changed = []
+        removed = []
+        for course in courses:
+            if course.get("published", True):
+                changed.append(self._set_course(course))
+            else:
+                removed.append(str(course["_id"]))
+        if changed:
+            self._refresh_features()
+            self._recompute(changed)
+        self.remove_courses(removed)
+
+    def remove_courses(self, course_ids: Iterable[str]):
+        """Deactivate courses; their slots are reclaimed by the next full load"""
+        rows = [self.index[c] for c in course_ids if c in self.index and self._active[self.index[c]]]
+        if not rows:
+            return
+        for i in rows:
+            self._df -= self._tf[i] > 0
+            self._active[i] = False
+        self.similarity[rows, :] = 0
+        self.similarity[:, rows] = 0
+
+    def update_progress(self, progress: Iterable[Dict[str, Any]]):
+        """Apply new or changed progress documents"""
+        users: Dict[str, Dict[int, float]] = {}
+        for doc in progress:
+            i = self.index.get(str(doc.get("course_id")))
+            if i is not None and doc.get("user_id"):
+                users.setdefault(doc["user_id"], {})[i] = interaction_weight(doc)
+        touched: Set[int] = set()
+        for user_id, weights in users.items():
+            touched |= self._apply_interactions(user_id, {**self.interactions.get(user_id, {}), **weights})
+        self._recompute(touched)
+
+    # Queries
+    def recommend(
+        self,
+        user_id: Optional[str] = None,
+        k: int = 5,
+        level: Optional[str] = None,
+        topics: Iterable[str] = (),
+        exclude: Iterable[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """Top-k courses for a learner, with the courses and topics behind each one"""
+        self.queries += 1
+        n = len(self.course_ids)
+        if not n:
+            return []
+        history = self.interactions.get(user_id, {}) if user_id else {}
+        scores = np.zeros(n, dtype=np.float32)
+        if history:
+            items = np.fromiter(history.keys(), dtype=np.int64)
+            weights = np.fromiter(history.values(), dtype=np.float32)
+            contributions = weights[:, None] * self.similarity[items, :n]
+            scores += contributions.sum(axis=0)
+        topics = [t for t in topics if t]
+        topic_scores = None
+        if topics:
+            query = np.hstack([self._text_vector(" ".join(topics)), self._tag_vector(topics)])
+            norm = np.linalg.norm(query)
+            if norm:
+                topic_scores = self._features[:n] @ (query / norm)
+                scores += topic_scores
+        if not scores.any():
+            # No history or topics to go on: most enrolled courses first
+            scores = np.diag(self._cooccurrence)[:n].copy()
+        if level is not None:
+            distance = np.abs(self._levels[:n] - LEVELS.get(level.lower(), 1))
+            scores *= 1 - 0.25 * distance
+
+        candidates = self._active[:n].copy()
+        candidates[list(history)] = False
+        for course_id in exclude:
+            if course_id in self.index:
+                candidates[self.index[course_id]] = False
+        scores = np.where(candidates, scores, -np.inf)
+        k = min(k, int(candidates.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for j in top.tolist():
+            because = []
+            if history:
+                best = int(np.argmax(contributions[:, j]))
+                if contributions[best, j] > 0:
+                    because.append(self.courses[int(items[best])]["title"])
+            results.append({
+                **self.courses[j],
+                "score": round(float(scores[j]), 4),
+                "because_of": because,
+                "matched_topics": [t for t in topics if t.lower() in {c.lower() for c in self.courses[j]["topics"]}]
+            })
+        return results
+
+    def similar(self, course_id: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Courses most similar to one course"""
+        i = self.index.get(course_id)
+        if i is None:
+            return []
+        n = len(self.course_ids)
+        row = np.where(self._active[:n], self.similarity[i, :n], -np.inf)
+        row[i] = -np.inf
+        top = np.argsort(-row, kind="stable")[:k]
+        return [{**self.courses[j], "score": round(float(row[j]), 4)} for j in top.tolist() if np.isfinite(row[j])]
+
+    def precision_at_k(self, held_out: Dict[str, Set[str]], k: int = 5) -> float:
+        """Mean fraction of each learner's top-k found in their held-out courses"""
+        if not held_out:
+            return 0.0
+        hits = [
+            len({r["course_id"] for r in self.recommend(user_id, k)} & relevant) / k
+            for user_id, relevant in held_out.items()
+        ]
+        return float(np.mean(hits))
+
+    # Refresh from MongoDB
+    async def refresh(self, full: bool = False):
+        """Load the catalog and progress, or just what changed since the last refresh"""
+        now = datetime.now(timezone.utc)
+        courses_db = DatabaseOperations("courses")
+        progress_db = DatabaseOperations("course_progress")
+        if full or self.collection_refreshed_at is None or time.time() - self.built_at > self.full_refresh_seconds:
+            courses = await courses_db.find_many({"published": True}, COURSE_FIELDS, limit=self.max_courses)
+            progress = await progress_db.find_many({}, PROGRESS_FIELDS)
+            self.load(courses, progress)
+        else:
+            since = {"updated_at": {"$gte": self.collection_refreshed_at}}
+            courses = await courses_db.find_many(since, COURSE_FIELDS)
+            progress = await progress_db.find_many(since, PROGRESS_FIELDS)
+            if len(self.course_ids) + len(courses) > self.max_courses:
+                return await self.refresh(full=True)
+            self.upsert_courses(courses)
+            self.update_progress(progress)
+        self.collection_refreshed_at = now
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Recommendation index refresh failed", extra={"error": str(e)})
+
+    def start(self, interval: float):
+        """Refresh incrementally every `interval` seconds on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("recommender_courses", self.size)
+        collector.gauge_set("recommender_learners", len(self.interactions))
+        collector.gauge_set("recommender_queries", self.queries)
+
+
+course_recommender = CourseRecommender(
+    max_courses=ai_service_settings.recommendation_max_courses,
+    content_weight=ai_service_settings.recommendation_content_weight,
+    full_refresh_seconds=ai_service_settings.recommendation_full_refresh_seconds
+)
+metrics_collector.register_collector(course_recommender.collect_metrics)
@@ -0,0 +1,228 @@
+"""
+Batch text analytics for lesson content
+
+Each document is tokenized once and readability, reading time and TF-IDF
+keywords are all derived from that token stream, for many documents per
+call. Terms share one vocabulary, so per-word work such as syllable
+counting happens once per distinct word. The corpus IDF index is updated
+incrementally as lessons are added, edited or removed, and terms no lesson
+uses are pruned from the vocabulary once it grows past a cap.
+"""
+import string
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+# Punctuation separates words; apostrophes are dropped so "don't" is one word
+PUNCTUATION = str.maketrans({**{mark: " " for mark in string.punctuation}, "'": None})
+STOP_WORDS = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by"}
+VOWELS = "aeiouy"
+WORDS_PER_MINUTE = 200
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text"""
+    return text.lower().translate(PUNCTUATION).split()
+
+
+def count_syllables(word: str) -> int:
+    """Count syllables in a word"""
+    word = word.lower()
+    count = 0
+
+    if word[0] in VOWELS:
+        count += 1
+
+    for i in range(1, len(word)):
+        if word[i] in VOWELS and word[i - 1] not in VOWELS:
+            count += 1
+
+    if word.endswith("e"):
+        count -= 1
+
+    return max(1, count)
+
+
+@dataclass
+class TextBatch:
+    """Metrics for a batch of documents, one entry per document"""
+    word_counts: np.ndarray
+    sentence_counts: np.ndarray
+    syllable_counts: np.ndarray
+    readability: np.ndarray  # Flesch reading ease, clipped to 0-100
+    reading_minutes: np.ndarray
+    keywords: List[List[str]]
+
+
+class TextAnalytics:
+    """Vocabulary, per-term statistics and the corpus document frequencies.
+
+    Documents are held as arrays of term ids; the document-term matrix for
+    a batch is built in sparse (document, term, count) form with NumPy, so
+    only tokenization and vocabulary lookup run per word in Python.
+    """
+
+    def __init__(self, max_documents: int = 50000, max_terms: int = 200000):
+        self.max_documents = max_documents
+        self.max_terms = max_terms
+        self._compact_at = max_terms
+        self.vocabulary: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self._syllables = np.zeros(0, dtype=np.int64)
+        self._keyword = np.zeros(0, dtype=bool)
+        self._df = np.zeros(0, dtype=np.int64)
+        self._idf: Optional[np.ndarray] = None
+        self.documents: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def _register_new_terms(self):
+        """Fill in statistics for terms added to the vocabulary since the last call"""
+        known = len(self.terms)
+        size = len(self.vocabulary)
+        if size == known:
+            return
+        new = list(islice(self.vocabulary, known, None))
+        self.terms.extend(new)
+        if size > len(self._df):
+            capacity = max(size, 2 * len(self._df), 1024)
+            self._syllables = np.resize(self._syllables, capacity)
+            self._keyword = np.resize(self._keyword, capacity)
+            self._df = np.concatenate([self._df, np.zeros(capacity - len(self._df), dtype=np.int64)])
+        self._syllables[known:size] = [count_syllables(term) for term in new]
+        self._keyword[known:size] = [len(term) > 3 and term not in STOP_WORDS for term in new]
+        self._idf = None
+
+    def _tokenize(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Term ids of every token, the document of each token, and sentence counts"""
+        tokens: List[str] = []
+        lengths = np.zeros(len(texts), dtype=np.int64)
+        sentences = np.zeros(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            found = tokenize(text)
+            tokens += found
+            lengths[i] = len(found)
+            sentences[i] = text.count(".") + text.count("!") + text.count("?")
+
+        vocabulary = self.vocabulary
+        ids = list(map(vocabulary.get, tokens))
+        if None in ids:
+            for term in sorted(set(tokens).difference(vocabulary)):
+                vocabulary[term] = len(vocabulary)
+            self._register_new_terms()
+            ids = list(map(vocabulary.__getitem__, tokens))
+        return np.array(ids, dtype=np.int64), np.repeat(np.arange(len(texts)), lengths), sentences
+
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency of every vocabulary term"""
+        if self._idf is None:
+            n = len(self.documents)
+            self._idf = np.log((1 + n) / (1 + self._df[:len(self.terms)])) + 1
+        return self._idf
+
+    def analyze(self, texts: Sequence[str], max_keywords: int = 10) -> TextBatch:
+        """Readability, reading time and top TF-IDF keywords for each text"""
+        ids, docs, sentences = self._tokenize(texts)
+        n = len(texts)
+        words = np.bincount(docs, minlength=n)
+        syllables = np.bincount(docs, weights=self._syllables[ids], minlength=n)
+
+        # Flesch reading ease
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = 206.835 - 1.015 * (words / np.maximum(sentences, 1)) - 84.6 * (syllables / words)
+        readability = np.where(words > 0, np.clip(score, 0.0, 100.0), 0.0)
+
+        batch = TextBatch(
+            word_counts=words,
+            sentence_counts=np.maximum(sentences, 1),
+            syllable_counts=syllables.astype(np.int64),
+            readability=readability,
+            reading_minutes=np.maximum(1, words // WORDS_PER_MINUTE),
+            keywords=self._top_keywords(ids, docs, n, max_keywords)
+        )
+        self._compact()
+        return batch
+
+    def _top_keywords(self, ids: np.ndarray, docs: np.ndarray, n: int, k: int) -> List[List[str]]:
+        mask = self._keyword[ids]
+        ids, docs = ids[mask], docs[mask]
+        size = max(len(self.terms), 1)
+
+        # Sparse document-term counts as (document, term, count) triples
+        pairs, counts = np.unique(docs * size + ids, return_counts=True)
+        doc_of, term_of = np.divmod(pairs, size)
+        scores = counts * self.idf()[term_of]
+
+        # Best k per document: sort by document, then score descending
+        order = np.lexsort((term_of, -scores, doc_of))
+        ranked_docs = doc_of[order]
+        rank = np.arange(len(order)) - np.searchsorted(ranked_docs, ranked_docs)
+        top = order[rank < k]
+        bounds = np.searchsorted(doc_of[top], np.arange(n + 1))
+        top_terms = term_of[top].tolist()
+        terms = self.terms
+        return [[terms[t] for t in top_terms[bounds[i]:bounds[i + 1]]] for i in range(n)]
+
+    # Corpus index
+    def add_documents(self, documents: Dict[str, str]):
+        """Add or replace corpus documents by id, updating document frequencies"""
+        self.remove_documents([doc_id for doc_id in documents if doc_id in self.documents])
+        ids, docs, _ = self._tokenize(list(documents.values()))
+        size = len(self.terms)
+        if not size:
+            return
+        pairs = np.unique(docs * size + ids)
+        doc_of, term_of = np.divmod(pairs, size)
+        self._df[:size] += np.bincount(term_of, minlength=size)
+        bounds = np.searchsorted(doc_of, np.arange(len(documents) + 1))
+        for i, doc_id in enumerate(documents):
+            self.documents[doc_id] = term_of[bounds[i]:bounds[i + 1]]
+        self._idf = None
+
+        overflow = len(self.documents) - self.max_documents
+        if overflow > 0:
+            self.remove_documents(list(islice(self.documents, overflow)))
+
+    def remove_documents(self, doc_ids: Iterable[str]):
+        """Drop documents from the corpus"""
+        removed = [self.documents.pop(doc_id) for doc_id in doc_ids if doc_id in self.documents]
+        if removed:
+            terms = np.concatenate(removed)
+            self._df[:len(self.terms)] -= np.bincount(terms, minlength=len(self.terms))
+            self._idf = None
+            self._compact()
+
+    def _compact(self):
+        """Drop terms no corpus document uses once the vocabulary passes its cap.
+
+        Analysed texts register their words too, so without this the
+        vocabulary would grow with every distinct word ever submitted.
+        """
+        size = len(self.terms)
+        if size <= self._compact_at:
+            return
+        live = np.flatnonzero(self._df[:size] > 0)
+        remap = np.full(size, -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+
+        self.terms = [self.terms[i] for i in live.tolist()]
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self._syllables = self._syllables[live]
+        self._keyword = self._keyword[live]
+        self._df = self._df[live]
+        for doc_id, terms in self.documents.items():
+            self.documents[doc_id] = remap[terms]
+        self._idf = None
+        # Live terms alone may be near the cap; don't rebuild on every call
+        self._compact_at = max(self.max_terms, 2 * len(self.terms))
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("text_analytics_corpus_documents", len(self.documents))
+        collector.gauge_set("text_analytics_vocabulary_terms", len(self.terms))
+
+
+text_analytics = TextAnalytics()
+metrics_collector.register_collector(text_analytics.collect_metrics)
@@ -0,0 +1,449 @@
+"""
+Token accounting and budgets for LLM calls
+
+Prompts are counted with a local tokenizer before the model is called and
+checked against per-user and per-tenant daily budgets. The usage of each
+call is added to Redis counters, and a background task flushes those
+counters to MongoDB.
+"""
+import asyncio
+import math
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Depends
+from pymongo import UpdateOne
+
+from shared.common.auth import get_current_user
+from shared.common.cache import cache_manager
+from shared.common.errors import RateLimitError
+from shared.common.llm import LLMClient, LLMResponse, llm_client
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+from config.config import ai_service_settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = get_logger("ai-service-token-budget")
+
+KEY_PREFIX = "ai:usage:"
+DIRTY_KEYS = f"{KEY_PREFIX}dirty"
+
+# Words, digit groups, symbol runs and whitespace, split the way BPE
+# pre-tokenizers split text before merging
+PIECE_PATTERN = re.compile(r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+")
+
+
+@lru_cache(maxsize=65536)
+def _piece_tokens(piece: str) -> int:
+    word = piece.strip()
+    if not word:
+        return 1
+    if not word.isascii():
+        return len(word)
+    if word[0].isalpha():
+        # Common words are one token; long words split into several pieces
+        return 1 if len(word) <= 8 else 1 + math.ceil((len(word) - 8) / 5)
+    if word[0].isdigit():
+        return 1
+    return max(1, len(word) // 2)
+
+
+class Tokenizer:
+    """Counts tokens with tiktoken when it's installed, else with the local pre-tokenizer"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logger.warning("tiktoken encoding unavailable, using local token counts", extra={"error": str(e)})
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return sum(map(_piece_tokens, PIECE_PATTERN.findall(text)))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of `text` within `max_tokens`, cut between pieces"""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        used = 0
+        for match in PIECE_PATTERN.finditer(text):
+            used += _piece_tokens(match.group())
+            if used > max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+
+tokenizer = Tokenizer()
+
+
+def count_tokens(text: str) -> int:
+    """Token count of a prompt or completion"""
+    return tokenizer.count(text)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """Dollar cost of a call from the configured per-1K-token prices"""
+    input_price, output_price = ai_service_settings.model_token_prices.get(model, ai_service_settings.default_token_price)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+
+def fit_prompt(build: Callable[[str], str], content: str, max_tokens: Optional[int] = None) -> Tuple[str, str]:
+    """Build a prompt around `content`, trimming the content so the whole prompt fits.
+
+    `build` renders the prompt for a given content; the content is cut to
+    whatever room the rest of the prompt leaves. Returns the prompt and the
+    (possibly trimmed) content.
+    """
+    max_tokens = max_tokens or ai_service_settings.max_tokens_per_request
+    prompt = build(content)
+    excess = count_tokens(prompt) - max_tokens
+    if excess <= 0:
+        return prompt, content
+
+    # Pieces can merge differently at the seams, so re-measure until it fits
+    room = count_tokens(content)
+    trimmed = content
+    while excess > 0 and trimmed:
+        room = max(0, room - excess)
+        trimmed = tokenizer.truncate(content, room)
+        prompt = build(trimmed)
+        excess = count_tokens(prompt) - max_tokens
+    metrics_collector.counter_inc("ai_prompts_trimmed_total")
+    logger.info("Prompt content trimmed to budget", extra={"max_tokens": max_tokens, "original_length": len(content), "trimmed_length": len(trimmed)})
+    return prompt, trimmed
+
+
+@dataclass
+class Usage:
+    """Tokens used by one model call"""
+    user_id: str
+    tenant_id: Optional[str]
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.completion_tokens)
+
+
+class TokenBudget:
+    """Daily token and cost budgets per user and per tenant, counted in Redis.
+
+    Each subject has one hash per UTC day holding tokens, cost and request
+    counts. A check is one pipelined HMGET round trip before the call, or
+    before a whole batch of calls.
+    Recording is one MULTI that increments every subject's hash and adds
+    the touched keys to a dirty set; `flush` drains that set into MongoDB
+    with one bulk_write of the day totals, so re-flushing a key is harmless.
+    Without Redis, checks and recording are skipped (fail open).
+    """
+
+    def __init__(
+        self,
+        user_daily_tokens: int = 200000,
+        tenant_daily_tokens: int = 5000000,
+        tenant_daily_cost: float = 50.0,
+        flush_interval: float = 30.0,
+        redis_client: Any = None
+    ):
+        self.limits = {"user": user_daily_tokens, "tenant": tenant_daily_tokens}
+        self.tenant_daily_cost = tenant_daily_cost
+        self.flush_interval = flush_interval
+        self.redis_client = redis_client
+        self.clock = time.time
+        self.collection: Any = None
+        self._task: Optional[asyncio.Task] = None
+        self.rejections = 0
+        self.tokens_recorded = 0
+        self.documents_flushed = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    def _day(self) -> str:
+        return time.strftime("%Y%m%d", time.gmtime(self.clock()))
+
+    def _seconds_to_midnight(self) -> int:
+        now = self.clock()
+        return max(1, int(86400 - now % 86400))
+
+    @staticmethod
+    def _subjects(user_id: str, tenant_id: Optional[str]) -> List[Tuple[str, str]]:
+        subjects = [("user", user_id)]
+        if tenant_id:
+            subjects.append(("tenant", tenant_id))
+        return subjects
+
+    @staticmethod
+    def _key(scope: str, subject: str, day: str) -> str:
+        return f"{KEY_PREFIX}{scope}:{subject}:{day}"
+
+    async def check(self, user_id: str, tenant_id: Optional[str], tokens: int, model: Optional[str] = None):
+        """Raise RateLimitError if `tokens` more would exceed a budget today"""
+        error = (await self.check_many([(user_id, tenant_id, tokens, model)]))[0]
+        if error is not None:
+            raise error
+
+    async def check_many(
+        self, calls: List[Tuple[str, Optional[str], int, Optional[str]]]
+    ) -> List[Optional[RateLimitError]]:
+        """Check (user_id, tenant_id, tokens, model) calls together in one round trip.
+
+        Calls are admitted in order and count against the same subjects'
+        budgets as the calls admitted before them; each rejected call gets
+        its RateLimitError in place of None.
+        """
+        errors: List[Optional[RateLimitError]] = [None] * len(calls)
+        client = await self._client()
+        if client is None:
+            return errors
+        day = self._day()
+        subjects = list(dict.fromkeys(
+            subject for user_id, tenant_id, _, _ in calls for subject in self._subjects(user_id, tenant_id)
+        ))
+        try:
+            pipe = client.pipeline(transaction=False)
+            for scope, subject in subjects:
+                pipe.hmget(self._key(scope, subject, day), "tokens", "cost")
+            replies = await pipe.execute()
+        except Exception as e:
+            logger.warning("Token budget check failed", extra={"error": str(e)})
+            return errors
+
+        used = {key: [int(used_tokens or 0), float(used_cost or 0)] for key, (used_tokens, used_cost) in zip(subjects, replies)}
+        for i, (user_id, tenant_id, tokens, model) in enumerate(calls):
+            cost = estimate_cost(model or llm_client.model, tokens)
+            call_subjects = self._subjects(user_id, tenant_id)
+            for scope, subject in call_subjects:
+                used_tokens, used_cost = used[(scope, subject)]
+                over_cost = scope == "tenant" and used_cost + cost > self.tenant_daily_cost
+                if used_tokens + tokens > self.limits[scope] or over_cost:
+                    self.rejections += 1
+                    metrics_collector.counter_inc("ai_token_budget_rejections_total", tags={"scope": scope})
+                    logger.warning("Token budget exceeded", extra={"scope": scope, "subject": subject, "tokens_used": used_tokens, "requested": tokens})
+                    errors[i] = RateLimitError(self.limits[scope], self._seconds_to_midnight(), {
+                        "reason": "daily_cost_limit" if over_cost else "daily_token_budget",
+                        "scope": scope,
+                        "tokens_used": used_tokens,
+                        "tokens_requested": tokens
+                    })
+                    break
+            else:
+                for key in call_subjects:
+                    used[key][0] += tokens
+                    used[key][1] += cost
+        return errors
+
+    async def record(self, usages: List[Usage]):
+        """Add the usage of finished calls to today's counters"""
+        if not usages:
+            return
+        for usage in usages:
+            metrics_collector.counter_inc("ai_tokens_total", usage.prompt_tokens, {"model": usage.model, "kind": "prompt"})
+            metrics_collector.counter_inc("ai_tokens_total", usage.completion_tokens, {"model": usage.model, "kind": "completion"})
+            self.tokens_recorded += usage.tokens
+        client = await self._client()
+        if client is None:
+            return
+        day = self._day()
+        try:
+            pipe = client.pipeline(transaction=True)
+            for usage in usages:
+                cost = usage.cost
+                for scope, subject in self._subjects(usage.user_id, usage.tenant_id):
+                    key = self._key(scope, subject, day)
+                    pipe.hincrby(key, "tokens", usage.tokens)
+                    pipe.hincrby(key, "prompt_tokens", usage.prompt_tokens)
+                    pipe.hincrby(key, "completion_tokens", usage.completion_tokens)
+                    pipe.hincrby(key, "requests", 1)
+                    pipe.hincrby(key, f"model:{usage.model}", usage.tokens)
+                    pipe.hincrbyfloat(key, "cost", cost)
+                    pipe.expire(key, 3 * 86400)
+                    pipe.sadd(DIRTY_KEYS, key)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Token usage not recorded", extra={"error": str(e), "calls": len(usages)})
+
+    async def usage(self, scope: str, subject: str) -> Dict[str, Any]:
+        """Today's counters for a user or tenant"""
+        client = await self._client()
+        if client is None:
+            return {}
+        return self._document(scope, subject, self._day(), await client.hgetall(self._key(scope, subject, self._day())))
+
+    @staticmethod
+    def _document(scope: str, subject: str, day: str, fields: Dict[str, str]) -> Dict[str, Any]:
+        models = {name[6:]: int(value) for name, value in fields.items() if name.startswith("model:")}
+        return {
+            "scope": scope,
+            "subject": subject,
+            "day": day,
+            "tokens": int(fields.get("tokens", 0)),
+            "prompt_tokens": int(fields.get("prompt_tokens", 0)),
+            "completion_tokens": int(fields.get("completion_tokens", 0)),
+            "requests": int(fields.get("requests", 0)),
+            "cost": float(fields.get("cost", 0)),
+            "tokens_by_model": models
+        }
+
+    async def flush(self) -> int:
+        """Write the day totals of every counter changed since the last flush"""
+        client = await self._client()
+        if client is None or self.collection is None:
+            return 0
+        keys = await client.spop(DIRTY_KEYS, 1000)
+        if not keys:
+            return 0
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            hashes = await pipe.execute()
+
+            now = datetime.now(timezone.utc)
+            operations = []
+            for key, fields in zip(keys, hashes):
+                if not fields:
+                    continue
+                scope, rest = key[len(KEY_PREFIX):].split(":", 1)
+                subject, day = rest.rsplit(":", 1)
+                document = self._document(scope, subject, day, fields)
+                document["updated_at"] = now
+                operations.append(UpdateOne({"_id": key[len(KEY_PREFIX):]}, {"$set": document}, upsert=True))
+            if operations:
+                await self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            await client.sadd(DIRTY_KEYS, *keys)
+            raise
+        self.documents_flushed += len(operations)
+        return len(operations)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                while await self.flush() >= 1000:
+                    pass
+            except Exception as e:
+                logger.error("Token usage flush failed", extra={"error": str(e)})
+
+    def start(self, collection: Any):
+        """Flush counters to `collection` periodically on the running event loop"""
+        self.collection = collection
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Final token usage flush failed", extra={"error": str(e)})
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("ai_token_budget_rejections", self.rejections)
+        collector.gauge_set("ai_tokens_recorded", self.tokens_recorded)
+
+
+# Whose budget the current request's model calls are charged to
+budget_subject: ContextVar[Optional[Tuple[str, Optional[str]]]] = ContextVar("ai_budget_subject", default=None)
+
+
+async def budgeted_user(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+    """get_current_user that also charges this request's model calls to the user and tenant"""
+    budget_subject.set((user["id"], user.get("tenant_id")))
+    return user
+
+
+class MeteredLLM:
+    """LLM client wrapper that enforces and records token budgets.
+
+    Calls made while a budget subject is set are checked against the
+    subject's budgets before the request and recorded after it; other
+    calls are only counted in metrics.
+    """
+
+    def __init__(self, client: LLMClient, budget: TokenBudget):
+        self.client = client
+        self.budget = budget
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    @property
+    def configured(self) -> bool:
+        return self.client.configured
+
+    async def _check(self, prompt: str, model: str) -> Tuple[int, Optional[Tuple[str, Optional[str]]]]:
+        prompt_tokens = count_tokens(prompt)
+        subject = budget_subject.get()
+        if subject is not None:
+            await self.budget.check(subject[0], subject[1], prompt_tokens, model)
+        return prompt_tokens, subject
+
+    async def _record(self, subject, model: str, prompt_tokens: int, text: str):
+        user_id, tenant_id = subject if subject is not None else ("system", None)
+        await self.budget.record([Usage(user_id, tenant_id, model, prompt_tokens, count_tokens(text))])
+
+    async def generate(self, prompt: str, model: Optional[str] = None, **kwargs: Any) -> LLMResponse:
+        model = model or self.client.model
+        prompt_tokens, subject = await self._check(prompt, model)
+        response = await self.client.generate(prompt, model=model, **kwargs)
+        await self._record(subject, model, prompt_tokens, response.text)
+        return response
+
+    async def stream(self, prompt: str, model: Optional[str] = None, **kwargs: Any) -> AsyncIterator[str]:
+        model = model or self.client.model
+        prompt_tokens, subject = await self._check(prompt, model)
+        chunks: List[str] = []
+        try:
+            async for chunk in self.client.stream(prompt, model=model, **kwargs):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # An abandoned stream is charged for what was generated before it stopped
+            await self._record(subject, model, prompt_tokens, "".join(chunks))
+
+
+token_budget = TokenBudget(
+    user_daily_tokens=ai_service_settings.user_daily_token_budget,
+    tenant_daily_tokens=ai_service_settings.tenant_daily_token_budget,
+    tenant_daily_cost=ai_service_settings.daily_cost_limit,
+    flush_interval=ai_service_settings.usage_flush_interval_seconds
+)
+metrics_collector.register_collector(token_budget.collect_metrics)
+
+metered_llm = MeteredLLM(llm_client, token_budget)
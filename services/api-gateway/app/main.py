@@ -8,17 +8,15 @@ import uvicorn
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.monitoring import setup_metrics
+from shared.common.tracing import setup_tracing
 from shared.common.database import get_database, close_connection
 # Temporarily disabled cache import due to compatibility issues
 # from shared.common.cache import close_connection as close_cache
-# Temporarily disabled middleware imports due to FastAPI version compatibility issues
-# from shared.common.middleware import (
-#     create_cors_middleware,
-#     RequestLoggingMiddleware,
-#     RateLimitMiddleware
-# )
-
-from routes.proxy import router as proxy_router
+from shared.common.middleware import RateLimitMiddleware
+from shared.common.load_shedding import LoadShedder
+
+from routes.proxy import router as proxy_router, close_http_client
 from routes.health import router as health_router
 from routes.discovery import router as discovery_router
 from routes.monitoring import router as monitoring_router
@@ -26,6 +24,12 @@ from routes.monitoring import router as monitoring_router
 # Initialize logger
 logger = get_logger("api-gateway")
 
+# Admission control shared by the middleware and the monitoring routes
+load_shedder = LoadShedder(
+    max_in_flight=settings.gateway_max_in_flight,
+    latency_target=settings.gateway_latency_target_seconds
+)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan context manager"""
@@ -48,6 +52,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down API Gateway")
+    await close_http_client()
     await close_connection()
     # await close_cache()  # Temporarily disabled
 
@@ -68,9 +73,16 @@ def create_application() -> FastAPI:
     # app.add_middleware(create_cors_middleware())
     # app.add_middleware(RequestLoggingMiddleware)
 
-    # Add rate limiting in production (moderate for gateway)
-    # if settings.environment == "production":
-    #     app.add_middleware(RateLimitMiddleware, requests_per_minute=1000)
+    # Load shedding and per-user/role/route rate limiting
+    if settings.rate_limit_enabled:
+        app.add_middleware(RateLimitMiddleware, shedder=load_shedder, requests_per_minute=1000)
+    app.state.load_shedder = load_shedder
+
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "api-gateway")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "api-gateway")
 
     # Include routers (order matters - specific routes before catch-all)
     app.include_router(health_router, prefix="", tags=["Health"])
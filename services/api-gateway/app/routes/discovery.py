@@ -7,6 +7,7 @@ import asyncio
 from typing import Dict, Any, List
 
 from shared.common.logging import get_logger
+from shared.common.tracing import TracingTransport
 
 logger = get_logger("api-gateway")
 router = APIRouter()
@@ -105,7 +106,7 @@ async def get_service_details(service_name: str):
 
     # Try to get additional info from the service
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with httpx.AsyncClient(timeout=5.0, transport=TracingTransport()) as client:
             response = await client.get(f"{service_url}/")
             if response.status_code == 200:
                 service_info = response.json()
@@ -185,7 +186,7 @@ async def get_health_matrix():
     try:
         async def check_service(service_name: str, service_url: str):
             try:
-                async with httpx.AsyncClient(timeout=3.0) as client:
+                async with httpx.AsyncClient(timeout=3.0, transport=TracingTransport()) as client:
                     response = await client.get(f"{service_url}/health")
                     return {
                         "service": service_name,
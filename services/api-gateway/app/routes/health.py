@@ -8,6 +8,7 @@ import time
 from typing import Dict, Any
 
 from shared.common.logging import get_logger
+from shared.common.tracing import TracingTransport
 
 logger = get_logger("api-gateway")
 router = APIRouter()
@@ -27,7 +28,7 @@ SERVICES = {
 async def check_service_health(service_name: str, service_url: str) -> Dict[str, Any]:
     """Check health of a specific service"""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with httpx.AsyncClient(timeout=5.0, transport=TracingTransport()) as client:
             response = await client.get(f"{service_url}/health")
             if response.status_code == 200:
                 return {"status": "healthy", "service": service_name, "response_time": response.elapsed.total_seconds()}
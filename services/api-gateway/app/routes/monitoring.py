@@ -1,67 +1,45 @@
 """
 Monitoring routes for API Gateway
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 import time
 import psutil
 from typing import Dict, Any, List
 import asyncio
 
+from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.metrics import Histogram, metrics_collector, PROMETHEUS_CONTENT_TYPE
+from shared.common.monitoring import render_metrics
+from shared.common.rate_limiting import get_rate_limit_stats
 
 logger = get_logger("api-gateway")
 router = APIRouter()
 
-# Metrics storage (in production, use a proper metrics system)
+# Gateway summary counters for the JSON endpoints; Prometheus series live in metrics_collector
 metrics_store = {
     "requests_total": 0,
     "requests_by_service": {},
-    "response_times": [],
+    "response_times": Histogram(),
     "errors_total": 0,
     "errors_by_service": {},
     "uptime_start": time.time()
 }
 
+def collect_gateway_metrics(collector):
+    """Publish gateway gauges at scrape time"""
+    collector.gauge_set("gateway_uptime_seconds", time.time() - metrics_store["uptime_start"])
+
+
+metrics_collector.register_collector(collect_gateway_metrics)
+
 @router.get("/metrics")
 async def get_metrics():
     """Get gateway metrics in Prometheus format"""
     try:
-        current_time = time.time()
-        uptime = current_time - metrics_store["uptime_start"]
-
-        metrics = f"""# API Gateway Metrics
-# HELP gateway_requests_total Total number of requests processed
-# TYPE gateway_requests_total counter
-gateway_requests_total {metrics_store["requests_total"]}
-
-# HELP gateway_errors_total Total number of errors
-# TYPE gateway_errors_total counter
-gateway_errors_total {metrics_store["errors_total"]}
-
-# HELP gateway_uptime_seconds Gateway uptime in seconds
-# TYPE gateway_uptime_seconds gauge
-gateway_uptime_seconds {uptime}
-
-# HELP gateway_services_total Total number of registered services
-# TYPE gateway_services_total gauge
-gateway_services_total 8
-
-"""
-
-        # Add per-service metrics
-        for service, count in metrics_store["requests_by_service"].items():
-            metrics += f"""# HELP gateway_requests_by_service_total Requests by service
-# TYPE gateway_requests_by_service_total counter
-gateway_requests_by_service_total{{service="{service}"}} {count}
-"""
-
-        for service, count in metrics_store["errors_by_service"].items():
-            metrics += f"""# HELP gateway_errors_by_service_total Errors by service
-# TYPE gateway_errors_by_service_total counter
-gateway_errors_by_service_total{{service="{service}"}} {count}
-"""
-
-        return metrics
+        body = await render_metrics("api-gateway", multiproc_dir=settings.metrics_multiproc_dir or None)
+        return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
 
     except Exception as e:
         logger.error("Metrics retrieval failed", extra={"error": str(e)})
@@ -75,10 +53,7 @@ async def get_stats():
         uptime = current_time - metrics_store["uptime_start"]
 
         # Calculate response time statistics
-        response_times = metrics_store["response_times"]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-        min_response_time = min(response_times) if response_times else 0
-        max_response_time = max(response_times) if response_times else 0
+        response_times = metrics_store["response_times"].summary()
 
         stats = {
             "gateway": {
@@ -92,10 +67,10 @@ async def get_stats():
                 "average_per_minute": round(metrics_store["requests_total"] / max(uptime / 60, 1), 2)
             },
             "performance": {
-                "avg_response_time": round(avg_response_time, 3),
-                "min_response_time": round(min_response_time, 3),
-                "max_response_time": round(max_response_time, 3),
-                "response_time_samples": len(response_times)
+                "avg_response_time": round(response_times["avg"], 3),
+                "min_response_time": round(response_times["min"], 3),
+                "max_response_time": round(response_times["max"], 3),
+                "response_time_samples": response_times["count"]
             },
             "errors": {
                 "total": metrics_store["errors_total"],
@@ -103,7 +78,7 @@ async def get_stats():
                 "error_rate": round((metrics_store["errors_total"] / max(metrics_store["requests_total"], 1)) * 100, 2)
             },
             "system": {
-                "cpu_percent": psutil.cpu_percent(interval=1),
+                "cpu_percent": psutil.cpu_percent(interval=None),
                 "memory_percent": psutil.virtual_memory().percent,
                 "memory_used_mb": round(psutil.virtual_memory().used / 1024 / 1024, 2),
                 "memory_total_mb": round(psutil.virtual_memory().total / 1024 / 1024, 2)
@@ -117,6 +92,21 @@ async def get_stats():
         logger.error("Stats retrieval failed", extra={"error": str(e)})
         raise HTTPException(500, "Stats retrieval failed")
 
+@router.get("/admission")
+async def get_admission_stats(request: Request):
+    """Get load shedding and rate limiting statistics"""
+    try:
+        shedder = getattr(request.app.state, "load_shedder", None)
+        return {
+            "load_shedding": shedder.get_stats() if shedder else None,
+            "rate_limiting": await get_rate_limit_stats(),
+            "timestamp": time.time()
+        }
+
+    except Exception as e:
+        logger.error("Admission stats retrieval failed", extra={"error": str(e)})
+        raise HTTPException(500, "Admission stats retrieval failed")
+
 @router.get("/logs/recent")
 async def get_recent_logs(lines: int = 50):
     """Get recent application logs"""
@@ -144,25 +134,16 @@ async def get_recent_logs(lines: int = 50):
 async def get_performance_metrics():
     """Get detailed performance metrics"""
     try:
-        response_times = metrics_store["response_times"]
-
-        # Calculate percentiles
-        if response_times:
-            sorted_times = sorted(response_times)
-            p50 = sorted_times[int(len(sorted_times) * 0.5)]
-            p95 = sorted_times[int(len(sorted_times) * 0.95)]
-            p99 = sorted_times[int(len(sorted_times) * 0.99)]
-        else:
-            p50 = p95 = p99 = 0
+        response_times = metrics_store["response_times"].summary()
 
         performance = {
             "response_times": {
-                "average": round(sum(response_times) / len(response_times), 3) if response_times else 0,
-                "median": round(p50, 3),
-                "95th_percentile": round(p95, 3),
-                "99th_percentile": round(p99, 3),
-                "min": round(min(response_times), 3) if response_times else 0,
-                "max": round(max(response_times), 3) if response_times else 0
+                "average": round(response_times["avg"], 3),
+                "median": round(response_times["p50"], 3),
+                "95th_percentile": round(response_times["p95"], 3),
+                "99th_percentile": round(response_times["p99"], 3),
+                "min": round(response_times["min"], 3),
+                "max": round(response_times["max"], 3)
             },
             "throughput": {
                 "requests_per_second": round(metrics_store["requests_total"] / max(time.time() - metrics_store["uptime_start"], 1), 2),
@@ -176,7 +157,7 @@ async def get_performance_metrics():
                 }
             },
             "system_resources": {
-                "cpu_usage_percent": psutil.cpu_percent(),
+                "cpu_usage_percent": psutil.cpu_percent(interval=None),
                 "memory_usage_percent": psutil.virtual_memory().percent,
                 "disk_usage_percent": psutil.disk_usage('/').percent,
                 "network_connections": len(psutil.net_connections())
@@ -209,8 +190,8 @@ async def get_alerts():
 
         # Check for high response times
         response_times = metrics_store["response_times"]
-        if response_times:
-            avg_response_time = sum(response_times) / len(response_times)
+        if response_times.count:
+            avg_response_time = response_times.total / response_times.count
             if avg_response_time > 2.0:  # 2 seconds
                 alerts.append({
                     "id": "high_response_time",
@@ -229,7 +210,7 @@ async def get_alerts():
                 "timestamp": current_time
             })
 
-        cpu_percent = psutil.cpu_percent()
+        cpu_percent = psutil.cpu_percent(interval=None)
         if cpu_percent > 90:
             alerts.append({
                 "id": "high_cpu_usage",
@@ -257,7 +238,7 @@ async def reset_metrics():
         metrics_store = {
             "requests_total": 0,
             "requests_by_service": {},
-            "response_times": [],
+            "response_times": Histogram(),
             "errors_total": 0,
             "errors_by_service": {},
             "uptime_start": time.time()
@@ -283,7 +264,7 @@ async def get_dashboard_data():
                 "uptime": f"{int(uptime // 3600)}h {int((uptime % 3600) // 60)}m",
                 "total_requests": metrics_store["requests_total"],
                 "error_rate": round((metrics_store["errors_total"] / max(metrics_store["requests_total"], 1)) * 100, 2),
-                "avg_response_time": round(sum(metrics_store["response_times"]) / max(len(metrics_store["response_times"]), 1), 3)
+                "avg_response_time": round(metrics_store["response_times"].summary()["avg"], 3)
             },
             "charts": {
                 "requests_over_time": [],  # Would contain time-series data
@@ -299,7 +280,7 @@ async def get_dashboard_data():
                 for service, count in metrics_store["requests_by_service"].items()
             },
             "system": {
-                "cpu": psutil.cpu_percent(),
+                "cpu": psutil.cpu_percent(interval=None),
                 "memory": psutil.virtual_memory().percent,
                 "disk": psutil.disk_usage('/').percent
             },
@@ -312,20 +293,20 @@ async def get_dashboard_data():
         logger.error("Dashboard data retrieval failed", extra={"error": str(e)})
         raise HTTPException(500, "Dashboard data retrieval failed")
 
-# Helper functions for metrics collection (would be called from middleware)
+# Helper functions for metrics collection (called from the proxy)
 def record_request(service: str, response_time: float, status_code: int):
-    """Record a request in metrics"""
+    """Record a proxied request in metrics"""
     metrics_store["requests_total"] += 1
 
     if service not in metrics_store["requests_by_service"]:
         metrics_store["requests_by_service"][service] = 0
     metrics_store["requests_by_service"][service] += 1
 
-    metrics_store["response_times"].append(response_time)
-
-    # Keep only last 1000 response times
-    if len(metrics_store["response_times"]) > 1000:
-        metrics_store["response_times"] = metrics_store["response_times"][-1000:]
+    metrics_store["response_times"].record(response_time)
+    metrics_collector.observe("gateway_upstream_duration_seconds", response_time, {
+        "service": service,
+        "status": status_code
+    })
 
     # Record errors
     if status_code >= 400:
@@ -2,11 +2,16 @@
 Request proxying routes for API Gateway
 """
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import httpx
-from typing import Dict
+import time
+from typing import Dict, Optional
 
+from shared.config.config import settings
+from shared.common.auth import AuthService, PRINCIPAL_HEADER, sign_principal
 from shared.common.logging import get_logger
+from shared.common.tracing import TracingTransport, current_trace_id
+from routes.monitoring import record_request
 
 logger = get_logger("api-gateway")
 router = APIRouter()
@@ -36,6 +41,45 @@ SERVICE_ROUTES = {
     "/files": "file"
 }
 
+# Upstream connections are pooled across requests
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared upstream client, created on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=30.0, transport=TracingTransport())
+    return _http_client
+
+async def close_http_client():
+    """Close the shared upstream client on shutdown"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def is_event_stream(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").startswith("text/event-stream")
+
+async def relay_stream(response: httpx.Response, target_service: str, started: float):
+    """Pass an upstream event stream through chunk by chunk.
+
+    If the client disconnects, the relay is cancelled and closing the
+    upstream response tells the service to stop generating.
+    """
+    completed = False
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+        completed = True
+    finally:
+        await response.aclose()
+        logger.debug("Proxy stream closed", extra=lambda: {
+            "target_service": target_service,
+            "completed": completed,
+            "duration": time.perf_counter() - started
+        })
+
 def determine_target_service(path: str) -> str | None:
     """Determine which service should handle the request"""
     path_parts = path.split("/")
@@ -113,9 +157,17 @@ async def proxy_request(request: Request, path: str):
         # Add gateway identifier
         headers["X-Gateway"] = "lms-api-gateway"
         headers["X-Forwarded-For"] = request.client.host if request.client else "unknown"
-        headers["X-Request-ID"] = request.headers.get("X-Request-ID", "gateway-generated")
+        headers["X-Request-ID"] = request.headers.get("X-Request-ID") or current_trace_id()
 
-        logger.info("Proxying request", extra={
+        # Verify the bearer token once here and hand services a signed principal;
+        # a principal header sent by the client is never forwarded
+        headers.pop(PRINCIPAL_HEADER, None)
+        if settings.auth_forward_principal:
+            principal = await AuthService.resolve_principal(request.headers.get("authorization"))
+            if principal is not None:
+                headers[PRINCIPAL_HEADER] = sign_principal(principal)
+
+        logger.debug("Proxying request", extra=lambda: {
             "method": request.method,
             "path": path,
             "target_service": target_service,
@@ -123,41 +175,60 @@ async def proxy_request(request: Request, path: str):
             "user_agent": headers.get("user-agent", "unknown")
         })
 
-        # Forward the request
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                headers=headers,
-                content=body,
-                params=request.query_params
+        # Forward the request; the body is read only once we know it isn't a stream
+        started = time.perf_counter()
+        client = get_http_client()
+        response = await client.send(client.build_request(
+            method=request.method,
+            url=target_url,
+            headers=headers,
+            content=body,
+            params=request.query_params
+        ), stream=True)
+        time_to_headers = time.perf_counter() - started
+
+        if is_event_stream(response):
+            record_request(target_service, time_to_headers, response.status_code)
+            response_headers = clean_headers(dict(response.headers))
+            response_headers["X-Accel-Buffering"] = "no"
+            return StreamingResponse(
+                relay_stream(response, target_service, started),
+                status_code=response.status_code,
+                headers=response_headers
             )
 
-            # Log response
-            logger.info("Proxy response received", extra={
-                "status_code": response.status_code,
-                "response_time": response.elapsed.total_seconds(),
-                "target_service": target_service
-            })
-
-            # Return response
-            # Handle different content types
-            if response.headers.get("content-type", "").startswith("application/json"):
-                try:
-                    content = response.json()
-                except:
-                    content = response.text
-            else:
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+
+        # Log response
+        logger.debug("Proxy response received", extra=lambda: {
+            "status_code": response.status_code,
+            "response_time": response.elapsed.total_seconds(),
+            "target_service": target_service
+        })
+        record_request(target_service, response.elapsed.total_seconds(), response.status_code)
+
+        # Return response
+        # Handle different content types
+        if response.headers.get("content-type", "").startswith("application/json"):
+            try:
+                content = response.json()
+            except:
                 content = response.text
+        else:
+            content = response.text
 
-            return JSONResponse(
-                content=content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
+        return JSONResponse(
+            content=content,
+            status_code=response.status_code,
+            headers=dict(response.headers)
+        )
 
     except httpx.TimeoutException:
         logger.error("Service timeout", extra={"path": path, "target_service": target_service})
+        record_request(target_service, 30.0, 504)
         raise HTTPException(504, "Service timeout")
     except httpx.ConnectError:
         logger.error("Service connection failed", extra={"path": path, "target_service": target_service})
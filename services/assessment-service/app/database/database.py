@@ -8,6 +8,7 @@ import json
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.database import mongo_metrics_listener
 from shared.common.errors import DatabaseError, NotFoundError
 from config.config import assessment_service_settings
 
@@ -50,7 +51,7 @@ class AssessmentDatabase:
             return
 
         try:
-            self.client = AsyncIOMotorClient(settings.mongo_url)
+            self.client = AsyncIOMotorClient(settings.mongo_url, event_listeners=[mongo_metrics_listener])
             self.db = self.client[settings.db_name]
             await self._create_indexes()
             await self.cache.init_cache()
@@ -25,10 +25,23 @@ class AuthServiceSettings:
         self.max_login_attempts: int = int(os.getenv("MAX_LOGIN_ATTEMPTS", "5"))
         self.lockout_duration_minutes: int = int(os.getenv("LOCKOUT_DURATION_MINUTES", "15"))
         self.enable_account_lockout: bool = os.getenv("ENABLE_ACCOUNT_LOCKOUT", "true").lower() == "true"
+        # Failed logins are counted per email and per client IP over a sliding window in Redis
+        self.login_window_seconds: int = int(os.getenv("LOGIN_WINDOW_SECONDS", "900"))
+        self.max_ip_login_failures: int = int(os.getenv("MAX_IP_LOGIN_FAILURES", "50"))
+        # Peers whose X-Forwarded-For is trusted for the client IP (the gateway); same variable uvicorn reads
+        self.forwarded_allow_ips: str = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+        # Password hashing runs on a bounded pool; logins beyond max_pending get a 429
+        self.bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+        self.password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.password_hash_max_pending: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
 
         # Session settings
         self.session_timeout_minutes: int = int(os.getenv("SESSION_TIMEOUT_MINUTES", "480"))  # 8 hours
         self.enable_session_tracking: bool = os.getenv("ENABLE_SESSION_TRACKING", "true").lower() == "true"
+        # Session touches are coalesced in memory and written in bulk on this interval
+        self.session_flush_interval_seconds: float = float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "30"))
+        self.session_flush_batch_size: int = int(os.getenv("SESSION_FLUSH_BATCH_SIZE", "1000"))
 
         # Rate limiting (auth-specific)
         self.auth_rate_limit_per_minute: int = int(os.getenv("AUTH_RATE_LIMIT_PER_MINUTE", "10"))
@@ -45,6 +58,9 @@ class AuthServiceSettings:
         # Audit settings
         self.enable_audit_logging: bool = os.getenv("ENABLE_AUDIT_LOGGING", "true").lower() == "true"
         self.audit_log_retention_days: int = int(os.getenv("AUDIT_LOG_RETENTION_DAYS", "90"))
+        self.audit_flush_interval_seconds: float = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+        self.audit_batch_size: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+        self.audit_max_pending: int = int(os.getenv("AUDIT_MAX_PENDING", "10000"))
 
 
 # Create settings instance
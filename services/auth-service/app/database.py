@@ -1,21 +1,202 @@
 """
 Auth Service Database Operations
 """
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 from shared.common.database import get_database
 from shared.common.logging import get_logger
 from shared.common.cache import cache_manager
+from shared.common.revocation import token_revocations
 from config import auth_settings
+from utils.login_throttle import login_throttle
 
 logger = get_logger("auth-service-db")
 
+# User fields carried in cached principals; changing one invalidates them everywhere
+PRINCIPAL_FIELDS = {"role", "email", "name", "tenant_id", "is_active"}
+
+
+class WriteBehindBuffer(ABC):
+    """Base for buffers that a background task flushes to Mongo periodically"""
+
+    name = "write-behind"
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+
+    @abstractmethod
+    async def flush(self, collection=None) -> int:
+        """Write everything buffered so far; returns the number of documents written"""
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"{self.name} flusher error", extra={"error": str(e)})
+
+    def start(self):
+        """Start the periodic flusher on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final {self.name} flush failed", extra={"error": str(e), "pending": len(self.pending)})
+
+
+class SessionActivityBuffer(WriteBehindBuffer):
+    """Write-behind buffer for session last-seen times.
+
+    Touches only record the latest timestamp per session in memory; a
+    background task writes them to Mongo with one unordered bulk_write per
+    batch. `$max` keeps concurrent replicas from moving a session backwards.
+    """
+
+    name = "session activity"
+
+    def __init__(self, flush_interval: float = 30.0, batch_size: int = 1000):
+        super().__init__(flush_interval, batch_size)
+        self.pending: Dict[str, datetime] = {}
+        self.touches = 0
+
+    def touch(self, session_id: str, now: Optional[datetime] = None):
+        """Record activity; costs one dict assignment"""
+        self.pending[session_id] = now or datetime.now(timezone.utc)
+        self.touches += 1
+
+    def discard(self, session_id: str):
+        self.pending.pop(session_id, None)
+
+    async def flush(self, collection=None) -> int:
+        """Write all pending touches; returns the number of sessions written"""
+        if not self.pending:
+            return 0
+        if collection is None:
+            collection = (await get_database()).user_sessions
+
+        pending, self.pending = self.pending, {}
+        timeout = timedelta(minutes=auth_settings.session_timeout_minutes)
+        items = list(pending.items())
+        written = 0
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            ops = [
+                UpdateOne(
+                    {"_id": session_id, "is_active": True},
+                    {"$max": {"last_activity": seen, "expires_at": seen + timeout}}
+                )
+                for session_id, seen in batch
+            ]
+            try:
+                await collection.bulk_write(ops, ordered=False)
+                written += len(ops)
+                self.writes += 1
+            except Exception as e:
+                # Put unwritten touches back unless a newer one arrived meanwhile
+                for session_id, seen in items[start:]:
+                    if self.pending.get(session_id, seen) <= seen:
+                        self.pending[session_id] = seen
+                logger.error("Session activity flush failed", extra={"error": str(e), "sessions": len(items) - start})
+                break
+        return written
+
+
+class AuditLogBuffer(WriteBehindBuffer):
+    """Buffers audit events and writes them with unordered insert_many.
+
+    A full batch is flushed right away rather than waiting for the interval.
+    If Mongo stays unavailable, the oldest events beyond `max_pending` are
+    dropped and counted rather than growing without bound.
+    """
+
+    name = "audit log"
+
+    def __init__(self, flush_interval: float = 1.0, batch_size: int = 500, max_pending: int = 10000):
+        super().__init__(flush_interval, batch_size)
+        self.max_pending = max_pending
+        self.pending: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._flushing: Optional[asyncio.Task] = None
+
+    def add(self, event: Dict[str, Any]):
+        self.pending.append(event)
+        if len(self.pending) > self.max_pending:
+            overflow = len(self.pending) - self.max_pending
+            del self.pending[:overflow]
+            self.dropped += overflow
+            logger.error("Audit buffer full, dropping oldest events", extra={"dropped": self.dropped})
+        if len(self.pending) >= self.batch_size and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_running_loop().create_task(self._flush_now())
+
+    async def _flush_now(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Audit log flush failed", extra={"error": str(e)})
+
+    async def flush(self, collection=None) -> int:
+        """Insert all pending events; returns the number written"""
+        if not self.pending:
+            return 0
+        if collection is None:
+            collection = (await get_database()).audit_logs
+
+        pending, self.pending = self.pending, []
+        written = 0
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                await collection.insert_many(batch, ordered=False)
+                written += len(batch)
+            except BulkWriteError as e:
+                # Duplicate ids mean a retried event is already stored
+                written += e.details.get("nInserted", 0)
+                failed = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+                if failed:
+                    self.pending[:0] = [batch[error["index"]] for error in failed]
+                    logger.error("Audit events rejected", extra={"count": len(failed), "error": failed[0].get("errmsg")})
+            except Exception as e:
+                self.pending[:0] = pending[start:]
+                logger.error("Audit log flush failed", extra={"error": str(e), "events": len(pending) - start})
+                break
+            self.writes += 1
+        return written
+
 
 class AuthDatabase:
     """Database operations for authentication service"""
 
     def __init__(self):
         self.db = None
+        self.session_activity = SessionActivityBuffer(
+            flush_interval=auth_settings.session_flush_interval_seconds,
+            batch_size=auth_settings.session_flush_batch_size
+        )
+        self.audit_log = AuditLogBuffer(
+            flush_interval=auth_settings.audit_flush_interval_seconds,
+            batch_size=auth_settings.audit_batch_size,
+            max_pending=auth_settings.audit_max_pending
+        )
 
     async def get_db(self):
         """Get database instance"""
@@ -101,6 +282,8 @@ class AuthDatabase:
             user = await self.get_user_by_id(user_id)
             if user:
                 await cache_manager.invalidate_pattern(f"user:email:{user['email']}")
+            if PRINCIPAL_FIELDS.intersection(updates):
+                await token_revocations.invalidate_principal(user_id)
 
         return success
 
@@ -112,60 +295,102 @@ class AuthDatabase:
         if result.deleted_count > 0:
             # Invalidate cache
             await cache_manager.invalidate_pattern(f"user:{user_id}")
+            await token_revocations.invalidate_principal(user_id)
             logger.info("User deleted", extra={"user_id": user_id})
             return True
 
         return False
 
-    async def record_login_attempt(self, email: str, success: bool) -> Dict[str, Any]:
-        """Record login attempt and handle account lockout"""
+    async def check_login_lock(self, email: str, ip_address: Optional[str] = None) -> Dict[str, Any]:
+        """Lock state from the Redis failure windows, checked before any user lookup"""
+        if auth_settings.enable_account_lockout:
+            state = await login_throttle.check(email, ip_address)
+            if state and state["locked"]:
+                return {
+                    "locked": True,
+                    "scope": state["scope"],
+                    "attempts_remaining": 0,
+                    "locked_until": state["locked_until"].isoformat()
+                }
+        return {"locked": False, "scope": None, "attempts_remaining": auth_settings.max_login_attempts, "locked_until": None}
+
+    async def record_login_attempt(
+        self,
+        email: str,
+        success: bool,
+        ip_address: Optional[str] = None,
+        user: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Record a login attempt and handle account lockout.
+
+        Failures are counted in Redis; Mongo is written only when an email
+        lockout starts, or on every attempt while Redis is unavailable.
+        """
+        if success:
+            await login_throttle.clear(email)
+            return {"locked": False, "scope": None, "attempts_remaining": auth_settings.max_login_attempts, "locked_until": None}
+        if not auth_settings.enable_account_lockout:
+            return {"locked": False, "scope": None, "attempts_remaining": auth_settings.max_login_attempts, "locked_until": None}
+
+        state = await login_throttle.record_failure(email, ip_address)
+        if state is None:
+            return await self._record_login_attempt_in_mongo(email)
+
+        if "email" in state["newly_locked"]:
+            if user is None:
+                user = await self.get_user_by_email(email)
+            if user:
+                until = datetime.now(timezone.utc) + timedelta(seconds=login_throttle.lockout_seconds)
+                await self.update_user(user["_id"], {"locked_until": until, "last_login_attempt": datetime.now(timezone.utc)})
+            await self.log_audit_event("account_locked", user["_id"] if user else None, {"ip_address": ip_address, "email": email})
+        elif "ip" in state["newly_locked"]:
+            await self.log_audit_event("ip_locked", None, {"ip_address": ip_address})
+
+        return {
+            "locked": state["locked"],
+            "scope": state["scope"],
+            "attempts_remaining": state["attempts_remaining"],
+            "locked_until": state["locked_until"].isoformat() if state["locked_until"] else None
+        }
+
+    async def _record_login_attempt_in_mongo(self, email: str) -> Dict[str, Any]:
+        """Failed-attempt counting on the user document, used when Redis is down"""
         user = await self.get_user_by_email(email)
         if not user:
-            return {"locked": False, "attempts_remaining": auth_settings.max_login_attempts}
+            return {"locked": False, "scope": None, "attempts_remaining": auth_settings.max_login_attempts, "locked_until": None}
 
-        updates = {}
-
-        if success:
-            # Successful login
-            updates["login_attempts"] = 0
-            updates["last_login_attempt"] = None
-            updates["locked_until"] = None
-            updates["last_login"] = datetime.now(timezone.utc)
-        else:
-            # Failed login
-            attempts = user.get("login_attempts", 0) + 1
-            updates["login_attempts"] = attempts
-            updates["last_login_attempt"] = datetime.now(timezone.utc)
-
-            # Check if account should be locked
-            if auth_settings.enable_account_lockout and attempts >= auth_settings.max_login_attempts:
-                lockout_until = datetime.now(timezone.utc) + timedelta(minutes=auth_settings.lockout_duration_minutes)
-                updates["locked_until"] = lockout_until
+        attempts = user.get("login_attempts", 0) + 1
+        updates = {"login_attempts": attempts, "last_login_attempt": datetime.now(timezone.utc)}
+        locked_until = self.locked_until(user)
+        if attempts >= auth_settings.max_login_attempts:
+            locked_until = datetime.now(timezone.utc) + timedelta(minutes=auth_settings.lockout_duration_minutes)
+            updates["locked_until"] = locked_until
 
         await self.update_user(user["_id"], updates)
 
-        # Check if account is currently locked
-        locked_until = user.get("locked_until")
-        is_locked = locked_until and locked_until > datetime.now(timezone.utc)
-
-        attempts_remaining = max(0, auth_settings.max_login_attempts - updates["login_attempts"])
-
         return {
-            "locked": is_locked,
-            "attempts_remaining": attempts_remaining,
+            "locked": locked_until is not None,
+            "scope": "email" if locked_until else None,
+            "attempts_remaining": max(0, auth_settings.max_login_attempts - attempts),
             "locked_until": locked_until.isoformat() if locked_until else None
         }
 
+    @staticmethod
+    def locked_until(user: Dict[str, Any]) -> Optional[datetime]:
+        """End of a lockout persisted on the user document, if still active"""
+        locked_until = user.get("locked_until")
+        if not isinstance(locked_until, datetime):
+            return None
+        if locked_until.tzinfo is None:
+            locked_until = locked_until.replace(tzinfo=timezone.utc)
+        return locked_until if locked_until > datetime.now(timezone.utc) else None
+
     async def is_account_locked(self, user_id: str) -> bool:
         """Check if user account is locked"""
         user = await self.get_user_by_id(user_id)
         if not user:
             return False
-
-        locked_until = user.get("locked_until")
-        if locked_until and isinstance(locked_until, datetime):
-            return locked_until > datetime.now(timezone.utc)
-        return False
+        return self.locked_until(user) is not None
 
     async def create_session(self, user_id: str, user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> str:
         """Create a new user session"""
@@ -187,35 +412,14 @@ class AuthDatabase:
 
         await db.user_sessions.insert_one(session_data)
 
-        # Cache session
-        await cache_manager.set(f"session:{session_data['_id']}", session_data, ttl=auth_settings.session_timeout_minutes * 60)
-
         return session_data["_id"]
 
     async def update_session_activity(self, session_id: str):
-        """Update session last activity"""
+        """Update session last activity (written to Mongo by the next flush)"""
         if not auth_settings.enable_session_tracking:
             return
 
-        db = await self.get_db()
-        now = datetime.now(timezone.utc)
-
-        await db.user_sessions.update_one(
-            {"_id": session_id, "is_active": True},
-            {
-                "$set": {
-                    "last_activity": now,
-                    "expires_at": now + timedelta(minutes=auth_settings.session_timeout_minutes)
-                }
-            }
-        )
-
-        # Update cache
-        cached_session = await cache_manager.get(f"session:{session_id}")
-        if cached_session:
-            cached_session["last_activity"] = now
-            cached_session["expires_at"] = now + timedelta(minutes=auth_settings.session_timeout_minutes)
-            await cache_manager.set(f"session:{session_id}", cached_session, ttl=auth_settings.session_timeout_minutes * 60)
+        self.session_activity.touch(session_id)
 
     async def invalidate_session(self, session_id: str):
         """Invalidate a user session"""
@@ -224,40 +428,42 @@ class AuthDatabase:
 
         db = await self.get_db()
 
+        self.session_activity.discard(session_id)
         await db.user_sessions.update_one(
             {"_id": session_id},
             {"$set": {"is_active": False, "invalidated_at": datetime.now(timezone.utc)}}
         )
 
-        # Remove from cache
-        await cache_manager.delete(f"session:{session_id}")
-
-    async def cleanup_expired_sessions(self):
-        """Clean up expired sessions"""
-        if not auth_settings.enable_session_tracking:
-            return
-
-        db = await self.get_db()
-        now = datetime.now(timezone.utc)
-
-        # Update database
-        result = await db.user_sessions.update_many(
-            {"expires_at": {"$lt": now}, "is_active": True},
-            {"$set": {"is_active": False, "expired_at": now}}
-        )
-
-        if result.modified_count > 0:
-            logger.info("Cleaned up expired sessions", extra={"count": result.modified_count})
+    async def ensure_indexes(self):
+        """Create auth collection indexes.
+
+        Expired sessions are removed by Mongo's TTL monitor on `expires_at`,
+        which the activity flush keeps pushing forward for live sessions.
+        Audit retention is a TTL index on `timestamp`.
+        """
+        try:
+            db = await self.get_db()
+            await db.user_sessions.create_index("expires_at", expireAfterSeconds=0)
+            await db.user_sessions.create_index("user_id")
+
+            retention = auth_settings.audit_log_retention_days * 86400
+            try:
+                await db.audit_logs.create_index("timestamp", name="timestamp_ttl", expireAfterSeconds=retention)
+            except OperationFailure as e:
+                if e.code != 85:  # IndexOptionsConflict: retention changed
+                    raise
+                await db.command("collMod", "audit_logs", index={"name": "timestamp_ttl", "expireAfterSeconds": retention})
+            await db.audit_logs.create_index([("user_id", 1), ("timestamp", -1)])
+        except Exception as e:
+            logger.error("Failed to create auth indexes", extra={"error": str(e)})
 
     async def log_audit_event(self, event_type: str, user_id: Optional[str] = None, details: Optional[Dict[str, Any]] = None):
         """Log audit event"""
         if not auth_settings.enable_audit_logging:
             return
 
-        db = await self.get_db()
-
         audit_data = {
-            "_id": f"audit_{datetime.now(timezone.utc).timestamp()}",
+            "_id": f"audit_{uuid.uuid4().hex}",
             "event_type": event_type,
             "user_id": user_id,
             "timestamp": datetime.now(timezone.utc),
@@ -266,21 +472,30 @@ class AuthDatabase:
             "user_agent": details.get("user_agent") if details else None
         }
 
-        await db.audit_logs.insert_one(audit_data)
-
-        # Clean up old audit logs
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=auth_settings.audit_log_retention_days)
-        await db.audit_logs.delete_many({"timestamp": {"$lt": cutoff_date}})
-
-    async def get_audit_logs(self, user_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get audit logs"""
+        # Written by the next flush; retention is the TTL index on timestamp
+        self.audit_log.add(audit_data)
+
+    async def get_audit_logs(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Get audit logs, newest first (served by the user_id/timestamp index)"""
         db = await self.get_db()
 
-        query = {}
+        query: Dict[str, Any] = {}
         if user_id:
             query["user_id"] = user_id
-
-        logs = await db.audit_logs.find(query).sort("timestamp", -1).limit(limit).to_list(length=None)
+        if since or until:
+            query["timestamp"] = {}
+            if since:
+                query["timestamp"]["$gte"] = since
+            if until:
+                query["timestamp"]["$lt"] = until
+
+        logs = await db.audit_logs.find(query).sort("timestamp", -1).limit(limit).to_list(length=limit)
         return logs
 
 
@@ -309,9 +524,9 @@ async def update_user(user_id: str, updates: Dict[str, Any]) -> bool:
     return await auth_db.update_user(user_id, updates)
 
 
-async def record_login_attempt(email: str, success: bool) -> Dict[str, Any]:
+async def record_login_attempt(email: str, success: bool, ip_address: Optional[str] = None) -> Dict[str, Any]:
     """Record login attempt"""
-    return await auth_db.record_login_attempt(email, success)
+    return await auth_db.record_login_attempt(email, success, ip_address)
 
 
 async def is_account_locked(user_id: str) -> bool:
@@ -4,13 +4,16 @@ Auth Service - FastAPI Application Factory
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
-from shared.common.monitoring import metrics_collector
+from shared.common.monitoring import metrics_collector, setup_metrics
+from shared.common.tracing import setup_tracing
 
 from config import auth_settings
 from database import auth_db
+from utils.auth_utils import password_hasher
 from middleware import AuthMiddleware, SecurityHeadersMiddleware, RequestLoggingMiddleware
 from routes.auth import router as auth_router
 from routes.users import router as users_router
@@ -31,11 +34,17 @@ async def lifespan(app: FastAPI):
 
     # Database connection is initialized lazily when needed
     # Metrics are initialized when first used
+    await auth_db.ensure_indexes()
+    auth_db.session_activity.start()
+    auth_db.audit_log.start()
 
     yield
 
     # Shutdown
     logger.info("Shutting down Auth Service")
+    await auth_db.session_activity.stop()
+    await auth_db.audit_log.stop()
+    password_hasher.shutdown()
 
 
 def create_application() -> FastAPI:
@@ -68,12 +77,23 @@ def create_application() -> FastAPI:
         "/docs",
         "/redoc",
         "/openapi.json",
+        "/metrics",
         "/auth/register",
         "/auth/login",
         "/auth/validate",
         "/tokens/validate"
     ])
 
+    # Client IP from the gateway's X-Forwarded-For, so login throttling is per
+    # client rather than per gateway; the header is ignored from other peers
+    app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=auth_settings.forwarded_allow_ips)
+
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "auth-service")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "auth-service")
+
     # Include routers
     app.include_router(
         auth_router,
@@ -149,5 +169,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8001,
         reload=settings.environment == "development",
-        log_level="info"
+        log_level="info",
+        proxy_headers=True,
+        forwarded_allow_ips=auth_settings.forwarded_allow_ips
     )
\ No newline at end of file
@@ -7,6 +7,7 @@ from typing import Optional
 from shared.common.logging import get_logger
 from shared.common.errors import ValidationError, AuthenticationError
 from services.auth_service import AuthService
+from utils.auth_utils import PasswordHasherBusy
 from models import (
     UserPublic,
     UserPrivate,
@@ -28,6 +29,10 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 security = HTTPBearer()
 
+def _hasher_busy() -> HTTPException:
+    """429 for requests turned away by the password hashing pool"""
+    return HTTPException(429, "Too many password operations in progress, retry shortly", headers={"Retry-After": "1"})
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user from service"""
     return await AuthService.get_current_user(credentials.credentials)
@@ -48,6 +53,8 @@ async def register(body: UserCreate):
     """
     try:
         return await AuthService.register_user(body)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     except ValidationError as e:
         logger.warning("Registration validation failed", extra={
             "email": body.email,
@@ -75,6 +82,8 @@ async def login(body: LoginRequest, request: Request):
         user_agent = request.headers.get("User-Agent")
 
         return await AuthService.authenticate_user(body, ip_address, user_agent)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     except AuthenticationError as e:
         logger.warning("Login failed", extra={
             "email": body.email,
@@ -135,6 +144,8 @@ async def update_me(body: UserUpdate, user: UserPrivate = Depends(get_current_us
     """
     try:
         return await AuthService.update_user_profile(user.id, body)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     except ValidationError as e:
         logger.warning("Profile update validation failed", extra={
             "user_id": user.id,
@@ -149,14 +160,18 @@ async def update_me(body: UserUpdate, user: UserPrivate = Depends(get_current_us
         raise HTTPException(500, "Profile update failed")
 
 @router.post("/logout")
-async def logout(user: UserPrivate = Depends(get_current_user)):
+async def logout(
+    user: UserPrivate = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """
-    Logout user (client should discard tokens).
-    In a production system, you might want to implement token blacklisting.
+    Logout user.
+
+    Revokes the access token and its session, so refresh tokens from the
+    same login stop working too.
     """
     try:
-        # For logout, we don't need to do anything special with the token
-        # The client should discard the tokens
+        await AuthService.logout_user(credentials.credentials)
         logger.info("User logout", extra={"user_id": user.id})
         return {"status": "logged_out", "message": "Successfully logged out"}
     except Exception as e:
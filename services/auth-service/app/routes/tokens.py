@@ -9,7 +9,7 @@ import jwt
 from shared.config.config import settings
 from shared.common.logging import get_logger
 from shared.common.errors import ValidationError, AuthenticationError
-from services.auth_service import AuthService
+from services.auth_service import AuthService, ValidationError as TokenValidationError
 from models import UserPrivate
 from database import auth_db
 
@@ -109,8 +109,7 @@ async def revoke_token(token: str, user: UserPrivate = Depends(get_current_user)
     """
     Revoke a specific token (admin only).
 
-    In a production system, this would add the token to a blacklist.
-    For now, this is a placeholder implementation.
+    The token's jti is revoked in every service until the token expires.
 
     - **token**: Token to revoke
     """
@@ -122,26 +121,27 @@ async def revoke_token(token: str, user: UserPrivate = Depends(get_current_user)
         if not token:
             raise HTTPException(400, "Token is required")
 
-        # In production, you would:
-        # 1. Decode the token to get user info
-        # 2. Add token to a blacklist/cache
-        # 3. Set an expiration time for the blacklist entry
+        result = await AuthService.revoke_token(token, "revoked")
 
-        logger.info("Token revocation requested", extra={
+        logger.info("Token revoked", extra={
             "requested_by": user.id,
-            "token_preview": token[:20] + "..." if len(token) > 20 else token
+            "token_id": result["token_id"]
         })
 
-        # Placeholder response
         return {
-            "status": "revoked",
-            "message": "Token has been revoked",
+            "status": "revoked" if result["revoked"] else "expired",
+            "message": "Token has been revoked" if result["revoked"] else result["reason"],
+            "token_id": result["token_id"],
             "revoked_at": datetime.now(timezone.utc).isoformat(),
-            "note": "Token blacklisting not yet implemented"
+            "expires_at": result.get("expires_at")
         }
 
     except AuthenticationError as e:
         raise HTTPException(403, str(e))
+    except TokenValidationError as e:
+        raise HTTPException(400, e.message)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Token revocation failed", extra={
             "requested_by": user.id,
@@ -168,8 +168,8 @@ async def get_token_config(user: UserPrivate = Depends(get_current_user)):
             "secret_configured": bool(settings.jwt_secret),
             "token_format": "JWT",
             "claims": {
-                "standard": ["sub", "exp", "iat"],
-                "custom": ["role"]
+                "standard": ["sub", "exp", "iat", "jti"],
+                "custom": ["role", "session_id"]
             }
         }
 
@@ -263,20 +263,17 @@ async def blacklist_token(token: str, reason: str = "manual", user: UserPrivate
         if not token:
             raise HTTPException(400, "Token is required")
 
-        # In production, you would:
-        # 1. Store the token hash in Redis/cache
-        # 2. Set expiration time
-        # 3. Check blacklist during token validation
+        result = await AuthService.revoke_token(token, reason)
 
         logger.info("Token blacklisted", extra={
             "requested_by": user.id,
             "reason": reason,
-            "token_preview": token[:20] + "..." if len(token) > 20 else token
+            "token_id": result["token_id"]
         })
 
         return {
-            "status": "blacklisted",
-            "token_id": "placeholder",  # Would be actual token ID/hash
+            "status": "blacklisted" if result["revoked"] else "expired",
+            "token_id": result["token_id"],
             "reason": reason,
             "blacklisted_at": datetime.now(timezone.utc).isoformat(),
             "blacklisted_by": user.id
@@ -284,6 +281,10 @@ async def blacklist_token(token: str, reason: str = "manual", user: UserPrivate
 
     except AuthenticationError as e:
         raise HTTPException(403, str(e))
+    except TokenValidationError as e:
+        raise HTTPException(400, e.message)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Token blacklisting failed", extra={
             "requested_by": user.id,
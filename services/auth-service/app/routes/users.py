@@ -8,6 +8,7 @@ from typing import List, Optional
 from shared.common.logging import get_logger
 from shared.common.errors import ValidationError, AuthenticationError
 from services.auth_service import AuthService
+from utils.auth_utils import PasswordHasherBusy
 from database import auth_db
 from models import UserPublic, UserPrivate, UserUpdate
 
@@ -119,6 +120,8 @@ async def update_user(user_id: str, body: UserUpdate, user: UserPrivate = Depend
         # Use the service to update user
         return await AuthService.update_user_profile(user_id, body)
 
+    except PasswordHasherBusy:
+        raise HTTPException(429, "Too many password operations in progress, retry shortly", headers={"Retry-After": "1"})
     except AuthenticationError as e:
         raise HTTPException(403, str(e))
     except ValidationError as e:
@@ -2,13 +2,15 @@
 Auth Service Business Logic
 """
 import jwt
+import math
+import uuid
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
-from passlib.hash import bcrypt
 
 from shared.common.logging import get_logger
 from shared.common.cache import cache_manager
 from shared.common.monitoring import metrics_collector
+from shared.common.revocation import token_revocations
 # Import error classes (will be implemented)
 from typing import Optional
 
@@ -29,6 +31,8 @@ from shared.config.config import settings
 
 from config import auth_settings, JWT_ALGORITHM, JWT_ACCESS_EXPIRE_MINUTES, JWT_REFRESH_EXPIRE_DAYS
 from database import auth_db
+from utils.auth_utils import password_hasher, PasswordHasherBusy
+from utils.login_throttle import login_throttle
 from models import (
     UserCreate, UserUpdate, LoginRequest, TokenPair,
     UserPublic, UserPrivate, AccountLockInfo
@@ -45,7 +49,7 @@ class AuthService:
         """Register a new user"""
         try:
             # Hash password
-            hashed_password = bcrypt.hash(user_data.password)
+            hashed_password = await password_hasher.hash(user_data.password)
 
             # Prepare user data
             user_dict = user_data.dict()
@@ -73,6 +77,8 @@ class AuthService:
                 role=created_user["role"]
             )
 
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             logger.error("User registration failed", extra={"error": str(e), "email": user_data.email})
             raise ValidationError(
@@ -85,45 +91,41 @@ class AuthService:
     async def authenticate_user(login_data: LoginRequest, ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> TokenPair:
         """Authenticate user and return tokens"""
         try:
+            # Locked emails and throttled IPs are turned away before any lookup
+            lock_info = await auth_db.check_login_lock(login_data.email, ip_address)
+            if lock_info["locked"]:
+                await metrics_collector.increment_counter("login_attempts", tags={"result": "account_locked" if lock_info["scope"] == "email" else "ip_throttled"})
+                raise AuthService._locked_error(lock_info)
+
             # Get user by email
             user = await auth_db.get_user_by_email(login_data.email)
             if not user:
                 # Record failed attempt for unknown email
-                await auth_db.record_login_attempt(login_data.email, False)
+                await auth_db.record_login_attempt(login_data.email, False, ip_address)
                 await metrics_collector.increment_counter("login_attempts", tags={"result": "user_not_found"})
                 raise AuthenticationError(
                     error_code="INVALID_CREDENTIALS",
                     message="Invalid email or password"
                 )
 
-            # Check if account is locked
-            if await auth_db.is_account_locked(user["_id"]):
-                lock_info = await auth_db.record_login_attempt(login_data.email, False)
+            # Check for a lockout persisted on the account
+            locked_until = auth_db.locked_until(user) if auth_settings.enable_account_lockout else None
+            if locked_until:
                 await metrics_collector.increment_counter("login_attempts", tags={"result": "account_locked"})
-                raise AuthenticationError(
-                    error_code="ACCOUNT_LOCKED",
-                    message="Account is temporarily locked due to too many failed login attempts",
-                    details={
-                        "locked_until": lock_info["locked_until"],
-                        "attempts_remaining": lock_info["attempts_remaining"]
-                    }
-                )
+                raise AuthService._locked_error({
+                    "scope": "email",
+                    "attempts_remaining": 0,
+                    "locked_until": locked_until.isoformat()
+                })
 
             # Verify password
-            if not bcrypt.verify(login_data.password, user.get("password_hash", "")):
+            if not await password_hasher.verify(login_data.password, user.get("password_hash", "")):
                 # Record failed attempt
-                lock_info = await auth_db.record_login_attempt(login_data.email, False)
+                lock_info = await auth_db.record_login_attempt(login_data.email, False, ip_address, user)
                 await metrics_collector.increment_counter("login_attempts", tags={"result": "invalid_password"})
 
                 if lock_info["locked"]:
-                    raise AuthenticationError(
-                        error_code="ACCOUNT_LOCKED",
-                        message="Account is temporarily locked due to too many failed login attempts",
-                        details={
-                            "locked_until": lock_info["locked_until"],
-                            "attempts_remaining": lock_info["attempts_remaining"]
-                        }
-                    )
+                    raise AuthService._locked_error(lock_info)
                 else:
                     raise AuthenticationError(
                         error_code="INVALID_CREDENTIALS",
@@ -131,10 +133,18 @@ class AuthService:
                     )
 
             # Successful login
-            await auth_db.record_login_attempt(login_data.email, True)
-
-            # Update last login
-            await auth_db.update_user(user["_id"], {"last_login": datetime.now(timezone.utc)})
+            await auth_db.record_login_attempt(login_data.email, True, ip_address)
+
+            # Update last login, upgrading the stored hash if the cost factor changed
+            login_update = {"last_login": datetime.now(timezone.utc)}
+            if user.get("locked_until") or user.get("login_attempts"):
+                login_update.update(locked_until=None, login_attempts=0)
+            if password_hasher.needs_rehash(user["password_hash"]):
+                try:
+                    login_update["password_hash"] = await password_hasher.hash(login_data.password)
+                except PasswordHasherBusy:
+                    pass  # retried on a later login
+            await auth_db.update_user(user["_id"], login_update)
 
             # Create session
             session_id = await auth_db.create_session(
@@ -162,7 +172,7 @@ class AuthService:
 
             return tokens
 
-        except AuthenticationError:
+        except (AuthenticationError, PasswordHasherBusy):
             raise
         except Exception as e:
             logger.error("Authentication failed", extra={
@@ -189,6 +199,12 @@ class AuthService:
                     message="Invalid token type"
                 )
 
+            if await token_revocations.is_revoked(payload):
+                raise AuthenticationError(
+                    error_code="TOKEN_REVOKED",
+                    message="Refresh token has been revoked"
+                )
+
             user_id = payload.get("sub")
             if not user_id:
                 raise AuthenticationError(
@@ -211,8 +227,8 @@ class AuthService:
                     message="Account is locked"
                 )
 
-            # Generate new tokens
-            tokens = await AuthService._create_tokens(user)
+            # Generate new tokens in the same session so logout still covers them
+            tokens = await AuthService._create_tokens(user, payload.get("session_id"))
 
             # Log audit event
             await auth_db.log_audit_event(
@@ -259,6 +275,12 @@ class AuthService:
                     message="Invalid token payload"
                 )
 
+            if await token_revocations.is_revoked(payload):
+                raise AuthenticationError(
+                    error_code="TOKEN_REVOKED",
+                    message="Access token has been revoked"
+                )
+
             # Get user
             user = await auth_db.get_user_by_id(user_id)
             if not user:
@@ -296,6 +318,8 @@ class AuthService:
                 error_code="INVALID_TOKEN",
                 message="Invalid access token"
             )
+        except AuthenticationError:
+            raise
         except Exception as e:
             logger.error("Failed to get current user", extra={"error": str(e)})
             raise AuthenticationError(
@@ -329,7 +353,7 @@ class AuthService:
                     )
                 update_data["email"] = updates.email
             if updates.password is not None:
-                update_data["password_hash"] = bcrypt.hash(updates.password)
+                update_data["password_hash"] = await password_hasher.hash(updates.password)
             if updates.role is not None:
                 # Only admins can change roles
                 # This would be checked by the route handler
@@ -365,7 +389,7 @@ class AuthService:
                 role=updated_user["role"]
             )
 
-        except ValidationError:
+        except (ValidationError, PasswordHasherBusy):
             raise
         except Exception as e:
             logger.error("Profile update failed", extra={"error": str(e), "user_id": user_id})
@@ -376,14 +400,20 @@ class AuthService:
 
     @staticmethod
     async def logout_user(token: str):
-        """Logout user by invalidating session"""
+        """Logout user by invalidating the session and revoking its tokens"""
         try:
             # Decode token to get session info
             payload = jwt.decode(token, settings.jwt_secret, algorithms=[JWT_ALGORITHM])
             session_id = payload.get("session_id")
 
-            if session_id and auth_settings.enable_session_tracking:
-                await auth_db.invalidate_session(session_id)
+            if payload.get("jti"):
+                await token_revocations.revoke(payload["jti"], payload["exp"], "logout")
+            if session_id:
+                # The session outlives this access token through its refresh tokens
+                session_expires = datetime.now(timezone.utc) + timedelta(days=JWT_REFRESH_EXPIRE_DAYS)
+                await token_revocations.revoke(session_id, session_expires.timestamp(), "logout")
+                if auth_settings.enable_session_tracking:
+                    await auth_db.invalidate_session(session_id)
 
             user_id = payload.get("sub")
             if user_id:
@@ -394,22 +424,65 @@ class AuthService:
         except Exception as e:
             logger.warning("Logout processing failed", extra={"error": str(e)})
 
+    @staticmethod
+    async def revoke_token(token: str, reason: str = "revoked") -> Dict[str, Any]:
+        """Revoke a single token by its jti until it would have expired"""
+        try:
+            payload = jwt.decode(token, settings.jwt_secret, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            return {"token_id": None, "revoked": False, "reason": "Token has already expired"}
+        except jwt.InvalidTokenError:
+            raise ValidationError(error_code="INVALID_TOKEN", message="Invalid token")
+
+        # Tokens issued before jti was added can only be revoked with their session
+        token_id = payload.get("jti") or payload.get("session_id")
+        if not token_id:
+            raise ValidationError(error_code="UNREVOCABLE_TOKEN", message="Token has no jti or session_id")
+
+        propagated = await token_revocations.revoke(token_id, payload["exp"], reason)
+        await auth_db.log_audit_event("token_revoked", payload.get("sub"), {"token_id": token_id, "reason": reason})
+
+        return {
+            "token_id": token_id,
+            "revoked": True,
+            "propagated": propagated,
+            "expires_at": datetime.fromtimestamp(payload["exp"], timezone.utc).isoformat()
+        }
+
     @staticmethod
     async def get_account_lock_info(email: str) -> AccountLockInfo:
-        """Get account lock information"""
-        user = await auth_db.get_user_by_email(email)
-        if not user:
-            return AccountLockInfo(
-                is_locked=False,
-                attempts_remaining=auth_settings.max_login_attempts
-            )
+        """Get account lock information without counting an attempt"""
+        lock_info = await auth_db.check_login_lock(email)
+        if lock_info["locked"]:
+            return AccountLockInfo(is_locked=True, attempts_remaining=0, locked_until=lock_info["locked_until"])
 
-        lock_info = await auth_db.record_login_attempt(email, False)  # This doesn't count as an actual attempt
+        user = await auth_db.get_user_by_email(email)
+        locked_until = auth_db.locked_until(user) if user and auth_settings.enable_account_lockout else None
+        if locked_until:
+            return AccountLockInfo(is_locked=True, attempts_remaining=0, locked_until=locked_until)
 
+        failures = await login_throttle.failures_for(email)
+        if failures is None:
+            failures = user.get("login_attempts", 0) if user else 0
         return AccountLockInfo(
-            is_locked=lock_info["locked"],
-            attempts_remaining=lock_info["attempts_remaining"],
-            locked_until=lock_info["locked_until"]
+            is_locked=False,
+            attempts_remaining=max(0, auth_settings.max_login_attempts - math.ceil(failures))
+        )
+
+    @staticmethod
+    def _locked_error(lock_info: Dict[str, Any]) -> AuthenticationError:
+        """Error for an attempt refused by an email lockout or IP throttle"""
+        details = {"locked_until": lock_info["locked_until"], "attempts_remaining": lock_info["attempts_remaining"]}
+        if lock_info["scope"] == "ip":
+            return AuthenticationError(
+                error_code="TOO_MANY_ATTEMPTS",
+                message="Too many failed login attempts from this address",
+                details=details
+            )
+        return AuthenticationError(
+            error_code="ACCOUNT_LOCKED",
+            message="Account is temporarily locked due to too many failed login attempts",
+            details=details
         )
 
     @staticmethod
@@ -424,7 +497,8 @@ class AuthService:
             "type": "access",
             "exp": now + timedelta(minutes=JWT_ACCESS_EXPIRE_MINUTES),
             "iat": now,
-            "iss": "lms-auth-service"
+            "iss": "lms-auth-service",
+            "jti": uuid.uuid4().hex
         }
 
         if session_id:
@@ -438,9 +512,13 @@ class AuthService:
             "type": "refresh",
             "exp": now + timedelta(days=JWT_REFRESH_EXPIRE_DAYS),
             "iat": now,
-            "iss": "lms-auth-service"
+            "iss": "lms-auth-service",
+            "jti": uuid.uuid4().hex
         }
 
+        if session_id:
+            refresh_payload["session_id"] = session_id
+
         refresh_token = jwt.encode(refresh_payload, settings.jwt_secret, algorithm=JWT_ALGORITHM)
 
         return TokenPair(
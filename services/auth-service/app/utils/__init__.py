@@ -2,6 +2,9 @@
 Auth Service Utilities
 """
 from .auth_utils import (
+    PasswordHasher,
+    PasswordHasherBusy,
+    password_hasher,
     hash_password,
     verify_password,
     generate_secure_token,
@@ -9,12 +12,18 @@ from .auth_utils import (
     sanitize_user_input,
     get_client_info
 )
+from .login_throttle import LoginThrottle, login_throttle
 
 __all__ = [
+    'PasswordHasher',
+    'PasswordHasherBusy',
+    'password_hasher',
     'hash_password',
     'verify_password',
     'generate_secure_token',
     'validate_email_format',
     'sanitize_user_input',
-    'get_client_info'
+    'get_client_info',
+    'LoginThrottle',
+    'login_throttle'
 ]
\ No newline at end of file
@@ -1,25 +1,111 @@
 """
 Authentication utility functions
 """
+import asyncio
 import re
 import secrets
 import string
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 from passlib.hash import bcrypt
 from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+from config import auth_settings
 
 logger = get_logger("auth-utils")
 
 
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+class PasswordHasher:
+    """bcrypt on a bounded thread pool so hashing never runs on the event loop.
+
+    bcrypt releases the GIL, so workers hash in parallel with request handling.
+    Calls beyond `max_pending` (running plus queued) fail fast with
+    PasswordHasherBusy instead of queueing behind a login storm.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 4, max_pending: int = 64):
+        self.scheme = bcrypt.using(rounds=rounds)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, operation: str, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            metrics_collector.counter_inc("password_hash_rejected_total", tags={"operation": operation})
+            raise PasswordHasherBusy(f"{self.pending} password operations already pending")
+
+        self.pending += 1
+        start_time = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            metrics_collector.observe("password_hash_duration_seconds", time.perf_counter() - start_time, {"operation": operation})
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        return await self._run("hash", self.scheme.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """Verify a password against its hash; malformed hashes never match"""
+        if not hashed:
+            return False
+        try:
+            return await self._run("verify", self.scheme.verify, password, hashed)
+        except (ValueError, TypeError) as e:
+            logger.warning("Password verification failed", extra={"error": str(e)})
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when a stored hash uses a different cost factor than configured"""
+        try:
+            return self.scheme.needs_update(hashed)
+        except (ValueError, TypeError):
+            return False
+
+    def collect_metrics(self, collector: MetricsCollector):
+        """Publish pool gauges at scrape time"""
+        collector.gauge_set("password_hash_pending", self.pending)
+        collector.gauge_set("password_hash_workers", self.workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    rounds=auth_settings.bcrypt_rounds,
+    workers=auth_settings.password_hash_workers,
+    max_pending=auth_settings.password_hash_max_pending
+)
+metrics_collector.register_collector(password_hasher.collect_metrics)
+
+
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    return bcrypt.hash(password)
+    """Hash a password using bcrypt (blocking; use password_hasher in handlers)"""
+    return password_hasher.scheme.hash(password)
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (blocking; use password_hasher in handlers)"""
     try:
-        return bcrypt.verify(password, hashed)
+        return password_hasher.scheme.verify(password, hashed)
     except Exception as e:
         logger.warning("Password verification failed", extra={"error": str(e)})
         return False
@@ -0,0 +1,192 @@
+"""
+Failed-login counters and lockout windows in Redis
+"""
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.common.cache import cache_manager
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+from config import auth_settings
+
+logger = get_logger("auth-login-throttle")
+
+KEY_PREFIX = "auth:login:"
+
+
+class LoginThrottle:
+    """Sliding-window failed-login limits per email and per client IP.
+
+    Each subject counts failures in fixed windows with INCR/EXPIRE; the
+    sliding count adds the previous window weighted by how much of it still
+    overlaps. Crossing a limit sets a lock key with the lockout TTL, and
+    only that transition is reported back so the caller can persist it.
+    A failed attempt is one MULTI round trip, plus one more when it crosses
+    a limit.
+    """
+
+    def __init__(
+        self,
+        window_seconds: int = 900,
+        max_email_failures: int = 5,
+        max_ip_failures: int = 50,
+        lockout_seconds: int = 900,
+        redis_client: Any = None
+    ):
+        self.window_seconds = window_seconds
+        self.limits = {"email": max_email_failures, "ip": max_ip_failures}
+        self.lockout_seconds = lockout_seconds
+        self.redis_client = redis_client
+        self.clock = time.time
+        self.failures = 0
+        self.lockouts = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    @staticmethod
+    def _subjects(email: str, ip_address: Optional[str]) -> List[Tuple[str, str]]:
+        subjects = [("email", email.strip().lower())]
+        if ip_address:
+            subjects.append(("ip", ip_address))
+        return subjects
+
+    @staticmethod
+    def _lock_key(scope: str, value: str) -> str:
+        return f"{KEY_PREFIX}lock:{scope}:{value}"
+
+    @staticmethod
+    def _count_key(scope: str, value: str, bucket: int) -> str:
+        return f"{KEY_PREFIX}fail:{scope}:{value}:{bucket}"
+
+    def _lock_state(self, subjects: List[Tuple[str, str]], ttls: List[int]) -> Dict[str, Any]:
+        """Longest remaining lock among subjects, from PTTL replies"""
+        remaining, scope = 0, None
+        for (subject_scope, _), ttl in zip(subjects, ttls):
+            if ttl and ttl > remaining:
+                remaining, scope = ttl, subject_scope
+        if not remaining:
+            return {"locked": False, "scope": None, "locked_until": None}
+        return {
+            "locked": True,
+            "scope": scope,
+            "locked_until": datetime.fromtimestamp(self.clock() + remaining / 1000, timezone.utc)
+        }
+
+    async def check(self, email: str, ip_address: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Current lock state, or None when Redis is unavailable"""
+        client = await self._client()
+        if client is None:
+            return None
+        subjects = self._subjects(email, ip_address)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for scope, value in subjects:
+                pipe.pttl(self._lock_key(scope, value))
+            ttls = await pipe.execute()
+        except Exception as e:
+            logger.warning("Login lock check failed", extra={"error": str(e)})
+            return None
+        return self._lock_state(subjects, [max(ttl, 0) for ttl in ttls])
+
+    async def failures_for(self, email: str) -> Optional[float]:
+        """Sliding failure count for an email without recording an attempt"""
+        client = await self._client()
+        if client is None:
+            return None
+        now = self.clock()
+        bucket = int(now // self.window_seconds)
+        value = email.strip().lower()
+        try:
+            current, previous = await client.mget(
+                self._count_key("email", value, bucket),
+                self._count_key("email", value, bucket - 1)
+            )
+        except Exception as e:
+            logger.warning("Login window read failed", extra={"error": str(e)})
+            return None
+        overlap = 1 - (now % self.window_seconds) / self.window_seconds
+        return int(current or 0) + int(previous or 0) * overlap
+
+    async def record_failure(self, email: str, ip_address: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Count a failed login; returns lock state plus `newly_locked` and `attempts_remaining`"""
+        client = await self._client()
+        if client is None:
+            return None
+
+        subjects = self._subjects(email, ip_address)
+        now = self.clock()
+        bucket = int(now // self.window_seconds)
+        overlap = 1 - (now % self.window_seconds) / self.window_seconds
+        try:
+            pipe = client.pipeline(transaction=True)
+            for scope, value in subjects:
+                key = self._count_key(scope, value, bucket)
+                pipe.incr(key)
+                pipe.expire(key, self.window_seconds * 2)
+                pipe.get(self._count_key(scope, value, bucket - 1))
+            replies = await pipe.execute()
+
+            counts = {}
+            for i, (scope, _) in enumerate(subjects):
+                current, _, previous = replies[i * 3:i * 3 + 3]
+                counts[scope] = current + int(previous or 0) * overlap
+
+            pipe = client.pipeline(transaction=True)
+            exceeded = [(scope, value) for scope, value in subjects if counts[scope] >= self.limits[scope]]
+            for scope, value in exceeded:
+                pipe.set(self._lock_key(scope, value), 1, ex=self.lockout_seconds, nx=True)
+            for scope, value in subjects:
+                pipe.pttl(self._lock_key(scope, value))
+            replies = await pipe.execute() if exceeded else [-2] * len(subjects)
+        except Exception as e:
+            logger.warning("Failed login not recorded", extra={"error": str(e)})
+            return None
+
+        created = dict(zip((scope for scope, _ in exceeded), replies[:len(exceeded)]))
+        ttls = [max(ttl, 0) for ttl in replies[len(exceeded):]]
+        self.failures += 1
+        newly_locked = [scope for scope, was_set in created.items() if was_set]
+        self.lockouts += len(newly_locked)
+
+        state = self._lock_state(subjects, ttls)
+        state["newly_locked"] = newly_locked
+        state["attempts_remaining"] = max(0, self.limits["email"] - math.ceil(counts["email"]))
+        return state
+
+    async def clear(self, email: str) -> bool:
+        """Reset an email's failure window after a successful login"""
+        client = await self._client()
+        if client is None:
+            return False
+        value = email.strip().lower()
+        bucket = int(self.clock() // self.window_seconds)
+        try:
+            await client.delete(
+                self._count_key("email", value, bucket),
+                self._count_key("email", value, bucket - 1)
+            )
+            return True
+        except Exception as e:
+            logger.warning("Login window reset failed", extra={"error": str(e)})
+            return False
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("login_failures_recorded", self.failures)
+        collector.gauge_set("login_lockouts", self.lockouts)
+
+
+login_throttle = LoginThrottle(
+    window_seconds=auth_settings.login_window_seconds,
+    max_email_failures=auth_settings.max_login_attempts,
+    max_ip_failures=auth_settings.max_ip_login_failures,
+    lockout_seconds=auth_settings.lockout_duration_minutes * 60
+)
+metrics_collector.register_collector(login_throttle.collect_metrics)
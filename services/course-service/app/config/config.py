@@ -47,6 +47,8 @@ class CourseServiceSettings(BaseSettings):
     enable_ai_course_generation: bool = True
     ai_course_generation_temperature: float = 0.7
     max_ai_generated_courses_per_day: int = 10
+    ai_generation_concurrency: int = 4  # LLM calls in flight per course being generated
+    ai_generation_workers: int = 2  # courses generated at once per process
 
     # Notification settings
     enable_course_publish_notifications: bool = True
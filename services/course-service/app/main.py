@@ -8,8 +8,12 @@ import uvicorn
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.monitoring import setup_metrics
+from shared.common.tracing import setup_tracing
 from shared.common.database import get_database, close_connection
 from shared.common.cache import close_connection as close_cache
+from shared.common.jobs import job_worker
+from shared.common.llm import llm_client
 # Temporarily disabled middleware imports due to FastAPI version compatibility issues
 # from shared.common.middleware import (
 #     create_cors_middleware,
@@ -17,6 +21,7 @@ from shared.common.cache import close_connection as close_cache
 #     RateLimitMiddleware
 # )
 
+from config.config import course_service_settings
 from routes.courses import router as courses_router
 from routes.lessons import router as lessons_router
 from routes.progress import router as progress_router
@@ -44,10 +49,15 @@ async def lifespan(app: FastAPI):
         logger.error("Database connection failed", extra={"error": str(e)})
         raise
 
+    # Workers for background jobs such as AI course generation
+    await job_worker.start_workers(course_service_settings.ai_generation_workers)
+
     yield
 
     # Shutdown
     logger.info("Shutting down Course Service")
+    await job_worker.stop_workers()
+    await llm_client.close()
     await close_connection()
     await close_cache()
 
@@ -72,6 +82,12 @@ def create_application() -> FastAPI:
     # if settings.environment == "production":
     #     app.add_middleware(RateLimitMiddleware, requests_per_minute=200)
 
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "course-service")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "course-service")
+
     # Include routers
     app.include_router(courses_router, prefix="/courses", tags=["Course Management"])
     app.include_router(lessons_router, prefix="/courses", tags=["Lesson Management"])
@@ -3,108 +3,60 @@ AI-powered course generation routes for Course Service
 """
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 import json
-import re
+import uuid
 
 from shared.config.config import settings
 from shared.common.auth import get_current_user, require_admin
 from shared.common.database import DatabaseOperations
-from shared.common.errors import ValidationError, NotFoundError, AuthorizationError
+from shared.common.errors import ValidationError, NotFoundError, AuthorizationError, ServiceUnavailableError
 from shared.common.logging import get_logger
-from shared.models.models import (
-    Course,
-    CourseLesson,
-    QuizQuestion,
-    QuizOption,
-    GenerateCourseRequest
-)
+from shared.common.jobs import job_queue, register_job, report_progress
+from shared.common.llm import llm_client
+from shared.models.models import Course, GenerateCourseRequest
+
+from config.config import course_service_settings
+from services.course_generation import CourseGenerationPipeline
 
 logger = get_logger("course-service")
 router = APIRouter()
 courses_db = DatabaseOperations("courses")
 
-# AI integrations
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-def _get_ai():
-    """Get AI model instance"""
-    if genai is None:
-        raise HTTPException(
-            status_code=500,
-            detail="AI dependency not installed. Please install google-generativeai.",
-        )
-    if not settings.gemini_api_key:
-        raise HTTPException(
-            status_code=500,
-            detail="No AI key configured. Set GEMINI_API_KEY in backend/.env",
-        )
-    genai.configure(api_key=settings.gemini_api_key)
-    return genai.GenerativeModel(settings.default_llm_model)
-
-def _safe_json_extract(text: str) -> dict:
-    """Extract JSON from AI response safely"""
-    if not isinstance(text, str):
-        text = str(text)
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-    try:
-        m = re.search(r"\{[\s\S]*\}", text)
-        if m:
-            return json.loads(m.group(0))
-    except Exception:
-        pass
-    raise ValueError("Could not parse JSON from AI response")
-
-async def _current_user(token: str = None):
-    """Get current authenticated user"""
-    if not token:
-        raise HTTPException(401, "No authentication token provided")
-
-    try:
-        import jwt
-        from shared.config.config import settings
-
-        # Decode and validate JWT token
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-
-        # Verify token hasn't expired
-        if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(401, "Token has expired")
-
-        # Get user from database
-        db = await DatabaseOperations("users").get_database()
-        user = await db.users.find_one({"_id": payload.get("sub")})
-        if not user:
-            raise HTTPException(401, "User not found")
-
-        return {
-            "id": user["_id"],
-            "role": user.get("role", "student"),
-            "email": user.get("email", ""),
-            "name": user.get("name", "")
-        }
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, "Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, "Invalid token")
-    except Exception as e:
-        raise HTTPException(401, f"Authentication failed: {str(e)}")
+def _pipeline(**kwargs) -> CourseGenerationPipeline:
+    return CourseGenerationPipeline(
+        courses_db,
+        concurrency=course_service_settings.ai_generation_concurrency,
+        max_quiz_questions=course_service_settings.max_quiz_questions_per_course,
+        **kwargs
+    )
 
 def _require_role(user, allowed: list[str]):
     """Check if user has required role"""
     if user.get("role") not in allowed:
         raise HTTPException(403, "Insufficient permissions")
 
+async def _require_job_access(job_id: str, user) -> dict:
+    """Fetch a course generation job the caller is allowed to see"""
+    job = await job_queue.get_job_status(job_id)
+    if not job or job.get("func_name") != generate_course_job.__name__:
+        raise NotFoundError("Generation job", job_id)
+    if user.get("role") != "admin" and job["metadata"].get("owner_id") != user["id"]:
+        raise AuthorizationError("Not your generation job")
+    return job
+
+@register_job
+async def generate_course_job(request: dict, owner_id: str, course_id: str) -> dict:
+    """Background job: run the generation pipeline, reporting progress as it goes"""
+    course = await _pipeline(on_progress=report_progress).run(GenerateCourseRequest(**request), owner_id, course_id)
+    return {"course_id": course.id, "lessons": len(course.lessons), "quiz_questions": len(course.quiz)}
+
 @router.post("/generate_course", response_model=Course)
-async def generate_course(req: GenerateCourseRequest, user=Depends(_current_user)):
+async def generate_course(req: GenerateCourseRequest, user=Depends(get_current_user)):
     """
-    Generate a complete course using AI.
+    Generate a complete course using AI and wait for the result.
+
+    Prefer POST /generate_course/jobs for large courses.
 
     - **topic**: Course topic
     - **audience**: Target audience
@@ -123,53 +75,9 @@ async def generate_course(req: GenerateCourseRequest, user=Depends(_current_user
             "user_id": user["id"]
         })
 
-        # Generate course structure
-        course_data = await _generate_course_structure(
-            req.topic, req.audience, req.difficulty, req.lessons_count
-        )
-
-        # Generate detailed content for each lesson
-        detailed_lessons = []
-        for i, lesson_outline in enumerate(course_data.get("lessons", [])):
-            lesson_content = await _generate_detailed_lesson(
-                lesson_outline, req.topic, req.audience, req.difficulty, i + 1
-            )
-            detailed_lessons.append(lesson_content)
-
-        # Generate quizzes
-        quizzes = await _generate_course_quizzes(
-            detailed_lessons, req.topic, req.difficulty
-        )
-
-        # Create course
-        course = Course(
-            owner_id=user["id"],
-            title=course_data.get("title", f"AI Generated: {req.topic}"),
-            audience=course_data.get("audience", req.audience),
-            difficulty=course_data.get("difficulty", req.difficulty),
-            lessons=detailed_lessons,
-            quiz=quizzes,
-        )
-
-        doc = course.dict()
-        doc["_id"] = course.id
-        doc["generated_content"] = course_data
-        doc["ai_generated"] = True
-        doc["generation_params"] = req.dict()
-        doc["created_at"] = datetime.now(timezone.utc)
-
-        await courses_db.insert_one(doc)
-
-        logger.info("AI course generation completed", extra={
-            "course_id": course.id,
-            "title": course.title,
-            "lessons_generated": len(detailed_lessons),
-            "quizzes_generated": len(quizzes)
-        })
-
-        return course
+        return await _pipeline().run(req, user["id"])
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError):
         raise
     except Exception as e:
         logger.error("AI course generation failed", extra={
@@ -179,136 +87,59 @@ async def generate_course(req: GenerateCourseRequest, user=Depends(_current_user
         })
         raise HTTPException(500, f"AI course generation failed: {str(e)}")
 
-async def _generate_course_structure(topic: str, audience: str, difficulty: str, lesson_count: int) -> dict:
-    """Generate course structure using AI"""
-    prompt = f"""
-    Create a detailed course structure for: {topic}
-
-    Target Audience: {audience}
-    Difficulty Level: {difficulty}
-    Number of Lessons: {lesson_count}
-
-    Return JSON with:
-    {{
-        "title": "Course title",
-        "description": "Detailed course description (200-300 words)",
-        "learning_objectives": ["objective1", "objective2"],
-        "prerequisites": ["prereq1", "prereq2"],
-        "lessons": [
-            {{
-                "id": "lesson_1",
-                "title": "Lesson Title",
-                "overview": "Brief overview of what will be covered",
-                "duration_minutes": 90,
-                "key_concepts": ["concept1", "concept2"],
-                "learning_outcomes": ["outcome1", "outcome2"]
-            }}
-        ]
-    }}
-
-    Make the course structure comprehensive and well-organized.
+@router.post("/generate_course/jobs", status_code=202)
+async def start_course_generation(req: GenerateCourseRequest, user=Depends(get_current_user)):
     """
+    Start generating a course in the background.
 
-    try:
-        model = _get_ai()
-        response = model.generate_content(prompt)
-        return _safe_json_extract(response.text)
-    except Exception as e:
-        logger.error("Course structure generation failed", extra={"error": str(e)})
-        raise HTTPException(500, f"Course structure generation failed: {e}")
-
-async def _generate_detailed_lesson(lesson_outline: dict, topic: str, audience: str, difficulty: str, lesson_number: int) -> dict:
-    """Generate detailed lesson content"""
-    lesson_title = lesson_outline.get("title", "")
-    key_concepts = lesson_outline.get("key_concepts", [])
-
-    prompt = f"""
-    Create comprehensive content for Lesson {lesson_number}: {lesson_title}
-    Course Topic: {topic}
-    Target Audience: {audience}
-    Difficulty Level: {difficulty}
-
-    Key Concepts: {', '.join(key_concepts)}
-
-    Provide detailed lesson content including:
-    - Step-by-step explanations
-    - Real-world examples and case studies
-    - Practical exercises and implementations
-    - Code examples (if applicable)
-    - Common mistakes and solutions
-    - Further reading resources
-
-    Make the content engaging, practical, and comprehensive (600-1000 words).
-    """
-
-    try:
-        model = _get_ai()
-        response = model.generate_content(prompt)
-
-        return {
-            "id": lesson_outline.get("id", f"lesson_{lesson_number}"),
-            "title": lesson_title,
-            "content": response.text,
-            "duration_minutes": lesson_outline.get("duration_minutes", 90),
-            "key_concepts": key_concepts,
-            "learning_outcomes": lesson_outline.get("learning_outcomes", []),
-            "order_index": lesson_number - 1,
-            "ai_generated": True
-        }
-    except Exception as e:
-        logger.error("Detailed lesson generation failed", extra={"error": str(e)})
-        raise HTTPException(500, f"Detailed lesson generation failed: {e}")
-
-async def _generate_course_quizzes(lessons: list, topic: str, difficulty: str) -> list:
-    """Generate quizzes for the course"""
-    prompt = f"""
-    Create a comprehensive quiz for the course: {topic}
-    Difficulty: {difficulty}
-    Course has {len(lessons)} lessons
-
-    Generate 20 multiple choice questions covering all major concepts.
-    Each question should have 4 options with exactly one correct answer.
-
-    Return format:
-    [
-        {{
-            "question": "Question text",
-            "options": [
-                {{"text": "Option 1", "is_correct": false}},
-                {{"text": "Option 2", "is_correct": true}},
-                ...
-            ],
-            "explanation": "Explanation of correct answer"
-        }}
-    ]
+    The course document is created as soon as the outline is ready and fills
+    in lesson by lesson; follow progress at the returned status or events URL.
     """
-
-    try:
-        model = _get_ai()
-        response = model.generate_content(prompt)
-        quiz_data = _safe_json_extract(response.text)
-
-        quizzes = []
-        for q in quiz_data[:20]:  # Limit to 20 questions
-            options = [
-                QuizOption(text=opt.get("text", ""), is_correct=bool(opt.get("is_correct", False)))
-                for opt in q.get("options", [])[:4]
-            ]
-            if options:
-                quiz_question = QuizQuestion(
-                    question=q.get("question", ""),
-                    options=options,
-                    explanation=q.get("explanation", "")
-                )
-                quizzes.append(quiz_question)
-
-        return quizzes
-    except Exception:
-        logger.warning("Quiz generation failed, returning empty list", extra={"topic": topic})
-        return []
+    _require_role(user, ["admin", "instructor"])
+
+    course_id = str(uuid.uuid4())
+    job_id = await job_queue.enqueue(
+        name=f"generate_course:{req.topic[:50]}",
+        func=generate_course_job,
+        kwargs={"request": req.dict(), "owner_id": user["id"], "course_id": course_id},
+        max_retries=0,
+        metadata={"owner_id": user["id"], "course_id": course_id}
+    )
+
+    logger.info("AI course generation queued", extra={
+        "job_id": job_id,
+        "course_id": course_id,
+        "lessons_count": req.lessons_count,
+        "user_id": user["id"]
+    })
+
+    return {
+        "job_id": job_id,
+        "course_id": course_id,
+        "status_url": f"/courses/generate_course/jobs/{job_id}",
+        "events_url": f"/courses/generate_course/jobs/{job_id}/events"
+    }
+
+@router.get("/generate_course/jobs/{job_id}")
+async def get_course_generation(job_id: str, user=Depends(get_current_user)):
+    """Poll a course generation job"""
+    job = await _require_job_access(job_id, user)
+    return {key: job.get(key) for key in ("id", "status", "progress", "metadata", "result", "error", "created_at", "completed_at")}
+
+@router.get("/generate_course/jobs/{job_id}/events")
+async def stream_course_generation(job_id: str, user=Depends(get_current_user)):
+    """Stream course generation progress as server-sent events until it finishes"""
+    await _require_job_access(job_id, user)
+
+    async def events():
+        async for job in job_queue.watch(job_id):
+            payload = {key: job.get(key) for key in ("status", "progress", "metadata", "result", "error")}
+            yield f"event: {job['status']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @router.post("/enhance_content")
-async def enhance_content(request: dict, user=Depends(_current_user)):
+async def enhance_content(request: dict, user=Depends(get_current_user)):
     """
     Enhance existing lesson content using AI.
 
@@ -377,8 +208,7 @@ async def enhance_content(request: dict, user=Depends(_current_user)):
 
         prompt = prompts.get(enhancement_type, prompts["comprehensive"])
 
-        model = _get_ai()
-        response = model.generate_content(prompt)
+        response = await llm_client.generate(prompt)
 
         logger.info("Content enhanced using AI", extra={
             "enhancement_type": enhancement_type,
@@ -394,14 +224,14 @@ async def enhance_content(request: dict, user=Depends(_current_user)):
             "generated_at": datetime.now(timezone.utc).isoformat()
         }
 
-    except (ValidationError, AuthorizationError):
+    except (ValidationError, AuthorizationError, ServiceUnavailableError):
         raise
     except Exception as e:
         logger.error("Content enhancement failed", extra={"error": str(e)})
         raise HTTPException(500, "Content enhancement failed")
 
 @router.get("/models")
-async def get_available_models(user=Depends(_current_user)):
+async def get_available_models(user=Depends(get_current_user)):
     """
     Get available AI models for course generation.
     """
@@ -1,9 +1,8 @@
 """
 Lesson management routes for Course Service
 """
-from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+from typing import List
 
 from shared.common.auth import get_current_user, require_admin
 from shared.common.database import DatabaseOperations, _require
@@ -15,49 +14,13 @@ logger = get_logger("course-service")
 router = APIRouter()
 courses_db = DatabaseOperations("courses")
 
-async def _current_user(token: Optional[str] = None):
-    """Get current authenticated user"""
-    if not token:
-        raise HTTPException(401, "No authentication token provided")
-
-    try:
-        import jwt
-        from shared.config.config import settings
-
-        # Decode and validate JWT token
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-
-        # Verify token hasn't expired
-        if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(401, "Token has expired")
-
-        # Get user from database
-        db = await DatabaseOperations("users").get_database()
-        user = await db.users.find_one({"_id": payload.get("sub")})
-        if not user:
-            raise HTTPException(401, "User not found")
-
-        return {
-            "id": user["_id"],
-            "role": user.get("role", "student"),
-            "email": user.get("email", ""),
-            "name": user.get("name", "")
-        }
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, "Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, "Invalid token")
-    except Exception as e:
-        raise HTTPException(401, f"Authentication failed: {str(e)}")
-
 def _require_role(user, allowed: list[str]):
     """Check if user has required role"""
     if user.get("role") not in allowed:
         raise HTTPException(403, "Insufficient permissions")
 
 @router.post("/{course_id}/lessons", response_model=dict)
-async def add_lesson(course_id: str, body: LessonCreate, user=Depends(_current_user)):
+async def add_lesson(course_id: str, body: LessonCreate, user=Depends(get_current_user)):
     """
     Add a lesson to a course.
 
@@ -107,7 +70,7 @@ async def add_lesson(course_id: str, body: LessonCreate, user=Depends(_current_u
         raise HTTPException(500, "Failed to add lesson")
 
 @router.get("/{course_id}/lessons")
-async def get_course_lessons(course_id: str, user=Depends(_current_user)):
+async def get_course_lessons(course_id: str, user=Depends(get_current_user)):
     """
     Get all lessons for a course.
 
@@ -144,7 +107,7 @@ async def get_course_lessons(course_id: str, user=Depends(_current_user)):
         raise HTTPException(500, "Failed to retrieve lessons")
 
 @router.get("/{course_id}/lessons/{lesson_id}")
-async def get_lesson(course_id: str, lesson_id: str, user=Depends(_current_user)):
+async def get_lesson(course_id: str, lesson_id: str, user=Depends(get_current_user)):
     """
     Get a specific lesson from a course.
 
@@ -188,7 +151,7 @@ async def update_lesson(
     course_id: str,
     lesson_id: str,
     lesson_data: dict,
-    user=Depends(_current_user)
+    user=Depends(get_current_user)
 ):
     """
     Update a lesson in a course.
@@ -238,7 +201,7 @@ async def update_lesson(
         raise HTTPException(500, "Failed to update lesson")
 
 @router.delete("/{course_id}/lessons/{lesson_id}")
-async def delete_lesson(course_id: str, lesson_id: str, user=Depends(_current_user)):
+async def delete_lesson(course_id: str, lesson_id: str, user=Depends(get_current_user)):
     """
     Delete a lesson from a course.
 
@@ -278,7 +241,7 @@ async def delete_lesson(course_id: str, lesson_id: str, user=Depends(_current_us
         raise HTTPException(500, "Failed to delete lesson")
 
 @router.put("/{course_id}/lessons/reorder")
-async def reorder_lessons(course_id: str, lesson_order: List[str], user=Depends(_current_user)):
+async def reorder_lessons(course_id: str, lesson_order: List[str], user=Depends(get_current_user)):
     """
     Reorder lessons in a course.
 
@@ -15,49 +15,13 @@ router = APIRouter()
 courses_db = DatabaseOperations("courses")
 progress_db = DatabaseOperations("course_progress")
 
-async def _current_user(token: Optional[str] = None):
-    """Get current authenticated user"""
-    if not token:
-        raise HTTPException(401, "No authentication token provided")
-
-    try:
-        import jwt
-        from shared.config.config import settings
-
-        # Decode and validate JWT token
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-
-        # Verify token hasn't expired
-        if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(401, "Token has expired")
-
-        # Get user from database
-        db = await DatabaseOperations("users").get_database()
-        user = await db.users.find_one({"_id": payload.get("sub")})
-        if not user:
-            raise HTTPException(401, "User not found")
-
-        return {
-            "id": user["_id"],
-            "role": user.get("role", "student"),
-            "email": user.get("email", ""),
-            "name": user.get("name", "")
-        }
-
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, "Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, "Invalid token")
-    except Exception as e:
-        raise HTTPException(401, f"Authentication failed: {str(e)}")
-
 def _require_role(user, allowed: list[str]):
     """Check if user has required role"""
     if user.get("role") not in allowed:
         raise HTTPException(403, "Insufficient permissions")
 
 @router.post("/{course_id}/progress")
-async def update_progress(course_id: str, progress_data: dict, user=Depends(_current_user)):
+async def update_progress(course_id: str, progress_data: dict, user=Depends(get_current_user)):
     """
     Update course progress for a user.
 
@@ -155,7 +119,7 @@ async def update_progress(course_id: str, progress_data: dict, user=Depends(_cur
         raise HTTPException(500, "Failed to update progress")
 
 @router.get("/{course_id}/progress")
-async def get_progress(course_id: str, user=Depends(_current_user)):
+async def get_progress(course_id: str, user=Depends(get_current_user)):
     """
     Get course progress for a user.
 
@@ -194,7 +158,7 @@ async def get_progress(course_id: str, user=Depends(_current_user)):
         raise HTTPException(500, "Failed to retrieve progress")
 
 @router.get("/{course_id}/progress/stats")
-async def get_progress_stats(course_id: str, user=Depends(_current_user)):
+async def get_progress_stats(course_id: str, user=Depends(get_current_user)):
     """
     Get detailed progress statistics for a course.
 
@@ -252,7 +216,7 @@ async def get_progress_stats(course_id: str, user=Depends(_current_user)):
         raise HTTPException(500, "Failed to retrieve progress statistics")
 
 @router.get("/user/progress")
-async def get_user_all_progress(user=Depends(_current_user)):
+async def get_user_all_progress(user=Depends(get_current_user)):
     """
     Get progress for all courses the user is enrolled in.
     """
@@ -292,7 +256,7 @@ async def get_user_all_progress(user=Depends(_current_user)):
         raise HTTPException(500, "Failed to retrieve user progress")
 
 @router.post("/{course_id}/progress/reset")
-async def reset_progress(course_id: str, user=Depends(_current_user)):
+async def reset_progress(course_id: str, user=Depends(get_current_user)):
     """
     Reset progress for a course (admin/instructor only).
 
@@ -0,0 +1,276 @@
+"""
+AI course generation pipeline
+"""
+import asyncio
+import json
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from shared.common.logging import get_logger
+from shared.common.llm import LLMClient, llm_client
+from shared.models.models import Course, CourseLesson, QuizOption, QuizQuestion, GenerateCourseRequest
+
+logger = get_logger("course-service")
+
+ProgressCallback = Callable[..., Awaitable[None]]
+
+
+def _safe_json_extract(text: str) -> Any:
+    """Extract JSON from AI response safely"""
+    if not isinstance(text, str):
+        text = str(text)
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    try:
+        m = re.search(r"\{[\s\S]*\}|\[[\s\S]*\]", text)
+        if m:
+            return json.loads(m.group(0))
+    except Exception:
+        pass
+    raise ValueError("Could not parse JSON from AI response")
+
+
+class CourseGenerationPipeline:
+    """Generates a course as a pipeline instead of one LLM call after another.
+
+    The outline comes first; then `concurrency` lessons are generated at a
+    time, and each lesson's quiz starts as soon as that lesson is written,
+    ahead of lessons still waiting for a slot. Each finished piece is written straight to
+    the course document, so readers see it fill in while generation runs.
+    """
+
+    def __init__(
+        self,
+        courses: Any,
+        llm: LLMClient = llm_client,
+        concurrency: int = 4,
+        max_quiz_questions: int = 50,
+        on_progress: Optional[ProgressCallback] = None
+    ):
+        self.courses = courses
+        self.llm = llm
+        self.concurrency = concurrency
+        self.max_quiz_questions = max_quiz_questions
+        self.on_progress = on_progress
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def _generate(self, prompt: str) -> str:
+        response = await self.llm.generate(prompt)
+        return response.text
+
+    async def _report(self, state: Dict[str, int], total: int, **extra: Any):
+        if self.on_progress is not None:
+            # The outline is one step, then a lesson and a quiz per lesson
+            done = 1 + state["lessons_done"] + state["quizzes_done"]
+            await self.on_progress(round(100 * done / (1 + 2 * total), 1), **state, lessons_total=total, **extra)
+
+    async def generate_outline(self, req: GenerateCourseRequest) -> Dict[str, Any]:
+        """Generate course structure using AI"""
+        prompt = f"""
+    Create a detailed course structure for: {req.topic}
+
+    Target Audience: {req.audience}
+    Difficulty Level: {req.difficulty}
+    Number of Lessons: {req.lessons_count}
+
+    Return JSON with:
+    {{
+        "title": "Course title",
+        "description": "Detailed course description (200-300 words)",
+        "learning_objectives": ["objective1", "objective2"],
+        "prerequisites": ["prereq1", "prereq2"],
+        "lessons": [
+            {{
+                "id": "lesson_1",
+                "title": "Lesson Title",
+                "overview": "Brief overview of what will be covered",
+                "duration_minutes": 90,
+                "key_concepts": ["concept1", "concept2"],
+                "learning_outcomes": ["outcome1", "outcome2"]
+            }}
+        ]
+    }}
+
+    Make the course structure comprehensive and well-organized.
+    """
+        outline = _safe_json_extract(await self._generate(prompt))
+        outline["lessons"] = outline.get("lessons", [])[:req.lessons_count]
+        return outline
+
+    async def generate_lesson(self, lesson_outline: Dict[str, Any], req: GenerateCourseRequest, lesson_number: int) -> Dict[str, Any]:
+        """Generate detailed lesson content"""
+        lesson_title = lesson_outline.get("title", "")
+        key_concepts = lesson_outline.get("key_concepts", [])
+
+        prompt = f"""
+    Create comprehensive content for Lesson {lesson_number}: {lesson_title}
+    Course Topic: {req.topic}
+    Target Audience: {req.audience}
+    Difficulty Level: {req.difficulty}
+
+    Key Concepts: {', '.join(key_concepts)}
+
+    Provide detailed lesson content including:
+    - Step-by-step explanations
+    - Real-world examples and case studies
+    - Practical exercises and implementations
+    - Code examples (if applicable)
+    - Common mistakes and solutions
+    - Further reading resources
+
+    Make the content engaging, practical, and comprehensive (600-1000 words).
+    """
+        content = await self._generate(prompt)
+
+        return {
+            "id": lesson_outline.get("id", f"lesson_{lesson_number}"),
+            "title": lesson_title,
+            "content": content,
+            "duration_minutes": lesson_outline.get("duration_minutes", 90),
+            "key_concepts": key_concepts,
+            "learning_outcomes": lesson_outline.get("learning_outcomes", []),
+            "order_index": lesson_number - 1,
+            "ai_generated": True
+        }
+
+    async def generate_lesson_quiz(self, lesson: Dict[str, Any], req: GenerateCourseRequest, question_count: int) -> List[QuizQuestion]:
+        """Generate quiz questions for one lesson; an empty list if generation fails"""
+        prompt = f"""
+    Create {question_count} quiz questions for the lesson "{lesson['title']}" of the course: {req.topic}
+    Difficulty: {req.difficulty}
+    Key Concepts: {', '.join(lesson.get('key_concepts', []))}
+
+    Lesson content:
+    {lesson['content'][:4000]}
+
+    Each question should have 4 options with exactly one correct answer.
+
+    Return format:
+    [
+        {{
+            "question": "Question text",
+            "options": [
+                {{"text": "Option 1", "is_correct": false}},
+                {{"text": "Option 2", "is_correct": true}},
+                ...
+            ],
+            "explanation": "Explanation of correct answer"
+        }}
+    ]
+    """
+        try:
+            quiz_data = _safe_json_extract(await self._generate(prompt))
+
+            quizzes = []
+            for q in quiz_data[:question_count]:
+                options = [
+                    QuizOption(text=opt.get("text", ""), is_correct=bool(opt.get("is_correct", False)))
+                    for opt in q.get("options", [])[:4]
+                ]
+                if options:
+                    quizzes.append(QuizQuestion(
+                        question=q.get("question", ""),
+                        options=options,
+                        explanation=q.get("explanation", "")
+                    ))
+            return quizzes
+        except Exception as e:
+            logger.warning("Quiz generation failed, skipping lesson quiz", extra={"lesson": lesson["title"], "error": str(e)})
+            return []
+
+    async def run(self, req: GenerateCourseRequest, owner_id: str, course_id: Optional[str] = None) -> Course:
+        """Generate a course, persisting each lesson and quiz as it completes"""
+        start = time.perf_counter()
+        outline = await self.generate_outline(req)
+        outlines = outline["lessons"]
+        total = len(outlines)
+
+        course = Course(
+            owner_id=owner_id,
+            title=outline.get("title", f"AI Generated: {req.topic}"),
+            audience=outline.get("audience", req.audience),
+            difficulty=outline.get("difficulty", req.difficulty),
+            lessons=[{"id": o.get("id", f"lesson_{i + 1}"), "title": o.get("title", ""), "order_index": i} for i, o in enumerate(outlines)],
+            **({"id": course_id} if course_id else {})
+        )
+
+        doc = course.dict()
+        doc["_id"] = course.id
+        doc["generated_content"] = outline
+        doc["ai_generated"] = True
+        doc["generation_params"] = req.dict()
+        doc["generation"] = {"status": "generating", "lessons_done": 0, "quizzes_done": 0, "lessons_total": total}
+        doc["created_at"] = datetime.now(timezone.utc)
+        await self.courses.insert_one(doc)
+
+        state = {"lessons_done": 0, "quizzes_done": 0}
+        await self._report(state, total, course_id=course.id)
+
+        questions_per_lesson = max(1, min(5, self.max_quiz_questions // max(total, 1)))
+        lessons: List[Optional[Dict[str, Any]]] = [None] * total
+        quizzes: List[List[QuizQuestion]] = [[] for _ in range(total)]
+
+        async def lesson_then_quiz(index: int):
+            async with self._slots:
+                await generate_lesson_and_quiz(index)
+
+        async def generate_lesson_and_quiz(index: int):
+            lesson = await self.generate_lesson(outlines[index], req, index + 1)
+            lessons[index] = lesson
+            await self.courses.update_one(
+                {"_id": course.id},
+                {"$set": {f"lessons.{index}": lesson}, "$inc": {"generation.lessons_done": 1}}
+            )
+            state["lessons_done"] += 1
+            await self._report(state, total, course_id=course.id)
+
+            if req.include_assessments:
+                quiz = await self.generate_lesson_quiz(lesson, req, questions_per_lesson)
+                quizzes[index] = quiz
+                if quiz:
+                    await self.courses.update_one(
+                        {"_id": course.id},
+                        {"$push": {"quiz": {"$each": [q.dict() for q in quiz]}}}
+                    )
+            await self.courses.update_one({"_id": course.id}, {"$inc": {"generation.quizzes_done": 1}})
+            state["quizzes_done"] += 1
+            await self._report(state, total, course_id=course.id)
+
+        tasks = [asyncio.create_task(lesson_then_quiz(i)) for i in range(total)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.courses.update_one(
+                {"_id": course.id},
+                {"$set": {"generation.status": "failed", "generation.error": str(e) or type(e).__name__}}
+            )
+            raise
+
+        # Quizzes were appended in completion order; store them in lesson order
+        ordered_quiz = [q for quiz in quizzes for q in quiz][:self.max_quiz_questions]
+        await self.courses.update_one(
+            {"_id": course.id},
+            {"$set": {
+                "quiz": [q.dict() for q in ordered_quiz],
+                "generation.status": "completed",
+                "generation.completed_at": datetime.now(timezone.utc)
+            }}
+        )
+
+        course.lessons = [CourseLesson(**lesson) for lesson in lessons]
+        course.quiz = ordered_quiz
+        logger.info("AI course generation completed", extra={
+            "course_id": course.id,
+            "title": course.title,
+            "lessons_generated": total,
+            "quizzes_generated": len(ordered_quiz),
+            "duration_seconds": round(time.perf_counter() - start, 2)
+        })
+        return course
@@ -8,6 +8,8 @@ import uvicorn
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.monitoring import setup_metrics
+from shared.common.tracing import setup_tracing
 from shared.common.database import get_database, close_connection
 from shared.common.cache import close_connection as close_cache
 # Temporarily disabled middleware imports due to FastAPI version compatibility issues
@@ -70,6 +72,12 @@ def create_application() -> FastAPI:
     # if settings.environment == "production":
     #     app.add_middleware(RateLimitMiddleware, requests_per_minute=100)
 
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "file-service")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "file-service")
+
     # Include routers
     app.include_router(files_router, prefix="/files", tags=["File Management"])
     app.include_router(upload_router, prefix="", tags=["File Upload"])
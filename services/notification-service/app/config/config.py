@@ -3,6 +3,7 @@ Notification Service Configuration
 """
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Dict, List
 import os
 from dotenv import load_dotenv
 
@@ -26,6 +27,22 @@ class NotificationServiceSettings(BaseSettings):
     email_batch_size: int = 50
     sms_batch_size: int = 20
     push_batch_size: int = 100
+    in_app_batch_size: int = 500
+
+    # Dispatch pipeline
+    dispatch_workers: Dict[str, int] = {"email": 4, "in_app": 8, "sms": 2, "push": 4}  # per channel
+    dispatch_queue_size: int = 10000  # queued jobs per channel before submitters wait
+    dispatch_insert_batch_size: int = 1000
+    dispatch_status_batch_size: int = 1000
+    dispatch_status_flush_ms: int = 200
+    dispatch_lease_seconds: int = 300  # renewed every third of this while a node holds the job; reclaimed after it lapses
+    dispatch_poll_seconds: int = 30
+
+    # Digest settings
+    digest_types: List[str] = ["course_update", "assignment_due", "grade_available", "deadline_warning", "course_reminder"]
+    digest_window_minutes: int = 15  # for users without their own setting
+    digest_max_listed: int = 10  # events listed in a digest message
+    digest_flush_seconds: int = 30
 
     # Retry settings
     max_delivery_attempts: int = 3
@@ -34,6 +51,10 @@ class NotificationServiceSettings(BaseSettings):
     # Cache settings
     notification_cache_ttl: int = 300  # 5 minutes
     settings_cache_ttl: int = 1800  # 30 minutes
+    inbox_cache_size: int = 50  # newest notifications cached per user
+    unread_counter_ttl: int = 86400  # idle counters are reloaded after this
+    stats_cache_ttl: int = 60
+    unread_reconcile_seconds: int = 900
 
     # Rate limiting
     notifications_per_minute: int = 60
@@ -56,9 +77,18 @@ class NotificationServiceSettings(BaseSettings):
     apns_key_id: str = ""
     apns_team_id: str = ""
 
+    # WebSocket settings
+    websocket_presence_ttl: int = 90  # seconds without a heartbeat before presence expires
+    websocket_heartbeat_interval: int = 30
+    websocket_send_queue_size: int = 256  # frames buffered per connection
+    websocket_slow_consumer_policy: str = "drop"  # "drop" oldest frames or "disconnect"
+    websocket_max_topics: int = 100  # course/cohort subscriptions per connection
+
     # Template settings
     template_cache_enabled: bool = True
     template_cache_ttl: int = 3600  # 1 hour
+    template_version_check_seconds: int = 5  # how often replicas look for saved templates
+    default_locale: str = "en"
 
     # Analytics settings
     enable_delivery_tracking: bool = True
@@ -2,11 +2,13 @@
 Notification Service Database Operations
 """
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone, timedelta
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.database import mongo_metrics_listener
 from shared.common.errors import DatabaseError
 
 logger = get_logger("notification-service-db")
@@ -25,7 +27,7 @@ class NotificationDatabase:
             return
 
         try:
-            self.client = AsyncIOMotorClient(settings.mongo_url)
+            self.client = AsyncIOMotorClient(settings.mongo_url, event_listeners=[mongo_metrics_listener])
             self.db = self.client[settings.db_name]
             await self._create_indexes()
             self._initialized = True
@@ -51,12 +53,19 @@ class NotificationDatabase:
             await self.db.notifications.create_index("created_at")
             await self.db.notifications.create_index([("recipient_id", 1), ("created_at", -1)])
 
+            # Dispatch outbox indexes: claimable jobs, and this node's claims
+            await self.db.notification_outbox.create_index([("status", 1), ("lease_until", 1)])
+            await self.db.notification_outbox.create_index([("owner", 1), ("lease_until", 1)])
+
             # Notification settings indexes
             await self.db.notification_settings.create_index("user_id", unique=True)
 
-            # Notification templates indexes
-            await self.db.notification_templates.create_index("type", unique=True)
-            await self.db.notification_templates.create_index("name")
+            # Notification templates indexes: one variant per name and locale
+            if "type_1" in await self.db.notification_templates.index_information():
+                await self.db.notification_templates.drop_index("type_1")
+            await self.db.notification_templates.update_many({"locale": {"$exists": False}}, {"$set": {"locale": "en"}})
+            await self.db.notification_templates.create_index([("name", 1), ("locale", 1)], unique=True)
+            await self.db.notification_templates.create_index("type")
 
             logger.info("Notification database indexes created successfully")
         except Exception as e:
@@ -72,6 +81,64 @@ class NotificationDatabase:
             logger.error("Failed to save notification", extra={"error": str(e)})
             raise DatabaseError("save_notification", f"Notification save failed: {str(e)}")
 
+    async def save_notifications(self, notifications: List[Dict[str, Any]], jobs: List[Dict[str, Any]]):
+        """Insert notifications and their outbox jobs with one unordered insert_many each"""
+        try:
+            await self.db.notifications.insert_many(notifications, ordered=False)
+            await self.db.notification_outbox.insert_many(jobs, ordered=False)
+        except Exception as e:
+            logger.error("Failed to save notifications", extra={"count": len(notifications), "error": str(e)})
+            raise DatabaseError("save_notifications", f"Notification save failed: {str(e)}")
+
+    async def get_notifications_by_ids(self, notification_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get many notifications by ID"""
+        try:
+            return await self.db.notifications.find({"_id": {"$in": notification_ids}}).to_list(None)
+        except Exception as e:
+            logger.error("Failed to get notifications", extra={"count": len(notification_ids), "error": str(e)})
+            raise DatabaseError("get_notifications_by_ids", f"Notification retrieval failed: {str(e)}")
+
+    async def apply_delivery_updates(self, notification_ops: List[Any], outbox_ops: List[Any]):
+        """Write a batch of delivery results with one unordered bulk_write per collection"""
+        try:
+            if notification_ops:
+                await self.db.notifications.bulk_write(notification_ops, ordered=False)
+            if outbox_ops:
+                await self.db.notification_outbox.bulk_write(outbox_ops, ordered=False)
+        except Exception as e:
+            logger.error("Failed to apply delivery updates", extra={"count": len(notification_ops), "error": str(e)})
+            raise DatabaseError("apply_delivery_updates", f"Delivery status update failed: {str(e)}")
+
+    async def claim_outbox_jobs(self, owner: str, now: datetime, lease_until: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Lease pending jobs that are due and not leased by a live node"""
+        try:
+            outbox = self.db.notification_outbox
+            due = await outbox.find(
+                {"status": "pending", "lease_until": {"$lte": now}}, {"_id": 1}
+            ).limit(limit).to_list(limit)
+            if not due:
+                return []
+            # The lease condition is re-checked per document, so each job goes to one node
+            await outbox.update_many(
+                {"_id": {"$in": [job["_id"] for job in due]}, "status": "pending", "lease_until": {"$lte": now}},
+                {"$set": {"owner": owner, "lease_until": lease_until}}
+            )
+            return await outbox.find({"owner": owner, "lease_until": lease_until}).to_list(None)
+        except Exception as e:
+            logger.error("Failed to claim outbox jobs", extra={"error": str(e)})
+            raise DatabaseError("claim_outbox_jobs", f"Outbox claim failed: {str(e)}")
+
+    async def renew_outbox_leases(self, owner: str, job_ids: List[str], lease_until: datetime):
+        """Extend the leases of jobs `owner` still holds"""
+        try:
+            await self.db.notification_outbox.update_many(
+                {"_id": {"$in": job_ids}, "owner": owner, "status": "pending"},
+                {"$set": {"lease_until": lease_until}}
+            )
+        except Exception as e:
+            logger.error("Failed to renew outbox leases", extra={"count": len(job_ids), "error": str(e)})
+            raise DatabaseError("renew_outbox_leases", f"Outbox lease renewal failed: {str(e)}")
+
     async def get_notification(self, notification_id: str) -> Optional[Dict[str, Any]]:
         """Get notification by ID"""
         try:
@@ -84,12 +151,14 @@ class NotificationDatabase:
             raise DatabaseError("get_notification", f"Notification retrieval failed: {str(e)}")
 
     async def get_user_notifications(self, user_id: str, limit: int = 50,
-                                   status: Optional[str] = None) -> List[Dict[str, Any]]:
+                                   status: Optional[str] = None, unread_only: bool = False) -> List[Dict[str, Any]]:
         """Get notifications for a user"""
         try:
             query = {"recipient_id": user_id}
             if status:
                 query["status"] = status
+            elif unread_only:
+                query["status"] = {"$ne": "read"}
 
             notifications = await self.db.notifications.find(query).sort("created_at", -1).limit(limit).to_list(limit)
             return notifications
@@ -100,6 +169,25 @@ class NotificationDatabase:
             })
             raise DatabaseError("get_user_notifications", f"User notifications retrieval failed: {str(e)}")
 
+    async def count_user_notifications(self, user_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """Total and unread notification counts for each user, in one aggregation"""
+        try:
+            rows = await self.db.notifications.aggregate([
+                {"$match": {"recipient_id": {"$in": user_ids}}},
+                {"$group": {
+                    "_id": "$recipient_id",
+                    "total": {"$sum": 1},
+                    "unread": {"$sum": {"$cond": [{"$eq": ["$status", "read"]}, 0, 1]}}
+                }}
+            ]).to_list(None)
+            counts = {user_id: {"total": 0, "unread": 0} for user_id in user_ids}
+            for row in rows:
+                counts[row["_id"]] = {"total": row["total"], "unread": row["unread"]}
+            return counts
+        except Exception as e:
+            logger.error("Failed to count user notifications", extra={"users": len(user_ids), "error": str(e)})
+            raise DatabaseError("count_user_notifications", f"Notification count failed: {str(e)}")
+
     async def update_notification(self, notification_id: str, updates: Dict[str, Any]) -> bool:
         """Update notification"""
         try:
@@ -116,6 +204,22 @@ class NotificationDatabase:
             })
             raise DatabaseError("update_notification", f"Notification update failed: {str(e)}")
 
+    async def mark_notification_read(self, notification_id: str) -> bool:
+        """Mark a notification read; False if it was already read (or is gone)"""
+        try:
+            now = datetime.now(timezone.utc)
+            result = await self.db.notifications.update_one(
+                {"_id": notification_id, "status": {"$ne": "read"}},
+                {"$set": {"status": "read", "read_at": now, "updated_at": now}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error("Failed to mark notification as read", extra={
+                "notification_id": notification_id,
+                "error": str(e)
+            })
+            raise DatabaseError("mark_notification_read", f"Mark as read failed: {str(e)}")
+
     async def delete_notification(self, notification_id: str) -> bool:
         """Delete notification"""
         try:
@@ -161,6 +265,15 @@ class NotificationDatabase:
             })
             raise DatabaseError("get_notification_settings", f"Notification settings retrieval failed: {str(e)}")
 
+    async def get_notification_settings_many(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the stored settings of many users, by user ID"""
+        try:
+            settings_list = await self.db.notification_settings.find({"user_id": {"$in": user_ids}}).to_list(None)
+            return {settings_data["user_id"]: settings_data for settings_data in settings_list}
+        except Exception as e:
+            logger.error("Failed to get notification settings", extra={"users": len(user_ids), "error": str(e)})
+            raise DatabaseError("get_notification_settings_many", f"Notification settings retrieval failed: {str(e)}")
+
     async def save_notification_settings(self, settings_data: Dict[str, Any]) -> str:
         """Save notification settings"""
         try:
@@ -187,6 +300,22 @@ class NotificationDatabase:
             })
             raise DatabaseError("update_notification_settings", f"Notification settings update failed: {str(e)}")
 
+    # Topic membership
+    async def get_user_course_ids(self, user_id: str) -> List[str]:
+        """IDs of the courses a user is enrolled in or owns (the course service's collection)"""
+        try:
+            courses = await self.db.courses.find(
+                {"$or": [{"enrolled_user_ids": user_id}, {"owner_id": user_id}]},
+                {"_id": 1}
+            ).to_list(None)
+            return [str(course["_id"]) for course in courses]
+        except Exception as e:
+            logger.error("Failed to get user courses", extra={
+                "user_id": user_id,
+                "error": str(e)
+            })
+            raise DatabaseError("get_user_course_ids", f"User course retrieval failed: {str(e)}")
+
     # Analytics operations
     async def get_notification_stats(self, user_id: Optional[str] = None, days: int = 30) -> Dict[str, Any]:
         """Get notification statistics"""
@@ -198,16 +327,17 @@ class NotificationDatabase:
             if user_id:
                 query["recipient_id"] = user_id
 
-            # Get statistics
-            total_sent = await self.db.notifications.count_documents(query)
-
-            delivered_query = query.copy()
-            delivered_query["status"] = "delivered"
-            total_delivered = await self.db.notifications.count_documents(delivered_query)
-
-            read_query = query.copy()
-            read_query["status"] = "read"
-            total_read = await self.db.notifications.count_documents(read_query)
+            # One pass grouped by status instead of a count per status
+            by_status = {
+                row["_id"]: row["count"]
+                for row in await self.db.notifications.aggregate([
+                    {"$match": query},
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+                ]).to_list(None)
+            }
+            total_sent = sum(by_status.values())
+            total_delivered = by_status.get("delivered", 0)
+            total_read = by_status.get("read", 0)
 
             # Calculate rates
             delivery_rate = (total_delivered / total_sent * 100) if total_sent > 0 else 0.0
@@ -234,11 +364,32 @@ class NotificationDatabase:
     async def get_notification_templates(self) -> List[Dict[str, Any]]:
         """Get all notification templates"""
         try:
-            templates = await self.db.notification_templates.find().to_list(100)
+            templates = await self.db.notification_templates.find().to_list(None)
             return templates
         except Exception as e:
             logger.error("Failed to get notification templates", extra={"error": str(e)})
             raise DatabaseError("get_notification_templates", f"Notification templates retrieval failed: {str(e)}")
 
+    async def save_notification_template(self, template_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create or replace the template variant with this name and locale"""
+        try:
+            fields = {key: value for key, value in template_data.items() if key not in ("_id", "created_at")}
+            return await self.db.notification_templates.find_one_and_update(
+                {"name": template_data["name"], "locale": template_data["locale"]},
+                {
+                    "$set": fields,
+                    "$setOnInsert": {"_id": template_data["_id"], "created_at": template_data["created_at"]}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error("Failed to save notification template", extra={
+                "name": template_data.get("name"),
+                "locale": template_data.get("locale"),
+                "error": str(e)
+            })
+            raise DatabaseError("save_notification_template", f"Notification template save failed: {str(e)}")
+
 # Global database instance
 notification_db = NotificationDatabase()
\ No newline at end of file
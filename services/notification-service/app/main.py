@@ -8,6 +8,8 @@ import uvicorn
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.monitoring import setup_metrics
+from shared.common.tracing import setup_tracing
 from shared.common.database import get_database, close_connection
 from shared.common.cache import close_connection as close_cache
 # Temporarily disabled middleware imports due to FastAPI version compatibility issues
@@ -18,8 +20,10 @@ from shared.common.cache import close_connection as close_cache
 # )
 
 from routes.notifications import router as notifications_router
-from routes.websocket import router as websocket_router
+from routes.websocket import router as websocket_router, manager as websocket_manager
 from routes.health import router as health_router
+from database.database import notification_db
+from services.notification_service import notification_service
 
 # Initialize logger
 logger = get_logger("notification-service")
@@ -38,14 +42,28 @@ async def lifespan(app: FastAPI):
         db = await get_database()
         await db.command('ping')
         logger.info("Database connection established")
+        await notification_db.init_db()
     except Exception as e:
         logger.error("Database connection failed", extra={"error": str(e)})
         raise
 
+    # Cross-node WebSocket delivery and presence
+    await websocket_manager.bus.start()
+
+    # Notification delivery workers, the outbox poll, unread counter reconciliation and digests
+    await notification_service.dispatcher.start()
+    notification_service.inbox.start()
+    notification_service.digests.start()
+
     yield
 
     # Shutdown
     logger.info("Shutting down Notification Service")
+    await notification_service.dispatcher.stop()
+    await notification_service.digests.stop()
+    await notification_service.inbox.stop()
+    await websocket_manager.close()
+    await notification_db.close_db()
     await close_connection()
     await close_cache()
 
@@ -70,6 +88,12 @@ def create_application() -> FastAPI:
     # if settings.environment == "production":
     #     app.add_middleware(RateLimitMiddleware, requests_per_minute=500)
 
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "notification-service")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "notification-service")
+
     # Include routers
     app.include_router(notifications_router, prefix="/notifications", tags=["Notifications"])
     app.include_router(websocket_router, prefix="", tags=["WebSocket"])
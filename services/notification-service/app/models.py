@@ -81,6 +81,7 @@ class NotificationTemplateBase(BaseModel):
     """Base notification template model"""
     name: str = Field(..., description="Template name")
     type: NotificationType = Field(..., description="Notification type")
+    locale: str = Field("en", description="Language of this variant, e.g. en or pt-BR")
     subject_template: str = Field(..., description="Email subject template")
     message_template: str = Field(..., description="Message template")
     variables: List[str] = Field(default_factory=list, description="Available template variables")
@@ -112,6 +113,13 @@ class NotificationSettingsBase(BaseModel):
     achievement_notifications: bool = Field(True, description="Achievement notifications")
     system_announcements: bool = Field(True, description="System announcement notifications")
 
+    # Digests
+    digest_enabled: bool = Field(True, description="Combine low and medium priority notifications into digests")
+    digest_window_minutes: int = Field(15, ge=0, description="Digest window; 0 sends each notification immediately")
+    digest_windows: Dict[NotificationType, int] = Field(default_factory=dict, description="Per-type digest windows in minutes")
+
+    locale: str = Field("en", description="Preferred language for templated notifications")
+
 class NotificationSettings(NotificationSettingsBase):
     """Complete notification settings model"""
     id: str = Field(..., alias="_id")
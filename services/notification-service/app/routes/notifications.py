@@ -2,7 +2,7 @@
 Notification management routes for Notification Service
 """
 from fastapi import APIRouter, Depends
-from typing import Optional
+from typing import List, Optional
 
 from shared.common.errors import ValidationError, NotFoundError, AuthorizationError
 from shared.common.logging import get_logger
@@ -10,8 +10,10 @@ from shared.common.logging import get_logger
 from utils.notification_utils import get_current_user, require_role
 from services.notification_service import notification_service
 from models import (
-    NotificationCreate, Notification, NotificationStats
+    NotificationCreate, Notification, NotificationStats, NotificationBatch,
+    NotificationTemplate, NotificationTemplateBase
 )
+from config.config import notification_service_settings
 
 logger = get_logger("notification-service")
 router = APIRouter()
@@ -72,6 +74,47 @@ async def create_notification(
         from fastapi import HTTPException
         raise HTTPException(500, "Failed to create notification")
 
+@router.post("/events", response_model=dict)
+async def publish_events(
+    batch: NotificationBatch,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Notify users of a batch of events (grades released, deadlines, course updates).
+
+    Low and medium priority events are combined per user and type into
+    digests over each user's digest window; high and urgent ones are sent
+    right away.
+    """
+    require_role(current_user, ["admin", "instructor"])
+    if len(batch.notifications) > notification_service_settings.max_bulk_notifications:
+        raise ValidationError(
+            f"At most {notification_service_settings.max_bulk_notifications} events per request", "notifications"
+        )
+
+    try:
+        for event in batch.notifications:
+            event.sender_id = event.sender_id or current_user["id"]
+        result = await notification_service.publish_events(batch.notifications)
+
+        logger.info("Notification events accepted", extra={
+            "count": len(batch.notifications),
+            "created_by": current_user["id"],
+            **result
+        })
+
+        return {"status": "accepted", **result}
+
+    except ValidationError:
+        raise
+    except Exception as e:
+        logger.error("Failed to publish notification events", extra={
+            "count": len(batch.notifications),
+            "error": str(e)
+        })
+        from fastapi import HTTPException
+        raise HTTPException(500, "Failed to publish notification events")
+
 @router.get("/")
 async def get_notifications(
     limit: int = 50,
@@ -86,13 +129,12 @@ async def get_notifications(
     """
     try:
         # Use service layer
-        from models import NotificationStatus
-        status = NotificationStatus.READ if not unread_only else None
         notifications = await notification_service.get_user_notifications(
             current_user["id"],
             limit=limit,
-            status=status
+            unread_only=unread_only
         )
+        counts = await notification_service.get_unread_counts(current_user["id"])
 
         logger.info("Notifications retrieved", extra={
             "user_id": current_user["id"],
@@ -103,6 +145,7 @@ async def get_notifications(
         return {
             "notifications": [notification.dict() for notification in notifications],
             "total": len(notifications),
+            "unread_count": counts["unread"],
             "limit": limit,
             "unread_only": unread_only
         }
@@ -115,6 +158,71 @@ async def get_notifications(
         from fastapi import HTTPException
         raise HTTPException(500, "Failed to retrieve notifications")
 
+@router.get("/unread/count")
+async def get_unread_count(current_user: dict = Depends(get_current_user)):
+    """
+    Get the user's unread and total notification counts.
+
+    Counts are kept in Redis and changes are pushed over the WebSocket as
+    `unread_count` messages, so connected clients don't need to poll this.
+    """
+    try:
+        counts = await notification_service.get_unread_counts(current_user["id"])
+        return {"unread": counts["unread"], "total": counts["total"]}
+
+    except Exception as e:
+        logger.error("Failed to get unread count", extra={
+            "user_id": current_user["id"],
+            "error": str(e)
+        })
+        from fastapi import HTTPException
+        raise HTTPException(500, "Failed to retrieve unread count")
+
+@router.get("/templates", response_model=List[NotificationTemplate])
+async def get_notification_templates(current_user: dict = Depends(get_current_user)):
+    """
+    List the stored notification templates, every locale variant included.
+    """
+    require_role(current_user, ["admin", "instructor"])
+    try:
+        return await notification_service.get_notification_templates()
+
+    except Exception as e:
+        logger.error("Failed to get notification templates", extra={"error": str(e)})
+        from fastapi import HTTPException
+        raise HTTPException(500, "Failed to retrieve notification templates")
+
+@router.put("/templates", response_model=NotificationTemplate)
+async def save_notification_template(
+    template: NotificationTemplateBase,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Create or replace the template with this name and locale.
+
+    Templates use `{variable}` placeholders and are compiled when saved;
+    every replica picks up the change within a few seconds.
+    """
+    require_role(current_user, ["admin"])
+    try:
+        saved = await notification_service.save_notification_template(template)
+
+        logger.info("Notification template saved", extra={
+            "name": template.name,
+            "locale": template.locale,
+            "user_id": current_user["id"]
+        })
+
+        return saved
+
+    except Exception as e:
+        logger.error("Failed to save notification template", extra={
+            "name": template.name,
+            "error": str(e)
+        })
+        from fastapi import HTTPException
+        raise HTTPException(500, "Failed to save notification template")
+
 @router.get("/{notification_id}", response_model=Notification)
 async def get_notification(
     notification_id: str,
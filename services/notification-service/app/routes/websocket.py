@@ -2,88 +2,267 @@
 WebSocket routes for Notification Service
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import asyncio
 import json
 
 from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+from config.config import notification_service_settings
+from database.database import notification_db
+from utils.websocket_bus import WebSocketBus
 
 logger = get_logger("notification-service")
 router = APIRouter()
 
+TOPIC_PREFIXES = ("course:", "cohort:")
+SLOW_CONSUMER_CLOSE_CODE = 1013  # try again later
+
+async def member_topics(user_id: str) -> Set[str]:
+    """Topics a user may subscribe to: the courses they are enrolled in or own.
+
+    There is no cohort membership store yet, so cohort topics are never granted.
+    """
+    if notification_db.db is None:
+        return set()
+    return {f"course:{course_id}" for course_id in await notification_db.get_user_course_ids(user_id)}
+
+def text_frame(message: str) -> Dict[str, str]:
+    """ASGI send event for a text message; one frame is shared by every recipient"""
+    return {"type": "websocket.send", "text": message}
+
+class Connection:
+    """One WebSocket with its bounded outbound queue, drained by its own writer task"""
+
+    __slots__ = ("websocket", "user_id", "queue", "topics", "writer", "dropped")
+
+    def __init__(self, websocket: WebSocket, user_id: str, max_queue: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.topics: Set[str] = set()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
 # WebSocket connection manager
 class ConnectionManager:
-    """Manages WebSocket connections for real-time notifications"""
-
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    """Manages this process's WebSocket connections; a user may have several (tabs, devices).
+
+    Sending never awaits a socket: frames go onto each connection's queue
+    and its writer sends them, so one slow client delays only itself. A
+    connection whose queue is full is a slow consumer and, depending on
+    `slow_consumer_policy`, loses its oldest frame ("drop") or is closed
+    ("disconnect"). Topic subscriptions are checked against `topic_access`,
+    which returns the topics a user belongs to.
+    """
 
-    async def connect(self, websocket: WebSocket, user_id: str):
+    def __init__(
+        self,
+        redis_client: Any = None,
+        node_id: Optional[str] = None,
+        max_queue: int = notification_service_settings.websocket_send_queue_size,
+        slow_consumer_policy: str = notification_service_settings.websocket_slow_consumer_policy,
+        max_topics: int = notification_service_settings.websocket_max_topics,
+        topic_access: Optional[Callable[[str], Awaitable[Set[str]]]] = None
+    ):
+        if slow_consumer_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        self.active_connections: Dict[str, Set[Connection]] = {}
+        self.topics: Dict[str, Set[Connection]] = {}
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.max_topics = max_topics
+        self.topic_access = topic_access or member_topics
+        self.bus = WebSocketBus(
+            self,
+            presence_ttl=notification_service_settings.websocket_presence_ttl,
+            heartbeat_interval=notification_service_settings.websocket_heartbeat_interval,
+            redis_client=redis_client,
+            node_id=node_id
+        )
+        self._tasks: Set[asyncio.Task] = set()
+        self.frames_dropped = 0
+        self.slow_consumers_closed = 0
+
+    def _spawn(self, coroutine: Awaitable):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
         """Accept and register a new WebSocket connection"""
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        connection = Connection(websocket, user_id, self.max_queue)
+        connection.writer = asyncio.get_running_loop().create_task(self._write(connection))
+        self.active_connections.setdefault(user_id, set()).add(connection)
+        await self.bus.join(user_id)
         logger.info("WebSocket connection established", extra={
             "user_id": user_id,
-            "total_connections": len(self.active_connections)
+            "user_connections": len(self.active_connections[user_id]),
+            "total_connections": self.get_connection_count()
         })
-
-    def disconnect(self, user_id: str):
-        """Remove a WebSocket connection"""
-        if user_id in self.active_connections:
+        return connection
+
+    async def disconnect(self, connection: Connection, code: Optional[int] = None):
+        """Remove a WebSocket connection, closing it with `code` if given"""
+        user_id = connection.user_id
+        connections = self.active_connections.get(user_id)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        if not connections:
             del self.active_connections[user_id]
-            logger.info("WebSocket connection closed", extra={
-                "user_id": user_id,
-                "remaining_connections": len(self.active_connections)
-            })
-
-    async def send_personal_message(self, message: str, user_id: str):
-        """Send a message to a specific user"""
-        if user_id in self.active_connections:
+        self.unsubscribe(connection, list(connection.topics))
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        if code is not None:
             try:
-                await self.active_connections[user_id].send_text(message)
-                logger.debug("WebSocket message sent", extra={
-                    "user_id": user_id,
-                    "message_type": "personal"
-                })
-            except Exception as e:
-                logger.error("Failed to send WebSocket message", extra={
-                    "user_id": user_id,
-                    "error": str(e)
-                })
-                # Remove broken connection
-                self.disconnect(user_id)
-
-    async def broadcast(self, message: str):
-        """Send a message to all connected users"""
-        disconnected_users = []
-        for user_id, connection in self.active_connections.items():
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error("Failed to broadcast to user", extra={
-                    "user_id": user_id,
-                    "error": str(e)
-                })
-                disconnected_users.append(user_id)
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+        await self.bus.leave(user_id)
+        logger.info("WebSocket connection closed", extra={
+            "user_id": user_id,
+            "close_code": code,
+            "remaining_connections": self.get_connection_count()
+        })
 
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+    async def _write(self, connection: Connection):
+        """Send queued frames in order until the socket fails or the connection is removed"""
+        queue, websocket = connection.queue, connection.websocket
+        try:
+            while True:
+                await websocket.send(await queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Failed to send WebSocket message", extra={
+                "user_id": connection.user_id,
+                "error": str(e)
+            })
+            # Remove broken connection
+            self._spawn(self.disconnect(connection))
+
+    def _offer(self, connection: Connection, frame: Dict[str, str]) -> bool:
+        """Queue a frame for one connection, applying the slow consumer policy"""
+        try:
+            connection.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.slow_consumer_policy == "disconnect":
+            self.slow_consumers_closed += 1
+            logger.warning("Closing slow WebSocket consumer", extra={"user_id": connection.user_id, "queued": connection.queue.qsize()})
+            self._spawn(self.disconnect(connection, SLOW_CONSUMER_CLOSE_CODE))
+            return False
+        connection.queue.get_nowait()
+        connection.queue.put_nowait(frame)
+        connection.dropped += 1
+        self.frames_dropped += 1
+        return True
 
-        logger.info("WebSocket broadcast completed", extra={
-            "message": message[:100] + "..." if len(message) > 100 else message,
-            "disconnected_users": len(disconnected_users)
-        })
+    def send(self, connection: Connection, message: str) -> bool:
+        """Queue a message for a single connection (replies to that client)"""
+        return self._offer(connection, text_frame(message))
+
+    def deliver(self, user_id: str, message: str) -> int:
+        """Queue a message for this process's connections of a user"""
+        frame = text_frame(message)
+        return sum(self._offer(connection, frame) for connection in list(self.active_connections.get(user_id, ())))
+
+    def deliver_all(self, message: str, exclude: Iterable[str] = (), topic: Optional[str] = None) -> int:
+        """Queue a message for every connection in this process, or a topic's subscribers"""
+        if topic is not None:
+            recipients = list(self.topics.get(topic, ()))
+        else:
+            recipients = [connection for connections in self.active_connections.values() for connection in connections]
+        excluded = set(exclude)
+        frame = text_frame(message)
+        offer = self._offer
+        delivered = sum(offer(connection, frame) for connection in recipients if connection.user_id not in excluded)
+        metrics_collector.counter_inc("websocket_broadcast_frames_total", delivered)
+        return delivered
+
+    # Topics
+    async def subscribe(self, connection: Connection, topics: Iterable[str]) -> List[str]:
+        """Subscribe a connection to course/cohort topics its user belongs to; returns the topics accepted"""
+        requested = [topic for topic in topics if isinstance(topic, str) and topic.startswith(TOPIC_PREFIXES)]
+        if not requested:
+            return []
+        try:
+            allowed = await self.topic_access(connection.user_id)
+        except Exception as e:
+            logger.warning("Topic membership lookup failed", extra={"user_id": connection.user_id, "error": str(e)})
+            return []
+
+        accepted = []
+        for topic in requested:
+            if topic not in allowed:
+                continue
+            if topic not in connection.topics and len(connection.topics) >= self.max_topics:
+                break
+            connection.topics.add(topic)
+            self.topics.setdefault(topic, set()).add(connection)
+            accepted.append(topic)
+        return accepted
+
+    def unsubscribe(self, connection: Connection, topics: Iterable[str]):
+        for topic in topics:
+            connection.topics.discard(topic)
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.topics[topic]
+
+    async def send_personal_message(self, message: str, user_id: str) -> int:
+        """Send a message to every connection of a user, on any node"""
+        return await self.bus.send_to_user(user_id, message)
+
+    async def broadcast(self, message: str, exclude_user_ids: Iterable[str] = (), topic: Optional[str] = None) -> int:
+        """Send a message to all connected users, or a topic's subscribers, on every node"""
+        delivered = await self.bus.broadcast(message, exclude_user_ids, topic)
+        logger.debug("WebSocket broadcast queued", extra={"topic": topic, "local_connections": delivered})
+        return delivered
+
+    async def close(self):
+        """Close every connection (server shutdown) and stop the bus"""
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                await self.disconnect(connection, 1001)
+        await self.bus.stop()
+
+    def local_users(self) -> Iterable[str]:
+        return self.active_connections.keys()
+
+    def connection_count(self, user_id: str) -> int:
+        return len(self.active_connections.get(user_id, ()))
 
     def get_connection_count(self) -> int:
-        """Get the number of active connections"""
-        return len(self.active_connections)
+        """Get the number of active connections in this process"""
+        return sum(len(connections) for connections in self.active_connections.values())
 
     def is_user_connected(self, user_id: str) -> bool:
-        """Check if a user is currently connected"""
+        """Check if a user is connected to this process"""
         return user_id in self.active_connections
 
-# Global connection manager instance
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("websocket_connections", self.get_connection_count())
+        collector.gauge_set("websocket_users", len(self.active_connections))
+        collector.gauge_set("websocket_topics", len(self.topics))
+        collector.gauge_set("websocket_frames_dropped", self.frames_dropped)
+        collector.gauge_set("websocket_slow_consumers_closed", self.slow_consumers_closed)
+
+# Global connection manager and its cross-node bus
 manager = ConnectionManager()
+bus = manager.bus
+metrics_collector.register_collector(manager.collect_metrics)
+metrics_collector.register_collector(bus.collect_metrics)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
 
 @router.websocket("/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
@@ -91,8 +270,12 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
     WebSocket endpoint for real-time notifications.
 
     - **user_id**: User identifier for the WebSocket connection
+
+    Clients send `{"type": "subscribe", "topics": ["course:<id>", "cohort:<id>"]}`
+    to receive broadcasts for those topics; only topics the user belongs to
+    are accepted and echoed back.
     """
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
 
     try:
         # Send welcome message
@@ -100,9 +283,9 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             "type": "connection",
             "message": "Connected to notification service",
             "user_id": user_id,
-            "timestamp": "2024-01-01T00:00:00Z"  # Would use datetime.utcnow()
+            "timestamp": _now()
         })
-        await manager.send_personal_message(welcome_message, user_id)
+        manager.send(connection, welcome_message)
 
         while True:
             try:
@@ -127,27 +310,40 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                     # Respond to ping with pong
                     pong_message = json.dumps({
                         "type": "pong",
-                        "timestamp": "2024-01-01T00:00:00Z"
+                        "timestamp": _now()
                     })
-                    await manager.send_personal_message(pong_message, user_id)
+                    manager.send(connection, pong_message)
+
+                elif message_type in ("subscribe", "unsubscribe"):
+                    # Course/cohort topics for targeted broadcasts
+                    topics = message_data.get("topics") or []
+                    if message_type == "subscribe":
+                        topics = await manager.subscribe(connection, topics)
+                    else:
+                        manager.unsubscribe(connection, topics)
+                    manager.send(connection, json.dumps({
+                        "type": f"{message_type}d",
+                        "topics": topics,
+                        "timestamp": _now()
+                    }))
 
                 elif message_type == "echo":
                     # Echo back the message
                     echo_message = json.dumps({
                         "type": "echo",
                         "original_message": message_data.get("message", data),
-                        "timestamp": "2024-01-01T00:00:00Z"
+                        "timestamp": _now()
                     })
-                    await manager.send_personal_message(echo_message, user_id)
+                    manager.send(connection, echo_message)
 
                 else:
                     # For unknown message types, just acknowledge
                     ack_message = json.dumps({
                         "type": "acknowledged",
                         "received_type": message_type,
-                        "timestamp": "2024-01-01T00:00:00Z"
+                        "timestamp": _now()
                     })
-                    await manager.send_personal_message(ack_message, user_id)
+                    manager.send(connection, ack_message)
 
             except json.JSONDecodeError:
                 # Handle non-JSON messages
@@ -157,18 +353,18 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 })
 
                 # Echo back as text
-                await manager.send_personal_message(f"Echo: {data}", user_id)
+                manager.send(connection, f"Echo: {data}")
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected", extra={"user_id": user_id})
-        manager.disconnect(user_id)
+        await manager.disconnect(connection)
 
     except Exception as e:
         logger.error("WebSocket error", extra={
             "user_id": user_id,
             "error": str(e)
         })
-        manager.disconnect(user_id)
+        await manager.disconnect(connection)
 
 @router.get("/ws/connections")
 async def get_connection_stats():
@@ -176,61 +372,66 @@ async def get_connection_stats():
     Get WebSocket connection statistics (for monitoring).
     """
     return {
+        "node_id": bus.node_id,
         "active_connections": manager.get_connection_count(),
+        "connected_users": len(manager.active_connections),
+        "topics": len(manager.topics),
+        "frames_dropped": manager.frames_dropped,
+        "slow_consumers_closed": manager.slow_consumers_closed,
         "status": "operational"
     }
 
 @router.get("/ws/test/{user_id}")
 async def test_websocket_connection(user_id: str):
     """
-    Test endpoint to check if a user is connected via WebSocket.
+    Test endpoint to check if a user is connected via WebSocket on any node.
     """
-    is_connected = manager.is_user_connected(user_id)
+    nodes = await bus.nodes_for(user_id)
+    is_connected = bool(nodes) or manager.is_user_connected(user_id)
 
     return {
         "user_id": user_id,
         "websocket_connected": is_connected,
+        "connections": sum(nodes.values()) or manager.connection_count(user_id),
+        "nodes": len(nodes),
         "message": "User is connected" if is_connected else "User is not connected"
     }
 
 # Utility functions for other services to use
 async def send_notification_to_user(user_id: str, notification: dict):
     """
-    Send a notification to a specific user via WebSocket.
+    Send a notification to a specific user via WebSocket, whichever node
+    holds their connections. Returns whether any connection was reached.
     This function can be imported and used by other services.
     """
-    if manager.is_user_connected(user_id):
-        message = json.dumps({
-            "type": "notification",
-            "notification": notification,
-            "timestamp": "2024-01-01T00:00:00Z"
-        })
-        await manager.send_personal_message(message, user_id)
-        return True
-    return False
+    message = json.dumps({
+        "type": "notification",
+        "notification": notification,
+        "timestamp": _now()
+    })
+    return await manager.send_personal_message(message, user_id) > 0
 
-async def broadcast_notification(notification: dict, exclude_user_ids: list = None):
+async def broadcast_notification(notification: dict, exclude_user_ids: list = None, topic: str = None):
     """
-    Broadcast a notification to all connected users.
+    Broadcast a notification to all connected users, or only to the
+    subscribers of a course/cohort topic.
     """
     if exclude_user_ids is None:
         exclude_user_ids = []
 
     message = json.dumps({
         "type": "broadcast",
+        "topic": topic,
         "notification": notification,
-        "timestamp": "2024-01-01T00:00:00Z"
+        "timestamp": _now()
     })
 
-    await manager.broadcast(message)
-
-    logger.info("Notification broadcast", extra={
-        "excluded_users": len(exclude_user_ids) if exclude_user_ids else 0
-    })
+    return await manager.broadcast(message, exclude_user_ids, topic)
 
 # Export functions for use by other modules
 __all__ = [
     "send_notification_to_user",
     "broadcast_notification",
-    "manager"
+    "manager",
+    "bus"
 ]
\ No newline at end of file
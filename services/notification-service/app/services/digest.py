@@ -0,0 +1,266 @@
+"""
+Notification digests
+
+Events of the same type for the same user that arrive within the user's
+digest window are coalesced into one notification. The first event of a
+(user, type) pair opens a bucket in Redis (a list of events under
+``notifications:digest:<type>:<user_id>``) and schedules it in the
+``notifications:digest:due`` sorted set at the end of its window. The
+flusher on any node claims due buckets with ZREM, so each bucket is sent
+once. A bucket holding a single event is sent as that event; larger ones
+are rendered with the type's digest template in the user's locale.
+
+High and urgent notifications, types that are not digested, and users
+whose window for the type is zero bypass the buckets, as does everything
+when Redis is unavailable.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from shared.common.cache import cache_manager
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector
+
+from models import NotificationCreate, NotificationPriority
+from utils.templates import TemplateRegistry
+
+logger = get_logger("notification-service-digest")
+
+DIGEST_PREFIX = "notifications:digest:"
+DUE_KEY = DIGEST_PREFIX + "due"
+
+BYPASS_PRIORITIES = {NotificationPriority.HIGH.value, NotificationPriority.URGENT.value}
+PRIORITY_ORDER = [p.value for p in NotificationPriority]
+
+# Built-in digest templates, by notification type; stored templates named "<type>_digest" take precedence
+DIGEST_TEMPLATES = {
+    "grade_available": ("{count} new grades are available", "New grades:\n{titles}"),
+    "assignment_due": ("{count} assignments are due soon", "Due soon:\n{titles}"),
+    "deadline_warning": ("{count} deadlines are coming up", "Upcoming deadlines:\n{titles}"),
+    "course_update": ("{count} updates in your courses", "Course updates:\n{titles}"),
+    "course_reminder": ("{count} course reminders", "Reminders:\n{titles}"),
+    "achievement_unlocked": ("You unlocked {count} achievements", "Achievements:\n{titles}")
+}
+FALLBACK_TEMPLATE = ("{count} new notifications", "{titles}")
+
+# Settings (as dicts) for each user; users without stored settings may be missing
+SettingsLoader = Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+# Creates notifications for delivery
+Deliver = Callable[[List[NotificationCreate]], Awaitable[Any]]
+
+
+class DigestCoalescer:
+    """Redis-backed digest buckets with a periodic flusher"""
+
+    def __init__(
+        self,
+        settings_loader: SettingsLoader,
+        deliver: Deliver,
+        templates: TemplateRegistry,
+        digest_types: Iterable[str],
+        default_window_minutes: int = 15,
+        max_listed: int = 10,
+        max_message_length: int = 1000,
+        flush_interval: float = 30.0,
+        redis_client: Any = None
+    ):
+        self.settings_loader = settings_loader
+        self.deliver = deliver
+        self.templates = templates
+        self.digest_types = set(digest_types)
+        self.default_window_minutes = default_window_minutes
+        self.max_listed = max_listed
+        self.max_message_length = max_message_length
+        self.flush_interval = flush_interval
+        self.redis_client = redis_client
+        for notification_type, (subject, message) in DIGEST_TEMPLATES.items():
+            templates.register_default(f"{notification_type}_digest", subject, message)
+        templates.register_default("digest", *FALLBACK_TEMPLATE)
+        self._flusher: Optional[asyncio.Task] = None
+        self.events_in = 0
+        self.events_bypassed = 0
+        self.events_coalesced = 0
+        self.digests_sent = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    def window_seconds(self, settings: Optional[Dict[str, Any]], notification_type: str) -> int:
+        """Digest window of a user for a type; zero sends immediately"""
+        if notification_type not in self.digest_types:
+            return 0
+        settings = settings or {}
+        if not settings.get("digest_enabled", True):
+            return 0
+        minutes = (settings.get("digest_windows") or {}).get(
+            notification_type, settings.get("digest_window_minutes", self.default_window_minutes)
+        )
+        return max(0, int(minutes * 60))
+
+    async def add(self, events: List[NotificationCreate], now: Optional[float] = None) -> Dict[str, int]:
+        """Send bypassing events now and put the rest into digest buckets"""
+        now = time.time() if now is None else now
+        self.events_in += len(events)
+        client = await self._client()
+        immediate: List[NotificationCreate] = []
+        deferred = []
+        if client is None:
+            immediate = list(events)
+        else:
+            candidates = [e for e in events if e.priority.value not in BYPASS_PRIORITIES and e.type.value in self.digest_types]
+            settings = await self.settings_loader(list({e.recipient_id for e in candidates})) if candidates else {}
+            for event in events:
+                window = 0
+                if event.priority.value not in BYPASS_PRIORITIES:
+                    window = self.window_seconds(settings.get(event.recipient_id), event.type.value)
+                if window:
+                    deferred.append((event, window))
+                else:
+                    immediate.append(event)
+
+        if deferred:
+            try:
+                await self._buffer(client, deferred, now)
+            except Exception as e:
+                logger.warning("Digest buffering failed, sending immediately", extra={"events": len(deferred), "error": str(e)})
+                immediate.extend(event for event, _ in deferred)
+                deferred = []
+
+        if immediate:
+            await self.deliver(immediate)
+        self.events_bypassed += len(immediate)
+        return {"immediate": len(immediate), "deferred": len(deferred)}
+
+    async def _buffer(self, client: Any, deferred: List[Any], now: float):
+        for start in range(0, len(deferred), 1000):
+            pipe = client.pipeline(transaction=True)
+            due: Dict[str, float] = {}
+            for event, window in deferred[start:start + 1000]:
+                member = f"{event.type.value}:{event.recipient_id}"
+                pipe.rpush(DIGEST_PREFIX + member, json.dumps(event.dict(), default=str))
+                due.setdefault(member, now + window)
+            for member, at in due.items():
+                # Only the first event of a bucket sets its due time
+                pipe.zadd(DUE_KEY, {member: at}, nx=True)
+                pipe.expire(DIGEST_PREFIX + member, int(at - now) + 86400)
+            await pipe.execute()
+
+    async def flush(self, now: Optional[float] = None, limit: int = 1000) -> int:
+        """Send every bucket whose window has ended; returns how many notifications were sent"""
+        now = time.time() if now is None else now
+        client = await self._client()
+        if client is None:
+            return 0
+        sent = 0
+        while True:
+            members = await client.zrangebyscore(DUE_KEY, "-inf", now, start=0, num=limit)
+            if not members:
+                return sent
+            # Whoever removes a member owns its bucket
+            pipe = client.pipeline(transaction=False)
+            for member in members:
+                pipe.zrem(DUE_KEY, member)
+            owned = [member for member, removed in zip(members, await pipe.execute()) if removed]
+            pipe = client.pipeline(transaction=True)
+            for member in owned:
+                pipe.lrange(DIGEST_PREFIX + member, 0, -1)
+                pipe.delete(DIGEST_PREFIX + member)
+            replies = await pipe.execute()
+
+            buckets = {member: replies[2 * i] for i, member in enumerate(owned) if replies[2 * i]}
+            try:
+                users = list({member.split(":", 1)[1] for member, records in buckets.items() if len(records) > 1})
+                settings = await self.settings_loader(users) if users else {}
+                notifications = [
+                    await self._digest([json.loads(r) for r in records], (settings.get(member.split(":", 1)[1]) or {}).get("locale"))
+                    for member, records in buckets.items()
+                ]
+                if notifications:
+                    await self.deliver(notifications)
+            except Exception:
+                # Put the claimed events back, due now, for the next flush
+                pipe = client.pipeline(transaction=True)
+                for member, records in buckets.items():
+                    pipe.lpush(DIGEST_PREFIX + member, *reversed(records))
+                    pipe.zadd(DUE_KEY, {member: now}, nx=True)
+                await pipe.execute()
+                raise
+            sent += len(notifications)
+            self.digests_sent += len(notifications)
+            if len(members) < limit:
+                return sent
+
+    async def _digest(self, records: List[Dict[str, Any]], locale: Optional[str] = None) -> NotificationCreate:
+        """One notification standing for a bucket's events"""
+        if len(records) == 1:
+            return NotificationCreate(**records[0])
+        self.events_coalesced += len(records)
+
+        first = records[0]
+        notification_type = first["type"]
+        listed = [f"- {record['title']}" for record in records[:self.max_listed]]
+        if len(records) > self.max_listed:
+            listed.append(f"...and {len(records) - self.max_listed} more")
+        variables = {"count": len(records), "titles": "\n".join(listed), "type": notification_type}
+        subject, message = (
+            await self.templates.render(f"{notification_type}_digest", variables, locale)
+            or await self.templates.render("digest", variables, locale)
+        )
+
+        channels: List[str] = []
+        for record in records:
+            channels.extend(channel for channel in record["channels"] if channel not in channels)
+        course_ids = {record.get("course_id") for record in records}
+        return NotificationCreate(
+            title=subject,
+            message=message[:self.max_message_length],
+            type=notification_type,
+            priority=max((record["priority"] for record in records), key=PRIORITY_ORDER.index),
+            recipient_id=first["recipient_id"],
+            sender_id=first.get("sender_id") if len({r.get("sender_id") for r in records}) == 1 else None,
+            course_id=course_ids.pop() if len(course_ids) == 1 else None,
+            channels=channels,
+            data={
+                "digest": True,
+                "count": len(records),
+                "events": [
+                    {key: record.get(key) for key in ("title", "course_id", "assignment_id")}
+                    for record in records[:self.max_listed]
+                ]
+            }
+        )
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Digest flush failed", extra={"error": str(e)})
+
+    def start(self):
+        """Start the periodic flusher on the running loop"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher; open buckets stay in Redis for the next node to flush"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._flusher = None
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("notification_digest_events_in", self.events_in)
+        collector.gauge_set("notification_digest_events_bypassed", self.events_bypassed)
+        collector.gauge_set("notification_digest_events_coalesced", self.events_coalesced)
+        collector.gauge_set("notification_digests_sent", self.digests_sent)
@@ -0,0 +1,347 @@
+"""
+Notification dispatch pipeline
+
+Creating a notification writes it and one outbox job per delivery channel
+(``notification_outbox``) with unordered insert_many calls, then queues the
+jobs in memory for that channel's worker pool. Workers send in batches of
+the channel's batch size; results are buffered and written back with one
+bulk_write per collection. The outbox is what makes delivery durable: jobs
+are leased to the node that queued them, and that node renews the leases
+of everything it still holds (queued, sending or awaiting its status
+write). Any job whose lease runs out (node crash, shutdown with a backlog,
+a retry coming due) is claimed again by the next poll on any node.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+from config.config import notification_service_settings
+from models import NotificationChannel, NotificationStatus
+
+logger = get_logger("notification-service-dispatch")
+
+# Sends a batch of notifications; returns one error message (or None) per notification
+ChannelSender = Callable[[List[Dict[str, Any]]], Awaitable[List[Optional[str]]]]
+
+
+class DispatchJob:
+    """One notification on one channel"""
+
+    __slots__ = ("job_id", "channel", "notification", "attempts")
+
+    def __init__(self, job_id: str, channel: str, notification: Dict[str, Any], attempts: int = 0):
+        self.job_id = job_id
+        self.channel = channel
+        self.notification = notification
+        self.attempts = attempts
+
+
+class NotificationDispatcher:
+    """Outbox-backed, per-channel worker pools with batched status writes"""
+
+    def __init__(
+        self,
+        db: Any,
+        senders: Dict[str, ChannelSender],
+        workers: Optional[Dict[str, int]] = None,
+        batch_sizes: Optional[Dict[str, int]] = None,
+        queue_size: int = notification_service_settings.dispatch_queue_size,
+        insert_batch_size: int = notification_service_settings.dispatch_insert_batch_size,
+        status_batch_size: int = notification_service_settings.dispatch_status_batch_size,
+        status_flush_interval: float = notification_service_settings.dispatch_status_flush_ms / 1000,
+        lease_seconds: int = notification_service_settings.dispatch_lease_seconds,
+        poll_interval: float = notification_service_settings.dispatch_poll_seconds,
+        max_attempts: int = notification_service_settings.max_delivery_attempts,
+        retry_delay: int = notification_service_settings.delivery_retry_delay
+    ):
+        self.db = db
+        self.senders = senders
+        self.workers = workers or dict(notification_service_settings.dispatch_workers)
+        self.batch_sizes = batch_sizes or {
+            NotificationChannel.EMAIL.value: notification_service_settings.email_batch_size,
+            NotificationChannel.IN_APP.value: notification_service_settings.in_app_batch_size,
+            NotificationChannel.SMS.value: notification_service_settings.sms_batch_size,
+            NotificationChannel.PUSH.value: notification_service_settings.push_batch_size
+        }
+        self.queue_size = queue_size
+        self.insert_batch_size = insert_batch_size
+        self.status_batch_size = status_batch_size
+        self.status_flush_interval = status_flush_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.node_id = uuid.uuid4().hex[:12]
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self._results: List[Tuple[DispatchJob, Optional[str]]] = []
+        self._flush_wanted: Optional[asyncio.Event] = None
+        self._flush_lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        # Jobs queued, being sent or awaiting their status write on this node
+        self._held: Set[str] = set()
+        self.sent = 0
+        self.failed = 0
+        self.status_writes = 0
+
+    # Intake
+    def _jobs_for(self, notifications: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+        lease_until = now + self.lease
+        return [
+            {
+                "_id": f"{notification['_id']}:{NotificationChannel(channel).value}",
+                "notification_id": notification["_id"],
+                "channel": NotificationChannel(channel).value,
+                "recipient_id": notification["recipient_id"],
+                "status": "pending",
+                "attempts": 0,
+                "owner": self.node_id,
+                "lease_until": lease_until,
+                "created_at": now
+            }
+            for notification in notifications
+            for channel in notification.get("channels", [])
+        ]
+
+    async def submit(self, notifications: List[Dict[str, Any]]):
+        """Store notifications with their outbox jobs and queue the jobs for delivery.
+
+        Waits while the channel queues are full, which paces large bulk
+        submissions to the speed of delivery.
+        """
+        for start in range(0, len(notifications), self.insert_batch_size):
+            chunk = notifications[start:start + self.insert_batch_size]
+            jobs = self._jobs_for(chunk, datetime.now(timezone.utc))
+            await self.db.save_notifications(chunk, jobs)
+            by_id = {notification["_id"]: notification for notification in chunk}
+            for job in jobs:
+                await self._enqueue(DispatchJob(job["_id"], job["channel"], by_id[job["notification_id"]]))
+
+    async def _enqueue(self, job: DispatchJob):
+        queue = self.queues.get(job.channel)
+        if queue is None:
+            # Not started (or no pool for this channel): the outbox poll picks it up
+            return
+        if job.job_id in self._held:
+            # Re-claimed by our own poll while still in the pipeline
+            return
+        self._held.add(job.job_id)
+        await queue.put(job)
+
+    async def recover(self) -> int:
+        """Claim due jobs from the outbox (retries, and jobs other nodes abandoned)"""
+        claimed = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            jobs = await self.db.claim_outbox_jobs(self.node_id, now, now + self.lease, self.insert_batch_size)
+            if not jobs:
+                return claimed
+            notifications = {
+                n["_id"]: n for n in await self.db.get_notifications_by_ids(list({job["notification_id"] for job in jobs}))
+            }
+            for job in jobs:
+                notification = notifications.get(job["notification_id"])
+                if notification is None:
+                    # The notification was deleted; nothing to send
+                    self.record(DispatchJob(job["_id"], job["channel"], {"_id": job["notification_id"]}, self.max_attempts), "notification deleted")
+                    continue
+                await self._enqueue(DispatchJob(job["_id"], job["channel"], notification, job.get("attempts", 0)))
+            claimed += len(jobs)
+            if len(jobs) < self.insert_batch_size:
+                return claimed
+
+    # Delivery
+    async def _work(self, channel: str):
+        queue = self.queues[channel]
+        send = self.senders[channel]
+        batch_size = self.batch_sizes.get(channel, 1)
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            start = time.perf_counter()
+            try:
+                errors = await send([job.notification for job in batch])
+            except Exception as e:
+                errors = [str(e)] * len(batch)
+            metrics_collector.observe("notification_send_seconds", time.perf_counter() - start, {"channel": channel})
+            for job, error in zip(batch, errors):
+                self.record(job, error)
+            for _ in batch:
+                queue.task_done()
+
+    def record(self, job: DispatchJob, error: Optional[str]):
+        """Buffer a delivery result for the next status write"""
+        self._results.append((job, error))
+        if error is None:
+            self.sent += 1
+        else:
+            self.failed += 1
+        metrics_collector.counter_inc("notification_deliveries_total", tags={"channel": job.channel, "result": "error" if error else "ok"})
+        if len(self._results) >= self.status_batch_size and self._flush_wanted is not None:
+            self._flush_wanted.set()
+
+    # Status writes
+    def _operations(self, results: List[Tuple[DispatchJob, Optional[str]]], now: datetime):
+        notification_ops, outbox_ops = [], []
+        for job, error in results:
+            notification_id = job.notification["_id"]
+            if error is None:
+                outbox_ops.append(DeleteOne({"_id": job.job_id}))
+                # Pipeline update: status moves forward to delivered unless already read
+                notification_ops.append(UpdateOne({"_id": notification_id}, [{"$set": {
+                    f"delivery.{job.channel}": "delivered",
+                    "status": {"$cond": [{"$eq": ["$status", NotificationStatus.READ.value]}, "$status", NotificationStatus.DELIVERED.value]},
+                    "delivered_at": {"$ifNull": ["$delivered_at", now]},
+                    "updated_at": now
+                }}]))
+                continue
+
+            attempts = job.attempts + 1
+            if attempts >= self.max_attempts:
+                outbox_ops.append(UpdateOne({"_id": job.job_id}, {"$set": {
+                    "status": "failed", "attempts": attempts, "last_error": error, "owner": None
+                }}))
+                notification_ops.append(UpdateOne({"_id": notification_id}, [{"$set": {
+                    f"delivery.{job.channel}": "failed",
+                    "status": {"$cond": [
+                        {"$in": ["$status", [NotificationStatus.PENDING.value, NotificationStatus.SENT.value]]},
+                        NotificationStatus.FAILED.value, "$status"
+                    ]},
+                    "updated_at": now
+                }}]))
+            else:
+                # Retry with exponential backoff once the lease (set to the retry time) runs out
+                retry_at = now + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+                outbox_ops.append(UpdateOne({"_id": job.job_id}, {"$set": {
+                    "attempts": attempts, "last_error": error, "owner": None, "lease_until": retry_at
+                }}))
+                notification_ops.append(UpdateOne({"_id": notification_id}, {"$set": {
+                    f"delivery.{job.channel}": "retrying", "updated_at": now
+                }}))
+        return notification_ops, outbox_ops
+
+    async def flush(self) -> int:
+        """Write buffered delivery results; returns how many were written.
+
+        Flushes run one at a time, so a drain waits for one in progress.
+        """
+        async with self._flush_lock:
+            if not self._results:
+                return 0
+            results, self._results = self._results, []
+            written = 0
+            for start in range(0, len(results), self.status_batch_size):
+                batch = results[start:start + self.status_batch_size]
+                try:
+                    await self.db.apply_delivery_updates(*self._operations(batch, datetime.now(timezone.utc)))
+                except BaseException:
+                    # Keep what wasn't written (or was cancelled mid-write) for the next flush;
+                    # the updates set absolute values, so writing one twice is harmless
+                    self._results[:0] = results[start:]
+                    raise
+                self.status_writes += 1
+                written += len(batch)
+                self._held.difference_update(job.job_id for job, _ in batch)
+            return written
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), self.status_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wanted.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Delivery status flush failed", extra={"error": str(e), "pending": len(self._results)})
+                await asyncio.sleep(self.status_flush_interval)
+
+    async def renew_leases(self) -> int:
+        """Extend the outbox leases of every job this node still holds"""
+        held = list(self._held)
+        lease_until = datetime.now(timezone.utc) + self.lease
+        for start in range(0, len(held), self.insert_batch_size):
+            await self.db.renew_outbox_leases(self.node_id, held[start:start + self.insert_batch_size], lease_until)
+        return len(held)
+
+    async def _lease_loop(self):
+        # Renewed well before expiry, so a backlog that outlasts one lease isn't claimed twice
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                await self.renew_leases()
+            except Exception as e:
+                logger.error("Outbox lease renewal failed", extra={"error": str(e), "held": len(self._held)})
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error("Outbox poll failed", extra={"error": str(e)})
+            await asyncio.sleep(self.poll_interval)
+
+    # Lifecycle
+    def _spawn(self, coroutine: Awaitable) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def start(self, poll: bool = True):
+        """Start worker pools, the status flusher and (optionally) the outbox poll"""
+        if self._tasks:
+            return
+        self._flush_wanted = asyncio.Event()
+        for channel, count in self.workers.items():
+            if channel not in self.senders or count <= 0:
+                continue
+            self.queues[channel] = asyncio.Queue(self.queue_size)
+            for _ in range(count):
+                self._spawn(self._work(channel))
+        self._spawn(self._flush_loop())
+        self._spawn(self._lease_loop())
+        if poll:
+            self._spawn(self._poll_loop())
+        logger.info("Notification dispatcher started", extra={"node_id": self.node_id, "workers": self.workers})
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait until every queued job has been sent and its result written"""
+        await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues.values())), timeout)
+        await self.flush()
+
+    async def stop(self, timeout: float = 10.0):
+        """Finish queued work (up to `timeout`), stop all tasks and write the last results.
+
+        Jobs still queued after the timeout are no longer renewed and are
+        claimed again when their lease expires.
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues.values())), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dispatcher stopped with queued jobs", extra={"queued": sum(q.qsize() for q in self.queues.values())})
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.queues = {}
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Final delivery status flush failed", extra={"error": str(e), "pending": len(self._results)})
+        self._held.clear()
+
+    def collect_metrics(self, collector: MetricsCollector):
+        for channel, queue in self.queues.items():
+            collector.gauge_set("notification_dispatch_queued", queue.qsize(), {"channel": channel})
+        collector.gauge_set("notification_status_pending", len(self._results))
+        collector.gauge_set("notification_dispatch_held", len(self._held))
+        collector.gauge_set("notification_status_writes", self.status_writes)
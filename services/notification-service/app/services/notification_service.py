@@ -2,20 +2,29 @@
 Notification Service Business Logic Layer
 """
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import asyncio
+import json
+import time
+import uuid
 
 from shared.common.logging import get_logger
 from shared.common.errors import ValidationError, DatabaseError, NotFoundError
+from shared.common.metrics import metrics_collector
 
 from database.database import notification_db
 from models import (
     Notification, NotificationCreate, NotificationUpdate,
-    NotificationTemplate, NotificationSettings,
+    NotificationTemplate, NotificationTemplateBase, NotificationSettings,
     NotificationStats, NotificationType, NotificationPriority,
     NotificationStatus, NotificationChannel
 )
 from config.config import notification_service_settings
+from services.dispatcher import NotificationDispatcher
+from services.digest import DigestCoalescer
+from routes.websocket import manager as websocket_manager
+from utils.inbox_cache import InboxCache
+from utils.templates import TemplateRegistry
 
 logger = get_logger("notification-service")
 
@@ -24,6 +33,43 @@ class NotificationService:
 
     def __init__(self):
         self.db = notification_db
+        self.dispatcher = NotificationDispatcher(self.db, {
+            NotificationChannel.EMAIL.value: self._send_email_notifications,
+            NotificationChannel.IN_APP.value: self._send_in_app_notifications,
+            NotificationChannel.SMS.value: self._send_sms_notifications,
+            NotificationChannel.PUSH.value: self._send_push_notifications
+        })
+        metrics_collector.register_collector(self.dispatcher.collect_metrics)
+        self.inbox = InboxCache(
+            self._load_counts,
+            inbox_size=notification_service_settings.inbox_cache_size,
+            inbox_ttl=notification_service_settings.notification_cache_ttl,
+            counter_ttl=notification_service_settings.unread_counter_ttl,
+            stats_ttl=notification_service_settings.stats_cache_ttl,
+            reconcile_interval=notification_service_settings.unread_reconcile_seconds
+        )
+        metrics_collector.register_collector(self.inbox.collect_metrics)
+        self.templates = TemplateRegistry(
+            self._load_templates,
+            ttl=notification_service_settings.template_cache_ttl if notification_service_settings.template_cache_enabled else 0,
+            default_locale=notification_service_settings.default_locale,
+            max_subject_length=notification_service_settings.max_title_length,
+            max_message_length=notification_service_settings.max_message_length,
+            version_check_interval=notification_service_settings.template_version_check_seconds
+        )
+        metrics_collector.register_collector(self.templates.collect_metrics)
+        self.digests = DigestCoalescer(
+            self._digest_settings,
+            self.create_bulk_notifications,
+            self.templates,
+            digest_types=notification_service_settings.digest_types,
+            default_window_minutes=notification_service_settings.digest_window_minutes,
+            max_listed=notification_service_settings.digest_max_listed,
+            max_message_length=notification_service_settings.max_message_length,
+            flush_interval=notification_service_settings.digest_flush_seconds
+        )
+        metrics_collector.register_collector(self.digests.collect_metrics)
+        self._settings_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 
     # Notification operations
     async def create_notification(self, notification_data: NotificationCreate) -> Notification:
@@ -31,30 +77,19 @@ class NotificationService:
         try:
             # Validate notification data
             self._validate_notification_data(notification_data)
+            notification_dict = self._build_notification(notification_data)
 
-            notification_dict = notification_data.dict(by_alias=True)
-            notification_dict["_id"] = self._generate_notification_id()
-            notification_dict["status"] = NotificationStatus.PENDING
-            notification_dict["created_at"] = datetime.now(timezone.utc)
-            notification_dict["updated_at"] = datetime.now(timezone.utc)
-
-            notification_id = await self.db.save_notification(notification_dict)
-
-            # Get created notification
-            created_notification = await self.db.get_notification(notification_id)
-            if not created_notification:
-                raise DatabaseError("create_notification", "Failed to retrieve created notification")
-
-            # Send notification asynchronously
-            asyncio.create_task(self._send_notification(created_notification))
+            # Stored with its outbox jobs, then queued for the channel workers
+            await self.dispatcher.submit([notification_dict])
+            await self._record_created([notification_dict])
 
             logger.info("Notification created", extra={
-                "notification_id": notification_id,
+                "notification_id": notification_dict["_id"],
                 "recipient_id": notification_data.recipient_id,
                 "type": notification_data.type.value
             })
 
-            return Notification(**created_notification)
+            return Notification(**notification_dict)
 
         except (ValidationError, DatabaseError):
             raise
@@ -81,10 +116,28 @@ class NotificationService:
             raise DatabaseError("get_notification", f"Notification retrieval failed: {str(e)}")
 
     async def get_user_notifications(self, user_id: str, limit: int = 50,
-                                   status: Optional[NotificationStatus] = None) -> List[Notification]:
-        """Get notifications for a user"""
+                                   status: Optional[NotificationStatus] = None,
+                                   unread_only: bool = False) -> List[Notification]:
+        """Get notifications for a user, newest first; the newest page comes from the inbox cache"""
         try:
-            notifications_data = await self.db.get_user_notifications(user_id, limit, status)
+            inbox_size = self.inbox.inbox_size
+            if status is None and limit <= inbox_size:
+                cached = await self.inbox.inbox(user_id)
+                if cached is not None:
+                    if unread_only:
+                        cached_page = [n for n in cached if n["status"] != NotificationStatus.READ.value]
+                    else:
+                        cached_page = cached
+                    # A short list is the whole inbox; otherwise it must cover the page
+                    if len(cached_page) >= limit or len(cached) < inbox_size:
+                        return [Notification(**notification) for notification in cached_page[:limit]]
+                elif not unread_only:
+                    version = await self.inbox.version(user_id)
+                    notifications_data = await self.db.get_user_notifications(user_id, inbox_size)
+                    await self.inbox.fill(user_id, notifications_data, version)
+                    return [Notification(**notification) for notification in notifications_data[:limit]]
+
+            notifications_data = await self.db.get_user_notifications(user_id, limit, status, unread_only)
             return [Notification(**notification) for notification in notifications_data]
 
         except Exception as e:
@@ -134,12 +187,12 @@ class NotificationService:
             if notification.recipient_id != user_id:
                 raise ValidationError("Not authorized to update this notification", "notification_id")
 
-            updates = NotificationUpdate(
-                status=NotificationStatus.READ,
-                read_at=datetime.now(timezone.utc)
-            )
+            # Only the request that flips the status moves the counter
+            if await self.db.mark_notification_read(notification_id):
+                await self.inbox.invalidate([user_id])
+                await self._record_changes({user_id: (0, -1)})
 
-            return await self.update_notification(notification_id, updates)
+            return await self.get_notification(notification_id)
 
         except (ValidationError, NotFoundError):
             raise
@@ -160,6 +213,10 @@ class NotificationService:
                 raise ValidationError("Not authorized to delete this notification", "notification_id")
 
             success = await self.db.delete_notification(notification_id)
+            if success:
+                await self.inbox.invalidate([user_id])
+                unread = 0 if notification.status == NotificationStatus.READ else -1
+                await self._record_changes({user_id: (-1, unread)})
 
             logger.info("Notification deleted", extra={
                 "notification_id": notification_id,
@@ -178,14 +235,33 @@ class NotificationService:
             raise DatabaseError("delete_notification", f"Notification deletion failed: {str(e)}")
 
     # Bulk operations
-    async def create_bulk_notifications(self, notifications: List[NotificationCreate]) -> List[str]:
-        """Create multiple notifications"""
+    async def publish_events(self, events: List[NotificationCreate]) -> Dict[str, int]:
+        """Notify users of events, combining low and medium priority ones into digests"""
         try:
-            notification_ids = []
+            for event in events:
+                self._validate_notification_data(event)
+
+            result = await self.digests.add(events)
+
+            logger.info("Notification events published", extra={"count": len(events), **result})
+            return result
 
+        except (ValidationError, DatabaseError):
+            raise
+        except Exception as e:
+            logger.error("Failed to publish notification events", extra={"error": str(e)})
+            raise DatabaseError("publish_events", f"Notification event publishing failed: {str(e)}")
+
+    async def create_bulk_notifications(self, notifications: List[NotificationCreate]) -> List[str]:
+        """Create multiple notifications with bulk inserts feeding the dispatch queues"""
+        try:
             for notification_data in notifications:
-                notification = await self.create_notification(notification_data)
-                notification_ids.append(notification.id)
+                self._validate_notification_data(notification_data)
+            notification_dicts = [self._build_notification(n) for n in notifications]
+
+            await self.dispatcher.submit(notification_dicts)
+            await self._record_created(notification_dicts)
+            notification_ids = [n["_id"] for n in notification_dicts]
 
             logger.info("Bulk notifications created", extra={
                 "count": len(notification_ids),
@@ -194,6 +270,8 @@ class NotificationService:
 
             return notification_ids
 
+        except (ValidationError, DatabaseError):
+            raise
         except Exception as e:
             logger.error("Failed to create bulk notifications", extra={"error": str(e)})
             raise DatabaseError("create_bulk_notifications", f"Bulk notification creation failed: {str(e)}")
@@ -202,6 +280,9 @@ class NotificationService:
         """Mark all user's notifications as read"""
         try:
             count = await self.db.mark_all_as_read(user_id)
+            if count:
+                await self.inbox.invalidate([user_id])
+                await self._record_changes({user_id: (0, -count)})
 
             logger.info("All notifications marked as read", extra={
                 "user_id": user_id,
@@ -242,6 +323,7 @@ class NotificationService:
             settings_dict["updated_at"] = datetime.now(timezone.utc)
 
             success = await self.db.update_notification_settings(user_id, settings_dict)
+            self._settings_cache.pop(user_id, None)
             if not success:
                 raise DatabaseError("update_notification_settings", "Failed to update notification settings")
 
@@ -265,31 +347,124 @@ class NotificationService:
             raise DatabaseError("update_notification_settings", f"Notification settings update failed: {str(e)}")
 
     # Analytics operations
-    async def get_notification_stats(self, user_id: Optional[str] = None, period: str = "month") -> NotificationStats:
-        """Get notification statistics"""
+    async def get_notification_stats(self, user_id: Optional[str] = None, days: int = 30) -> NotificationStats:
+        """Get notification statistics; a user's summary is cached briefly"""
         try:
-            stats_data = await self.db.get_notification_stats(user_id, period)
+            if user_id is not None and days == 30:
+                stats_data = await self.inbox.stats(user_id)
+                if stats_data is None:
+                    stats_data = await self.db.get_notification_stats(user_id, days)
+                    await self.inbox.set_stats(user_id, stats_data)
+            else:
+                stats_data = await self.db.get_notification_stats(user_id, days)
             return NotificationStats(**stats_data)
 
         except Exception as e:
             logger.error("Failed to get notification stats", extra={
                 "user_id": user_id,
-                "period": period,
+                "days": days,
                 "error": str(e)
             })
             raise DatabaseError("get_notification_stats", f"Notification stats retrieval failed: {str(e)}")
 
+    async def get_unread_counts(self, user_id: str) -> Dict[str, int]:
+        """Total and unread notification counts of a user"""
+        try:
+            counts = await self.inbox.counts(user_id)
+            if counts is None:
+                counts = (await self.db.count_user_notifications([user_id]))[user_id]
+            return counts
+
+        except Exception as e:
+            logger.error("Failed to get unread counts", extra={
+                "user_id": user_id,
+                "error": str(e)
+            })
+            raise DatabaseError("get_unread_counts", f"Unread count retrieval failed: {str(e)}")
+
+    # Digest support
+    async def _load_templates(self) -> List[Dict[str, Any]]:
+        return await self.db.get_notification_templates()
+
+    async def _digest_settings(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored settings of many users, cached in memory for `settings_cache_ttl`"""
+        now = time.monotonic()
+        cache = self._settings_cache
+        missing = [user_id for user_id in user_ids if user_id not in cache or cache[user_id][0] <= now]
+        if missing:
+            stored = await self.db.get_notification_settings_many(missing)
+            expires = now + notification_service_settings.settings_cache_ttl
+            if len(cache) + len(missing) > 100000:
+                for user_id in [u for u, (expiry, _) in cache.items() if expiry <= now]:
+                    del cache[user_id]
+            for user_id in missing:
+                cache[user_id] = (expires, stored.get(user_id, {}))
+        return {user_id: cache[user_id][1] for user_id in user_ids}
+
+    # Unread counters and inbox cache
+    async def _load_counts(self, user_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        return await self.db.count_user_notifications(user_ids)
+
+    async def _record_created(self, notifications: List[Dict[str, Any]]) -> None:
+        """Count new notifications and add them to cached inboxes"""
+        deltas: Dict[str, Tuple[int, int]] = {}
+        for notification in notifications:
+            total, unread = deltas.get(notification["recipient_id"], (0, 0))
+            deltas[notification["recipient_id"]] = (total + 1, unread + 1)
+        await self.inbox.push(notifications)
+        await self._record_changes(deltas)
+
+    async def _record_changes(self, deltas: Dict[str, Tuple[int, int]]) -> None:
+        """Apply counter deltas and push the unread change to each user's WebSockets"""
+        counts = await self.inbox.apply(deltas)
+        timestamp = datetime.now(timezone.utc).isoformat()
+        messages = []
+        for user_id, (_, unread) in deltas.items():
+            message = {"type": "unread_count", "delta": unread, "timestamp": timestamp}
+            # Absolute counts when known; otherwise clients apply the delta
+            if counts[user_id] is not None:
+                message.update(counts[user_id])
+            messages.append((user_id, json.dumps(message)))
+        for start in range(0, len(messages), 500):
+            await asyncio.gather(*(
+                websocket_manager.send_personal_message(message, user_id)
+                for user_id, message in messages[start:start + 500]
+            ), return_exceptions=True)
+
     # Template operations
     async def get_notification_templates(self) -> List[NotificationTemplate]:
-        """Get all notification templates"""
+        """Get all stored notification templates, as last loaded by the template registry"""
         try:
-            templates_data = await self.db.get_notification_templates()
-            return [NotificationTemplate(**template) for template in templates_data]
+            return [NotificationTemplate(**template) for template in await self.templates.stored_templates()]
 
         except Exception as e:
             logger.error("Failed to get notification templates", extra={"error": str(e)})
             raise DatabaseError("get_notification_templates", f"Notification templates retrieval failed: {str(e)}")
 
+    async def save_notification_template(self, template: NotificationTemplateBase) -> NotificationTemplate:
+        """Create or replace a template variant and recompile templates on every replica"""
+        now = datetime.now(timezone.utc)
+        template_data = template.dict()
+        template_data["type"] = template.type.value
+        template_data.update({"_id": f"tmpl_{uuid.uuid4().hex}", "created_at": now, "updated_at": now})
+        stored = await self.db.save_notification_template(template_data)
+        await self.templates.invalidate()
+
+        logger.info("Notification template saved", extra={
+            "template_id": stored["_id"],
+            "name": template.name,
+            "locale": template.locale
+        })
+        return NotificationTemplate(**stored)
+
+    async def render_template(self, name: str, variables: Dict[str, Any],
+                              locale: Optional[str] = None) -> Tuple[str, str]:
+        """Render a template's sanitized (subject, message) in the closest available locale"""
+        rendered = await self.templates.render(name, variables, locale)
+        if rendered is None:
+            raise NotFoundError("Notification template", name)
+        return rendered
+
     # Helper methods
     def _validate_notification_data(self, notification_data: NotificationCreate) -> None:
         """Validate notification data"""
@@ -302,6 +477,16 @@ class NotificationService:
         if not notification_data.channels:
             raise ValidationError("At least one delivery channel required", "channels")
 
+    def _build_notification(self, notification_data: NotificationCreate) -> Dict[str, Any]:
+        """Notification document ready to insert"""
+        now = datetime.now(timezone.utc)
+        notification_dict = notification_data.dict(by_alias=True)
+        notification_dict["_id"] = self._generate_notification_id()
+        notification_dict["status"] = NotificationStatus.PENDING
+        notification_dict["created_at"] = now
+        notification_dict["updated_at"] = now
+        return notification_dict
+
     def _generate_notification_id(self) -> str:
         """Generate unique notification ID"""
         import uuid
@@ -320,6 +505,10 @@ class NotificationService:
             "grade_notifications": True,
             "achievement_notifications": True,
             "system_announcements": True,
+            "digest_enabled": True,
+            "digest_window_minutes": notification_service_settings.digest_window_minutes,
+            "digest_windows": {},
+            "locale": notification_service_settings.default_locale,
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         }
@@ -327,80 +516,42 @@ class NotificationService:
         await self.db.save_notification_settings(default_settings)
         return NotificationSettings(**default_settings)
 
-    async def _send_notification(self, notification: Dict[str, Any]) -> None:
-        """Send notification through configured channels"""
-        try:
-            notification_id = notification["_id"]
-            channels = notification.get("channels", [])
-
-            # Update status to sent
-            await self.db.update_notification(notification_id, {
-                "status": NotificationStatus.SENT,
-                "sent_at": datetime.now(timezone.utc)
-            })
-
-            # Send through each channel
-            for channel in channels:
-                try:
-                    if channel == NotificationChannel.EMAIL:
-                        await self._send_email_notification(notification)
-                    elif channel == NotificationChannel.IN_APP:
-                        await self._send_in_app_notification(notification)
-                    elif channel == NotificationChannel.SMS:
-                        await self._send_sms_notification(notification)
-                    elif channel == NotificationChannel.PUSH:
-                        await self._send_push_notification(notification)
-
-                    # Update delivery status
-                    await self.db.update_notification(notification_id, {
-                        "status": NotificationStatus.DELIVERED,
-                        "delivered_at": datetime.now(timezone.utc)
-                    })
-
-                except Exception as e:
-                    logger.error(f"Failed to send notification via {channel}", extra={
-                        "notification_id": notification_id,
-                        "channel": channel,
-                        "error": str(e)
-                    })
-
-        except Exception as e:
-            logger.error("Failed to send notification", extra={
-                "notification_id": notification["_id"],
-                "error": str(e)
-            })
-
-    async def _send_email_notification(self, notification: Dict[str, Any]) -> None:
-        """Send email notification"""
+    # Channel senders: each takes a batch and returns one error (or None) per notification
+    async def _send_email_notifications(self, notifications: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Send email notifications"""
         # Implementation would integrate with email service
-        logger.info("Email notification sent", extra={
-            "notification_id": notification["_id"],
-            "recipient_id": notification["recipient_id"]
+        logger.info("Email notifications sent", extra={
+            "count": len(notifications),
+            "notification_ids": [n["_id"] for n in notifications[:5]]
         })
+        return [None] * len(notifications)
 
-    async def _send_in_app_notification(self, notification: Dict[str, Any]) -> None:
-        """Send in-app notification"""
+    async def _send_in_app_notifications(self, notifications: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Send in-app notifications"""
         # Implementation would integrate with real-time messaging
-        logger.info("In-app notification sent", extra={
-            "notification_id": notification["_id"],
-            "recipient_id": notification["recipient_id"]
+        logger.info("In-app notifications sent", extra={
+            "count": len(notifications),
+            "notification_ids": [n["_id"] for n in notifications[:5]]
         })
+        return [None] * len(notifications)
 
-    async def _send_sms_notification(self, notification: Dict[str, Any]) -> None:
-        """Send SMS notification"""
+    async def _send_sms_notifications(self, notifications: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Send SMS notifications"""
         # Implementation would integrate with SMS service
-        logger.info("SMS notification sent", extra={
-            "notification_id": notification["_id"],
-            "recipient_id": notification["recipient_id"]
+        logger.info("SMS notifications sent", extra={
+            "count": len(notifications),
+            "notification_ids": [n["_id"] for n in notifications[:5]]
         })
+        return [None] * len(notifications)
 
-    async def _send_push_notification(self, notification: Dict[str, Any]) -> None:
-        """Send push notification"""
+    async def _send_push_notifications(self, notifications: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Send push notifications"""
         # Implementation would integrate with push notification service
-        logger.info("Push notification sent", extra={
-            "notification_id": notification["_id"],
-            "recipient_id": notification["recipient_id"]
+        logger.info("Push notifications sent", extra={
+            "count": len(notifications),
+            "notification_ids": [n["_id"] for n in notifications[:5]]
         })
+        return [None] * len(notifications)
 
 # Global service instance
 notification_service = NotificationService()
\ No newline at end of file
@@ -0,0 +1,332 @@
+"""
+Per-user unread counters and inbox cache for the Notification Service
+
+Each user with recent activity has three Redis keys:
+
+- ``notifications:counts:<user_id>``: hash with ``total`` and ``unread``,
+  changed with HINCRBY as notifications are created, read and deleted.
+  ``loaded`` marks a hash whose values came from MongoDB; increments that
+  land on a hash that was never loaded are ignored by readers, which load
+  it instead.
+- ``notifications:inbox:<user_id>``: the newest notifications as JSON,
+  newest first, capped with LTRIM. Created notifications are added with
+  LPUSHX, so only warm inboxes grow; reads and deletes drop the list.
+- ``notifications:inbox-version:<user_id>``: bumped by every push and
+  invalidation. A fill only writes if the version is the one read before
+  the database query, so a notification created in between is not lost.
+- ``notifications:stats:<user_id>``: the stats summary, briefly.
+
+Read state is exact in the cached inbox; per-channel delivery progress is
+written by the dispatcher later and shows up when an entry is reloaded.
+Counters can drift if a write to Redis fails, so a reconciliation job
+recomputes them from MongoDB and swaps the values in with WATCH, leaving
+any hash that changed in the meantime for the next round.
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from redis.exceptions import WatchError
+
+from shared.common.cache import cache_manager
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector
+
+logger = get_logger("notification-service-inbox")
+
+COUNTS_PREFIX = "notifications:counts:"
+INBOX_PREFIX = "notifications:inbox:"
+VERSION_PREFIX = "notifications:inbox-version:"
+STATS_PREFIX = "notifications:stats:"
+
+# Loads {"total": n, "unread": n} for each user from the database
+CountsLoader = Callable[[List[str]], Awaitable[Dict[str, Dict[str, int]]]]
+
+
+class InboxCache:
+    """Redis-backed unread counters, capped inbox lists and stats summaries.
+
+    Every method fails open: without Redis, readers get None and fall back
+    to MongoDB, and writers do nothing.
+    """
+
+    def __init__(
+        self,
+        loader: CountsLoader,
+        inbox_size: int = 50,
+        inbox_ttl: int = 300,
+        counter_ttl: int = 86400,
+        stats_ttl: int = 60,
+        reconcile_interval: float = 900.0,
+        redis_client: Any = None
+    ):
+        self.loader = loader
+        self.inbox_size = inbox_size
+        self.inbox_ttl = inbox_ttl
+        self.counter_ttl = counter_ttl
+        self.stats_ttl = stats_ttl
+        self.reconcile_interval = reconcile_interval
+        self.redis_client = redis_client
+        self._reconciler: Optional[asyncio.Task] = None
+        self.inbox_hits = 0
+        self.inbox_misses = 0
+        self.counter_loads = 0
+        self.counters_corrected = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    # Counters
+    @staticmethod
+    def _counts(fields: Dict[str, str]) -> Optional[Dict[str, int]]:
+        if not fields or "loaded" not in fields:
+            return None
+        return {"total": max(0, int(fields.get("total", 0))), "unread": max(0, int(fields.get("unread", 0)))}
+
+    async def counts(self, user_id: str) -> Optional[Dict[str, int]]:
+        """Cached counters of a user, loading them from the database on a miss"""
+        client = await self._client()
+        if client is None:
+            return None
+        try:
+            counts = self._counts(await client.hgetall(COUNTS_PREFIX + user_id))
+            if counts is not None:
+                return counts
+            self.counter_loads += 1
+            counts = (await self.loader([user_id]))[user_id]
+            pipe = client.pipeline(transaction=True)
+            pipe.hset(COUNTS_PREFIX + user_id, mapping={**counts, "loaded": 1})
+            pipe.expire(COUNTS_PREFIX + user_id, self.counter_ttl)
+            await pipe.execute()
+            return counts
+        except Exception as e:
+            logger.warning("Unread counter lookup failed", extra={"user_id": user_id, "error": str(e)})
+            return None
+
+    async def apply(self, deltas: Dict[str, Tuple[int, int]]) -> Dict[str, Optional[Dict[str, int]]]:
+        """Add (total, unread) deltas per user; returns the new counts where they are known"""
+        client = await self._client()
+        if client is None or not deltas:
+            return {user_id: None for user_id in deltas}
+        users = list(deltas)
+        result: Dict[str, Optional[Dict[str, int]]] = {}
+        try:
+            for start in range(0, len(users), 1000):
+                chunk = users[start:start + 1000]
+                pipe = client.pipeline(transaction=True)
+                for user_id in chunk:
+                    key = COUNTS_PREFIX + user_id
+                    total, unread = deltas[user_id]
+                    if total:
+                        pipe.hincrby(key, "total", total)
+                    if unread:
+                        pipe.hincrby(key, "unread", unread)
+                    pipe.expire(key, self.counter_ttl)
+                    pipe.hgetall(key)
+                replies = await pipe.execute()
+                # The hgetall reply closes each user's group of commands
+                position = 0
+                for user_id in chunk:
+                    total, unread = deltas[user_id]
+                    position += bool(total) + bool(unread) + 2
+                    result[user_id] = self._counts(replies[position - 1])
+        except Exception as e:
+            logger.warning("Unread counter update failed", extra={"users": len(users), "error": str(e)})
+        return {user_id: result.get(user_id) for user_id in users}
+
+    async def mark_all_read(self, user_id: str, marked: int) -> Optional[Dict[str, int]]:
+        """Counters after `marked` notifications were read at once"""
+        return (await self.apply({user_id: (0, -marked)}))[user_id]
+
+    # Inbox
+    async def inbox(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """The cached newest notifications of a user (newest first), or None on a miss"""
+        client = await self._client()
+        if client is None:
+            return None
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.lrange(INBOX_PREFIX + user_id, 0, self.inbox_size - 1)
+            pipe.hgetall(COUNTS_PREFIX + user_id)
+            entries, fields = await pipe.execute()
+        except Exception as e:
+            logger.warning("Inbox cache lookup failed", extra={"user_id": user_id, "error": str(e)})
+            return None
+        counts = self._counts(fields)
+        if entries or (counts is not None and counts["total"] == 0):
+            self.inbox_hits += 1
+            return [json.loads(entry) for entry in entries]
+        self.inbox_misses += 1
+        return None
+
+    async def version(self, user_id: str) -> Optional[int]:
+        """The inbox version to pass to `fill`; read it before querying the database"""
+        client = await self._client()
+        if client is None:
+            return None
+        try:
+            return int(await client.get(VERSION_PREFIX + user_id) or 0)
+        except Exception as e:
+            logger.warning("Inbox version lookup failed", extra={"user_id": user_id, "error": str(e)})
+            return None
+
+    async def fill(self, user_id: str, notifications: List[Dict[str, Any]], version: Optional[int] = None):
+        """Store the newest notifications of a user (newest first) after a miss.
+
+        With a `version`, nothing is stored if the inbox changed since it was read.
+        """
+        client = await self._client()
+        if client is None or not notifications:
+            return
+        key = INBOX_PREFIX + user_id
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                if version is not None:
+                    await pipe.watch(VERSION_PREFIX + user_id)
+                    if int(await pipe.get(VERSION_PREFIX + user_id) or 0) != version:
+                        return
+                    pipe.multi()
+                pipe.delete(key)
+                pipe.rpush(key, *(json.dumps(n, default=str) for n in notifications[:self.inbox_size]))
+                pipe.expire(key, self.inbox_ttl)
+                await pipe.execute()
+        except WatchError:
+            pass
+        except Exception as e:
+            logger.warning("Inbox cache fill failed", extra={"user_id": user_id, "error": str(e)})
+
+    async def push(self, notifications: Iterable[Dict[str, Any]]):
+        """Add new notifications to the inboxes that are cached"""
+        client = await self._client()
+        if client is None:
+            return
+        by_user: Dict[str, List[str]] = {}
+        for notification in notifications:
+            by_user.setdefault(notification["recipient_id"], []).append(json.dumps(notification, default=str))
+        users = list(by_user)
+        try:
+            for start in range(0, len(users), 1000):
+                pipe = client.pipeline(transaction=False)
+                for user_id in users[start:start + 1000]:
+                    key = INBOX_PREFIX + user_id
+                    pipe.lpushx(key, *by_user[user_id])
+                    pipe.ltrim(key, 0, self.inbox_size - 1)
+                    pipe.delete(STATS_PREFIX + user_id)
+                    pipe.incr(VERSION_PREFIX + user_id)
+                    pipe.expire(VERSION_PREFIX + user_id, self.counter_ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Inbox cache update failed", extra={"users": len(users), "error": str(e)})
+
+    async def invalidate(self, user_ids: Iterable[str]):
+        """Drop the cached inbox and stats of users whose notifications changed"""
+        client = await self._client()
+        users = set(user_ids)
+        if client is None or not users:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(*(prefix + user_id for user_id in users for prefix in (INBOX_PREFIX, STATS_PREFIX)))
+            for user_id in users:
+                pipe.incr(VERSION_PREFIX + user_id)
+                pipe.expire(VERSION_PREFIX + user_id, self.counter_ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Inbox cache invalidation failed", extra={"users": len(users), "error": str(e)})
+
+    # Stats summary
+    async def stats(self, user_id: str) -> Optional[Dict[str, Any]]:
+        client = await self._client()
+        if client is None:
+            return None
+        try:
+            cached = await client.get(STATS_PREFIX + user_id)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning("Stats cache lookup failed", extra={"user_id": user_id, "error": str(e)})
+            return None
+
+    async def set_stats(self, user_id: str, stats: Dict[str, Any]):
+        client = await self._client()
+        if client is None:
+            return
+        try:
+            await client.set(STATS_PREFIX + user_id, json.dumps(stats), ex=self.stats_ttl)
+        except Exception as e:
+            logger.warning("Stats cache update failed", extra={"user_id": user_id, "error": str(e)})
+
+    # Reconciliation
+    async def reconcile(self, batch_size: int = 500) -> int:
+        """Recompute every cached counter hash from the database; returns how many were corrected"""
+        client = await self._client()
+        if client is None:
+            return 0
+        corrected = 0
+        batch: List[str] = []
+        async for key in client.scan_iter(match=COUNTS_PREFIX + "*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                corrected += await self._reconcile_batch(client, batch)
+                batch = []
+        if batch:
+            corrected += await self._reconcile_batch(client, batch)
+        self.counters_corrected += corrected
+        return corrected
+
+    async def _reconcile_batch(self, client: Any, keys: List[str]) -> int:
+        users = [key[len(COUNTS_PREFIX):] for key in keys]
+        async with client.pipeline(transaction=True) as pipe:
+            # Snapshot before loading: a counter that moves while we query is left alone
+            await pipe.watch(*keys)
+            before = [await pipe.hgetall(key) for key in keys]
+            actual = await self.loader(users)
+            pipe.multi()
+            changed = 0
+            for key, user_id, fields in zip(keys, users, before):
+                counts = actual[user_id]
+                if self._counts(fields) != counts:
+                    pipe.hset(key, mapping={**counts, "loaded": 1})
+                    pipe.expire(key, self.counter_ttl)
+                    changed += 1
+            if not changed:
+                await pipe.reset()
+                return 0
+            try:
+                await pipe.execute()
+            except WatchError:
+                return 0
+            return changed
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                corrected = await self.reconcile()
+                if corrected:
+                    logger.info("Unread counters reconciled", extra={"corrected": corrected})
+            except Exception as e:
+                logger.warning("Unread counter reconciliation failed", extra={"error": str(e)})
+
+    def start(self):
+        """Start the periodic reconciliation on the running loop"""
+        if self._reconciler is None or self._reconciler.done():
+            self._reconciler = asyncio.get_running_loop().create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            try:
+                await self._reconciler
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reconciler = None
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("notification_inbox_cache_hits", self.inbox_hits)
+        collector.gauge_set("notification_inbox_cache_misses", self.inbox_misses)
+        collector.gauge_set("notification_counter_loads", self.counter_loads)
+        collector.gauge_set("notification_counters_corrected", self.counters_corrected)
@@ -11,6 +11,8 @@ from config.config import notification_service_settings
 
 logger = get_logger("notification-service-utils")
 
+HTML_TAG = re.compile(r'<[^>]+>')
+
 async def get_current_user(token: Optional[str] = None):
     """Get current authenticated user from JWT token"""
     if not token:
@@ -80,7 +82,7 @@ def validate_notification_data(title: str, message: str) -> bool:
 def sanitize_notification_content(text: str) -> str:
     """Sanitize notification content"""
     # Remove potentially harmful HTML/script tags
-    text = re.sub(r'<[^>]+>', '', text)
+    text = HTML_TAG.sub('', text)
 
     # Trim whitespace
     text = text.strip()
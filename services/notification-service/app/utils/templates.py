@@ -0,0 +1,206 @@
+"""
+Precompiled notification templates
+
+Templates use the ``{variable}`` placeholders of
+``format_notification_message``, but are parsed once into literal and
+variable segments, so rendering is a single join instead of one string
+scan per variable. Placeholders without a value are left as written.
+
+Sanitization follows ``sanitize_notification_content``: tags are stripped
+from the template text when it is compiled, so a rendered message only
+needs the tag regex if a variable brought a ``<`` in with it.
+
+Stored templates have a locale; a lookup falls back from ``pt-BR`` to
+``pt`` to the default locale, and the resolution is remembered until the
+next reload. Saving a template reloads this replica at once and bumps a
+version in Redis that the other replicas check every few seconds.
+"""
+import asyncio
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from shared.common.cache import cache_manager
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector
+
+from utils.notification_utils import HTML_TAG
+
+logger = get_logger("notification-service-templates")
+
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+VERSION_KEY = "notifications:templates:version"
+
+# Loads stored templates as dicts with name, locale, subject_template and message_template
+TemplateLoader = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+
+class CompiledTemplate:
+    """A sanitized template split into literal text (even positions) and variable names (odd positions)"""
+
+    __slots__ = ("source", "parts", "max_length")
+
+    def __init__(self, source: str, max_length: Optional[int] = None):
+        self.source = source
+        self.parts = PLACEHOLDER.split(HTML_TAG.sub("", source).strip())
+        self.max_length = max_length
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = str(variables[name]) if name in variables else "{" + name + "}"
+        text = "".join(parts)
+        if "<" in text:
+            text = HTML_TAG.sub("", text).strip()
+        elif len(parts) > 1:
+            text = text.strip()
+        if self.max_length is not None and len(text) > self.max_length:
+            text = text[:self.max_length - 3] + "..."
+        return text
+
+
+class TemplateRegistry:
+    """Compiled subject/message templates by name and locale.
+
+    Stored templates are reloaded when one is saved, when another replica
+    reports a newer version, and after `ttl` seconds regardless. Built-in
+    defaults fill in for names that storage does not define.
+    """
+
+    def __init__(
+        self,
+        loader: TemplateLoader,
+        ttl: float = 3600.0,
+        default_locale: str = "en",
+        max_subject_length: Optional[int] = None,
+        max_message_length: Optional[int] = None,
+        version_check_interval: float = 5.0,
+        redis_client: Any = None
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.default_locale = default_locale
+        self.max_subject_length = max_subject_length
+        self.max_message_length = max_message_length
+        self.version_check_interval = version_check_interval
+        self.redis_client = redis_client
+        self.defaults: Dict[Tuple[str, str], Tuple[CompiledTemplate, CompiledTemplate]] = {}
+        self.templates: Dict[Tuple[str, str], Tuple[CompiledTemplate, CompiledTemplate]] = {}
+        self.stored: List[Dict[str, Any]] = []
+        self._resolved: Dict[Tuple[str, Optional[str]], Optional[Tuple[CompiledTemplate, CompiledTemplate]]] = {}
+        self._expires_at = 0.0  # when the compiled set must be reloaded
+        self._next_check = 0.0  # when a lookup next leaves the fast path
+        self._version: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.renders = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    def _compile(self, subject: str, message: str) -> Tuple[CompiledTemplate, CompiledTemplate]:
+        return CompiledTemplate(subject, self.max_subject_length), CompiledTemplate(message, self.max_message_length)
+
+    def register_default(self, name: str, subject: str, message: str, locale: Optional[str] = None):
+        self.defaults[(name, locale or self.default_locale)] = self._compile(subject, message)
+        self._resolved.clear()
+
+    async def load(self):
+        """Compile every stored template, replacing the previous set"""
+        version = await self._remote_version()
+        stored = await self.loader()
+        self.templates = {
+            (template["name"], template.get("locale") or self.default_locale): self._compile(
+                template["subject_template"], template["message_template"]
+            )
+            for template in stored
+        }
+        self.stored = stored
+        self._resolved.clear()
+        self._version = version
+        now = time.monotonic()
+        self._expires_at = now + self.ttl
+        self._next_check = min(self._expires_at, now + self.version_check_interval)
+        self.loads += 1
+
+    async def _remote_version(self) -> Optional[str]:
+        client = await self._client()
+        if client is None:
+            return None
+        try:
+            return await client.get(VERSION_KEY)
+        except Exception as e:
+            logger.warning("Template version lookup failed", extra={"error": str(e)})
+            return self._version
+
+    async def invalidate(self):
+        """Reload now, and tell the other replicas to (after a template is saved or deleted)"""
+        client = await self._client()
+        if client is not None:
+            try:
+                await client.incr(VERSION_KEY)
+            except Exception as e:
+                logger.warning("Template version update failed", extra={"error": str(e)})
+        self._expires_at = self._next_check = 0.0
+
+    async def _refresh(self):
+        """Reload if the TTL ran out or another replica saved a template"""
+        now = time.monotonic()
+        if now < self._expires_at:
+            self._next_check = min(self._expires_at, now + self.version_check_interval)
+            if await self._remote_version() == self._version:
+                return
+            self._expires_at = 0.0
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return
+            try:
+                await self.load()
+            except Exception as e:
+                # Keep serving what was compiled last; try again after a short pause
+                logger.warning("Template reload failed", extra={"error": str(e)})
+                self._expires_at = self._next_check = time.monotonic() + min(self.ttl, 30.0)
+
+    async def stored_templates(self) -> List[Dict[str, Any]]:
+        """The stored templates as last loaded"""
+        if time.monotonic() >= self._next_check:
+            await self._refresh()
+        return self.stored
+
+    async def get(self, name: str, locale: Optional[str] = None) -> Optional[Tuple[CompiledTemplate, CompiledTemplate]]:
+        """The compiled (subject, message) templates for `name` in the closest locale, stored ones first"""
+        if time.monotonic() >= self._next_check:
+            await self._refresh()
+        key = (name, locale)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        chain = [self.default_locale]
+        if locale:
+            chain[:0] = [locale, locale.split("-")[0]]
+        template = None
+        for candidate in chain:
+            template = self.templates.get((name, candidate)) or self.defaults.get((name, candidate))
+            if template is not None:
+                break
+        self._resolved[key] = template
+        return template
+
+    async def render(self, name: str, variables: Dict[str, Any], locale: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """Rendered (subject, message), or None if no template has that name"""
+        template = await self.get(name, locale)
+        if template is None:
+            return None
+        self.renders += 1
+        return template[0].render(variables), template[1].render(variables)
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("notification_templates_compiled", len(self.templates) + len(self.defaults))
+        collector.gauge_set("notification_template_loads", self.loads)
+        collector.gauge_set("notification_template_renders", self.renders)
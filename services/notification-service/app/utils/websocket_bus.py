@@ -0,0 +1,285 @@
+"""
+Cross-node WebSocket delivery for the Notification Service
+
+Every replica holds only its own WebSocket connections. Presence lives in
+Redis as one hash per user (``ws:presence:<user_id>``, node id -> number
+of open connections), so any replica can tell whether a user is online
+and which nodes hold their connections. A message for a user is handed
+to local connections directly and published on the channel of each other
+node that holds one; broadcasts go out on a channel every node reads.
+"""
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, Iterable, Optional, Protocol
+
+from redis.exceptions import WatchError
+
+from shared.common.cache import cache_manager
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector
+
+logger = get_logger("notification-service-bus")
+
+PRESENCE_PREFIX = "ws:presence:"
+NODE_CHANNEL_PREFIX = "ws:node:"
+BROADCAST_CHANNEL = "ws:broadcast"
+
+
+class LocalConnections(Protocol):
+    """What the bus needs from the process-local connection manager"""
+
+    def local_users(self) -> Iterable[str]: ...
+
+    def connection_count(self, user_id: str) -> int: ...
+
+    def deliver(self, user_id: str, message: str) -> int: ...
+
+    def deliver_all(self, message: str, exclude: Iterable[str] = (), topic: Optional[str] = None) -> int: ...
+
+
+class WebSocketBus:
+    """Presence tracking and message routing between notification replicas.
+
+    Without Redis the bus degrades to delivering on this node only.
+    """
+
+    def __init__(
+        self,
+        connections: LocalConnections,
+        presence_ttl: int = 90,
+        heartbeat_interval: float = 30.0,
+        redis_client: Any = None,
+        node_id: Optional[str] = None
+    ):
+        self.connections = connections
+        self.presence_ttl = presence_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.redis_client = redis_client
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        self.channel = NODE_CHANNEL_PREFIX + self.node_id
+        self._listener: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+        self.published = 0
+        self.received = 0
+        self.stale_nodes_removed = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    # Presence
+    async def join(self, user_id: str):
+        """Count a new connection of `user_id` on this node"""
+        client = await self._client()
+        if client is None:
+            return
+        try:
+            key = PRESENCE_PREFIX + user_id
+            pipe = client.pipeline(transaction=False)
+            pipe.hincrby(key, self.node_id, 1)
+            pipe.expire(key, self.presence_ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Presence update failed", extra={"user_id": user_id, "error": str(e)})
+
+    async def leave(self, user_id: str):
+        """Count a closed connection; the node field goes when it reaches zero"""
+        client = await self._client()
+        if client is None:
+            return
+        key = PRESENCE_PREFIX + user_id
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                while True:
+                    # Decrement and delete together; a join in between retries instead of being deleted
+                    await pipe.watch(key)
+                    count = int(await pipe.hget(key, self.node_id) or 0) - 1
+                    pipe.multi()
+                    if count > 0:
+                        pipe.hset(key, self.node_id, count)
+                    else:
+                        pipe.hdel(key, self.node_id)
+                    try:
+                        await pipe.execute()
+                        return
+                    except WatchError:
+                        continue
+        except Exception as e:
+            logger.warning("Presence update failed", extra={"user_id": user_id, "error": str(e)})
+
+    async def nodes_for(self, user_id: str) -> Dict[str, int]:
+        """Nodes holding connections of `user_id`, with their connection counts"""
+        client = await self._client()
+        if client is None:
+            return {}
+        fields = await client.hgetall(PRESENCE_PREFIX + user_id)
+        return {node: int(count) for node, count in fields.items() if int(count) > 0}
+
+    async def is_online(self, user_id: str) -> bool:
+        """Whether `user_id` has a connection on any node"""
+        try:
+            return bool(await self.nodes_for(user_id))
+        except Exception as e:
+            logger.warning("Presence lookup failed", extra={"user_id": user_id, "error": str(e)})
+            return False
+
+    async def refresh_presence(self):
+        """Extend the presence TTL of every user connected here.
+
+        The counts are rewritten as well, so a user whose key expired while
+        Redis was unreachable shows up again.
+        """
+        client = await self._client()
+        users = list(self.connections.local_users())
+        if client is None or not users:
+            return
+        for start in range(0, len(users), 1000):
+            pipe = client.pipeline(transaction=False)
+            for user_id in users[start:start + 1000]:
+                key = PRESENCE_PREFIX + user_id
+                pipe.hset(key, self.node_id, self.connections.connection_count(user_id))
+                pipe.expire(key, self.presence_ttl)
+            await pipe.execute()
+
+    # Delivery
+    async def send_to_user(self, user_id: str, message: str) -> int:
+        """Deliver to every connection of `user_id` on any node.
+
+        Returns the number of connections queued locally plus the number
+        of other nodes the message was published to.
+        """
+        delivered = self.connections.deliver(user_id, message)
+        client = await self._client()
+        if client is None:
+            return delivered
+        try:
+            remote = [node for node in await self.nodes_for(user_id) if node != self.node_id]
+            if not remote:
+                return delivered
+            payload = json.dumps({"user_id": user_id, "message": message})
+            pipe = client.pipeline(transaction=False)
+            for node in remote:
+                pipe.publish(NODE_CHANNEL_PREFIX + node, payload)
+            receivers = await pipe.execute()
+            self.published += len(remote)
+            # Nobody listening means the node is gone; drop its stale presence
+            stale = [node for node, count in zip(remote, receivers) if not count]
+            if stale:
+                self.stale_nodes_removed += len(stale)
+                await client.hdel(PRESENCE_PREFIX + user_id, *stale)
+            return delivered + len(remote) - len(stale)
+        except Exception as e:
+            logger.warning("Cross-node delivery failed", extra={"user_id": user_id, "error": str(e)})
+            return delivered
+
+    async def broadcast(self, message: str, exclude: Iterable[str] = (), topic: Optional[str] = None) -> int:
+        """Deliver to every connected user (or a topic's subscribers) on every node except `exclude`"""
+        exclude = list(exclude)
+        delivered = self.connections.deliver_all(message, exclude, topic)
+        client = await self._client()
+        if client is not None:
+            try:
+                await client.publish(BROADCAST_CHANNEL, json.dumps({"origin": self.node_id, "message": message, "exclude": exclude, "topic": topic}))
+                self.published += 1
+            except Exception as e:
+                logger.warning("Cross-node broadcast failed", extra={"error": str(e)})
+        return delivered
+
+    async def _handle(self, channel: str, data: str):
+        self.received += 1
+        payload = json.loads(data)
+        if channel == BROADCAST_CHANNEL:
+            if payload.get("origin") != self.node_id:
+                self.connections.deliver_all(payload["message"], payload.get("exclude", ()), payload.get("topic"))
+        else:
+            self.connections.deliver(payload["user_id"], payload["message"])
+
+    # Background tasks
+    async def _listen(self):
+        while True:
+            client = await self._client()
+            if client is None:
+                await asyncio.sleep(self.heartbeat_interval)
+                continue
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel, BROADCAST_CHANNEL)
+                self._subscribed.set()
+                # Presence written while unsubscribed would have looked stale
+                await self.refresh_presence()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    channel, data = message["channel"], message["data"]
+                    try:
+                        await self._handle(
+                            channel.decode() if isinstance(channel, bytes) else channel,
+                            data.decode() if isinstance(data, bytes) else data
+                        )
+                    except Exception as e:
+                        logger.error("WebSocket bus message failed", extra={"channel": str(channel), "error": str(e)})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._subscribed.clear()
+                logger.warning("WebSocket bus listener failed, retrying", extra={"error": str(e)})
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.refresh_presence()
+            except Exception as e:
+                logger.warning("Presence refresh failed", extra={"error": str(e)})
+
+    async def start(self, timeout: float = 5.0):
+        """Subscribe this node and start the presence heartbeat on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self._listen())
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = loop.create_task(self._beat())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("WebSocket bus not subscribed yet, delivering locally until it is", extra={"node_id": self.node_id})
+
+    async def stop(self):
+        """Stop the listener and heartbeat and remove this node's presence"""
+        for task in (self._listener, self._heartbeat):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._listener = self._heartbeat = None
+        self._subscribed.clear()
+        client = await self._client()
+        users = list(self.connections.local_users())
+        if client is None or not users:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id in users:
+                pipe.hdel(PRESENCE_PREFIX + user_id, self.node_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Presence cleanup failed", extra={"error": str(e)})
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("websocket_bus_published", self.published)
+        collector.gauge_set("websocket_bus_received", self.received)
+        collector.gauge_set("websocket_bus_stale_nodes_removed", self.stale_nodes_removed)
@@ -8,6 +8,8 @@ import uvicorn
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.monitoring import setup_metrics
+from shared.common.tracing import setup_tracing
 from shared.common.database import get_database, close_connection
 from shared.common.cache import close_connection as close_cache
 # from .middleware.auth_middleware import RequestLoggingMiddleware
@@ -71,6 +73,12 @@ def create_application() -> FastAPI:
     # Add custom middleware (commented out for now)
     # app.add_middleware(RequestLoggingMiddleware)
 
+    # Request metrics and Prometheus /metrics endpoint
+    setup_metrics(app, "user-service")
+
+    # W3C trace context propagation and request spans (outermost)
+    setup_tracing(app, "user-service")
+
     # Include routers
     app.include_router(profiles_router, prefix="/users", tags=["User Profiles"])
     app.include_router(career_router, prefix="/users", tags=["Career Development"])
@@ -1,51 +1,170 @@
 """
 Shared authentication utilities for LMS microservices
 """
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from functools import lru_cache
 import jwt
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from shared.config.config import settings
 from shared.database.database import get_database
+from shared.common.metrics import MetricsCollector, metrics_collector
+from shared.common.revocation import token_revocations
 
 # Security scheme for FastAPI
 security = HTTPBearer(auto_error=False)
 
+# Header the gateway uses to forward the principal it already verified
+PRINCIPAL_HEADER = "x-auth-principal"
+
+
+class PrincipalCache:
+    """Bounded LRU of verified principals keyed by (sub, iat)"""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[Any, Any], Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Any, Any]) -> Optional[Dict[str, Any]]:
+        """Return a cached principal, or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Tuple[Any, Any], principal: Dict[str, Any], ttl: Optional[float] = None):
+        """Cache a principal, evicting the least recently used entry when full"""
+        ttl = self.ttl_seconds if ttl is None else min(ttl, self.ttl_seconds)
+        self._entries[key] = (principal, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop every cached principal for a user (role change, deletion)"""
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def collect_metrics(self, collector: MetricsCollector):
+        """Publish cache gauges at scrape time"""
+        collector.gauge_set("auth_principal_cache_entries", len(self._entries))
+        collector.gauge_set("auth_principal_cache_hits", self.hits)
+        collector.gauge_set("auth_principal_cache_misses", self.misses)
+
+
+principal_cache = PrincipalCache(settings.auth_principal_cache_size, settings.auth_principal_cache_ttl_seconds)
+metrics_collector.register_collector(principal_cache.collect_metrics)
+
+
+def _invalidate_cached_principal(user_id: str):
+    principal_cache.invalidate(user_id)
+
+
+token_revocations.principal_listeners.append(_invalidate_cached_principal)
+
+
+@lru_cache(maxsize=4)
+def _principal_signing_key(secret: str) -> bytes:
+    """Derive the principal header key so it is never the JWT key itself"""
+    return hashlib.sha256(b"lms-principal:" + secret.encode()).digest()
+
+
+def sign_principal(principal: Dict[str, Any], ttl_seconds: Optional[int] = None) -> str:
+    """Serialize a verified principal into a short-lived signed header value"""
+    ttl_seconds = ttl_seconds or settings.auth_principal_header_ttl_seconds
+    data = dict(principal, exp=int(time.time()) + ttl_seconds)
+    body = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).rstrip(b"=")
+    signature = hmac.new(_principal_signing_key(settings.jwt_secret), body, hashlib.sha256).hexdigest()
+    return f"{body.decode()}.{signature}"
+
+
+def verify_principal(value: str) -> Optional[Dict[str, Any]]:
+    """Return the principal from a signed header value, or None if invalid or expired"""
+    body, _, signature = value.partition(".")
+    expected = hmac.new(_principal_signing_key(settings.jwt_secret), body.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+    except ValueError:
+        return None
+    if data.pop("exp", 0) < time.time():
+        return None
+    return data
+
+
 class AuthService:
     """Centralized authentication service"""
 
     @staticmethod
     async def validate_jwt_token(token: str) -> Dict[str, Any]:
-        """Validate JWT token and return user info"""
+        """Validate JWT token and return user info.
+
+        The signature is checked in memory on every call; the user lookup only
+        runs on a principal cache miss.
+        """
         try:
-            # Decode and validate JWT token
+            # Decode and validate JWT token (signature and exp)
             payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(401, "Token has expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(401, "Invalid token")
 
-            # Verify token hasn't expired
-            if payload.get("exp") and datetime.fromtimestamp(payload["exp"], timezone.utc) < datetime.now(timezone.utc):
-                raise HTTPException(401, "Token has expired")
-
-            # Get user from database to ensure they still exist
-            db = get_database()
-            user = await db.users.find_one({"_id": payload.get("sub")})
+        if await token_revocations.is_revoked(payload):
+            raise HTTPException(401, "Token has been revoked")
+
+        key = (payload.get("sub"), payload.get("iat"))
+        principal = principal_cache.get(key)
+        if principal is None:
+            try:
+                # Get user from database to ensure they still exist
+                db = get_database()
+                user = await db.users.find_one({"_id": key[0]}, {"role": 1, "email": 1, "name": 1, "tenant_id": 1})
+            except Exception as e:
+                raise HTTPException(401, f"Authentication failed: {str(e)}")
             if not user:
                 raise HTTPException(401, "User not found")
 
-            return {
+            principal = {
                 "id": user["_id"],
                 "role": user.get("role", "student"),
                 "email": user.get("email", ""),
-                "name": user.get("name", "")
+                "name": user.get("name", ""),
+                "tenant_id": user.get("tenant_id")
             }
+            ttl = payload["exp"] - time.time() if payload.get("exp") else None
+            principal_cache.set(key, principal, ttl)
 
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(401, "Token has expired")
-        except jwt.InvalidTokenError:
-            raise HTTPException(401, "Invalid token")
-        except Exception as e:
-            raise HTTPException(401, f"Authentication failed: {str(e)}")
+        return dict(principal)
+
+    @staticmethod
+    async def resolve_principal(authorization: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Verify an Authorization header value; None when missing or invalid"""
+        if not authorization or not authorization.lower().startswith("bearer "):
+            return None
+        try:
+            return await AuthService.validate_jwt_token(authorization[7:])
+        except HTTPException:
+            return None
 
     @staticmethod
     def require_role(user: Dict[str, Any], allowed_roles: list[str]):
@@ -63,20 +182,42 @@ class AuthService:
         """Check if user is instructor or admin"""
         AuthService.require_role(user, ["admin", "super_admin", "instructor", "teaching_assistant"])
 
-async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Dict[str, Any]:
+
+def _forwarded_principal(request: Request) -> Optional[Dict[str, Any]]:
+    """Principal the gateway already verified for this request, if any"""
+    value = request.headers.get(PRINCIPAL_HEADER)
+    return verify_principal(value) if value else None
+
+
+def _request_token(request: Request, credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[str]:
+    # `?token=` is still accepted for callers of the old per-route helpers
+    return credentials.credentials if credentials else request.query_params.get("token")
+
+
+async def get_current_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Dict[str, Any]:
     """FastAPI dependency for getting current authenticated user"""
-    if not credentials:
+    principal = _forwarded_principal(request)
+    if principal is not None:
+        return principal
+
+    token = _request_token(request, credentials)
+    if not token:
         raise HTTPException(401, "Authentication credentials not provided")
 
-    return await AuthService.validate_jwt_token(credentials.credentials)
+    return await AuthService.validate_jwt_token(token)
 
-async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Dict[str, Any]]:
+async def get_optional_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Dict[str, Any]]:
     """FastAPI dependency for optional user authentication"""
-    if not credentials:
+    principal = _forwarded_principal(request)
+    if principal is not None:
+        return principal
+
+    token = _request_token(request, credentials)
+    if not token:
         return None
 
     try:
-        return await AuthService.validate_jwt_token(credentials.credentials)
+        return await AuthService.validate_jwt_token(token)
     except HTTPException:
         return None
 
@@ -92,4 +233,4 @@ def require_instructor(user: Dict[str, Any] = Depends(get_current_user)):
 def require_student(user: Dict[str, Any] = Depends(get_current_user)):
     """Dependency for student+ endpoints"""
     AuthService.require_role(user, ["student", "admin", "super_admin", "instructor", "teaching_assistant"])
-    return user
\ No newline at end of file
+    return user
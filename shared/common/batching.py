@@ -0,0 +1,98 @@
+"""
+Micro-batching for LMS microservices
+
+Callers submit one item at a time and await its own result; items that
+arrive within a short window are handed to the handler together, so the
+handler can deduplicate them and use bulk database writes.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+logger = get_logger("common-batching")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects items for up to `window` seconds or `max_batch` items.
+
+    `handler` receives the batch as a list and returns one result per item,
+    in order; a result that is an exception is raised to that caller alone.
+    If the handler raises, every caller in the batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[T]], Awaitable[List[R]]],
+        window: float = 0.005,
+        max_batch: int = 100,
+        name: str = "batch"
+    ):
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_soon()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_soon)
+        return await future
+
+    def _flush_soon(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        start = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        metrics_collector.observe("batch_size", len(batch), {"batch": self.name})
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            logger.warning("Batch failed", extra={"batch": self.name, "size": len(batch), "error": str(e)})
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            metrics_collector.observe("batch_duration_seconds", time.perf_counter() - start, {"batch": self.name})
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def flush(self):
+        """Process anything pending now and wait for running batches"""
+        self._flush_soon()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("batch_pending_items", len(self._pending), {"batch": self.name})
+        collector.gauge_set("batch_mean_size", self.items / self.batches if self.batches else 0, {"batch": self.name})
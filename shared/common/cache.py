@@ -12,6 +12,8 @@ except ImportError:
     import redis
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+from shared.common.tracing import traced, SpanKind
 
 logger = get_logger("common-cache")
 
@@ -28,6 +30,11 @@ except ImportError:
         pass
 
 
+def _observe_redis(command: str, start_time: float):
+    """Record a Redis command duration"""
+    metrics_collector.observe("redis_command_duration_seconds", time.perf_counter() - start_time, {"command": command})
+
+
 class RedisManager:
     """Redis connection manager with connection pooling"""
 
@@ -35,6 +42,18 @@ class RedisManager:
         self.client: Optional[Any] = None
         self._connection_lock = asyncio.Lock()
         self.redis_available = REDIS_AVAILABLE
+        metrics_collector.register_collector(self.collect_pool_metrics)
+
+    def collect_pool_metrics(self, collector: MetricsCollector):
+        """Publish connection pool gauges at scrape time"""
+        pool = getattr(self.client, "connection_pool", None)
+        if pool is None:
+            return
+        in_use = len(getattr(pool, "_in_use_connections", ()))
+        available = len(getattr(pool, "_available_connections", ()))
+        collector.gauge_set("redis_pool_connections", in_use, {"state": "in_use"})
+        collector.gauge_set("redis_pool_connections", available, {"state": "idle"})
+        collector.gauge_set("redis_pool_max_connections", pool.max_connections)
 
     async def connect(self) -> Any:
         """Connect to Redis with connection pooling"""
@@ -94,32 +113,44 @@ class RedisManager:
                 self.client = None
                 logger.info("Redis connection closed")
 
+    @traced("redis.get", SpanKind.CLIENT, {"db.system": "redis", "db.operation": "get"})
     async def get(self, key: str) -> Optional[str]:
         """Get value from Redis"""
+        start_time = time.perf_counter()
         try:
             client = await self.connect()
             return await client.get(key)
         except Exception as e:
             logger.warning("Redis get failed", extra={"key": key, "error": str(e)})
             return None
+        finally:
+            _observe_redis("get", start_time)
 
+    @traced("redis.set", SpanKind.CLIENT, {"db.system": "redis", "db.operation": "set"})
     async def set(self, key: str, value: str, ttl: int = 300) -> bool:
         """Set value in Redis with TTL"""
+        start_time = time.perf_counter()
         try:
             client = await self.connect()
             return await client.set(key, value, ex=ttl)
         except Exception as e:
             logger.warning("Redis set failed", extra={"key": key, "error": str(e)})
             return False
+        finally:
+            _observe_redis("set", start_time)
 
+    @traced("redis.delete", SpanKind.CLIENT, {"db.system": "redis", "db.operation": "delete"})
     async def delete(self, key: str) -> bool:
         """Delete key from Redis"""
+        start_time = time.perf_counter()
         try:
             client = await self.connect()
             return await client.delete(key) > 0
         except Exception as e:
             logger.warning("Redis delete failed", extra={"key": key, "error": str(e)})
             return False
+        finally:
+            _observe_redis("delete", start_time)
 
     async def exists(self, key: str) -> bool:
         """Check if key exists in Redis"""
@@ -139,14 +170,18 @@ class RedisManager:
             logger.warning("Redis expire failed", extra={"key": key, "error": str(e)})
             return False
 
+    @traced("redis.incr", SpanKind.CLIENT, {"db.system": "redis", "db.operation": "incr"})
     async def incr(self, key: str) -> int:
         """Increment value"""
+        start_time = time.perf_counter()
         try:
             client = await self.connect()
             return await client.incr(key)
         except Exception as e:
             logger.warning("Redis incr failed", extra={"key": key, "error": str(e)})
             return 0
+        finally:
+            _observe_redis("incr", start_time)
 
 
 class LocalCache:
@@ -229,6 +264,7 @@ class CacheManager:
         if value is not None:
             async with self._stats_lock:
                 self.cache_hits += 1
+            metrics_collector.counter_inc("cache_requests_total", tags={"tier": "local", "result": "hit"})
             return value
 
         # Try Redis
@@ -240,14 +276,17 @@ class CacheManager:
                 await self.local_cache.set(key, parsed_value, ttl=60)  # 1 minute local TTL
                 async with self._stats_lock:
                     self.cache_hits += 1
+                metrics_collector.counter_inc("cache_requests_total", tags={"tier": "redis", "result": "hit"})
                 return parsed_value
             except json.JSONDecodeError:
                 async with self._stats_lock:
                     self.cache_hits += 1
+                metrics_collector.counter_inc("cache_requests_total", tags={"tier": "redis", "result": "hit"})
                 return redis_value
 
         async with self._stats_lock:
             self.cache_misses += 1
+        metrics_collector.counter_inc("cache_requests_total", tags={"tier": "redis", "result": "miss"})
         return None
 
     async def set(self, key: str, value: Any, ttl: int = 300, local_ttl: int = 60) -> bool:
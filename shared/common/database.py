@@ -2,16 +2,127 @@
 Enhanced database utilities for LMS microservices
 """
 import asyncio
+import threading
 from contextlib import asynccontextmanager
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
+from pymongo import monitoring
 from pymongo.errors import PyMongoError, ConnectionFailure, OperationFailure
 from shared.config.config import settings
 from shared.common.errors import DatabaseError
 from shared.common.logging import get_logger
+from shared.common.tracing import traced_operation
+from shared.common.metrics import Histogram, MetricsCollector, metrics_collector
 
 logger = get_logger("common-database")
 
+
+class MongoMetricsListener(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """pymongo event listener feeding command timings and pool gauges into metrics.
+
+    pymongo calls the listener from driver and monitor threads, while the
+    MetricsCollector is only safe on the event loop. Events are therefore
+    recorded into the listener's own histograms and pool counters under a
+    lock, and merged into the collector at scrape time on the loop. Memory is
+    bounded by the number of command/collection/outcome series, not events.
+    """
+
+    def __init__(self, collector: MetricsCollector = metrics_collector):
+        self.collector = collector
+        self._lock = threading.Lock()
+        self._pending: Dict[int, str] = {}
+        self._durations: Dict[Tuple[str, str, str], Histogram] = {}
+        self.pools: Dict[str, Dict[str, int]] = {}
+        collector.register_collector(self.collect)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._pending[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+    def _observe(self, event, outcome: str):
+        with self._lock:
+            key = (event.command_name, self._pending.pop(event.request_id, ""), outcome)
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = Histogram()
+            histogram.record(event.duration_micros / 1e6)
+
+    def _pool(self, address) -> Dict[str, int]:
+        """Get the counters for a pool; callers hold the lock"""
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {"open": 0, "checked_out": 0, "waiting": 0}
+        return pool
+
+    def _adjust(self, address, **deltas: int):
+        with self._lock:
+            pool = self._pool(address)
+            for state, delta in deltas.items():
+                pool[state] += delta
+
+    def pool_created(self, event):
+        self._adjust(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        self._adjust(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._adjust(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._adjust(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._adjust(event.address, waiting=-1)
+
+    def connection_checked_out(self, event):
+        self._adjust(event.address, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._adjust(event.address, checked_out=-1)
+
+    def collect(self, collector: MetricsCollector):
+        """Merge buffered command timings and publish pool gauges (runs on the loop)"""
+        with self._lock:
+            durations, self._durations = self._durations, {}
+            pools = [(address, dict(pool)) for address, pool in self.pools.items()]
+
+        for (command, collection, outcome), histogram in durations.items():
+            collector.histogram("mongodb_command_duration_seconds", {
+                "command": command,
+                "collection": collection,
+                "outcome": outcome
+            }).merge(histogram)
+
+        for address, pool in pools:
+            for state, value in pool.items():
+                collector.gauge_set("mongodb_pool_connections", value, {"address": address, "state": state})
+
+
+# Shared listener; pass as event_listeners to every Motor client
+mongo_metrics_listener = MongoMetricsListener()
+
 class DatabaseManager:
     """Enhanced database manager with connection pooling and error handling"""
 
@@ -36,7 +147,8 @@ class DatabaseManager:
                     serverSelectionTimeoutMS=5000,  # Timeout for server selection
                     connectTimeoutMS=5000,  # Timeout for initial connection
                     retryWrites=True,
-                    retryReads=True
+                    retryReads=True,
+                    event_listeners=[mongo_metrics_listener]
                 )
 
                 # Test connection
@@ -115,6 +227,7 @@ class DatabaseOperations:
     def __init__(self, collection_name: str):
         self.collection_name = collection_name
 
+    @traced_operation
     async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Find one document with error handling"""
         try:
@@ -129,6 +242,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("find_one", str(e))
 
+    @traced_operation
     async def find_many(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
                        skip: int = 0, limit: Optional[int] = None, sort: Optional[List[tuple]] = None) -> List[Dict[str, Any]]:
         """Find multiple documents with error handling"""
@@ -154,6 +268,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("find_many", str(e))
 
+    @traced_operation
     async def insert_one(self, document: Dict[str, Any]) -> str:
         """Insert one document with error handling"""
         try:
@@ -166,7 +281,7 @@ class DatabaseOperations:
                 document["_id"] = document.get("id", str(uuid.uuid4()))
 
             result = await collection.insert_one(document)
-            logger.info("Document inserted", extra={
+            logger.debug("Document inserted", extra=lambda: {
                 "collection": self.collection_name,
                 "document_id": str(result.inserted_id)
             })
@@ -178,6 +293,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("insert_one", str(e))
 
+    @traced_operation
     async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> bool:
         """Update one document with error handling"""
         try:
@@ -188,7 +304,7 @@ class DatabaseOperations:
             updated = result.modified_count > 0 or (upsert and result.upserted_id is not None)
 
             if updated:
-                logger.info("Document updated", extra={
+                logger.debug("Document updated", extra=lambda: {
                     "collection": self.collection_name,
                     "query": query,
                     "modified_count": result.modified_count
@@ -203,6 +319,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("update_one", str(e))
 
+    @traced_operation
     async def delete_one(self, query: Dict[str, Any]) -> bool:
         """Delete one document with error handling"""
         try:
@@ -213,7 +330,7 @@ class DatabaseOperations:
             deleted = result.deleted_count > 0
 
             if deleted:
-                logger.info("Document deleted", extra={
+                logger.debug("Document deleted", extra=lambda: {
                     "collection": self.collection_name,
                     "query": query
                 })
@@ -227,6 +344,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("delete_one", str(e))
 
+    @traced_operation
     async def count_documents(self, query: Dict[str, Any]) -> int:
         """Count documents with error handling"""
         try:
@@ -3,18 +3,23 @@ Background job processing system for LMS microservices
 """
 import asyncio
 import json
+import time
 import uuid
-from typing import Dict, List, Any, Optional, Callable, Awaitable
+from contextvars import ContextVar
+from typing import Dict, List, Any, Optional, Callable, Awaitable, AsyncIterator
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict, deque
 from enum import Enum
 from dataclasses import dataclass, asdict
 from shared.common.logging import get_logger
 from shared.common.cache import cache_manager
-from shared.common.monitoring import metrics_collector
+from shared.common.metrics import MetricsCollector, metrics_collector
 
 logger = get_logger("common-jobs")
 
+# Id of the job the current task is executing, for progress reporting
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
 
 class JobStatus(Enum):
     """Job status enumeration"""
@@ -95,8 +100,17 @@ class JobQueue:
         }
         self.running_jobs: Dict[str, asyncio.Task] = {}
         self.completed_jobs: deque = deque(maxlen=1000)  # Keep last 1000 completed jobs
+        self._watchers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
         self._lock = asyncio.Lock()
 
+    def _notify(self, job: Job):
+        """Push the job's new state to anyone watching it"""
+        watchers = self._watchers.get(job.id)
+        if watchers:
+            state = job.to_dict()
+            for queue in watchers:
+                queue.put_nowait(state)
+
     async def enqueue(
         self,
         name: str,
@@ -177,6 +191,7 @@ class JobQueue:
 
                 # Move to completed jobs
                 self.completed_jobs.append(job.to_dict())
+                self._notify(job)
 
                 # Remove from running jobs
                 if job_id in self.running_jobs:
@@ -209,6 +224,7 @@ class JobQueue:
                 else:
                     # Move to completed jobs
                     self.completed_jobs.append(job.to_dict())
+                    self._notify(job)
 
                 # Remove from running jobs
                 if job_id in self.running_jobs:
@@ -227,6 +243,7 @@ class JobQueue:
                 job = self.jobs[job_id]
                 job.status = JobStatus.CANCELLED
                 job.completed_at = datetime.now(timezone.utc)
+                self._notify(job)
 
                 # Cancel running task
                 if job_id in self.running_jobs:
@@ -254,6 +271,55 @@ class JobQueue:
 
         return None
 
+    async def update_progress(self, job_id: str, progress: float, metadata: Optional[Dict[str, Any]] = None):
+        """Record progress (0-100) for a job and wake its watchers"""
+        async with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.progress = progress
+            if metadata:
+                job.metadata.update(metadata)
+            self._notify(job)
+            state = job.to_dict()
+
+        await cache_manager.set(f"job:{job_id}", state, ttl=86400)
+
+    async def watch(self, job_id: str, poll_interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a job's state now and after every change until it finishes.
+
+        Jobs running in this process push updates; jobs owned by another
+        process are followed by polling the cached state.
+        """
+        terminal = {JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value}
+        updates: asyncio.Queue = asyncio.Queue()
+        self._watchers[job_id].append(updates)
+        try:
+            job = self.jobs.get(job_id)
+            state = job.to_dict() if job else await self.get_job_status(job_id)
+            last = None
+            while state is not None:
+                if state != last:
+                    yield state
+                    last = state
+                if state["status"] in terminal:
+                    return
+                if job_id in self.jobs:
+                    state = await updates.get()
+                else:
+                    await asyncio.sleep(poll_interval)
+                    state = await self.get_job_status(job_id)
+        finally:
+            self._watchers[job_id].remove(updates)
+            if not self._watchers[job_id]:
+                del self._watchers[job_id]
+
+    def collect_metrics(self, collector: MetricsCollector):
+        """Publish queue depth gauges at scrape time"""
+        for priority, queue in self.priority_queues.items():
+            collector.gauge_set("job_queue_depth", len(queue), {"priority": priority.name.lower()})
+        collector.gauge_set("jobs_running", len(self.running_jobs))
+
     async def get_queue_stats(self) -> Dict[str, Any]:
         """Get queue statistics"""
         async with self._lock:
@@ -452,11 +518,13 @@ class JobWorker:
     async def _execute_job(self, job: Job, worker_id: int):
         """Execute a job"""
         logger.info(f"Worker {worker_id} executing job: {job.name} ({job.id})")
+        start_time = time.perf_counter()
 
         # Store running job reference
         task = asyncio.current_task()
         if task:
             self.job_queue.running_jobs[job.id] = task
+        token = current_job_id.set(job.id)
 
         try:
             # Get function from registry
@@ -484,11 +552,16 @@ class JobWorker:
             error = f"Job execution failed: {str(e)}"
             await self.job_queue.fail_job(job.id, error)
 
+        finally:
+            current_job_id.reset(token)
+            metrics_collector.observe("job_duration_seconds", time.perf_counter() - start_time, {"job": job.func_name})
+
 
 # Global instances
 job_queue = JobQueue()
 job_scheduler = JobScheduler(job_queue)
 job_worker = JobWorker(job_queue, {})
+metrics_collector.register_collector(job_queue.collect_metrics)
 
 # Job registry - functions must be registered here
 job_registry = job_worker.job_registry
@@ -574,6 +647,13 @@ async def cancel_job(job_id: str):
     await job_queue.cancel_job(job_id)
 
 
+async def report_progress(progress: float, **metadata: Any):
+    """Update progress of the job the current task is running; a no-op outside a job"""
+    job_id = current_job_id.get()
+    if job_id:
+        await job_queue.update_progress(job_id, progress, metadata)
+
+
 async def get_job_stats() -> Dict[str, Any]:
     """Get job processing statistics"""
     queue_stats = await job_queue.get_queue_stats()
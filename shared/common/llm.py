@@ -0,0 +1,277 @@
+"""
+Shared async LLM client for LMS microservices
+
+Every AI route goes through one process-wide client that talks to the
+Gemini ``generateContent`` REST endpoint over a pooled httpx connection,
+so generations never block the event loop and connections are reused.
+``LLM_BASE_URL`` can point it at a local fake server for tests.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from shared.config.config import settings
+from shared.common.errors import AIError, ServiceUnavailableError
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+from shared.common.tracing import tracer, SpanKind, TracingTransport
+
+logger = get_logger("common-llm")
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class LLMResponse:
+    """Text of one generation plus how it was obtained"""
+    text: str
+    model: str
+    attempts: int = 1
+    duration_seconds: float = 0.0
+    cached: Optional[str] = None  # cache tier that served it, if any
+
+
+class LLMClient:
+    """Async generateContent client with timeouts, retries and bounded concurrency.
+
+    At most `max_concurrency` generations are in flight per process; the
+    rest wait on a semaphore. Each attempt has its own timeout. Timeouts,
+    transport errors and 408/429/5xx replies are retried with full-jitter
+    exponential backoff, honouring Retry-After, without holding a slot.
+    """
+
+    def __init__(
+        self,
+        api_key: str = "",
+        model: str = "gemini-1.5-flash",
+        base_url: str = "https://generativelanguage.googleapis.com",
+        timeout: float = 60.0,
+        max_retries: int = 2,
+        max_concurrency: int = 16,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                transport=TracingTransport(httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )))
+            )
+        return self._client
+
+    def _slots(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)], or the server's Retry-After"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _extract_text(data: Dict[str, Any]) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            reason = (data.get("promptFeedback") or {}).get("blockReason", "no candidates returned")
+            raise AIError("generate_content", f"Empty response: {reason}")
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    async def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **generation_config: Any
+    ) -> LLMResponse:
+        """Generate text for a prompt; raises AIError or ServiceUnavailableError"""
+        if not self.configured:
+            raise AIError("generate_content", "No AI key configured. Set GEMINI_API_KEY")
+
+        model = model or self.model
+        body: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        url = f"/v1beta/models/{model}:generateContent"
+        start = time.perf_counter()
+        error = "unknown"
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            self.waiting += 1
+            try:
+                await self._slots().acquire()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                with tracer.span("ai.generate_content", SpanKind.CLIENT, {"ai.model": model, "ai.attempt": attempt}):
+                    response = await self._http().post(
+                        url,
+                        headers={"x-goog-api-key": self.api_key},
+                        json=body,
+                        timeout=timeout or self.timeout
+                    )
+                if response.status_code == 200:
+                    duration = time.perf_counter() - start
+                    metrics_collector.observe("llm_request_duration_seconds", duration, {"model": model, "outcome": "success"})
+                    return LLMResponse(self._extract_text(response.json()), model, attempt + 1, duration)
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.failures += 1
+                    metrics_collector.observe("llm_request_duration_seconds", time.perf_counter() - start, {"model": model, "outcome": "error"})
+                    raise AIError("generate_content", f"HTTP {response.status_code}", {"body": response.text[:500]})
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TimeoutException:
+                error = "timeout"
+            except httpx.TransportError as e:
+                error = type(e).__name__
+            finally:
+                self.in_flight -= 1
+                self._slots().release()
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                metrics_collector.counter_inc("llm_retries_total", tags={"model": model, "reason": error})
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self.failures += 1
+        metrics_collector.observe("llm_request_duration_seconds", time.perf_counter() - start, {"model": model, "outcome": "unavailable"})
+        logger.error("LLM request failed", extra={"model": model, "error": error, "attempts": self.max_retries + 1})
+        raise ServiceUnavailableError("llm", f"AI model unavailable: {error}", {"model": model})
+
+    async def stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **generation_config: Any
+    ) -> AsyncIterator[str]:
+        """Yield text chunks as the model produces them.
+
+        Failures before the first chunk are retried like `generate`; once
+        text has been yielded a failure raises ServiceUnavailableError.
+        Closing the iterator, or cancelling its consumer, closes the
+        upstream connection, which aborts the generation.
+        """
+        if not self.configured:
+            raise AIError("generate_content", "No AI key configured. Set GEMINI_API_KEY")
+
+        model = model or self.model
+        body: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        url = f"/v1beta/models/{model}:streamGenerateContent"
+        start = time.perf_counter()
+        error = "unknown"
+        started = False
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            self.waiting += 1
+            try:
+                await self._slots().acquire()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                async with self._http().stream(
+                    "POST", url,
+                    params={"alt": "sse"},
+                    headers={"x-goog-api-key": self.api_key},
+                    json=body,
+                    timeout=timeout or self.timeout
+                ) as response:
+                    if response.status_code == 200:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            candidates = json.loads(line[5:]).get("candidates") or [{}]
+                            parts = (candidates[0].get("content") or {}).get("parts") or []
+                            text = "".join(part.get("text", "") for part in parts)
+                            if text:
+                                if not started:
+                                    started = True
+                                    metrics_collector.observe("llm_stream_first_chunk_seconds", time.perf_counter() - start, {"model": model})
+                                yield text
+                        metrics_collector.observe("llm_request_duration_seconds", time.perf_counter() - start, {"model": model, "outcome": "success"})
+                        return
+                    await response.aread()
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self.failures += 1
+                        raise AIError("generate_content", f"HTTP {response.status_code}", {"body": response.text[:500]})
+                    error = f"HTTP {response.status_code}"
+                    retry_after = response.headers.get("Retry-After")
+            except httpx.TimeoutException:
+                error = "timeout"
+            except httpx.TransportError as e:
+                error = type(e).__name__
+            finally:
+                self.in_flight -= 1
+                self._slots().release()
+
+            if started:
+                break
+            if attempt < self.max_retries:
+                self.retries += 1
+                metrics_collector.counter_inc("llm_retries_total", tags={"model": model, "reason": error})
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self.failures += 1
+        metrics_collector.observe("llm_request_duration_seconds", time.perf_counter() - start, {"model": model, "outcome": "unavailable"})
+        logger.error("LLM stream failed", extra={"model": model, "error": error, "started": started})
+        raise ServiceUnavailableError("llm", f"AI model unavailable: {error}", {"model": model})
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def collect_metrics(self, collector: MetricsCollector):
+        collector.gauge_set("llm_requests_in_flight", self.in_flight)
+        collector.gauge_set("llm_requests_waiting", self.waiting)
+        collector.gauge_set("llm_max_concurrency", self.max_concurrency)
+
+
+llm_client = LLMClient(
+    api_key=settings.gemini_api_key,
+    model=settings.default_llm_model,
+    base_url=settings.llm_base_url,
+    timeout=settings.llm_timeout_seconds,
+    max_retries=settings.llm_max_retries,
+    max_concurrency=settings.llm_max_concurrency
+)
+metrics_collector.register_collector(llm_client.collect_metrics)
@@ -0,0 +1,528 @@
+"""
+Response cache for LLM generations
+
+Generations are keyed by model, template id and canonical parameters
+rather than by the raw request, so volatile fields (user ids, timestamps)
+and whitespace noise don't defeat the cache. Lookups go through a small
+in-process LRU, then Redis, then an optional Mongo collection whose
+entries expire through a TTL index. An optional similarity tier reuses
+the answer cached for a near-duplicate free-text parameter.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared.config.config import settings
+from shared.common.cache import cache_manager
+from shared.common.llm import LLMClient, LLMResponse, llm_client
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+logger = get_logger("common-llm-cache")
+
+KEY_PREFIX = "llm:cache:"
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def canonicalize(value: Any) -> Any:
+    """Normalize parameters so equivalent requests serialize identically"""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", value)).strip()
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0])) if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if hasattr(value, "value"):  # enums
+        return canonicalize(value.value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _digest(payload: Any, size: int = 40) -> str:
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:size]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+@dataclass
+class CacheKey:
+    """Normalized identity of a generation"""
+    template: str
+    model: str
+    key: str
+    namespace: str = ""
+    text: Optional[str] = None  # free-text parameter compared by the similarity tier
+
+
+def make_key(template: str, params: Dict[str, Any], model: str = "", semantic_field: Optional[str] = None) -> CacheKey:
+    """Build a cache key from model, template id and canonical parameters.
+
+    With `semantic_field`, the remaining parameters also form a namespace
+    inside which that field's text can be matched by similarity.
+    """
+    canonical = canonicalize(params)
+    key = f"{KEY_PREFIX}{template}:{_digest({'model': model, 'template': template, 'params': canonical})}"
+    text = canonical.get(semantic_field) if semantic_field else None
+    if not isinstance(text, str) or not text:
+        return CacheKey(template, model, key)
+    rest = {k: v for k, v in canonical.items() if k != semantic_field}
+    namespace = _digest({"model": model, "template": template, "params": rest}, 24)
+    return CacheKey(template, model, key, namespace, text)
+
+
+def hashed_embedding(text: str, dim: int = 256) -> np.ndarray:
+    """Unit vector of hashed word unigrams and bigrams; no model download needed"""
+    words = _WORD.findall(text.lower())
+    tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = np.zeros(dim, dtype=np.float32)
+    if tokens:
+        np.add.at(vector, [zlib.crc32(token.encode()) % dim for token in tokens], 1.0)
+        vector /= np.linalg.norm(vector)
+    return vector
+
+
+class _VectorSpace:
+    """Ring buffer of vectors and the cache keys they belong to"""
+
+    def __init__(self, dim: int, capacity: int):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(64, capacity), dim), dtype=np.float32)
+        self.keys: List[str] = []
+        self.next = 0
+
+    def add(self, key: str, vector: np.ndarray):
+        if len(self.keys) < self.capacity:
+            if len(self.keys) == self.vectors.shape[0]:
+                grown = np.zeros((min(self.capacity, 2 * len(self.keys)), self.vectors.shape[1]), dtype=np.float32)
+                grown[:len(self.keys)] = self.vectors
+                self.vectors = grown
+            self.vectors[len(self.keys)] = vector
+            self.keys.append(key)
+            return
+        self.vectors[self.next] = vector
+        self.keys[self.next] = key
+        self.next = (self.next + 1) % self.capacity
+
+
+class SemanticIndex:
+    """Cosine-similarity lookup of cached texts, one vector space per namespace.
+
+    A namespace holds generations whose other parameters are identical, so
+    only the free text is compared. Embeddings are computed locally by
+    `embed`; spaces are capped at `max_entries` vectors and `max_namespaces`
+    spaces, oldest first.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 2000,
+        max_namespaces: int = 1000,
+        embed: Callable[[str], np.ndarray] = hashed_embedding
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+        self.embed = embed
+        self._spaces: "OrderedDict[str, _VectorSpace]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(len(space.keys) for space in self._spaces.values())
+
+    def add(self, namespace: str, text: str, key: str):
+        vector = self.embed(text)
+        space = self._spaces.get(namespace)
+        if space is None:
+            space = self._spaces[namespace] = _VectorSpace(vector.shape[0], self.max_entries)
+            if len(self._spaces) > self.max_namespaces:
+                self._spaces.popitem(last=False)
+        self._spaces.move_to_end(namespace)
+        space.add(key, vector)
+
+    def search(self, namespace: str, text: str) -> Optional[Tuple[str, float]]:
+        """Closest cached key at or above the threshold, with its similarity"""
+        space = self._spaces.get(namespace)
+        if space is None or not space.keys:
+            return None
+        scores = space.vectors[:len(space.keys)] @ self.embed(text)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return space.keys[best], float(scores[best])
+
+
+class LLMCache:
+    """Tiered cache of LLM generations with TTLs and size caps.
+
+    The local tier is an LRU of `local_entries`; Redis entries carry the
+    entry TTL and are subject to the server's eviction policy; the Mongo
+    tier (attached with `attach`) expires through a TTL index on
+    `expires_at` and is trimmed to `max_documents` by least recent use.
+    Concurrent misses for one key share a single generation.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 86400,
+        local_entries: int = 1000,
+        max_documents: int = 100000,
+        semantic: Optional[SemanticIndex] = None,
+        enabled: bool = True,
+        redis_client: Any = None,
+        prune_every: int = 500,
+        llm: Optional[LLMClient] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.local_entries = local_entries
+        self.max_documents = max_documents
+        self.semantic = semantic
+        self.enabled = enabled
+        self.redis_client = redis_client
+        self.prune_every = prune_every
+        self.llm = llm  # client for misses; the shared llm_client when unset
+        self.collection: Any = None
+        self._local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes_since_prune = 0
+        self.hits: Dict[str, int] = {"local": 0, "redis": 0, "mongo": 0, "semantic": 0, "inflight": 0}
+        self.misses = 0
+        self.saved_tokens = 0
+
+    async def _redis(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    async def attach(self, collection: Any):
+        """Use a Mongo collection as the durable tier and ensure its indexes"""
+        self.collection = collection
+        try:
+            await collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+            await collection.create_index("last_hit_at")
+        except Exception as e:
+            logger.warning("LLM cache indexes not created", extra={"error": str(e)})
+
+    # Tiers
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] <= time.time():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _local_set(self, key: str, entry: Dict[str, Any]):
+        self._local[key] = entry
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_entries:
+            self._local.popitem(last=False)
+
+    async def _fetch(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Entry for a key and the tier that served it"""
+        entry = self._local_get(key)
+        if entry is not None:
+            return entry, "local"
+
+        client = await self._redis()
+        if client is not None:
+            try:
+                raw = await client.get(key)
+                if raw is not None:
+                    data = json.loads(raw)
+                    ttl = await client.ttl(key)
+                    entry = {"value": data["value"], "tokens": data.get("tokens", 0), "expires": time.time() + max(ttl, 1)}
+                    self._local_set(key, entry)
+                    return entry, "redis"
+            except Exception as e:
+                logger.warning("LLM cache Redis read failed", extra={"key": key, "error": str(e)})
+
+        if self.collection is not None:
+            now = datetime.now(timezone.utc)
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {"_id": key, "expires_at": {"$gt": now}},
+                    {"$set": {"last_hit_at": now}, "$inc": {"hits": 1}},
+                    projection={"value": 1, "tokens": 1, "expires_at": 1}
+                )
+            except Exception as e:
+                logger.warning("LLM cache Mongo read failed", extra={"key": key, "error": str(e)})
+                doc = None
+            if doc is not None:
+                expires_at = doc["expires_at"]
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                remaining = max(1, int((expires_at - now).total_seconds()))
+                entry = {"value": doc["value"], "tokens": doc.get("tokens", 0), "expires": time.time() + remaining}
+                self._local_set(key, entry)
+                await self._redis_set(key, entry, remaining)
+                return entry, "mongo"
+        return None
+
+    async def _redis_set(self, key: str, entry: Dict[str, Any], ttl: int):
+        client = await self._redis()
+        if client is None:
+            return
+        try:
+            await client.set(key, json.dumps({"value": entry["value"], "tokens": entry["tokens"]}, default=str), ex=ttl)
+        except Exception as e:
+            logger.warning("LLM cache Redis write failed", extra={"key": key, "error": str(e)})
+
+    async def _mongo_set(self, key: CacheKey, entry: Dict[str, Any], ttl: int):
+        if self.collection is None:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.replace_one({"_id": key.key}, {
+                "content_hash": key.key,
+                "template": key.template,
+                "model": key.model,
+                "value": entry["value"],
+                "tokens": entry["tokens"],
+                "hits": 0,
+                "created_at": now,
+                "last_hit_at": now,
+                "expires_at": now + timedelta(seconds=ttl)
+            }, upsert=True)
+        except Exception as e:
+            logger.warning("LLM cache Mongo write failed", extra={"key": key.key, "error": str(e)})
+            return
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= self.prune_every:
+            self._writes_since_prune = 0
+            await self.prune()
+
+    async def prune(self) -> int:
+        """Delete the least recently used Mongo entries above `max_documents`"""
+        if self.collection is None:
+            return 0
+        try:
+            excess = await self.collection.estimated_document_count() - self.max_documents
+            if excess <= 0:
+                return 0
+            cursor = self.collection.find({}, {"_id": 1}).sort("last_hit_at", 1).limit(excess)
+            ids = [doc["_id"] async for doc in cursor]
+            result = await self.collection.delete_many({"_id": {"$in": ids}})
+            logger.info("LLM cache pruned", extra={"deleted": result.deleted_count})
+            return result.deleted_count
+        except Exception as e:
+            logger.warning("LLM cache prune failed", extra={"error": str(e)})
+            return 0
+
+    # Public API
+    def _record_hit(self, key: CacheKey, tier: str, tokens: int):
+        self.hits[tier] += 1
+        self.saved_tokens += tokens
+        metrics_collector.counter_inc("llm_cache_requests_total", tags={"template": key.template, "result": "hit", "tier": tier})
+        metrics_collector.counter_inc("llm_cache_saved_tokens_total", tokens, {"template": key.template})
+
+    async def lookup(self, key: CacheKey) -> Optional[Tuple[Any, str]]:
+        """Cached value for a key, trying a similar text when the exact key misses"""
+        found = await self._fetch(key.key)
+        if found is None and self.semantic is not None and key.text:
+            match = self.semantic.search(key.namespace, key.text)
+            if match is not None:
+                similar = await self._fetch(match[0])
+                if similar is not None:
+                    found = similar[0], "semantic"
+        if found is None:
+            return None
+        entry, tier = found
+        self._record_hit(key, tier, entry["tokens"])
+        return entry["value"], tier
+
+    async def store(self, key: CacheKey, value: Any, tokens: int = 0, ttl: Optional[int] = None):
+        """Write a value to every tier"""
+        ttl = ttl or self.ttl_seconds
+        entry = {"value": value, "tokens": tokens, "expires": time.time() + ttl}
+        self._local_set(key.key, entry)
+        await self._redis_set(key.key, entry, ttl)
+        await self._mongo_set(key, entry, ttl)
+        if self.semantic is not None and key.text:
+            self.semantic.add(key.namespace, key.text, key.key)
+
+    async def get_or_compute(
+        self,
+        key: CacheKey,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        weigh: Optional[Callable[[Any], int]] = None
+    ) -> Tuple[Any, Optional[str]]:
+        """Cached value and its tier, or a freshly computed value and None.
+
+        `weigh` gives the tokens a cached value saves on each later hit.
+        """
+        if not self.enabled:
+            return await compute(), None
+
+        found = await self.lookup(key)
+        if found is not None:
+            return found
+
+        pending = self._inflight.get(key.key)
+        if pending is not None:
+            value = await asyncio.shield(pending)
+            self._record_hit(key, "inflight", weigh(value) if weigh else 0)
+            return value, "inflight"
+
+        self.misses += 1
+        metrics_collector.counter_inc("llm_cache_requests_total", tags={"template": key.template, "result": "miss", "tier": "none"})
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key.key] = future
+        try:
+            value = await compute()
+            await self.store(key, value, weigh(value) if weigh else 0, ttl)
+            future.set_result(value)
+            return value, None
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            self._inflight.pop(key.key, None)
+
+    async def generate(
+        self,
+        template: str,
+        prompt: str,
+        params: Dict[str, Any],
+        llm: Optional[LLMClient] = None,
+        model: Optional[str] = None,
+        ttl: Optional[int] = None,
+        semantic_field: Optional[str] = None,
+        **generation_config: Any
+    ) -> LLMResponse:
+        """Generate through the cache.
+
+        `params` must contain everything the prompt is built from; the
+        prompt text itself is not part of the key.
+        """
+        llm = llm or self.llm or llm_client
+        model = model or llm.model
+        key = make_key(template, {**params, "generation_config": generation_config}, model, semantic_field)
+        fresh: List[LLMResponse] = []
+
+        async def compute() -> Dict[str, Any]:
+            response = await llm.generate(prompt, model=model, **generation_config)
+            fresh.append(response)
+            return {"text": response.text, "model": response.model}
+
+        value, tier = await self.get_or_compute(
+            key, compute, ttl,
+            weigh=lambda v: estimate_tokens(prompt) + estimate_tokens(v["text"])
+        )
+        if fresh:
+            return fresh[0]
+        return LLMResponse(value["text"], value["model"], attempts=0, cached=tier)
+
+    async def stream(
+        self,
+        template: str,
+        prompt: str,
+        params: Dict[str, Any],
+        llm: Optional[LLMClient] = None,
+        model: Optional[str] = None,
+        ttl: Optional[int] = None,
+        semantic_field: Optional[str] = None,
+        **generation_config: Any
+    ) -> AsyncIterator[str]:
+        """Stream a generation through the cache.
+
+        A hit is yielded as a single chunk; a miss is streamed from the
+        model and stored only if the stream runs to completion.
+        """
+        llm = llm or self.llm or llm_client
+        model = model or llm.model
+        key = make_key(template, {**params, "generation_config": generation_config}, model, semantic_field)
+        if self.enabled:
+            found = await self.lookup(key)
+            if found is not None:
+                yield found[0]["text"]
+                return
+            self.misses += 1
+            metrics_collector.counter_inc("llm_cache_requests_total", tags={"template": key.template, "result": "miss", "tier": "none"})
+
+        chunks: List[str] = []
+        async for chunk in llm.stream(prompt, model=model, **generation_config):
+            chunks.append(chunk)
+            yield chunk
+        if self.enabled:
+            text = "".join(chunks)
+            await self.store(key, {"text": text, "model": model}, estimate_tokens(prompt) + estimate_tokens(text), ttl)
+
+    async def invalidate(self, template: str) -> int:
+        """Drop every entry of a template, e.g. after its prompt changes"""
+        prefix = f"{KEY_PREFIX}{template}:"
+        for key in [k for k in self._local if k.startswith(prefix)]:
+            del self._local[key]
+        deleted = 0
+        client = await self._redis()
+        if client is not None:
+            try:
+                keys = [key async for key in client.scan_iter(match=f"{prefix}*", count=1000)]
+                if keys:
+                    deleted = await client.delete(*keys)
+            except Exception as e:
+                logger.warning("LLM cache Redis invalidation failed", extra={"template": template, "error": str(e)})
+        if self.collection is not None:
+            try:
+                result = await self.collection.delete_many({"template": template})
+                deleted = max(deleted, result.deleted_count)
+            except Exception as e:
+                logger.warning("LLM cache invalidation failed", extra={"template": template, "error": str(e)})
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "saved_tokens": self.saved_tokens,
+            "local_entries": len(self._local),
+            "semantic_entries": len(self.semantic) if self.semantic is not None else 0
+        }
+
+    def collect_metrics(self, collector: MetricsCollector):
+        stats = self.stats()
+        collector.gauge_set("llm_cache_hit_ratio", stats["hit_ratio"])
+        collector.gauge_set("llm_cache_local_entries", stats["local_entries"])
+        collector.gauge_set("llm_cache_semantic_entries", stats["semantic_entries"])
+
+
+llm_cache = LLMCache(
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+    local_entries=settings.llm_cache_local_entries,
+    max_documents=settings.llm_cache_max_documents,
+    semantic=SemanticIndex(
+        threshold=settings.llm_semantic_cache_threshold,
+        max_entries=settings.llm_semantic_cache_entries
+    ) if settings.llm_semantic_cache_enabled else None,
+    enabled=settings.llm_cache_enabled
+)
+metrics_collector.register_collector(llm_cache.collect_metrics)
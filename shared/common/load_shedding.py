@@ -0,0 +1,153 @@
+"""
+Adaptive load shedding for LMS microservices
+"""
+import math
+import time
+from collections import defaultdict
+from enum import Enum
+from typing import Dict, Any, List, Optional, Tuple
+
+from shared.common.logging import get_logger
+
+logger = get_logger("common-load-shedding")
+
+
+class RequestPriority(Enum):
+    """Request priority classes used when shedding load"""
+    LOW = 1
+    NORMAL = 2
+    CRITICAL = 3
+
+
+# Route prefixes (without the /api prefix) and their priority class.
+# Anything not listed is NORMAL.
+DEFAULT_PRIORITY_ROUTES: Dict[str, RequestPriority] = {
+    "/health": RequestPriority.CRITICAL,
+    "/metrics": RequestPriority.CRITICAL,
+    "/auth": RequestPriority.CRITICAL,
+    "/courses/ai": RequestPriority.LOW,
+    "/ai": RequestPriority.LOW,
+    "/analytics": RequestPriority.LOW,
+}
+
+# Per-priority shedding policy:
+# (share of max_in_flight the class may occupy, latency multiple of the target past which it is shed).
+# CRITICAL traffic is never shed on latency, only at the hard in-flight cap.
+SHED_POLICY: Dict[RequestPriority, Tuple[float, Optional[float]]] = {
+    RequestPriority.LOW: (0.5, 1.0),
+    RequestPriority.NORMAL: (0.8, 2.0),
+    RequestPriority.CRITICAL: (1.0, None),
+}
+
+# Class whose latency gates admission. LOW routes wait on LLM calls and are
+# slow by design, so only NORMAL latency shows that upstreams are saturated.
+LATENCY_SIGNAL = RequestPriority.NORMAL
+
+
+class LoadShedder:
+    """In-flight and latency based admission control.
+
+    Tracks the number of requests currently being served and an EWMA of
+    latency per priority class. Lower priority classes are rejected first as
+    the in-flight count or the LATENCY_SIGNAL class's latency rises, which
+    keeps queueing (and therefore tail latency) bounded under overload.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 512,
+        latency_target: float = 1.0,
+        ewma_alpha: float = 0.2,
+        stale_after: float = 2.0,
+        priority_routes: Optional[Dict[str, RequestPriority]] = None
+    ):
+        self.max_in_flight = max_in_flight
+        self.latency_target = latency_target
+        self.ewma_alpha = ewma_alpha
+        self.stale_after = stale_after
+        self.in_flight = 0
+        self.latency_ewma: Dict[RequestPriority, float] = defaultdict(float)
+        self._last_sample: Dict[RequestPriority, float] = defaultdict(float)
+        self.admitted: Dict[RequestPriority, int] = defaultdict(int)
+        self.shed: Dict[RequestPriority, int] = defaultdict(int)
+
+        # Longest prefix first so "/courses/ai" wins over "/courses"
+        routes = priority_routes if priority_routes is not None else DEFAULT_PRIORITY_ROUTES
+        self._routes: List[Tuple[str, RequestPriority]] = sorted(
+            routes.items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self._limits = {
+            priority: max(1, int(max_in_flight * share))
+            for priority, (share, _) in SHED_POLICY.items()
+        }
+
+    def classify(self, path: str) -> RequestPriority:
+        """Get the priority class for a request path"""
+        if path.startswith("/api/"):
+            path = path[4:]
+
+        for prefix, priority in self._routes:
+            if path.startswith(prefix) and (len(path) == len(prefix) or path[len(prefix)] == "/"):
+                return priority
+
+        return RequestPriority.NORMAL
+
+    def try_acquire(self, priority: RequestPriority) -> Tuple[bool, int]:
+        """Admit or reject a request; returns (admitted, retry_after_seconds)"""
+        reason = None
+
+        if self.in_flight >= self._limits[priority]:
+            reason = "in_flight"
+        else:
+            latency_multiple = SHED_POLICY[priority][1]
+            if (
+                latency_multiple is not None
+                and self.latency_ewma[LATENCY_SIGNAL] > self.latency_target * latency_multiple
+                and time.monotonic() - self._last_sample[LATENCY_SIGNAL] < self.stale_after
+            ):
+                reason = "latency"
+
+        if reason:
+            self.shed[priority] += 1
+            if self.shed[priority] % 1000 == 1:
+                logger.warning("Shedding load", extra={
+                    "priority": priority.name,
+                    "reason": reason,
+                    "in_flight": self.in_flight,
+                    "latency_ewma": round(self.latency_ewma[LATENCY_SIGNAL], 3),
+                    "shed_total": self.shed[priority]
+                })
+            return False, self.retry_after()
+
+        self.in_flight += 1
+        self.admitted[priority] += 1
+        return True, 0
+
+    def release(self, priority: RequestPriority, duration: Optional[float] = None):
+        """Mark an admitted request as finished and record its latency in its class.
+
+        `duration` is None for requests whose latency says nothing about load,
+        such as event streams that stay open while a model generates.
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if duration is None:
+            return
+        ewma = self.latency_ewma[priority]
+        self.latency_ewma[priority] = duration if ewma == 0.0 else ewma + self.ewma_alpha * (duration - ewma)
+        self._last_sample[priority] = time.monotonic()
+
+    def retry_after(self) -> int:
+        """Suggested client back-off in whole seconds"""
+        return max(1, math.ceil(max(self.latency_ewma[LATENCY_SIGNAL], self.latency_target)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get admission statistics"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "latency_ewma": {priority.name: round(ewma, 4) for priority, ewma in self.latency_ewma.items()},
+            "latency_target": self.latency_target,
+            "limits": {priority.name: limit for priority, limit in self._limits.items()},
+            "admitted": {priority.name: count for priority, count in self.admitted.items()},
+            "shed": {priority.name: count for priority, count in self.shed.items()}
+        }
@@ -1,21 +1,100 @@
 """
 Structured logging utilities for LMS microservices
 """
+import atexit
 import logging
 import json
+import queue
+import random
 import sys
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Callable, Optional, Tuple, Union
 import uuid
 
 from shared.config.config import settings
+from shared.common.tracing import current_span
+
+# `extra` may be a dict or a zero-argument callable returning one; callables
+# are only evaluated when the line is actually going to be emitted.
+Extra = Union[Dict[str, Any], Callable[[], Dict[str, Any]], None]
+
+
+def _parse_sampling(spec: str) -> Dict[str, Dict[int, float]]:
+    """Parse LOG_SAMPLING ("logger:level=rate,...") into {logger: {levelno: rate}}"""
+    rates: Dict[str, Dict[int, float]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            target, rate = item.split("=")
+            name, level = target.rsplit(":", 1)
+            rates.setdefault(name, {})[logging.getLevelName(level.upper())] = float(rate)
+        except ValueError:
+            continue
+    return rates
+
+
+_SAMPLING = _parse_sampling(settings.log_sampling)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped when the queue is full.
+
+    Records are enqueued as-is; formatting happens on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue: "queue.Queue" = queue.Queue(maxsize=settings.log_queue_size)
+_queue_handler = DroppingQueueHandler(_queue)
+_stream_handler = logging.StreamHandler(sys.stdout)
+_listener: Optional[QueueListener] = None
+
+
+def _start_listener():
+    """Start the process-wide log writer thread"""
+    global _listener
+    if _listener is None:
+        _listener = QueueListener(_queue, _stream_handler, respect_handler_level=False)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued log records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 class StructuredLogger:
-    """Structured logger with correlation IDs and service context"""
+    """Structured logger with correlation IDs and service context.
+
+    The level check runs before anything is built. Lines can then be sampled
+    per level and identical messages are rate limited per window; the number
+    of suppressed repeats is reported on the next line that gets through.
+    """
 
     def __init__(self, service_name: str):
         self.service_name = service_name
         self.logger = logging.getLogger(service_name)
+        self.sample_rates: Dict[int, float] = dict(_SAMPLING.get(service_name, {}))
+        self.rate_limit = settings.log_rate_limit
+        self.rate_window = settings.log_rate_window_seconds
+        self._windows: Dict[Tuple[int, str], list] = {}
         self._setup_logger()
 
     def _setup_logger(self):
@@ -25,53 +104,96 @@ class StructuredLogger:
             self.logger.removeHandler(handler)
 
         # Set log level
-        log_level = getattr(logging, settings.environment.upper() if hasattr(settings, 'environment') else 'INFO', logging.INFO)
+        log_level = getattr(logging, settings.log_level.upper(), logging.INFO)
         self.logger.setLevel(log_level)
 
-        # Create console handler
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(log_level)
-
-        # Create structured formatter
         formatter = StructuredFormatter(service_name=self.service_name)
-        handler.setFormatter(formatter)
+        if settings.log_async:
+            # One shared queue and writer thread; the event loop only enqueues
+            _stream_handler.setFormatter(formatter)
+            self.logger.addHandler(_queue_handler)
+            _start_listener()
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
 
-        self.logger.addHandler(handler)
         self.logger.propagate = False
 
-    def _log(self, level: str, message: str, extra: Optional[Dict[str, Any]] = None, correlation_id: Optional[str] = None):
+    def set_sampling(self, level: str, rate: float):
+        """Emit only `rate` (0..1) of this logger's lines at `level`"""
+        self.sample_rates[logging.getLevelName(level.upper())] = rate
+
+    def _allow(self, levelno: int, message: str) -> Tuple[bool, int]:
+        """Apply sampling and repeat rate limiting; returns (emit, suppressed_count)"""
+        rate = self.sample_rates.get(levelno)
+        if rate is not None and random.random() >= rate:
+            return False, 0
+
+        if not self.rate_limit:
+            return True, 0
+
+        now = time.monotonic()
+        key = (levelno, message)
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.rate_window:
+            if len(self._windows) > 10000:
+                self._windows.clear()
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            return True, suppressed
+
+        if window[1] >= self.rate_limit:
+            window[2] += 1
+            return False, 0
+
+        window[1] += 1
+        return True, 0
+
+    def _log(self, levelno: int, message: str, extra: Extra = None, correlation_id: Optional[str] = None):
         """Internal logging method"""
-        log_data = {
-            "message": message,
-            "correlation_id": correlation_id or str(uuid.uuid4()),
-            "timestamp": datetime.utcnow().isoformat(),
-            "service": self.service_name,
-        }
+        if not self.logger.isEnabledFor(levelno):
+            return
+
+        emit, suppressed = self._allow(levelno, message)
+        if not emit:
+            return
+
+        log_data = {"message": message, "service": self.service_name}
+
+        span = current_span()
+        if correlation_id or span is not None:
+            log_data["correlation_id"] = correlation_id or span.trace_id
+        if span is not None:
+            log_data["trace_id"] = span.trace_id
+            log_data["span_id"] = span.span_id
+        if suppressed:
+            log_data["suppressed_repeats"] = suppressed
 
         if extra:
-            log_data.update(extra)
+            log_data.update(extra() if callable(extra) else extra)
 
-        getattr(self.logger, level)(message, extra={"structured_data": log_data})
+        self.logger.log(levelno, message, extra={"structured_data": log_data})
 
-    def info(self, message: str, extra: Optional[Dict[str, Any]] = None, correlation_id: Optional[str] = None):
+    def info(self, message: str, extra: Extra = None, correlation_id: Optional[str] = None):
         """Log info message"""
-        self._log("info", message, extra, correlation_id)
+        self._log(logging.INFO, message, extra, correlation_id)
 
-    def error(self, message: str, extra: Optional[Dict[str, Any]] = None, correlation_id: Optional[str] = None):
+    def error(self, message: str, extra: Extra = None, correlation_id: Optional[str] = None):
         """Log error message"""
-        self._log("error", message, extra, correlation_id)
+        self._log(logging.ERROR, message, extra, correlation_id)
 
-    def warning(self, message: str, extra: Optional[Dict[str, Any]] = None, correlation_id: Optional[str] = None):
+    def warning(self, message: str, extra: Extra = None, correlation_id: Optional[str] = None):
         """Log warning message"""
-        self._log("warning", message, extra, correlation_id)
+        self._log(logging.WARNING, message, extra, correlation_id)
 
-    def debug(self, message: str, extra: Optional[Dict[str, Any]] = None, correlation_id: Optional[str] = None):
+    def debug(self, message: str, extra: Extra = None, correlation_id: Optional[str] = None):
         """Log debug message"""
-        self._log("debug", message, extra, correlation_id)
+        self._log(logging.DEBUG, message, extra, correlation_id)
 
-    def critical(self, message: str, extra: Optional[Dict[str, Any]] = None, correlation_id: Optional[str] = None):
+    def critical(self, message: str, extra: Extra = None, correlation_id: Optional[str] = None):
         """Log critical message"""
-        self._log("critical", message, extra, correlation_id)
+        self._log(logging.CRITICAL, message, extra, correlation_id)
 
 class StructuredFormatter(logging.Formatter):
     """Custom formatter for structured logging"""
@@ -83,7 +205,9 @@ class StructuredFormatter(logging.Formatter):
     def format(self, record):
         """Format log record as JSON"""
         if hasattr(record, 'structured_data'):
-            return json.dumps(record.structured_data, default=str)
+            data = record.structured_data
+            data["timestamp"] = datetime.utcfromtimestamp(record.created).isoformat()
+            return json.dumps(data, default=str)
         else:
             # Fallback for non-structured logs
             return super().format(record)
@@ -109,8 +233,9 @@ class CorrelationIdMiddleware:
             await self.app(scope, receive, send)
             return
 
-        # Generate correlation ID
-        correlation_id = str(uuid.uuid4())
+        # Reuse the trace id when the request is traced so logs and spans line up
+        span = current_span()
+        correlation_id = span.trace_id if span else str(uuid.uuid4())
 
         # Add to scope for later retrieval
         scope["correlation_id"] = correlation_id
@@ -130,4 +255,4 @@ class CorrelationIdMiddleware:
 # Helper function to get correlation ID from FastAPI request
 def get_correlation_id(request) -> str:
     """Extract correlation ID from request"""
-    return getattr(request.state, 'correlation_id', str(uuid.uuid4()))
\ No newline at end of file
+    return getattr(request.state, 'correlation_id', str(uuid.uuid4()))
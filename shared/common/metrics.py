@@ -0,0 +1,518 @@
+"""
+Metrics primitives and Prometheus exposition for LMS microservices
+"""
+import fcntl
+import json
+import os
+import re
+import tempfile
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+from math import frexp, ldexp
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+# Default latency buckets (seconds) used when exposing histograms
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Starlette appends the charset for text/* media types
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+class Histogram:
+    """Log-linear bucketed histogram (HDR style) with bounded memory.
+
+    Values are mapped to buckets by binary exponent and a fixed number of
+    linear sub-buckets per exponent, so recording is O(1), memory is bounded
+    by the value range rather than the sample count, quantiles carry a
+    relative error below 1/SUB_BUCKETS, and histograms merge by adding counts.
+    """
+
+    SUB_BUCKETS = 64
+
+    __slots__ = ("buckets", "count", "total", "min", "max", "zero_count")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.zero_count = 0
+
+    def record(self, value: float):
+        """Record a value"""
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value <= 0:
+            self.zero_count += 1
+            return
+
+        # Inlined bucket index for SUB_BUCKETS = 64: mantissa is in [0.5, 1)
+        mantissa, exponent = frexp(value)
+        index = exponent * 64 + int((mantissa - 0.5) * 128)
+        buckets = self.buckets
+        buckets[index] = buckets.get(index, 0) + 1
+
+    def merge(self, other: "Histogram"):
+        """Merge another histogram into this one"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def bucket_bounds(cls, index: int) -> Tuple[float, float]:
+        """Get the (lower, upper) value bounds of a bucket"""
+        exponent, sub_bucket = divmod(index, cls.SUB_BUCKETS)
+        width = 2 * cls.SUB_BUCKETS
+        return (
+            ldexp(0.5 + sub_bucket / width, exponent),
+            ldexp(0.5 + (sub_bucket + 1) / width, exponent)
+        )
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-th quantile (0 <= q <= 1)"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(0.0, self.min)
+
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                lower, upper = self.bucket_bounds(index)
+                return min(max((lower + upper) / 2, self.min), self.max)
+
+        return self.max
+
+    def cumulative_counts(self, bounds: Tuple[float, ...]) -> List[int]:
+        """Get cumulative counts at each upper bound (Prometheus `le` semantics).
+
+        Each log-linear bucket is attributed to the first bound at or above its
+        midpoint, so counts are exact to within one sub-bucket of the bound.
+        """
+        counts = [0] * len(bounds)
+        if bounds:
+            counts[0] = self.zero_count
+        for index, count in self.buckets.items():
+            lower, upper = self.bucket_bounds(index)
+            position = bisect_left(bounds, (lower + upper) / 2)
+            if position < len(bounds):
+                counts[position] += count
+
+        running = 0
+        for position, count in enumerate(counts):
+            running += count
+            counts[position] = running
+        return counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the histogram state"""
+        return {
+            "buckets": dict(self.buckets),
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max,
+            "zero_count": self.zero_count
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        """Rebuild a histogram from `to_dict` output"""
+        histogram = cls()
+        histogram.buckets = {int(index): count for index, count in data["buckets"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"] if data["min"] is not None else float("inf")
+        histogram.max = data["max"]
+        histogram.zero_count = data["zero_count"]
+        return histogram
+
+    def summary(self) -> Dict[str, float]:
+        """Get count, min, max, avg and common percentiles"""
+        if self.count == 0:
+            return {"count": 0, "min": 0, "max": 0, "avg": 0, "p50": 0, "p95": 0, "p99": 0}
+
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.total / self.count,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class MetricsCollector:
+    """Advanced metrics collector.
+
+    Services run one event loop per process, so updates are plain dict and
+    attribute writes with no locking. Label sets are interned once into a
+    series key; hot paths can hold on to a Histogram handle and skip the
+    lookup entirely. The number of distinct series is capped so unbounded
+    label values (raw paths, ids) cannot grow memory without limit.
+    """
+
+    OVERFLOW_LABELS: Tuple[Tuple[str, str], ...] = (("overflow", "true"),)
+
+    def __init__(self, max_series: int = 10000):
+        self.max_series = max_series
+        self.counters: Dict[str, float] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.series: Dict[str, Tuple[str, Tuple[Tuple[str, str], ...]]] = {}
+        self._keys: Dict[Tuple[str, Tuple], str] = {}
+        self.collectors: List[Callable[["MetricsCollector"], None]] = []
+        self._instance: Optional[Tuple[int, str]] = None
+
+    @property
+    def instance(self) -> str:
+        """Identifies this process's snapshots: the pid plus when it first reported,
+        so a reused pid (or a forked worker) never writes over another process's file"""
+        pid = os.getpid()
+        if self._instance is None or self._instance[0] != pid:
+            self._instance = (pid, f"{pid}-{time.time_ns()}")
+        return self._instance[1]
+
+    def series_key(self, name: str, tags: Optional[Dict[str, Any]] = None) -> str:
+        """Get the interned series key for a metric name and label set"""
+        if not tags:
+            return name
+
+        labels = tuple(sorted(tags.items()))
+        key = self._keys.get((name, labels))
+        if key is None:
+            key = self._intern(name, labels)
+        return key
+
+    def _intern(self, name: str, labels: Tuple) -> str:
+        """Create and remember the series key for a new label set"""
+        if len(self._keys) >= self.max_series:
+            labels = self.OVERFLOW_LABELS
+            key = self._make_key(name, dict(labels))
+            self.series.setdefault(key, (name, labels))
+            return key
+
+        str_labels = tuple((str(k), str(v)) for k, v in labels)
+        key = self._make_key(name, dict(str_labels))
+        self._keys[(name, labels)] = key
+        self.series[key] = (name, str_labels)
+        return key
+
+    def counter_inc(self, name: str, value: float = 1, tags: Optional[Dict[str, Any]] = None):
+        """Increment a counter without awaiting"""
+        self.counters[self.series_key(name, tags)] += value
+
+    def gauge_set(self, name: str, value: float, tags: Optional[Dict[str, Any]] = None):
+        """Set a gauge without awaiting"""
+        self.gauges[self.series_key(name, tags)] = value
+
+    def histogram(self, name: str, tags: Optional[Dict[str, Any]] = None) -> Histogram:
+        """Get (creating if needed) the histogram for a series"""
+        key = self.series_key(name, tags)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name: str, value: float, tags: Optional[Dict[str, Any]] = None):
+        """Record a histogram value without awaiting"""
+        self.histogram(name, tags).record(value)
+
+    async def increment_counter(self, name: str, value: int = 1, tags: Optional[Dict[str, Any]] = None):
+        """Increment a counter metric"""
+        self.counter_inc(name, value, tags)
+
+    async def set_gauge(self, name: str, value: float, tags: Optional[Dict[str, Any]] = None):
+        """Set a gauge metric"""
+        self.gauge_set(name, value, tags)
+
+    async def record_histogram(self, name: str, value: float, tags: Optional[Dict[str, Any]] = None):
+        """Record a histogram value"""
+        self.histogram(name, tags).record(value)
+
+    async def record_timer(self, name: str, duration: float, tags: Optional[Dict[str, Any]] = None):
+        """Record a timer duration"""
+        self.histogram(name, tags).record(duration)
+
+    def _make_key(self, name: str, tags: Optional[Dict[str, Any]] = None) -> str:
+        """Create a unique key for metric with tags"""
+        if not tags:
+            return name
+
+        tag_str = ",".join([f'{k}="{v}"' for k, v in sorted(tags.items())])
+        return f"{name}{{{tag_str}}}"
+
+    async def get_metrics_summary(self) -> Dict[str, Any]:
+        """Get summary of all metrics"""
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {
+                name: histogram.summary()
+                for name, histogram in list(self.histograms.items())
+            },
+            "series_count": len(self.series),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+    def register_collector(self, collector: Callable[["MetricsCollector"], None]):
+        """Register a callback that refreshes gauges at scrape time"""
+        self.collectors.append(collector)
+
+    def collect(self):
+        """Run scrape-time collectors; a failing collector does not break the scrape"""
+        for collector in list(self.collectors):
+            try:
+                collector(self)
+            except Exception:
+                continue
+
+    def labels_for(self, key: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        """Get (metric name, labels) for a series key"""
+        return self.series.get(key) or (key, ())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serializable copy of all series, used for multi-process aggregation"""
+        series = {}
+        for key in set(self.counters) | set(self.gauges) | set(self.histograms):
+            name, labels = self.labels_for(key)
+            series[key] = [name, [list(label) for label in labels]]
+
+        return {
+            "pid": os.getpid(),
+            "instance": self.instance,
+            "timestamp": time.time(),
+            "series": series,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {key: histogram.to_dict() for key, histogram in list(self.histograms.items())}
+        }
+
+    def merge_snapshot(self, snapshot: Dict[str, Any], include_gauges: bool = True):
+        """Merge another process's snapshot: counters and histograms add up,
+        gauges are kept per process under a `pid` label."""
+        for key, (name, labels) in snapshot["series"].items():
+            self.series.setdefault(key, (name, tuple(tuple(label) for label in labels)))
+
+        for key, value in snapshot["counters"].items():
+            self.counters[key] += value
+
+        for key, data in snapshot["histograms"].items():
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.histograms[key] = Histogram.from_dict(data)
+            else:
+                histogram.merge(Histogram.from_dict(data))
+
+        if not include_gauges:
+            return
+        for key, value in snapshot["gauges"].items():
+            name, labels = self.series[key]
+            pid_labels = tuple(sorted(labels + (("pid", str(snapshot["pid"])),)))
+            pid_key = self._make_key(name, dict(pid_labels))
+            self.series[pid_key] = (name, pid_labels)
+            self.gauges[pid_key] = value
+
+
+RETAINED_SNAPSHOT = "metrics-retained.json"
+
+
+def _snapshot_path(snapshot: Dict[str, Any], directory: str) -> str:
+    return os.path.join(directory, f"metrics-{snapshot.get('instance') or snapshot['pid']}.json")
+
+
+class _DirectoryLock:
+    """flock on a lock file in the snapshot directory: shared for readers,
+    exclusive while an exiting worker folds its file into the retained totals"""
+
+    def __init__(self, directory: str, exclusive: bool):
+        self.path = os.path.join(directory, ".metrics.lock")
+        self.operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+    def __enter__(self):
+        self.handle = open(self.path, "a")
+        fcntl.flock(self.handle, self.operation)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+def write_snapshot(snapshot: Dict[str, Any], directory: str, path: Optional[str] = None):
+    """Atomically write a process's `MetricsCollector.snapshot()` into a shared directory.
+
+    Takes a snapshot rather than the collector so it can run off the event
+    loop without racing metric updates.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = path or _snapshot_path(snapshot, directory)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as handle:
+            json.dump(snapshot, handle)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def retire_snapshot(snapshot: Dict[str, Any], directory: str):
+    """Fold an exiting worker's final counters and histograms into the retained
+    totals and remove its snapshot file, so the directory does not grow with
+    every worker that ever ran and totals still never go backwards."""
+    os.makedirs(directory, exist_ok=True)
+    retained_path = os.path.join(directory, RETAINED_SNAPSHOT)
+    with _DirectoryLock(directory, exclusive=True):
+        retained = MetricsCollector(max_series=0)
+        try:
+            with open(retained_path) as handle:
+                retained.merge_snapshot(json.load(handle), include_gauges=False)
+        except (OSError, ValueError):
+            pass
+        retained.merge_snapshot(snapshot, include_gauges=False)
+        totals = retained.snapshot()
+        totals.update({"pid": "retained", "instance": "retained", "gauges": {}})
+        write_snapshot(totals, directory, retained_path)
+        try:
+            os.unlink(_snapshot_path(snapshot, directory))
+        except FileNotFoundError:
+            pass
+
+
+def aggregate_snapshots(directory: str, gauge_stale_after: float = 60.0) -> MetricsCollector:
+    """Merge every worker snapshot in a directory into one collector.
+
+    Counters and histograms from exited workers are kept (in their own file
+    or in the retained totals) so totals never go backwards; gauges from
+    snapshots older than `gauge_stale_after` are dropped.
+    """
+    aggregated = MetricsCollector(max_series=0)
+    now = time.time()
+    with _DirectoryLock(directory, exclusive=False):
+        for filename in sorted(os.listdir(directory)):
+            if not (filename.startswith("metrics-") and filename.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            aggregated.merge_snapshot(snapshot, include_gauges=now - snapshot["timestamp"] < gauge_stale_after)
+    return aggregated
+
+
+def route_template(scope: Dict[str, Any], cache: Dict[Any, str]) -> str:
+    """Get the path template of the route that handled an ASGI request, or "unmatched".
+
+    Uses scope["route"] when the framework sets it, otherwise maps the matched
+    endpoint back to its route; `cache` memoizes the endpoint lookup.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+
+    template = cache.get(endpoint)
+    if template is None:
+        template = "unmatched"
+        for candidate in getattr(scope.get("app"), "routes", ()):
+            if getattr(candidate, "endpoint", None) is endpoint:
+                template = candidate.path
+                break
+        cache[endpoint] = template
+    return template
+
+
+def _metric_name(name: str) -> str:
+    """Coerce a metric name into the Prometheus name charset"""
+    name = _INVALID_NAME_CHARS.sub("_", name)
+    return "_" + name if name[:1].isdigit() else name
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{_metric_name(k)}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(
+    collector: MetricsCollector,
+    const_labels: Optional[Dict[str, str]] = None,
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+) -> str:
+    """Render all series in the Prometheus text exposition format (0.0.4)"""
+    extra = tuple(sorted((k, str(v)) for k, v in (const_labels or {}).items()))
+    families: Dict[str, Tuple[str, List[str]]] = {}
+
+    def family(name: str, metric_type: str) -> List[str]:
+        name = _metric_name(name)
+        entry = families.get(name)
+        if entry is None:
+            entry = families[name] = (metric_type, [])
+        return entry[1]
+
+    for kind, values in (("counter", collector.counters), ("gauge", collector.gauges)):
+        for key, value in list(values.items()):
+            name, labels = collector.labels_for(key)
+            family(name, kind).append(
+                f"{_metric_name(name)}{_format_labels(labels + extra)} {_format_value(value)}"
+            )
+
+    bucket_labels = [("le", _format_value(float(bound))) for bound in buckets] + [("le", "+Inf")]
+    for key, histogram in list(collector.histograms.items()):
+        name, labels = collector.labels_for(key)
+        metric = _metric_name(name)
+        lines = family(name, "histogram")
+        labels = labels + extra
+        cumulative = histogram.cumulative_counts(buckets) + [histogram.count]
+        for le, count in zip(bucket_labels, cumulative):
+            lines.append(f"{metric}_bucket{_format_labels(labels + (le,))} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(histogram.total)}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+
+    output = []
+    for name in sorted(families):
+        metric_type, lines = families[name]
+        output.append(f"# TYPE {name} {metric_type}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
+
+
+# Global metrics collector instance
+metrics_collector = MetricsCollector()
@@ -1,9 +1,17 @@
 """
 Common middleware for LMS microservices
 """
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import jwt
 from starlette.middleware.cors import CORSMiddleware
 
 from shared.config.config import settings
+from shared.common.load_shedding import LoadShedder
+from shared.common.rate_limiting import RateLimiter, RateLimitRule, rate_limiter as default_rate_limiter
+from shared.common.responses import ErrorCodes
 
 def create_cors_middleware():
     """Create CORS middleware with proper configuration"""
@@ -21,10 +29,145 @@ class RequestLoggingMiddleware:
     pass
 
 class RateLimitMiddleware:
-    """Placeholder middleware class"""
-    pass
+    """ASGI middleware enforcing load shedding and per-user/role/route rate limits.
+
+    Load shedding runs first so an overloaded process rejects with 503 before
+    spending anything on rate limit bookkeeping. Rate limit rules are resolved
+    from the requester's role and the most specific matching route rule, and
+    counted per user (or per client IP for anonymous requests).
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: Optional[RateLimiter] = None,
+        shedder: Optional[LoadShedder] = None,
+        requests_per_minute: Optional[int] = None,
+        exclude_paths: Optional[List[str]] = None
+    ):
+        self.app = app
+        self.limiter = limiter or default_rate_limiter
+        self.shedder = shedder
+        self.default_rule = RateLimitRule(requests=requests_per_minute, window_seconds=60) if requests_per_minute else None
+        self.exclude_paths = tuple(exclude_paths or ["/health", "/docs", "/redoc", "/openapi.json", "/monitoring", "/metrics"])
+        self._shed_body = _error_body(ErrorCodes.SERVICE_UNAVAILABLE, "Service overloaded, retry later", 503)
+        self._limited_body = _error_body(ErrorCodes.RATE_LIMIT_EXCEEDED, "Rate limit exceeded", 429)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+
+        if self.shedder is None:
+            await self._rate_limited_call(path, scope, receive, send)
+            return
+
+        priority = self.shedder.classify(path)
+        admitted, retry_after = self.shedder.try_acquire(priority)
+        if not admitted:
+            await _send_error(send, 503, self._shed_body, [(b"retry-after", str(retry_after).encode())])
+            return
+
+        start_time = time.monotonic()
+        streaming = False
+
+        async def watched_send(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+            await send(message)
+
+        try:
+            await self._rate_limited_call(path, scope, receive, watched_send)
+        finally:
+            # A stream is open for as long as the model generates; its duration isn't load
+            self.shedder.release(priority, None if streaming else time.monotonic() - start_time)
+
+    async def _rate_limited_call(self, path: str, scope, receive, send):
+        """Apply rate limits, then forward to the wrapped app"""
+        if path.startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        route = path if path.startswith("/api/") else "/api" + path
+        user_id, role = _principal_from_scope(scope)
+        client_key = f"user:{user_id}" if user_id else f"ip:{_client_ip(scope)}"
+
+        endpoint, rule = self.limiter.resolve_rule(route, role)
+        if rule is None:
+            if self.default_rule is None:
+                await self.app(scope, receive, send)
+                return
+            endpoint, rule = "*", self.default_rule
+
+        allowed, info = await self.limiter.check(f"{client_key}:{endpoint}", rule)
+        limit_headers = [
+            (b"x-ratelimit-limit", str(info.get("limit", 0)).encode()),
+            (b"x-ratelimit-remaining", str(info.get("remaining", 0)).encode()),
+            (b"x-ratelimit-reset", str(int(time.time()) + info.get("reset_in", 0)).encode()),
+        ]
+
+        if not allowed:
+            limit_headers.append((b"retry-after", str(info.get("retry_after", 0)).encode()))
+            await _send_error(send, 429, self._limited_body, limit_headers)
+            return
+
+        async def send_with_limit_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + limit_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_limit_headers)
+
+
+def _error_body(error_code: str, message: str, status_code: int) -> bytes:
+    """Pre-serialize an error body in the standard error response shape"""
+    return json.dumps({
+        "success": False,
+        "error_code": error_code,
+        "message": message,
+        "errors": {"status_code": status_code}
+    }).encode()
+
+
+async def _send_error(send, status_code: int, body: bytes, headers: List[Tuple[bytes, bytes]]):
+    """Send a complete JSON error response on a raw ASGI channel"""
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ] + headers
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _client_ip(scope) -> str:
+    """Get the client IP from an ASGI scope"""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _principal_from_scope(scope) -> Tuple[Optional[str], Optional[str]]:
+    """Get (user_id, role) from a verified bearer token, or (None, None)"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            if not value.startswith(b"Bearer "):
+                return None, None
+            try:
+                payload: Dict[str, Any] = jwt.decode(value[7:].decode(), settings.jwt_secret, algorithms=["HS256"])
+            except jwt.InvalidTokenError:
+                return None, None
+            return payload.get("sub"), payload.get("role")
+    return None, None
 
 # Common middleware stack
 def get_common_middleware():
     """Get list of common middleware for services"""
-    return [create_cors_middleware()]
\ No newline at end of file
+    return [create_cors_middleware()]
@@ -11,102 +11,22 @@ except ImportError:
     PSUTIL_AVAILABLE = False
 import json
 from typing import Dict, List, Any, Optional, Callable
-from collections import defaultdict, deque
+from collections import defaultdict
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from fastapi import Request, Response
+from fastapi.responses import PlainTextResponse
+from shared.config.config import settings
 from shared.common.logging import get_logger
 from shared.common.cache import cache_manager
+from shared.common.metrics import (
+    Histogram, MetricsCollector, metrics_collector,
+    PROMETHEUS_CONTENT_TYPE, render_prometheus, write_snapshot, retire_snapshot, aggregate_snapshots, route_template
+)
 
 logger = get_logger("common-monitoring")
 
 
-class MetricsCollector:
-    """Advanced metrics collector"""
-
-    def __init__(self):
-        self.metrics: Dict[str, Any] = defaultdict(dict)
-        self.counters: Dict[str, int] = defaultdict(int)
-        self.gauges: Dict[str, float] = {}
-        self.histograms: Dict[str, List[float]] = defaultdict(list)
-        self.timers: Dict[str, List[float]] = defaultdict(list)
-        self._lock = asyncio.Lock()
-
-    async def increment_counter(self, name: str, value: int = 1, tags: Optional[Dict[str, Any]] = None):
-        """Increment a counter metric"""
-        async with self._lock:
-            key = self._make_key(name, tags)
-            self.counters[key] += value
-
-    async def set_gauge(self, name: str, value: float, tags: Optional[Dict[str, Any]] = None):
-        """Set a gauge metric"""
-        async with self._lock:
-            key = self._make_key(name, tags)
-            self.gauges[key] = value
-
-    async def record_histogram(self, name: str, value: float, tags: Optional[Dict[str, Any]] = None):
-        """Record a histogram value"""
-        async with self._lock:
-            key = self._make_key(name, tags)
-            self.histograms[key].append(value)
-
-            # Keep only last 1000 values
-            if len(self.histograms[key]) > 1000:
-                self.histograms[key] = self.histograms[key][-1000:]
-
-    async def record_timer(self, name: str, duration: float, tags: Optional[Dict[str, Any]] = None):
-        """Record a timer duration"""
-        await self.record_histogram(name, duration, tags)
-
-    def _make_key(self, name: str, tags: Optional[Dict[str, Any]] = None) -> str:
-        """Create a unique key for metric with tags"""
-        if not tags:
-            return name
-
-        tag_str = ",".join([f"{k}={v}" for k, v in sorted(tags.items())])
-        return f"{name}{{tag_str}}"
-
-    async def get_metrics_summary(self) -> Dict[str, Any]:
-        """Get summary of all metrics"""
-        async with self._lock:
-            summary = {
-                "counters": dict(self.counters),
-                "gauges": dict(self.gauges),
-                "histograms": {
-                    name: {
-                        "count": len(values),
-                        "min": min(values) if values else 0,
-                        "max": max(values) if values else 0,
-                        "avg": sum(values) / len(values) if values else 0,
-                        "p95": self._percentile(values, 95) if values else 0,
-                        "p99": self._percentile(values, 99) if values else 0
-                    }
-                    for name, values in self.histograms.items()
-                },
-                "timers": {
-                    name: {
-                        "count": len(values),
-                        "avg": sum(values) / len(values) if values else 0,
-                        "p95": self._percentile(values, 95) if values else 0,
-                        "p99": self._percentile(values, 99) if values else 0
-                    }
-                    for name, values in self.timers.items()
-                },
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
-
-            return summary
-
-    def _percentile(self, values: List[float], percentile: float) -> float:
-        """Calculate percentile from list of values"""
-        if not values:
-            return 0.0
-
-        sorted_values = sorted(values)
-        index = int(len(sorted_values) * percentile / 100)
-        return sorted_values[min(index, len(sorted_values) - 1)]
-
-
 class HealthChecker:
     """Advanced health checker for services and dependencies"""
 
@@ -182,7 +102,7 @@ class PerformanceMonitor:
     """Performance monitoring for requests and operations"""
 
     def __init__(self):
-        self.request_times: deque = deque(maxlen=1000)
+        self.request_times = Histogram()
         self.endpoint_stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
             "count": 0,
             "total_time": 0,
@@ -202,7 +122,7 @@ class PerformanceMonitor:
         user_id: Optional[str] = None
     ):
         """Record request performance metrics"""
-        self.request_times.append(duration)
+        self.request_times.record(duration)
 
         stats = self.endpoint_stats[endpoint]
         stats["count"] += 1
@@ -229,20 +149,20 @@ class PerformanceMonitor:
 
     async def get_performance_stats(self) -> Dict[str, Any]:
         """Get performance statistics"""
-        if not self.request_times:
+        if not self.request_times.count:
             return {"message": "No requests recorded yet"}
 
-        sorted_times = sorted(self.request_times)
+        overall = self.request_times.summary()
 
         return {
             "overall": {
-                "total_requests": len(self.request_times),
-                "avg_response_time": sum(self.request_times) / len(self.request_times),
-                "min_response_time": min(self.request_times),
-                "max_response_time": max(self.request_times),
-                "p50_response_time": sorted_times[len(sorted_times) // 2],
-                "p95_response_time": sorted_times[int(len(sorted_times) * 0.95)],
-                "p99_response_time": sorted_times[int(len(sorted_times) * 0.99)]
+                "total_requests": overall["count"],
+                "avg_response_time": overall["avg"],
+                "min_response_time": overall["min"],
+                "max_response_time": overall["max"],
+                "p50_response_time": overall["p50"],
+                "p95_response_time": overall["p95"],
+                "p99_response_time": overall["p99"]
             },
             "endpoints": dict(self.endpoint_stats),
             "timestamp": datetime.now(timezone.utc).isoformat()
@@ -255,6 +175,11 @@ class SystemMonitor:
     def __init__(self):
         self.last_cpu_percent = 0
         self.last_network_stats = {}
+        if PSUTIL_AVAILABLE:
+            # Prime the counters so later interval=None calls measure since the previous call
+            psutil.cpu_percent(interval=None)
+            self.process = psutil.Process()
+            self.process.cpu_percent(interval=None)
 
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get system resource statistics"""
@@ -266,8 +191,8 @@ class SystemMonitor:
             }
 
         try:
-            # CPU usage
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU usage since the previous sample; never blocks the event loop
+            cpu_percent = psutil.cpu_percent(interval=None)
 
             # Memory usage
             memory = psutil.virtual_memory()
@@ -318,13 +243,13 @@ class SystemMonitor:
             }
 
         try:
-            process = psutil.Process()
+            process = self.process
             memory_info = process.memory_info()
             cpu_times = process.cpu_times()
 
             return {
                 "pid": process.pid,
-                "cpu_percent": process.cpu_percent(),
+                "cpu_percent": process.cpu_percent(interval=None),
                 "memory_rss": memory_info.rss,
                 "memory_vms": memory_info.vms,
                 "cpu_user": cpu_times.user,
@@ -339,12 +264,143 @@ class SystemMonitor:
 
 
 # Global instances
-metrics_collector = MetricsCollector()
 health_checker = HealthChecker()
 performance_monitor = PerformanceMonitor()
 system_monitor = SystemMonitor()
 
 
+def collect_process_metrics(collector: MetricsCollector):
+    """Publish process resource gauges at scrape time"""
+    if not PSUTIL_AVAILABLE:
+        return
+    process = system_monitor.process
+    cpu_times = process.cpu_times()
+    collector.gauge_set("process_resident_memory_bytes", process.memory_info().rss)
+    collector.gauge_set("process_cpu_percent", process.cpu_percent(interval=None))
+    collector.gauge_set("process_threads", process.num_threads())
+    collector.counters["process_cpu_seconds_total"] = cpu_times.user + cpu_times.system
+
+
+metrics_collector.register_collector(collect_process_metrics)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request duration by method, route template and status.
+
+    Routes are labelled with their template ("/courses/{course_id}") rather
+    than the raw path so label cardinality stays bounded. With a multiprocess
+    directory configured, each worker periodically writes a snapshot that the
+    /metrics endpoint of any worker aggregates, and folds it into the retained
+    totals when the worker shuts down.
+    """
+
+    def __init__(
+        self,
+        app,
+        collector: Optional[MetricsCollector] = None,
+        multiproc_dir: Optional[str] = None,
+        snapshot_interval: float = 5.0
+    ):
+        self.app = app
+        self.collector = collector or metrics_collector
+        self.multiproc_dir = multiproc_dir
+        self.snapshot_interval = snapshot_interval
+        self._last_snapshot = 0.0
+        self._pending_write: Optional[asyncio.Future] = None
+        self._histograms: Dict[tuple, Histogram] = {}
+        self._templates: Dict[Any, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" and self.multiproc_dir:
+            await self.app(scope, receive, self._retiring_send(send))
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start_time
+            series = (scope["method"], route_template(scope, self._templates), status_code)
+            histogram = self._histograms.get(series)
+            if histogram is None:
+                histogram = self._histograms[series] = self.collector.histogram(
+                    "http_request_duration_seconds",
+                    {"method": series[0], "route": series[1], "status": series[2]}
+                )
+            histogram.record(duration)
+
+            if self.multiproc_dir and time.monotonic() - self._last_snapshot > self.snapshot_interval:
+                self._last_snapshot = time.monotonic()
+                snapshot = self.collector.snapshot()
+                self._pending_write = asyncio.get_running_loop().run_in_executor(
+                    None, write_snapshot, snapshot, self.multiproc_dir
+                )
+
+    def _retiring_send(self, send):
+        async def send_after_retiring(message):
+            if message["type"] == "lifespan.shutdown.complete":
+                # Stop periodic writes and let the last one land before its file is removed
+                multiproc_dir, self.multiproc_dir = self.multiproc_dir, None
+                if self._pending_write is not None:
+                    await asyncio.gather(self._pending_write, return_exceptions=True)
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, retire_snapshot, self.collector.snapshot(), multiproc_dir
+                    )
+                except Exception as e:
+                    logger.warning("Failed to retire metrics snapshot", extra={"error": str(e)})
+            await send(message)
+        return send_after_retiring
+
+
+async def render_metrics(
+    service_name: str,
+    collector: Optional[MetricsCollector] = None,
+    multiproc_dir: Optional[str] = None
+) -> str:
+    """Render metrics for scraping, aggregating all workers in multiprocess mode"""
+    collector = collector or metrics_collector
+    collector.collect()
+
+    if not multiproc_dir:
+        return render_prometheus(collector, {"service": service_name})
+
+    loop = asyncio.get_running_loop()
+    snapshot = collector.snapshot()
+    await loop.run_in_executor(None, write_snapshot, snapshot, multiproc_dir)
+    aggregated = await loop.run_in_executor(None, aggregate_snapshots, multiproc_dir)
+    return render_prometheus(aggregated, {"service": service_name})
+
+
+def setup_metrics(app, service_name: str, collector: Optional[MetricsCollector] = None):
+    """Install request metrics middleware and a Prometheus /metrics endpoint.
+
+    Call before including catch-all routers so /metrics is matched first.
+    """
+    if not settings.metrics_enabled:
+        return
+
+    multiproc_dir = settings.metrics_multiproc_dir or None
+    app.add_middleware(MetricsMiddleware, collector=collector, multiproc_dir=multiproc_dir)
+
+    async def metrics_endpoint():
+        body = await render_metrics(service_name, collector, multiproc_dir)
+        return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+
 # Middleware for request monitoring
 @asynccontextmanager
 async def monitor_request(request: Request, response: Optional[Response] = None):
@@ -21,12 +21,14 @@ class RateLimitRule:
         requests: int,
         window_seconds: int,
         burst_limit: Optional[int] = None,
-        strategy: str = "fixed_window"
+        strategy: str = "fixed_window",
+        prefix: bool = False
     ):
         self.requests = requests
         self.window_seconds = window_seconds
         self.burst_limit = burst_limit or requests * 2
         self.strategy = strategy  # fixed_window, sliding_window, token_bucket
+        self.prefix = prefix  # also applies to every path below the endpoint
 
 
 class RateLimiter:
@@ -34,6 +36,7 @@ class RateLimiter:
 
     def __init__(self):
         self.rules: Dict[str, RateLimitRule] = {}
+        self.role_rules: Dict[str, Dict[str, RateLimitRule]] = defaultdict(dict)
         self.request_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
         self.token_buckets: Dict[str, Dict[str, Any]] = {}
         self._cleanup_task: Optional[asyncio.Task] = None
@@ -43,16 +46,50 @@ class RateLimiter:
         self.rules[endpoint] = rule
         logger.info(f"Added rate limit rule for {endpoint}: {rule.requests} req/{rule.window_seconds}s")
 
+    def add_role_rule(self, role: str, endpoint: str, rule: RateLimitRule):
+        """Add a rate limit rule that only applies to users with the given role"""
+        self.role_rules[role][endpoint] = rule
+
     def get_rule(self, endpoint: str) -> Optional[RateLimitRule]:
         """Get rate limit rule for an endpoint"""
         return self.rules.get(endpoint)
 
+    def resolve_rule(self, path: str, role: Optional[str] = None) -> Tuple[Optional[str], Optional[RateLimitRule]]:
+        """Find the most specific rule for a path, preferring role rules on ties.
+
+        A rule matches its own endpoint; only prefix rules also match the
+        paths below it.
+        """
+        role_rules = self.role_rules.get(role) if role else None
+        candidate = path.rstrip("/")
+        exact = True
+
+        while candidate:
+            for rules in (role_rules, self.rules):
+                rule = rules.get(candidate) if rules else None
+                if rule and (exact or rule.prefix):
+                    return candidate, rule
+
+            cut = candidate.rfind("/")
+            if cut <= 0:
+                break
+            candidate = candidate[:cut]
+            exact = False
+
+        return None, None
+
     async def is_allowed(self, key: str, endpoint: str) -> Tuple[bool, Dict[str, Any]]:
         """Check if request is allowed under rate limits"""
         rule = self.get_rule(endpoint)
         if not rule:
             return True, {"allowed": True}
 
+        return await self.check(key, rule)
+
+    async def check(self, key: str, rule: RateLimitRule) -> Tuple[bool, Dict[str, Any]]:
+        """Check a key against a specific rule"""
+        self.start_cleanup_task()
+
         if rule.strategy == "fixed_window":
             return await self._check_fixed_window(key, rule)
         elif rule.strategy == "sliding_window":
@@ -64,36 +101,38 @@ class RateLimiter:
 
     async def _check_fixed_window(self, key: str, rule: RateLimitRule) -> Tuple[bool, Dict[str, Any]]:
         """Fixed window rate limiting"""
-        cache_key = f"ratelimit:fixed:{key}:{int(time.time() / rule.window_seconds)}"
+        now = time.time()
+        cache_key = f"ratelimit:fixed:{key}:{int(now / rule.window_seconds)}"
+
+        # Redis unavailable - fall back to in-process accounting
+        if not cache_manager.redis.redis_available:
+            return await self._check_sliding_window(key, rule)
+
+        # Atomic increment so concurrent requests and gateway replicas share one count
+        count = await cache_manager.redis.incr(cache_key)
+        if not count:
+            return await self._check_sliding_window(key, rule)
 
-        # Get current count
-        count = await cache_manager.get(cache_key)
-        if count is None:
-            count = 0
+        if count == 1:
+            await cache_manager.redis.expire(cache_key, rule.window_seconds)
 
-        count = int(count) if isinstance(count, str) else count
-        count += 1
+        reset_in = rule.window_seconds - (int(now) % rule.window_seconds)
 
         # Check limit
         if count > rule.requests:
-            remaining_time = rule.window_seconds - (int(time.time()) % rule.window_seconds)
             return False, {
                 "allowed": False,
                 "limit": rule.requests,
                 "remaining": 0,
-                "reset_in": remaining_time,
-                "retry_after": remaining_time
+                "reset_in": reset_in,
+                "retry_after": reset_in
             }
 
-        # Update count
-        await cache_manager.set(cache_key, count, ttl=rule.window_seconds)
-
-        remaining = max(0, rule.requests - count)
         return True, {
             "allowed": True,
             "limit": rule.requests,
-            "remaining": remaining,
-            "reset_in": rule.window_seconds - (int(time.time()) % rule.window_seconds)
+            "remaining": max(0, rule.requests - count),
+            "reset_in": reset_in
         }
 
     async def _check_sliding_window(self, key: str, rule: RateLimitRule) -> Tuple[bool, Dict[str, Any]]:
@@ -198,9 +237,12 @@ class RateLimiter:
         logger.info(f"Reset rate limit for {key} on {endpoint}")
 
     def start_cleanup_task(self):
-        """Start background cleanup task"""
+        """Start background cleanup task (no-op outside a running event loop)"""
         if self._cleanup_task is None:
-            self._cleanup_task = asyncio.create_task(self._cleanup_old_data())
+            try:
+                self._cleanup_task = asyncio.get_running_loop().create_task(self._cleanup_old_data())
+            except RuntimeError:
+                pass
 
     async def _cleanup_old_data(self):
         """Clean up old rate limiting data"""
@@ -344,7 +386,12 @@ def apply_user_rate_limits(user_role: str):
     """Apply rate limits based on user role"""
     if user_role in USER_RATE_LIMITS:
         for endpoint, rule in USER_RATE_LIMITS[user_role].items():
-            rate_limiter.add_rule(endpoint, rule)
+            rate_limiter.add_role_rule(user_role, endpoint, rule)
+
+
+# Initialize role limits
+for role in USER_RATE_LIMITS:
+    apply_user_rate_limits(role)
 
 
 # Burst handling
@@ -369,6 +416,7 @@ async def get_rate_limit_stats() -> Dict[str, Any]:
     """Get rate limiting statistics"""
     return {
         "rules_count": len(rate_limiter.rules),
+        "role_rules": {role: list(rules.keys()) for role, rules in rate_limiter.role_rules.items()},
         "active_keys": len(rate_limiter.request_history) + len(rate_limiter.token_buckets),
         "rules": list(rate_limiter.rules.keys()),
         "history_size": sum(len(history) for history in rate_limiter.request_history.values()),
@@ -388,7 +436,3 @@ def add_rate_limit_headers(response, rate_limit_info: Dict[str, Any]):
         response.headers["X-RateLimit-Remaining"] = "0"
         response.headers["X-RateLimit-Reset"] = str(int(time.time()) + rate_limit_info.get("retry_after", 0))
         response.headers["Retry-After"] = str(rate_limit_info.get("retry_after", 0))
-
-
-# Start cleanup task
-rate_limiter.start_cleanup_task()
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Token revocation list for LMS microservices
+
+Revoked token ids (jti) and session ids live in Redis under
+``auth:revoked:<id>`` with a TTL equal to the token's remaining lifetime.
+Every process keeps a Bloom filter of those ids, loaded on startup and kept
+current over pub/sub, so the common "not revoked" answer needs no network
+call. Filter hits are confirmed against Redis to rule out false positives.
+
+The same listener carries principal invalidations on ``auth:principals``:
+when a user's role, email or status changes, or the user is deleted, every
+process drops its cached principals for that user.
+"""
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from shared.config.config import settings
+from shared.common.cache import cache_manager
+from shared.common.logging import get_logger
+from shared.common.metrics import MetricsCollector, metrics_collector
+
+logger = get_logger("common-revocation")
+
+REVOKED_KEY_PREFIX = "auth:revoked:"
+REVOCATION_CHANNEL = "auth:revocations"
+PRINCIPAL_CHANNEL = "auth:principals"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class TokenRevocationList:
+    """Process-local view of revoked token and session ids"""
+
+    def __init__(
+        self,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        rebuild_interval: float = 300.0,
+        redis_client: Any = None
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.filter = BloomFilter(capacity, error_rate)
+        self.redis_client = redis_client
+        # Recently confirmed revocations (id -> expiry), so repeat hits skip Redis
+        self._confirmed: "OrderedDict[str, float]" = OrderedDict()
+        self._listener: Optional[asyncio.Task] = None
+        # Called with a user id whenever that user's cached principals must go
+        self.principal_listeners: List[Callable[[str], None]] = []
+        self.filter_hits = 0
+        self.false_positives = 0
+
+    async def _client(self):
+        if self.redis_client is not None:
+            return self.redis_client
+        if not cache_manager.redis.redis_available:
+            return None
+        return await cache_manager.redis.connect()
+
+    def _remember(self, identifier: str, expires_at: float):
+        self._confirmed[identifier] = expires_at
+        self._confirmed.move_to_end(identifier)
+        if len(self._confirmed) > 10000:
+            self._confirmed.popitem(last=False)
+
+    async def revoke(self, identifier: str, expires_at: float, reason: str = "revoked") -> bool:
+        """Revoke an id until `expires_at` (epoch seconds) in every process"""
+        self.filter.add(identifier)
+        self._remember(identifier, expires_at)
+
+        client = await self._client()
+        if client is None:
+            logger.warning("Redis unavailable, revocation is local to this process", extra={"id": identifier})
+            return False
+        try:
+            ttl = max(1, math.ceil(expires_at - time.time()))
+            await client.set(REVOKED_KEY_PREFIX + identifier, reason, ex=ttl)
+            await client.publish(REVOCATION_CHANNEL, identifier)
+            metrics_collector.counter_inc("token_revocations_total", tags={"reason": reason})
+            return True
+        except Exception as e:
+            logger.error("Token revocation failed", extra={"id": identifier, "error": str(e)})
+            return False
+
+    async def invalidate_principal(self, user_id: str) -> bool:
+        """Drop a user's cached principals in this process and, over pub/sub, every other one"""
+        self._principal_changed(user_id)
+        client = await self._client()
+        if client is None:
+            logger.warning("Redis unavailable, principal invalidation is local to this process", extra={"user_id": user_id})
+            return False
+        try:
+            await client.publish(PRINCIPAL_CHANNEL, user_id)
+            return True
+        except Exception as e:
+            logger.error("Principal invalidation failed", extra={"user_id": user_id, "error": str(e)})
+            return False
+
+    def _principal_changed(self, user_id: str):
+        for listener in self.principal_listeners:
+            listener(user_id)
+
+    def _apply(self, message: Dict[str, Any], bloom: BloomFilter):
+        """Apply one pub/sub message: a revoked id, or a user whose principal changed"""
+        channel, data = message["channel"], message["data"]
+        channel = channel.decode() if isinstance(channel, bytes) else channel
+        data = data.decode() if isinstance(data, bytes) else data
+        if channel == PRINCIPAL_CHANNEL:
+            self._principal_changed(data)
+        else:
+            bloom.add(data)
+
+    async def is_revoked(self, payload: Dict[str, Any]) -> bool:
+        """Check a decoded token's jti and session_id"""
+        self.start()
+        for identifier in (payload.get("jti"), payload.get("session_id")):
+            if identifier and identifier in self.filter and await self._confirm(identifier):
+                return True
+        return False
+
+    async def _confirm(self, identifier: str) -> bool:
+        """Rule out Bloom false positives"""
+        self.filter_hits += 1
+        expires_at = self._confirmed.get(identifier)
+        if expires_at is not None:
+            if expires_at > time.time():
+                return True
+            del self._confirmed[identifier]
+            return False
+
+        client = await self._client()
+        if client is not None:
+            try:
+                ttl = await client.ttl(REVOKED_KEY_PREFIX + identifier)
+                if ttl is not None and ttl > 0:
+                    self._remember(identifier, time.time() + ttl)
+                    return True
+            except Exception as e:
+                logger.warning("Revocation lookup failed", extra={"id": identifier, "error": str(e)})
+        self.false_positives += 1
+        return False
+
+    def start(self):
+        """Start the pub/sub listener for the running event loop, once"""
+        if self._listener is None or self._listener.done():
+            try:
+                self._listener = asyncio.get_running_loop().create_task(self._listen())
+            except RuntimeError:
+                pass
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+    async def _load(self, client) -> BloomFilter:
+        """Build a filter from the ids currently revoked in Redis"""
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        async for key in client.scan_iter(match=REVOKED_KEY_PREFIX + "*", count=1000):
+            key = key.decode() if isinstance(key, bytes) else key
+            bloom.add(key[len(REVOKED_KEY_PREFIX):])
+        return bloom
+
+    async def _listen(self):
+        """Keep the filter in sync: subscribe, load, apply updates, rebuild periodically.
+
+        Rebuilding is how expired ids leave the filter, since Bloom filters
+        cannot delete.
+        """
+        while True:
+            client = await self._client()
+            if client is None:
+                await asyncio.sleep(self.rebuild_interval)
+                continue
+            pubsub = client.pubsub()
+            try:
+                # Subscribe before loading so nothing revoked in between is missed
+                await pubsub.subscribe(REVOCATION_CHANNEL, PRINCIPAL_CHANNEL)
+                self.filter = await self._load(client)
+                rebuild_at = time.monotonic() + self.rebuild_interval
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self._apply(message, self.filter)
+                    if time.monotonic() >= rebuild_at:
+                        bloom = await self._load(client)
+                        # Re-apply anything that arrived during the scan
+                        while (message := await pubsub.get_message(ignore_subscribe_messages=True)) is not None:
+                            self._apply(message, bloom)
+                        self.filter = bloom
+                        rebuild_at = time.monotonic() + self.rebuild_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Revocation listener failed, retrying", extra={"error": str(e)})
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def collect_metrics(self, collector: MetricsCollector):
+        """Publish filter gauges at scrape time"""
+        collector.gauge_set("token_revocation_filter_entries", self.filter.count)
+        collector.gauge_set("token_revocation_filter_hits", self.filter_hits)
+        collector.gauge_set("token_revocation_false_positives", self.false_positives)
+
+
+token_revocations = TokenRevocationList(
+    capacity=settings.revocation_filter_capacity,
+    error_rate=settings.revocation_filter_error_rate,
+    rebuild_interval=settings.revocation_rebuild_seconds
+)
+metrics_collector.register_collector(token_revocations.collect_metrics)
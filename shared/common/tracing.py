@@ -0,0 +1,514 @@
+"""
+Distributed tracing for LMS microservices
+"""
+import atexit
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from shared.config.config import settings
+from shared.common.metrics import MetricsCollector, metrics_collector, route_template
+
+# Plain stdlib logger: shared.common.logging imports this module for trace ids
+logger = logging.getLogger("common-tracing")
+
+
+class SpanKind(Enum):
+    """Span kinds (values match OTLP)"""
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+        "recording", "start_ns", "end_ns", "attributes", "error"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        span_id: str,
+        parent_id: Optional[str],
+        sampled: bool,
+        recording: bool,
+        kind: SpanKind = SpanKind.INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.recording = recording
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes if attributes is not None else {}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value for this span"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any):
+        """Set a span attribute"""
+        if self.recording:
+            self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        """Mark the span as failed"""
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the span"""
+        return {
+            "name": self.name,
+            "kind": self.kind.name.lower(),
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """Get the active span, if any"""
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """Get the active trace id, if any"""
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Parse a W3C traceparent header into (trace_id, parent_id, sampled)"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[0] == "ff":
+        return None
+    trace_id, parent_id, flags = parts[1].lower(), parts[2].lower(), parts[3]
+    try:
+        int(trace_id, 16)
+        int(parent_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, sampled
+
+
+def inject_trace_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add the active span's traceparent to outgoing headers"""
+    span = _current_span.get()
+    if span is not None:
+        headers["traceparent"] = span.traceparent
+    return headers
+
+
+class InMemorySpanExporter:
+    """Keeps exported spans in memory (tests and debugging)"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter:
+    """Appends spans as JSON lines to a local file"""
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a") as handle:
+            for span in spans:
+                record = span.to_dict()
+                record["service"] = self.service_name
+                handle.write(json.dumps(record, default=str) + "\n")
+
+    def shutdown(self):
+        pass
+
+
+class OTLPHttpSpanExporter:
+    """Sends spans to an OTLP/HTTP collector using the JSON encoding"""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        import httpx
+
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: List[Span]):
+        response = self.client.post(self.url, json=self._encode(spans))
+        response.raise_for_status()
+
+    def _encode(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "lms"},
+                    "spans": [{
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": span.kind.value,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+                        "status": {"code": 2, "message": span.error} if span.error else {"code": 0}
+                    } for span in spans]
+                }]
+            }]
+        }
+
+    def shutdown(self):
+        self.client.close()
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class BatchSpanProcessor:
+    """Buffers finished spans and exports them in batches from a background thread.
+
+    The buffer is bounded; when the exporter cannot keep up spans are dropped
+    and counted rather than slowing down request handling.
+    """
+
+    def __init__(self, exporter, max_queue_size: int = 4096, batch_size: int = 512, flush_interval: float = 2.0):
+        self.exporter = exporter
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: deque = deque()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def on_end(self, span: Span):
+        """Queue a finished span for export"""
+        if len(self.queue) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self.queue.append(span)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+        if len(self.queue) >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.force_flush()
+
+    def force_flush(self):
+        """Export everything currently queued"""
+        while self.queue:
+            batch = []
+            while self.queue and len(batch) < self.batch_size:
+                batch.append(self.queue.popleft())
+            try:
+                self.exporter.export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.warning("Span export failed: %s", e)
+
+    def shutdown(self):
+        """Flush remaining spans and stop the export thread"""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.force_flush()
+        self.exporter.shutdown()
+
+    def collect_metrics(self, collector: MetricsCollector):
+        """Publish exporter counters at scrape time"""
+        collector.counters["tracing_spans_exported_total"] = self.exported
+        collector.counters["tracing_spans_dropped_total"] = self.dropped
+        collector.counters["tracing_spans_failed_total"] = self.failed
+        collector.gauge_set("tracing_span_queue_size", len(self.queue))
+
+
+class Tracer:
+    """Creates spans and tracks the active span per task.
+
+    Sampling is decided once per trace from the trace id (so every service
+    agrees without coordination) and inherited from remote parents. Children
+    of unsampled spans are not created at all, which keeps unsampled requests
+    close to zero cost while still carrying trace ids for log correlation.
+    """
+
+    def __init__(self, service_name: str = "lms", sample_ratio: float = 1.0, processor: Optional[BatchSpanProcessor] = None):
+        self.service_name = service_name
+        self.processor = processor
+        self.set_sample_ratio(sample_ratio)
+
+    def set_sample_ratio(self, ratio: float):
+        """Set the share of new traces that are recorded"""
+        self.sample_ratio = min(max(ratio, 0.0), 1.0)
+        self._threshold = int(self.sample_ratio * (1 << 64))
+
+    def start_span(
+        self,
+        name: str,
+        kind: SpanKind = SpanKind.INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        remote_parent: Optional[Tuple[str, str, bool]] = None
+    ) -> Span:
+        """Create a span (without activating it); callers must end_span it"""
+        if remote_parent is not None:
+            trace_id, parent_id, sampled = remote_parent
+        else:
+            parent = _current_span.get()
+            if parent is not None:
+                trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+            else:
+                trace_id = f"{random.getrandbits(128):032x}"
+                parent_id = None
+                sampled = int(trace_id[:16], 16) < self._threshold
+
+        return Span(
+            name, trace_id, f"{random.getrandbits(64):016x}", parent_id, sampled,
+            recording=sampled and self.processor is not None, kind=kind, attributes=attributes
+        )
+
+    def end_span(self, span: Span):
+        """Finish a span and hand it to the exporter if it is recorded"""
+        span.end_ns = time.time_ns()
+        if span.recording:
+            self.processor.on_end(span)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: SpanKind = SpanKind.INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        remote_parent: Optional[Tuple[str, str, bool]] = None
+    ):
+        """Run a block inside a new active span"""
+        parent = _current_span.get()
+        if remote_parent is None and parent is not None and not parent.recording:
+            # Unsampled trace: keep the parent active instead of building a child
+            yield parent
+            return
+
+        span = self.start_span(name, kind, attributes, remote_parent)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def shutdown(self):
+        """Flush and stop the exporter"""
+        if self.processor is not None:
+            self.processor.shutdown()
+
+
+# Global tracer; configure_tracing() attaches an exporter
+tracer = Tracer()
+
+
+def traced(name: str, kind: SpanKind = SpanKind.INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+    """Decorator running an async function inside a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name, kind, dict(attributes) if attributes else None):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure_tracing(service_name: str) -> Tracer:
+    """Configure the global tracer from settings"""
+    tracer.service_name = service_name
+    tracer.set_sample_ratio(settings.tracing_sample_ratio)
+
+    if not settings.tracing_enabled or tracer.processor is not None:
+        return tracer
+
+    if settings.tracing_exporter == "file":
+        exporter = FileSpanExporter(settings.tracing_file_path, service_name)
+    else:
+        exporter = OTLPHttpSpanExporter(settings.otel_exporter_otlp_endpoint, service_name)
+
+    tracer.processor = BatchSpanProcessor(exporter)
+    metrics_collector.register_collector(tracer.processor.collect_metrics)
+    atexit.register(tracer.shutdown)
+    logger.info("Tracing enabled: exporter=%s sample_ratio=%s", settings.tracing_exporter, tracer.sample_ratio)
+    return tracer
+
+
+class TracingMiddleware:
+    """ASGI middleware that continues or starts a trace for every request.
+
+    Reads the incoming W3C traceparent, activates a server span for the
+    request and returns the trace id in an x-trace-id response header.
+    """
+
+    def __init__(self, app, tracer_instance: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer_instance or tracer
+        self._templates: Dict[Any, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        remote_parent = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                remote_parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        method = scope["method"]
+        span = self.tracer.start_span(method, SpanKind.SERVER, remote_parent=remote_parent)
+        if span.recording:
+            span.attributes["http.method"] = method
+            span.attributes["http.target"] = scope["path"]
+        trace_header = (b"x-trace-id", span.trace_id.encode())
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [trace_header]
+                if span.recording:
+                    status_code = message["status"]
+                    span.attributes["http.status_code"] = status_code
+                    if status_code >= 500:
+                        span.error = f"HTTP {status_code}"
+            await send(message)
+
+        token = _current_span.set(span)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            if span.recording:
+                route = route_template(scope, self._templates)
+                span.name = f"{method} {route}"
+                span.attributes["http.route"] = route
+            self.tracer.end_span(span)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that propagates traceparent and records a client span per request.
+
+    Wraps the transport that does the I/O, so the span is ended whether the
+    request returns a response or fails with a transport error or timeout.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        parent = _current_span.get()
+        if parent is None or not parent.recording:
+            if parent is not None:
+                request.headers["traceparent"] = parent.traceparent
+            return await self.transport.handle_async_request(request)
+
+        span = tracer.start_span(f"HTTP {request.method}", SpanKind.CLIENT, {
+            "http.method": request.method,
+            # Without the query string, which may carry credentials
+            "http.url": str(request.url.copy_with(query=None))
+        })
+        request.headers["traceparent"] = span.traceparent
+        try:
+            response = await self.transport.handle_async_request(request)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.error = f"HTTP {response.status_code}"
+            return response
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            tracer.end_span(span)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def traced_operation(func):
+    """Run a DatabaseOperations method (anything with a `collection_name`) inside a Mongo client span"""
+    operation = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        with tracer.span(f"mongo.{operation}", SpanKind.CLIENT, {
+            "db.system": "mongodb",
+            "db.collection": self.collection_name,
+            "db.operation": operation
+        }):
+            return await func(self, *args, **kwargs)
+    return wrapper
+
+
+def setup_tracing(app, service_name: str):
+    """Configure tracing and install the request tracing middleware.
+
+    Call after other add_middleware calls so the trace is active for them.
+    """
+    configure_tracing(service_name)
+    app.add_middleware(TracingMiddleware)
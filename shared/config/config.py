@@ -29,6 +29,30 @@ class Settings(BaseSettings):
     db_connection_pool_recycle: int = int(os.getenv("DB_CONNECTION_POOL_RECYCLE", "3600"))
     db_read_preference: str = os.getenv("DB_READ_PREFERENCE", "primary")
 
+    # Gateway admission control
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    gateway_max_in_flight: int = int(os.getenv("GATEWAY_MAX_IN_FLIGHT", "512"))
+    gateway_latency_target_seconds: float = float(os.getenv("GATEWAY_LATENCY_TARGET_SECONDS", "1.0"))
+
+    # Metrics
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    metrics_multiproc_dir: str = os.getenv("METRICS_MULTIPROC_DIR", "")
+
+    # Tracing
+    tracing_enabled: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    tracing_exporter: str = os.getenv("TRACING_EXPORTER", "otlp")
+    tracing_sample_ratio: float = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
+    otel_exporter_otlp_endpoint: str = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://otel-collector:4318")
+    tracing_file_path: str = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+
+    # Logging
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_async: bool = os.getenv("LOG_ASYNC", "true").lower() == "true"
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    log_rate_limit: int = int(os.getenv("LOG_RATE_LIMIT", "100"))
+    log_rate_window_seconds: float = float(os.getenv("LOG_RATE_WINDOW_SECONDS", "1.0"))
+    log_sampling: str = os.getenv("LOG_SAMPLING", "")
+
     # Security - NO HARDCODED SECRETS
     jwt_secret: str = os.getenv("JWT_SECRET", "")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
@@ -36,9 +60,29 @@ class Settings(BaseSettings):
     access_expire_min: int = int(os.getenv("ACCESS_EXPIRE_MIN", "30"))
     refresh_expire_days: int = int(os.getenv("REFRESH_EXPIRE_DAYS", "14"))
 
+    # Edge authentication
+    auth_principal_cache_size: int = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+    auth_principal_cache_ttl_seconds: int = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+    revocation_filter_capacity: int = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+    revocation_filter_error_rate: float = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001"))
+    revocation_rebuild_seconds: float = float(os.getenv("REVOCATION_REBUILD_SECONDS", "300"))
+    auth_forward_principal: bool = os.getenv("AUTH_FORWARD_PRINCIPAL", "true").lower() == "true"
+    auth_principal_header_ttl_seconds: int = int(os.getenv("AUTH_PRINCIPAL_HEADER_TTL_SECONDS", "30"))
+
     # AI - NO HARDCODED API KEYS
     gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
     default_llm_model: str = os.getenv("DEFAULT_LLM_MODEL", "gemini-1.5-flash")
+    llm_base_url: str = os.getenv("LLM_BASE_URL", "https://generativelanguage.googleapis.com")
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    llm_cache_ttl_seconds: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    llm_cache_local_entries: int = int(os.getenv("LLM_CACHE_LOCAL_ENTRIES", "1000"))
+    llm_cache_max_documents: int = int(os.getenv("LLM_CACHE_MAX_DOCUMENTS", "100000"))
+    llm_semantic_cache_enabled: bool = os.getenv("LLM_SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    llm_semantic_cache_threshold: float = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    llm_semantic_cache_entries: int = int(os.getenv("LLM_SEMANTIC_CACHE_ENTRIES", "2000"))
 
     # CORS
     cors_origins: str = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
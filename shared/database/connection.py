@@ -10,6 +10,7 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
 from shared.config.config import settings
 from shared.common.logging import get_logger
+from shared.common.database import mongo_metrics_listener
 
 logger = get_logger("database-connection")
 
@@ -40,7 +41,8 @@ class DatabaseConnectionManager:
                     readPreference=getattr(settings, 'db_read_preference', 'primary'),
                     serverSelectionTimeoutMS=5000,
                     connectTimeoutMS=10000,
-                    socketTimeoutMS=30000
+                    socketTimeoutMS=30000,
+                    event_listeners=[mongo_metrics_listener]
                 )
 
                 # Test connection
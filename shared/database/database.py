@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from typing import Dict, Any
 from fastapi import HTTPException
 from shared.config.config import settings
+from shared.common.database import mongo_metrics_listener
 import uuid
 
 # Global variables for database connection
@@ -13,7 +14,7 @@ def init_database():
     """Initialize database connection"""
     global client, db, fs_bucket
     if client is None:
-        client = AsyncIOMotorClient(settings.mongo_url)
+        client = AsyncIOMotorClient(settings.mongo_url, event_listeners=[mongo_metrics_listener])
         db = client[settings.db_name]
         fs_bucket = AsyncIOMotorGridFSBucket(db)
     return db, fs_bucket
@@ -7,6 +7,7 @@ from motor.core import AgnosticCollection
 from typing import Dict, Any, List, Optional, Union
 from contextlib import asynccontextmanager
 from performance_config import performance_settings
+from shared.common.metrics import metrics_collector
 import time
 import logging
 
@@ -217,6 +218,10 @@ class OptimizedCollection:
         stats["max_time"] = max(stats["max_time"], duration)
         stats["min_time"] = min(stats["min_time"], duration)
         stats["total_records"] += record_count
+        metrics_collector.observe("db_query_duration_seconds", duration, {
+            "collection": self._collection_name,
+            "operation": operation
+        })
 
     def _record_error(self, operation: str, error: str):
         """Record query errors."""
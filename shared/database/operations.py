@@ -10,6 +10,8 @@ from pymongo.errors import PyMongoError, ConnectionFailure, OperationFailure
 
 from shared.common.errors import DatabaseError
 from shared.common.logging import get_logger
+from shared.common.tracing import traced_operation
+from shared.common.metrics import metrics_collector
 from .connection import get_database
 
 logger = get_logger("database-operations")
@@ -26,6 +28,7 @@ class DatabaseOperations:
         db = await get_database()
         return db[self.collection_name]
 
+    @traced_operation
     async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Find one document with error handling and timing"""
         start_time = time.time()
@@ -43,6 +46,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("find_one", str(e))
 
+    @traced_operation
     async def find_many(self, query: Dict[str, Any] = None, projection: Optional[Dict[str, Any]] = None,
                        skip: int = 0, limit: Optional[int] = None, sort: Optional[List[tuple]] = None) -> List[Dict[str, Any]]:
         """Find multiple documents with error handling and timing"""
@@ -73,6 +77,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("find_many", str(e))
 
+    @traced_operation
     async def insert_one(self, document: Dict[str, Any]) -> str:
         """Insert one document with error handling and timing"""
         start_time = time.time()
@@ -87,7 +92,7 @@ class DatabaseOperations:
             result = await collection.insert_one(document)
             self._record_query_time("insert_one", time.time() - start_time)
 
-            logger.info("Document inserted", extra={
+            logger.debug("Document inserted", extra=lambda: {
                 "collection": self.collection_name,
                 "document_id": str(result.inserted_id)
             })
@@ -101,6 +106,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("insert_one", str(e))
 
+    @traced_operation
     async def insert_many(self, documents: List[Dict[str, Any]]) -> List[str]:
         """Insert multiple documents with error handling and timing"""
         start_time = time.time()
@@ -116,7 +122,7 @@ class DatabaseOperations:
             result = await collection.insert_many(documents)
             self._record_query_time("insert_many", time.time() - start_time, len(documents))
 
-            logger.info("Documents inserted", extra={
+            logger.debug("Documents inserted", extra=lambda: {
                 "collection": self.collection_name,
                 "count": len(result.inserted_ids)
             })
@@ -130,6 +136,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("insert_many", str(e))
 
+    @traced_operation
     async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> bool:
         """Update one document with error handling and timing"""
         start_time = time.time()
@@ -141,7 +148,7 @@ class DatabaseOperations:
             self._record_query_time("update_one", time.time() - start_time)
 
             if updated:
-                logger.info("Document updated", extra={
+                logger.debug("Document updated", extra=lambda: {
                     "collection": self.collection_name,
                     "query": query,
                     "modified_count": result.modified_count
@@ -157,6 +164,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("update_one", str(e))
 
+    @traced_operation
     async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> int:
         """Update multiple documents with error handling and timing"""
         start_time = time.time()
@@ -166,7 +174,7 @@ class DatabaseOperations:
             result = await collection.update_many(query, update)
             self._record_query_time("update_many", time.time() - start_time, result.modified_count)
 
-            logger.info("Documents updated", extra={
+            logger.debug("Documents updated", extra=lambda: {
                 "collection": self.collection_name,
                 "query": query,
                 "modified_count": result.modified_count
@@ -182,6 +190,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("update_many", str(e))
 
+    @traced_operation
     async def delete_one(self, query: Dict[str, Any]) -> bool:
         """Delete one document with error handling and timing"""
         start_time = time.time()
@@ -193,7 +202,7 @@ class DatabaseOperations:
             self._record_query_time("delete_one", time.time() - start_time)
 
             if deleted:
-                logger.info("Document deleted", extra={
+                logger.debug("Document deleted", extra=lambda: {
                     "collection": self.collection_name,
                     "query": query
                 })
@@ -208,6 +217,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("delete_one", str(e))
 
+    @traced_operation
     async def delete_many(self, query: Dict[str, Any]) -> int:
         """Delete multiple documents with error handling and timing"""
         start_time = time.time()
@@ -217,7 +227,7 @@ class DatabaseOperations:
             result = await collection.delete_many(query)
             self._record_query_time("delete_many", time.time() - start_time, result.deleted_count)
 
-            logger.info("Documents deleted", extra={
+            logger.debug("Documents deleted", extra=lambda: {
                 "collection": self.collection_name,
                 "query": query,
                 "deleted_count": result.deleted_count
@@ -233,6 +243,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("delete_many", str(e))
 
+    @traced_operation
     async def count_documents(self, query: Dict[str, Any] = None) -> int:
         """Count documents with error handling and timing"""
         start_time = time.time()
@@ -250,6 +261,7 @@ class DatabaseOperations:
             })
             raise DatabaseError("count_documents", str(e))
 
+    @traced_operation
     async def aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Aggregate documents with error handling and timing"""
         start_time = time.time()
@@ -290,6 +302,10 @@ class DatabaseOperations:
         stats["max_time"] = max(stats["max_time"], duration)
         stats["min_time"] = min(stats["min_time"], duration)
         stats["total_records"] += record_count
+        metrics_collector.observe("db_query_duration_seconds", duration, {
+            "collection": self.collection_name,
+            "operation": operation
+        })
 
     def _record_error(self, operation: str, error: str):
         """Record query errors"""
@@ -0,0 +1,148 @@
+"""
+Local fake of the Gemini generateContent endpoint for tests and benchmarks
+
+Run standalone with ``python -m tests.fake_llm`` and point services at it
+with ``LLM_BASE_URL=http://127.0.0.1:8099``.
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Callable, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class FakeLLM:
+    """Behaviour of the fake model: latency, injected failures and call stats"""
+
+    def __init__(self, latency: float = 0.05):
+        self.reset(latency)
+
+    def reset(self, latency: float = 0.05):
+        self.latency = latency
+        self.fail_status: List[int] = []  # statuses returned by the next calls, in order
+        self.stall: Optional[float] = None  # one-off delay for the next call
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts: List[str] = []
+        self.respond: Optional[Callable[[str], str]] = None  # prompt -> text; echoes the prompt if unset
+        self.stream_chunks = 20  # a streamed reply is split into this many chunks
+        self.chunk_delay = 0.0  # between streamed chunks; `latency` is the wait for the first
+        self.streams_completed = 0
+        self.streams_aborted = 0
+
+    async def generate_content(self, request: Request):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            body = await request.json()
+            prompt = "".join(part.get("text", "") for part in body["contents"][0]["parts"])
+            self.prompts.append(prompt)
+
+            delay, self.stall = (self.stall, None) if self.stall is not None else (self.latency, None)
+            await asyncio.sleep(delay)
+
+            if self.fail_status:
+                status = self.fail_status.pop(0)
+                return JSONResponse({"error": {"code": status, "message": "injected"}}, status, headers={"Retry-After": "0"})
+            if not request.headers.get("x-goog-api-key"):
+                return JSONResponse({"error": {"code": 403, "message": "API key missing"}}, 403)
+
+            model = request.path_params["model"]
+            text = self.respond(prompt) if self.respond else f"[{model}] {prompt.strip()[:200]}"
+            return JSONResponse({
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def stream_generate_content(self, request: Request):
+        self.calls += 1
+        body = await request.json()
+        prompt = "".join(part.get("text", "") for part in body["contents"][0]["parts"])
+        self.prompts.append(prompt)
+
+        if self.fail_status:
+            await asyncio.sleep(self.latency)
+            status = self.fail_status.pop(0)
+            return JSONResponse({"error": {"code": status, "message": "injected"}}, status, headers={"Retry-After": "0"})
+
+        model = request.path_params["model"]
+        text = self.respond(prompt) if self.respond else f"[{model}] {prompt.strip()[:200]}"
+        size = max(1, -(-len(text) // self.stream_chunks))
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+        async def events():
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            finished = False
+            try:
+                await asyncio.sleep(self.latency)
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        await asyncio.sleep(self.chunk_delay)
+                    data = {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk}]}}]}
+                    yield f"data: {json.dumps(data)}\r\n\r\n"
+                finished = True
+            finally:
+                self.in_flight -= 1
+                if finished:
+                    self.streams_completed += 1
+                else:
+                    self.streams_aborted += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v1beta/models/{model}:generateContent", self.generate_content, methods=["POST"]),
+            Route("/v1beta/models/{model}:streamGenerateContent", self.stream_generate_content, methods=["POST"])
+        ])
+
+
+class ServerThread:
+    """Runs an ASGI app under uvicorn on a free local port in a background thread"""
+
+    def __init__(self, app, port: int = 0):
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"
+        ))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        deadline = time.time() + 5
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+class FakeLLMServer(ServerThread):
+    """Serves a FakeLLM; `llm` controls its behaviour"""
+
+    def __init__(self, latency: float = 0.05, port: int = 0):
+        self.llm = FakeLLM(latency)
+        super().__init__(self.llm.app(), port)
+
+
+if __name__ == "__main__":
+    uvicorn.run(FakeLLM().app(), host="127.0.0.1", port=8099)
@@ -0,0 +1,93 @@
+"""
+Performance tests for login throughput with audit logging enabled
+"""
+import pytest
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from tests.service_modules import import_service_module
+
+AuditLogBuffer = import_service_module("auth-service", "database").AuditLogBuffer
+
+LOGINS = 2000
+CONCURRENCY = 100
+ROUND_TRIP = 0.001  # one Mongo round trip
+RETENTION_SCAN = 0.002  # delete_many over audit_logs, on top of the round trip
+
+
+class FakeAuditLogs:
+    """audit_logs with simulated latency, counting round trips"""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.documents = 0
+
+    async def insert_one(self, doc):
+        self.round_trips += 1
+        self.documents += 1
+        await asyncio.sleep(ROUND_TRIP)
+
+    async def delete_many(self, query):
+        self.round_trips += 1
+        await asyncio.sleep(ROUND_TRIP + RETENTION_SCAN)
+
+    async def insert_many(self, docs, ordered=True):
+        self.round_trips += 1
+        self.documents += len(docs)
+        await asyncio.sleep(ROUND_TRIP)
+
+
+def audit_event(i: int) -> dict:
+    return {"_id": f"audit_{i}", "event_type": "login_success", "user_id": f"user_{i}", "timestamp": datetime.now(timezone.utc)}
+
+
+async def run_logins(login) -> float:
+    """Logins per second with CONCURRENCY logins in flight"""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            await asyncio.sleep(ROUND_TRIP)  # user lookup
+            await login(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(LOGINS)))
+    return LOGINS / (time.perf_counter() - start)
+
+
+class TestAuditLogging:
+    """Audit logging throughput test cases"""
+
+    @pytest.mark.asyncio
+    async def test_login_throughput_with_auditing(self):
+        """Buffered audit writes take the audit collection off the login path"""
+        legacy = FakeAuditLogs()
+
+        async def legacy_login(i):
+            await legacy.insert_one(audit_event(i))
+            cutoff = datetime.now(timezone.utc) - timedelta(days=90)
+            await legacy.delete_many({"timestamp": {"$lt": cutoff}})
+
+        legacy_rate = await run_logins(legacy_login)
+
+        buffered = FakeAuditLogs()
+        buffer = AuditLogBuffer(flush_interval=1.0, batch_size=500)
+        buffer.flush = lambda collection=None: AuditLogBuffer.flush(buffer, buffered)
+
+        async def buffered_login(i):
+            buffer.add(audit_event(i))
+
+        buffered_rate = await run_logins(buffered_login)
+        await buffer.stop()
+
+        print(f"""
+Login Throughput With Auditing ({LOGINS} logins, {CONCURRENCY} concurrent, {ROUND_TRIP * 1e3:.0f}ms round trip):
+- insert_one + delete_many per login: {legacy_rate:,.0f} logins/s, {legacy.round_trips} audit round trips
+- Buffered insert_many + TTL retention: {buffered_rate:,.0f} logins/s, {buffered.round_trips} audit round trips
+        """)
+
+        # Round trips rather than rates, which swing with load on a shared runner
+        assert legacy.round_trips == 2 * LOGINS
+        assert buffered.documents == LOGINS
+        assert buffered.round_trips <= LOGINS // 500 + 1
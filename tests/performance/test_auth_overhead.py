@@ -0,0 +1,97 @@
+"""
+Performance tests for per-request authentication overhead
+"""
+import pytest
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+import shared.common.auth as auth
+from shared.common.auth import AuthService, PrincipalCache, sign_principal, verify_principal
+from shared.common.revocation import TokenRevocationList
+from shared.config.config import settings
+
+REQUESTS = 5000
+DB_ROUND_TRIP = 0.0005  # a same-datacenter Mongo find_one
+
+
+class FakeUsers:
+    """users collection with a simulated network round trip"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        await asyncio.sleep(DB_ROUND_TRIP)
+        return {"_id": query["_id"], "role": "student", "email": "s@example.com", "name": "Student"}
+
+
+class FakeDB:
+    def __init__(self):
+        self.users = FakeUsers()
+
+
+async def legacy_validate(db, token: str):
+    """The previous path: decode, then a user lookup on every request"""
+    payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
+    user = await db.users.find_one({"_id": payload.get("sub")})
+    return {"id": user["_id"], "role": user["role"], "email": user["email"], "name": user["name"]}
+
+
+async def measure(validate, tokens) -> float:
+    """Mean seconds per authenticated request"""
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        await validate(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / REQUESTS
+
+
+class TestAuthOverhead:
+    """Authentication overhead test cases"""
+
+    @pytest.mark.asyncio
+    async def test_per_request_auth_overhead(self, monkeypatch):
+        """Cached verification removes the database from the hot path"""
+        now = datetime.now(timezone.utc)
+        # 50 active users, each making many requests with the same token
+        tokens = [
+            jwt.encode({"sub": f"user-{i}", "iat": now, "exp": now + timedelta(minutes=30)},
+                       settings.jwt_secret, algorithm="HS256")
+            for i in range(50)
+        ]
+
+        db = FakeDB()
+        monkeypatch.setattr(auth, "get_database", lambda: db)
+        monkeypatch.setattr(auth, "principal_cache", PrincipalCache(max_size=10000, ttl_seconds=60))
+        revocations = TokenRevocationList(capacity=1000, error_rate=0.01)
+        revocations.start = lambda: None
+        monkeypatch.setattr(auth, "token_revocations", revocations)
+
+        legacy = await measure(lambda token: legacy_validate(db, token), tokens)
+        legacy_calls = db.users.calls
+
+        db.users.calls = 0
+        cached = await measure(AuthService.validate_jwt_token, tokens)
+        cached_calls = db.users.calls
+
+        headers = [sign_principal({"id": f"user-{i}", "role": "student"}) for i in range(50)]
+
+        async def forwarded_validate(value):
+            return verify_principal(value)
+
+        forwarded = await measure(forwarded_validate, headers)
+
+        print(f"""
+Auth Overhead ({REQUESTS} requests, 50 users, {DB_ROUND_TRIP * 1e3:.1f}ms simulated DB round trip):
+- Decode + DB lookup per request: {legacy * 1e6:.1f}us/request ({legacy_calls} lookups)
+- In-memory verify + principal cache: {cached * 1e6:.1f}us/request ({cached_calls} lookups)
+- Gateway-signed principal header: {forwarded * 1e6:.1f}us/request (0 lookups)
+        """)
+
+        assert legacy_calls == REQUESTS
+        assert cached_calls == len(tokens)
+        assert cached < legacy / 5
+        assert forwarded < cached
@@ -0,0 +1,94 @@
+"""
+Performance tests for AI course generation wall-clock time
+"""
+import pytest
+import importlib.util
+import json
+import time
+from pathlib import Path
+
+from shared.common.llm import LLMClient
+from shared.models.models import GenerateCourseRequest
+from tests.fake_llm import FakeLLMServer
+
+_spec = importlib.util.spec_from_file_location(
+    "course_generation",
+    Path(__file__).resolve().parents[2] / "services" / "course-service" / "app" / "services" / "course_generation.py"
+)
+course_generation = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(course_generation)
+
+LESSONS = 10
+LATENCY = 0.2  # fixed fake model latency per call
+
+
+def respond(prompt: str) -> str:
+    if "course structure" in prompt:
+        return json.dumps({"title": "Graphs", "lessons": [{"title": f"Lesson {i + 1}"} for i in range(LESSONS)]})
+    if "quiz" in prompt:
+        return json.dumps([{"question": "Q?", "options": [{"text": "a", "is_correct": True}, {"text": "b"}]}] * 20)
+    return "Lesson content"
+
+
+class NullCourses:
+    """courses collection that accepts writes and counts them"""
+
+    def __init__(self):
+        self.writes = 0
+
+    async def insert_one(self, doc):
+        self.writes += 1
+
+    async def update_one(self, query, update):
+        self.writes += 1
+
+
+async def sequential(pipeline, req):
+    """The previous flow: outline, each lesson in turn, then one course quiz"""
+    outline = await pipeline.generate_outline(req)
+    lessons = []
+    for i, lesson_outline in enumerate(outline["lessons"]):
+        lessons.append(await pipeline.generate_lesson(lesson_outline, req, i + 1))
+    await pipeline.llm.generate(f"Create a comprehensive quiz for the course: {req.topic}")
+    return lessons
+
+
+class TestCourseGenerationWallClock:
+    """Course generation wall-clock test cases"""
+
+    @pytest.mark.asyncio
+    async def test_ten_lesson_course(self):
+        """Pipelined generation finishes a 10-lesson course in a fraction of the serial time"""
+        req = GenerateCourseRequest(topic="Graphs", audience="students", difficulty="beginner", lessons_count=LESSONS)
+        results = {}
+        with FakeLLMServer(latency=LATENCY) as server:
+            server.llm.respond = respond
+            llm = LLMClient(api_key="k", model="fake", base_url=server.base_url, max_concurrency=16)
+
+            start = time.perf_counter()
+            await sequential(course_generation.CourseGenerationPipeline(NullCourses(), llm=llm), req)
+            results["serial"] = (time.perf_counter() - start, server.llm.calls, 1, server.llm.max_in_flight)
+
+            for concurrency in (4, 10):
+                server.llm.reset(latency=LATENCY)
+                server.llm.respond = respond
+                courses = NullCourses()
+                pipeline = course_generation.CourseGenerationPipeline(courses, llm=llm, concurrency=concurrency)
+                start = time.perf_counter()
+                course = await pipeline.run(req, "owner-1")
+                results[concurrency] = (time.perf_counter() - start, server.llm.calls, courses.writes, server.llm.max_in_flight)
+                assert len(course.lessons) == LESSONS
+            await llm.close()
+
+        print(f"""
+Course Generation Wall Clock ({LESSONS} lessons, {LATENCY * 1e3:.0f}ms per LLM call):
+- Serial (outline, lessons one by one, course quiz): {results['serial'][0]:.2f}s, {results['serial'][1]} LLM calls, 1 write at the end
+- Pipelined, 4 lessons at a time (+ per-lesson quizzes): {results[4][0]:.2f}s, {results[4][1]} LLM calls, {results[4][2]} incremental writes, {results[4][3]} calls in flight at peak
+- Pipelined, 10 lessons at a time: {results[10][0]:.2f}s, {results[10][1]} LLM calls, {results[10][2]} incremental writes, {results[10][3]} calls in flight at peak
+        """)
+
+        # Overlap at the model rather than elapsed time, which swings with load on a shared runner
+        assert results["serial"][1:] == (LESSONS + 2, 1, 1)
+        for concurrency in (4, 10):
+            assert results[concurrency][1] == 2 * LESSONS + 1
+            assert concurrency // 2 < results[concurrency][3] <= concurrency
@@ -0,0 +1,201 @@
+"""
+Load tests for gateway rate limiting and load shedding
+"""
+import pytest
+import asyncio
+import time
+import jwt
+from typing import List, Tuple
+
+from shared.config.config import settings
+from shared.common.load_shedding import LoadShedder, RequestPriority
+from shared.common.middleware import RateLimitMiddleware
+from shared.common.rate_limiting import RateLimiter, RateLimitRule
+
+
+SERVICE_TIME = 0.01
+UPSTREAM_CAPACITY = 20
+
+
+def make_upstream(capacity: int = UPSTREAM_CAPACITY, service_time: float = SERVICE_TIME):
+    """Fake upstream ASGI app that serves `capacity` requests at a time"""
+    semaphore = asyncio.Semaphore(capacity)
+
+    async def app(scope, receive, send):
+        async with semaphore:
+            await asyncio.sleep(service_time)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return app
+
+
+async def call(app, path: str, token: str = None) -> Tuple[int, dict, float]:
+    """Drive one request through an ASGI app; returns (status, headers, latency)"""
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    scope = {"type": "http", "path": path, "method": "GET", "headers": headers, "client": ("10.0.0.1", 1234)}
+    result = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = dict(message["headers"])
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return result["status"], result["headers"], time.perf_counter() - start
+
+
+def p99(samples: List[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+async def run_load(app, workers: int, requests_per_worker: int, path: str = "/api/courses/1"):
+    """Closed-loop load generator; returns latencies of successful requests and all statuses"""
+    latencies: List[float] = []
+    statuses: List[int] = []
+
+    async def worker():
+        for _ in range(requests_per_worker):
+            status, _, latency = await call(app, path)
+            statuses.append(status)
+            if status == 200:
+                latencies.append(latency)
+            else:
+                # Rejected clients back off briefly instead of hot-looping
+                await asyncio.sleep(SERVICE_TIME)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return latencies, statuses
+
+
+class TestGatewayAdmission:
+    """Admission control test cases"""
+
+    @pytest.mark.asyncio
+    async def test_p99_bounded_under_5x_overload(self):
+        """Shedding keeps admitted p99 close to the service time at 5x offered concurrency"""
+        overload_workers = UPSTREAM_CAPACITY * 5
+
+        unprotected, _ = await run_load(make_upstream(), overload_workers, 10)
+
+        shedder = LoadShedder(max_in_flight=UPSTREAM_CAPACITY, latency_target=SERVICE_TIME * 3)
+        protected_app = RateLimitMiddleware(make_upstream(), limiter=RateLimiter(), shedder=shedder)
+        protected, statuses = await run_load(protected_app, overload_workers, 10)
+
+        print(f"""
+Admission Results (5x overload):
+- Unprotected p99: {p99(unprotected) * 1000:.1f}ms
+- Protected p99: {p99(protected) * 1000:.1f}ms
+- Admitted: {statuses.count(200)} / Shed: {statuses.count(503)}
+        """)
+
+        assert statuses.count(503) > 0
+        assert p99(protected) < SERVICE_TIME * 4
+        assert p99(protected) < p99(unprotected) / 2
+
+    @pytest.mark.asyncio
+    async def test_critical_traffic_survives_overload(self):
+        """Auth and health requests are admitted while normal traffic is shed"""
+        shedder = LoadShedder(max_in_flight=UPSTREAM_CAPACITY, latency_target=SERVICE_TIME)
+        app = RateLimitMiddleware(make_upstream(), limiter=RateLimiter(), shedder=shedder)
+
+        overload = asyncio.ensure_future(run_load(app, UPSTREAM_CAPACITY * 5, 10))
+        await asyncio.sleep(SERVICE_TIME)
+
+        critical = []
+        for _ in range(20):
+            status, _, _ = await call(app, "/api/auth/login")
+            critical.append(status)
+            status, _, _ = await call(app, "/health")
+            critical.append(status)
+
+        _, statuses = await overload
+
+        assert statuses.count(503) > 0
+        assert all(status == 200 for status in critical)
+        assert shedder.shed[RequestPriority.CRITICAL] == 0
+
+    @pytest.mark.asyncio
+    async def test_slow_ai_calls_do_not_shed_fast_routes(self):
+        """Long LLM calls and streams on LOW routes leave NORMAL traffic admitted"""
+        fast = make_upstream()
+        ai_time = SERVICE_TIME * 20
+
+        async def upstream(scope, receive, send):
+            if scope["path"].startswith("/api/ai/stream"):
+                await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+                await asyncio.sleep(ai_time)
+                await send({"type": "http.response.body", "body": b"data: done\n\n"})
+            elif scope["path"].startswith("/api/ai"):
+                await asyncio.sleep(ai_time)
+                await send({"type": "http.response.start", "status": 200, "headers": []})
+                await send({"type": "http.response.body", "body": b"{}"})
+            else:
+                await fast(scope, receive, send)
+
+        shedder = LoadShedder(max_in_flight=UPSTREAM_CAPACITY * 10, latency_target=SERVICE_TIME * 3)
+        app = RateLimitMiddleware(upstream, limiter=RateLimiter(), shedder=shedder)
+
+        async def ai_user(path):
+            for _ in range(3):
+                await call(app, path)
+
+        ai_calls = asyncio.ensure_future(asyncio.gather(*(ai_user(path) for path in ["/api/ai/analyze", "/api/ai/stream"] * 5)))
+        statuses = []
+        while not ai_calls.done():
+            for path in ("/api/courses/1", "/api/users/me", "/api/notifications"):
+                statuses.append((await call(app, path))[0])
+        await ai_calls
+
+        assert shedder.latency_ewma[RequestPriority.LOW] > SERVICE_TIME * 10
+        assert statuses and all(status == 200 for status in statuses)
+        assert shedder.shed[RequestPriority.NORMAL] == 0
+        assert shedder.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_shed_response_has_retry_after(self):
+        """Shed requests get a 503 with Retry-After"""
+        shedder = LoadShedder(max_in_flight=1)
+        shedder.try_acquire(RequestPriority.NORMAL)
+        app = RateLimitMiddleware(make_upstream(), limiter=RateLimiter(), shedder=shedder)
+
+        status, headers, _ = await call(app, "/api/courses")
+
+        assert status == 503
+        assert int(headers[b"retry-after"]) >= 1
+
+    @pytest.mark.asyncio
+    async def test_role_and_route_rules(self):
+        """Role rules override route rules and counts are kept per user and route"""
+        limiter = RateLimiter()
+        limiter.add_rule("/api/courses", RateLimitRule(requests=5, window_seconds=60, strategy="sliding_window"))
+        limiter.add_rule("/api/files", RateLimitRule(requests=2, window_seconds=60, strategy="sliding_window", prefix=True))
+        limiter.add_role_rule("student", "/api/courses/ai/generate",
+                              RateLimitRule(requests=2, window_seconds=60, strategy="sliding_window"))
+        app = RateLimitMiddleware(make_upstream(), limiter=limiter)
+
+        student = jwt.encode({"sub": "student-1", "role": "student"}, settings.jwt_secret, algorithm="HS256")
+        instructor = jwt.encode({"sub": "instructor-1", "role": "instructor"}, settings.jwt_secret, algorithm="HS256")
+
+        student_ai = [(await call(app, "/courses/ai/generate", student))[0] for _ in range(3)]
+        instructor_ai = [(await call(app, "/courses/ai/generate", instructor))[0] for _ in range(3)]
+        student_courses = [(await call(app, "/courses", student))[0] for _ in range(6)]
+        student_lessons = [(await call(app, "/courses/42/lessons", student))[0] for _ in range(6)]
+        student_files = [(await call(app, f"/files/{i}/download", student))[0] for i in range(3)]
+
+        assert student_ai == [200, 200, 429]
+        assert instructor_ai == [200, 200, 200]
+        assert student_courses == [200] * 5 + [429]
+        # "/api/courses" is an exact rule; only prefix rules cover the paths below them
+        assert student_lessons == [200] * 6
+        assert student_files == [200, 200, 429]
+
+        status, headers, _ = await call(app, "/courses", student)
+        assert status == 429
+        assert b"retry-after" in headers
+        assert headers[b"x-ratelimit-remaining"] == b"0"
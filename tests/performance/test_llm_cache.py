@@ -0,0 +1,88 @@
+"""
+Performance tests for the LLM response cache on a repetitive workload
+"""
+import pytest
+import asyncio
+import random
+import time
+
+from fakeredis import FakeServer, aioredis
+
+from shared.common.llm import LLMClient
+from shared.common.llm_cache import LLMCache, SemanticIndex
+from tests.fake_llm import FakeLLMServer
+
+REQUESTS = 400
+LATENCY = 0.05
+
+
+def workload(seed: int = 7):
+    """Zipf-like mix of enhancement requests; some texts differ only by a trailing edit"""
+    rng = random.Random(seed)
+    lessons = [f"Lesson {i}: how {topic} works, with worked examples and common mistakes to avoid"
+               for i, topic in enumerate(["recursion", "hashing", "sorting", "graphs", "trees", "queues"] * 5)]
+    weights = [1 / (rank + 1) for rank in range(len(lessons))]
+    requests = []
+    for _ in range(REQUESTS):
+        content = rng.choices(lessons, weights)[0]
+        if rng.random() < 0.2:
+            content += " (revised)"
+        requests.append({"content": content, "level": rng.choice(["beginner", "intermediate"])})
+    return requests
+
+
+async def run(llm: LLMClient, cache: LLMCache = None):
+    latencies = []
+
+    async def one(params):
+        prompt = f"Enhance for {params['level']} learners: {params['content']}"
+        start = time.perf_counter()
+        if cache is None:
+            await llm.generate(prompt)
+        else:
+            await cache.generate("enhancement.enhance_content", prompt, params, llm=llm, semantic_field="content")
+        latencies.append(time.perf_counter() - start)
+
+    requests = workload()
+    start = time.perf_counter()
+    for batch in range(0, REQUESTS, 20):  # 20 users at a time
+        await asyncio.gather(*(one(params) for params in requests[batch:batch + 20]))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+class TestLLMCacheWorkload:
+    """LLM cache workload test cases"""
+
+    @pytest.mark.asyncio
+    async def test_repetitive_enhancement_workload(self):
+        """Exact and similarity tiers absorb most of a repetitive workload"""
+        with FakeLLMServer(latency=LATENCY) as server:
+            llm = LLMClient(api_key="k", model="fake", base_url=server.base_url, max_concurrency=32)
+
+            uncached_time, uncached = await run(llm)
+            uncached_calls = server.llm.calls
+
+            server.llm.reset(latency=LATENCY)
+            exact = LLMCache(redis_client=aioredis.FakeRedis(server=FakeServer()))
+            exact_time, exact_latencies = await run(llm, exact)
+            exact_calls = server.llm.calls
+
+            server.llm.reset(latency=LATENCY)
+            semantic = LLMCache(semantic=SemanticIndex(), redis_client=aioredis.FakeRedis(server=FakeServer()))
+            semantic_time, semantic_latencies = await run(llm, semantic)
+            semantic_calls = server.llm.calls
+            await llm.close()
+
+        def p50(values):
+            return values[len(values) // 2] * 1e3
+
+        print(f"""
+LLM Cache ({REQUESTS} requests, {LATENCY * 1e3:.0f}ms model latency):
+- No cache: {uncached_calls} model calls, {uncached_time:.2f}s, p50 {p50(uncached):.1f}ms
+- Exact cache: {exact_calls} model calls, hit ratio {exact.stats()['hit_ratio']:.1%}, {exact.saved_tokens} tokens saved, {exact_time:.2f}s, p50 {p50(exact_latencies):.2f}ms
+- Exact + similarity: {semantic_calls} model calls, hit ratio {semantic.stats()['hit_ratio']:.1%} ({semantic.hits['semantic']} similar), {semantic.saved_tokens} tokens saved, {semantic_time:.2f}s
+        """)
+
+        assert exact_calls < uncached_calls / 2
+        assert semantic_calls < exact_calls
+        assert exact_time < uncached_time
@@ -0,0 +1,76 @@
+"""
+Performance tests for request throughput while LLM generations are in flight
+"""
+import pytest
+import asyncio
+import time
+
+import httpx
+
+from shared.common.llm import LLMClient
+from tests.fake_llm import FakeLLMServer
+
+GENERATIONS = 32
+LATENCY = 0.25  # fake model time per generation
+PROBE_INTERVAL = 0.005  # a cheap request (health check, cached read) every 5ms
+
+
+async def probe(stop: asyncio.Event, lags: list):
+    """Stands in for other requests: records how late each one gets the loop"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run_with_probe(generate) -> dict:
+    stop, lags = asyncio.Event(), []
+    prober = asyncio.create_task(probe(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(generate(f"lesson {i}") for i in range(GENERATIONS)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "served": len(lags) / elapsed,
+        "p99_lag": lags[int(len(lags) * 0.99)] if lags else elapsed,
+        "max_lag": lags[-1] if lags else elapsed,
+    }
+
+
+class TestLLMConcurrency:
+    """LLM client concurrency test cases"""
+
+    @pytest.mark.asyncio
+    async def test_throughput_during_generations(self):
+        """Async generations keep the event loop free for other requests"""
+        with FakeLLMServer(latency=LATENCY) as server:
+            url = f"{server.base_url}/v1beta/models/fake:generateContent"
+
+            # Previous pattern: a blocking SDK call inside an async handler
+            blocking_http = httpx.Client()
+
+            async def blocking_generate(prompt):
+                response = blocking_http.post(url, params={"key": "k"}, json={"contents": [{"parts": [{"text": prompt}]}]})
+                return response.json()
+
+            blocking = await run_with_probe(blocking_generate)
+            blocking_http.close()
+
+            client = LLMClient(api_key="k", model="fake", base_url=server.base_url, max_concurrency=16)
+            shared = await run_with_probe(client.generate)
+            await client.close()
+            max_in_flight = server.llm.max_in_flight
+
+        print(f"""
+Throughput During Generations ({GENERATIONS} generations, {LATENCY * 1e3:.0f}ms model latency, probe every {PROBE_INTERVAL * 1e3:.0f}ms):
+- Blocking generate_content: {blocking['elapsed']:.2f}s for all generations, {blocking['served']:,.0f} other requests/s, p99 loop lag {blocking['p99_lag'] * 1e3:.0f}ms (max {blocking['max_lag'] * 1e3:.0f}ms)
+- Shared async client (16 slots): {shared['elapsed']:.2f}s for all generations, {shared['served']:,.0f} other requests/s, p99 loop lag {shared['p99_lag'] * 1e3:.1f}ms (max {shared['max_lag'] * 1e3:.1f}ms)
+- Peak generations in flight at the model: {max_in_flight}
+        """)
+
+        assert shared["elapsed"] < blocking["elapsed"] / 4
+        assert shared["served"] > blocking["served"] * 10
+        assert max_in_flight <= 16
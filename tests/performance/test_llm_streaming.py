@@ -0,0 +1,98 @@
+"""
+Performance tests for streamed AI responses through the API gateway
+"""
+import pytest
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from shared.common.llm import LLMClient
+from shared.common.tracing import setup_tracing
+from tests.fake_llm import FakeLLMServer, ServerThread
+from tests.service_modules import import_service_module
+
+proxy = import_service_module("api-gateway", "routes.proxy")
+
+FIRST_TOKEN = 0.3  # model latency before the first token
+CHUNKS = 30
+CHUNK_DELAY = 0.03
+
+
+def ai_service(llm: LLMClient) -> Starlette:
+    """Stand-in for the AI service lesson route, buffered or streamed like `?stream=true`"""
+
+    async def enhance_lesson(request: Request):
+        prompt = (await request.json())["lesson_content"]
+        if request.query_params.get("stream") != "true":
+            # Buffered: wait for the whole generation, as the JSON routes do
+            text = "".join([chunk async for chunk in llm.stream(prompt)])
+            return JSONResponse({"enhanced_lesson": {"content": text}})
+
+        async def events():
+            async for chunk in llm.stream(prompt):
+                yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/ai/enhance-lesson", enhance_lesson, methods=["POST"])])
+
+
+async def timed_request(client: httpx.AsyncClient, url: str):
+    """Time to first body byte and to the end of the response"""
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", url, json={"lesson_content": "Recursion " * 40}) as response:
+        async for _ in response.aiter_raw():
+            if first is None:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+class TestGatewayStreaming:
+    """Gateway streaming test cases"""
+
+    @pytest.mark.asyncio
+    async def test_time_to_first_byte(self):
+        """Streaming through the gateway shows text after the first token, and a disconnect stops the model"""
+        with FakeLLMServer(latency=FIRST_TOKEN) as model:
+            model.llm.stream_chunks = CHUNKS
+            model.llm.chunk_delay = CHUNK_DELAY
+            llm = LLMClient(api_key="k", model="fake", base_url=model.base_url)
+            with ServerThread(ai_service(llm)) as upstream:
+                proxy.SERVICES["ai"] = upstream.base_url
+                gateway_app = FastAPI()
+                gateway_app.include_router(proxy.router)
+                setup_tracing(gateway_app, "api-gateway")
+                with ServerThread(gateway_app) as gateway:
+                    async with httpx.AsyncClient(base_url=gateway.base_url, timeout=30) as client:
+                        buffered = await timed_request(client, "/api/ai/enhance-lesson")
+                        streamed = await timed_request(client, "/api/ai/enhance-lesson?stream=true")
+
+                        # Disconnect after the first event; the model stream should be aborted
+                        async with client.stream("POST", "/api/ai/enhance-lesson?stream=true", json={"lesson_content": "x"}) as response:
+                            async for _ in response.aiter_raw():
+                                break
+                        deadline = time.time() + 2
+                        while not model.llm.streams_aborted and time.time() < deadline:
+                            await asyncio.sleep(0.05)
+                    await proxy.close_http_client()
+            await llm.close()
+
+        print(f"""
+Gateway Streaming (first token {FIRST_TOKEN * 1e3:.0f}ms, {CHUNKS} chunks every {CHUNK_DELAY * 1e3:.0f}ms):
+- Buffered reply: first byte {buffered[0] * 1e3:.0f}ms, complete {buffered[1] * 1e3:.0f}ms
+- Streamed (SSE): first byte {streamed[0] * 1e3:.0f}ms, complete {streamed[1] * 1e3:.0f}ms
+- Client disconnect after the first event: {model.llm.streams_aborted} model stream aborted
+        """)
+
+        assert streamed[0] < FIRST_TOKEN + 0.3
+        assert buffered[0] > FIRST_TOKEN + (CHUNKS - 1) * CHUNK_DELAY * 0.8
+        assert model.llm.streams_aborted == 1
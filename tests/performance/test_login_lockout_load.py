@@ -0,0 +1,112 @@
+"""
+Performance tests for backend load during a credential-stuffing burst
+"""
+import pytest
+import json
+import time
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+LoginThrottle = import_service_module("auth-service", "utils.login_throttle").LoginThrottle
+
+TARGET_RATE = 10000  # failed logins per second
+CACHED_KEYS = 20000  # other keys in Redis that every KEYS scan walks
+LEGACY_ATTEMPTS = 200
+THROTTLED_ATTEMPTS = 10000
+
+
+class CountingRedis(aioredis.FakeRedis):
+    """In-process Redis counting round trips (a pipeline is one)"""
+
+    calls = 0
+
+    async def execute_command(self, *args, **kwargs):
+        CountingRedis.calls += 1
+        return await super().execute_command(*args, **kwargs)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        async def counted(*args, **kwargs):
+            CountingRedis.calls += 1
+            return await execute(*args, **kwargs)
+
+        pipe.execute = counted
+        return pipe
+
+
+class CountingUsers:
+    """users collection counting round trips"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def find_one(self, query):
+        self.calls += 1
+        return {"_id": "user-1", "email": "victim@example.com", "login_attempts": 3}
+
+    async def update_one(self, query, update):
+        self.calls += 1
+
+
+async def legacy_failure(client, users, email: str):
+    """The previous record_login_attempt: read, rewrite, KEYS-invalidate, re-read"""
+    user = json.loads(await client.get(f"user:email:{email}") or "null") or await users.find_one({"email": email})
+    await users.update_one({"_id": user["_id"]}, {"$set": {"login_attempts": user["login_attempts"] + 1}})
+    keys = await client.keys(f"user:{user['_id']}")
+    if keys:
+        await client.delete(*keys)
+    if not await client.get(f"user:{user['_id']}"):
+        user = await users.find_one({"_id": user["_id"]})
+        await client.set(f"user:email:{email}", json.dumps(user), ex=3600)
+        await client.set(f"user:{user['_id']}", json.dumps(user), ex=3600)
+    keys = await client.keys(f"user:email:{email}")
+    if keys:
+        await client.delete(*keys)
+
+
+class TestLoginLockoutLoad:
+    """Credential-stuffing load test cases"""
+
+    @pytest.mark.asyncio
+    async def test_failed_login_burst(self):
+        """Redis counters replace per-attempt user rewrites and KEYS scans"""
+        client = CountingRedis(server=FakeServer())
+        for i in range(CACHED_KEYS):
+            await client.set(f"course:{i}", "x")
+
+        users = CountingUsers()
+        CountingRedis.calls = 0
+        start = time.perf_counter()
+        for i in range(LEGACY_ATTEMPTS):
+            await legacy_failure(client, users, "victim@example.com")
+        legacy_seconds = (time.perf_counter() - start) / LEGACY_ATTEMPTS
+        legacy_redis = CountingRedis.calls / LEGACY_ATTEMPTS
+        legacy_mongo = users.calls / LEGACY_ATTEMPTS
+
+        throttle = LoginThrottle(max_email_failures=5, max_ip_failures=50, redis_client=client)
+        CountingRedis.calls = 0
+        start = time.perf_counter()
+        locked = 0
+        for i in range(THROTTLED_ATTEMPTS):
+            # Stuffing spreads across many emails and a pool of addresses
+            result = await throttle.record_failure(f"user{i % 5000}@example.com", f"10.0.{i % 200 // 100}.{i % 100}")
+            locked += bool(result["newly_locked"])
+        throttled_seconds = (time.perf_counter() - start) / THROTTLED_ATTEMPTS
+        throttled_redis = CountingRedis.calls / THROTTLED_ATTEMPTS
+
+        print(f"""
+Failed Login Burst (target {TARGET_RATE:,}/s, {CACHED_KEYS:,} other keys in Redis):
+- Mongo counters: {legacy_mongo:.0f} Mongo + {legacy_redis:.0f} Redis round trips per failure (2 KEYS scans)
+  => {legacy_mongo * TARGET_RATE:,.0f} Mongo ops/s, {legacy_redis * TARGET_RATE:,.0f} Redis ops/s, {1 / legacy_seconds:,.0f} failures/s per process
+- Redis windows: 0 Mongo + {throttled_redis:.2f} Redis round trips per failure
+  => {throttled_redis * TARGET_RATE:,.0f} Redis ops/s, {1 / throttled_seconds:,.0f} failures/s per process
+- Lockouts persisted to Mongo: {locked} ({locked / THROTTLED_ATTEMPTS:.1%} of failures)
+        """)
+
+        assert throttled_redis < 1.5
+        assert throttled_seconds < legacy_seconds
+        assert locked == throttle.lockouts
@@ -0,0 +1,52 @@
+"""
+Performance benchmarks for the shared metrics collector
+"""
+import pytest
+import random
+import time
+
+from shared.common.monitoring import MetricsCollector
+
+
+class TestMetricsPerformance:
+    """Metrics recording benchmarks"""
+
+    def test_histogram_record_throughput(self):
+        """Recording through a held histogram handle targets 1M values/second"""
+        collector = MetricsCollector()
+        histogram = collector.histogram("request_duration", {"route": "/courses/{course_id}", "method": "GET"})
+        rng = random.Random(7)
+        values = [rng.lognormvariate(-4, 1) for _ in range(1_000_000)]
+
+        record = histogram.record
+        start = time.perf_counter()
+        for value in values:
+            record(value)
+        elapsed = time.perf_counter() - start
+        rate = len(values) / elapsed
+
+        print(f"""
+Metrics Benchmark:
+- Recorded: {len(values)} values in {elapsed:.3f}s
+- Throughput: {rate:,.0f} records/second
+- Buckets used: {len(histogram.buckets)}
+        """)
+
+        assert histogram.count == len(values)
+        # 1M/s is the target without coverage tracing; keep headroom for instrumented runs
+        assert rate > 250_000
+
+    def test_tagged_counter_throughput(self):
+        """Tagged counter increments avoid locks and repeated key formatting"""
+        collector = MetricsCollector()
+        tags = {"result": "success"}
+
+        start = time.perf_counter()
+        for _ in range(200_000):
+            collector.counter_inc("login_attempts", tags=tags)
+        rate = 200_000 / (time.perf_counter() - start)
+
+        print(f"Tagged counter throughput: {rate:,.0f} increments/second")
+
+        assert collector.counters['login_attempts{result="success"}'] == 200_000
+        assert rate > 100_000
@@ -0,0 +1,173 @@
+"""
+Performance tests for notification digests on a replayed event log
+"""
+import pytest
+import asyncio
+import logging
+import random
+import time
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+notification_service = import_service_module("notification-service", "services.notification_service")
+websocket = import_service_module("notification-service", "routes.websocket")
+models = import_service_module("notification-service", "models")
+
+STUDENTS = 1500
+DAY = 86400
+TICK = 30  # seconds between digest flushes, as in the service
+IMMEDIATE_USERS = 100  # students who turned digests off
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Collection that counts operations and written documents"""
+
+    def __init__(self, stats: dict, docs=None):
+        self.stats = stats
+        self.docs = docs or []
+
+    async def insert_many(self, docs, ordered=True):
+        self.stats["operations"] += 1
+        self.stats["documents_written"] += len(docs)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.stats["operations"] += 1
+        self.stats["documents_written"] += len(operations)
+
+    def find(self, query=None):
+        self.stats["operations"] += 1
+        if not query:
+            return FakeCursor(self.docs)
+        wanted = set(query["user_id"]["$in"])
+        return FakeCursor([doc for doc in self.docs if doc["user_id"] in wanted])
+
+
+class FakeDB:
+    def __init__(self):
+        self.stats = {"operations": 0, "documents_written": 0}
+        self.notifications = FakeCollection(self.stats)
+        self.notification_outbox = FakeCollection(self.stats)
+        self.notification_settings = FakeCollection(self.stats, [
+            {"user_id": f"student{i}", "digest_enabled": False} for i in range(IMMEDIATE_USERS)
+        ])
+        self.notification_templates = FakeCollection(self.stats)
+
+
+def event_log(seed: int = 3):
+    """A day of one large course: (time, event) pairs in time order"""
+    rng = random.Random(seed)
+    log = []
+
+    def for_everyone(at, spread, **fields):
+        for i in range(STUDENTS):
+            log.append((at + rng.uniform(0, spread), models.NotificationCreate(recipient_id=f"student{i}", course_id="cs101", **fields)))
+
+    # The instructor releases quiz grades in two grading sessions
+    for quiz in range(8):
+        session = 13 * 3600 if quiz < 4 else 20 * 3600
+        for_everyone(session + quiz * 300, 120, title=f"Quiz {quiz + 1} graded", message="Your grade is available",
+                     type="grade_available", channels=["in_app", "email"])
+    # Lessons published through the day, a few at a time
+    for lesson in range(12):
+        for_everyone(9 * 3600 + (lesson // 3) * 7200 + (lesson % 3) * 240, 5,
+                     title=f"Lesson {lesson + 1} published", message="New material", type="course_update", channels=["in_app"])
+    # Deadline warnings, the last one urgent
+    for n, priority in enumerate(["medium", "medium", "urgent"]):
+        for_everyone(17 * 3600 + n * 600, 5, title=f"Problem set {n + 1} due soon", message="Due tonight",
+                     type="deadline_warning", priority=priority, channels=["in_app", "email", "push"])
+    # An announcement everyone should see at once
+    for_everyone(12 * 3600, 5, title="Exam room changed", message="Room 204", type="system_announcement",
+                 priority="high", channels=["in_app", "email"])
+    log.sort(key=lambda entry: entry[0])
+    return log
+
+
+def service_with(server):
+    service = notification_service.NotificationService()
+    service.db = type(notification_service.notification_db)()
+    service.db.db = FakeDB()
+    service.dispatcher.db = service.db
+    service.inbox.redis_client = aioredis.FakeRedis(server=server, decode_responses=True)
+    service.digests.redis_client = aioredis.FakeRedis(server=server, decode_responses=True)
+    service.templates.ttl = DAY
+
+    sends = {}
+
+    def counting(channel):
+        async def send(batch):
+            sends[channel] = sends.get(channel, 0) + len(batch)
+            return [None] * len(batch)
+        return send
+
+    service.dispatcher.senders = {channel: counting(channel) for channel in service.dispatcher.senders}
+    return service, sends
+
+
+async def replay(service, log, coalesce: bool):
+    await service.dispatcher.start(poll=False)
+    start = time.perf_counter()
+    i = 0
+    for tick in range(0, DAY + 3600, TICK):
+        batch = []
+        while i < len(log) and log[i][0] < tick + TICK:
+            batch.append(log[i][1])
+            i += 1
+        if coalesce:
+            if batch:
+                await service.digests.add(batch, now=tick)
+            await service.digests.flush(now=tick + TICK)
+        elif batch:
+            await service.create_bulk_notifications(batch)
+    await service.dispatcher.drain()
+    elapsed = time.perf_counter() - start
+    await service.dispatcher.stop()
+    return elapsed
+
+
+class TestNotificationDigestPerformance:
+    """Notification digest performance test cases"""
+
+    @pytest.mark.asyncio
+    async def test_replayed_course_day(self, monkeypatch):
+        """One day of a 1500-student course: every event sent vs 15-minute digests"""
+        logging.disable(logging.INFO)
+        server = FakeServer()
+        monkeypatch.setattr(notification_service, "websocket_manager",
+                            websocket.ConnectionManager(redis_client=aioredis.FakeRedis(server=server, decode_responses=True)))
+        log = event_log()
+        try:
+            before, before_sends = service_with(server)
+            before_time = await replay(before, log, coalesce=False)
+            after, after_sends = service_with(server)
+            after_time = await replay(after, log, coalesce=True)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        def totals(service, sends):
+            stats = service.db.db.stats
+            return sum(sends.values()), stats["documents_written"], stats["operations"]
+
+        b, a = totals(before, before_sends), totals(after, after_sends)
+        digests = after.digests
+        print(f"""
+Notification Digests ({len(log)} events in one day for {STUDENTS} students, 15 minute windows, {IMMEDIATE_USERS} students opted out):
+- One notification per event: {b[0]} channel sends ({before_sends}), {b[1]} documents written in {b[2]} operations, {before_time:.2f}s
+- Digests: {a[0]} channel sends ({after_sends}), {a[1]} documents written in {a[2]} operations, {after_time:.2f}s
+- Reduction: {b[0] / a[0]:.1f}x fewer sends, {b[1] / a[1]:.1f}x fewer documents written
+- Coalescer: {digests.events_bypassed} events sent immediately, {digests.events_coalesced} coalesced, {digests.digests_sent} notifications from buckets, {after.templates.loads} template load(s), {after.templates.renders} renders
+        """)
+
+        assert digests.events_in == len(log)
+        assert digests.events_bypassed >= 2 * STUDENTS  # the urgent warning and the announcement
+        assert a[0] < b[0] / 1.8
+        assert a[1] < b[1] / 1.8
@@ -0,0 +1,144 @@
+"""
+Performance tests for pipelined notification dispatch
+"""
+import pytest
+import asyncio
+import logging
+import time
+
+from tests.service_modules import import_service_module
+
+notification_service = import_service_module("notification-service", "services.notification_service")
+models = import_service_module("notification-service", "models")
+
+COHORT = 100_000
+SERIAL_SAMPLE = 2_000  # the serial path is timed on a sample and extrapolated
+ROUND_TRIP = 0.001  # per MongoDB operation
+POOL_SIZE = 10  # connections in the driver pool
+
+
+class FakeCollection:
+    """Collection that costs one pooled round trip per operation"""
+
+    def __init__(self, pool: asyncio.Semaphore, stats: dict):
+        self.pool = pool
+        self.stats = stats
+        self.docs = {}
+
+    async def _round_trip(self):
+        async with self.pool:
+            self.stats["round_trips"] += 1
+            await asyncio.sleep(ROUND_TRIP)
+
+    async def insert_one(self, doc):
+        await self._round_trip()
+        self.docs[doc["_id"]] = doc
+        return type("InsertOneResult", (), {"inserted_id": doc["_id"]})
+
+    async def insert_many(self, docs, ordered=True):
+        await self._round_trip()
+        for doc in docs:
+            self.docs[doc["_id"]] = doc
+
+    async def find_one(self, query):
+        await self._round_trip()
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update):
+        await self._round_trip()
+        self.docs[query["_id"]].update(update["$set"])
+        return type("UpdateResult", (), {"modified_count": 1})
+
+    async def bulk_write(self, operations, ordered=True):
+        await self._round_trip()
+        self.stats["bulk_operations"] += len(operations)
+
+
+class FakeDB:
+    def __init__(self):
+        self.stats = {"round_trips": 0, "bulk_operations": 0}
+        pool = asyncio.Semaphore(POOL_SIZE)
+        self.notifications = FakeCollection(pool, self.stats)
+        self.notification_outbox = FakeCollection(pool, self.stats)
+
+
+def cohort(size: int):
+    return [
+        models.NotificationCreate(
+            title="Assignment due tomorrow",
+            message="Recursion problem set 4 is due at 23:59",
+            type=models.NotificationType.ASSIGNMENT_DUE,
+            priority=models.NotificationPriority.HIGH,
+            recipient_id=f"student{i}",
+            course_id="cs101",
+            assignment_id="ps4",
+            channels=[models.NotificationChannel.IN_APP, models.NotificationChannel.EMAIL]
+        )
+        for i in range(size)
+    ]
+
+
+def service_with_fake_db():
+    service = notification_service.NotificationService()
+    service.db = type(notification_service.notification_db)()
+    service.db.db = FakeDB()
+    service.dispatcher.db = service.db
+    return service
+
+
+async def previous_path(service, notifications):
+    """The old flow: serial create (insert, re-read), an untracked task per notification writing status per channel"""
+    db = service.db
+    tasks = []
+
+    async def send(notification):
+        await db.update_notification(notification["_id"], {"status": models.NotificationStatus.SENT})
+        for _ in notification["channels"]:
+            await db.update_notification(notification["_id"], {"status": models.NotificationStatus.DELIVERED})
+
+    for notification_data in notifications:
+        notification_dict = service._build_notification(notification_data)
+        created = await db.get_notification(await db.save_notification(notification_dict))
+        tasks.append(asyncio.create_task(send(created)))
+    await asyncio.gather(*tasks)
+
+
+class TestNotificationDispatchPerformance:
+    """Notification dispatch performance test cases"""
+
+    @pytest.mark.asyncio
+    async def test_assignment_deadline_cohort(self):
+        """100k assignment-deadline notifications over in-app and email"""
+        logging.disable(logging.INFO)
+        try:
+            before = service_with_fake_db()
+            start = time.perf_counter()
+            await previous_path(before, cohort(SERIAL_SAMPLE))
+            serial_rate = SERIAL_SAMPLE / (time.perf_counter() - start)
+            serial_trips = before.db.db.stats["round_trips"]
+
+            after = service_with_fake_db()
+            notifications = cohort(COHORT)
+            await after.dispatcher.start(poll=False)
+            start = time.perf_counter()
+            await after.create_bulk_notifications(notifications)
+            queued = time.perf_counter() - start
+            await after.dispatcher.drain()
+            elapsed = time.perf_counter() - start
+            await after.dispatcher.stop()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        stats = after.db.db.stats
+        print(f"""
+Notification Dispatch ({COHORT} notifications x 2 channels, {ROUND_TRIP * 1e3:.0f}ms round trip, pool of {POOL_SIZE}):
+- Serial create + per-channel updates: {serial_rate:.0f} notifications/s ({SERIAL_SAMPLE} sampled), {serial_trips / SERIAL_SAMPLE:.1f} round trips each, ~{COHORT / serial_rate:.0f}s projected
+- Outbox pipeline: {COHORT / elapsed:.0f} notifications/s, all queued in {queued:.2f}s, delivered in {elapsed:.2f}s
+- Pipeline round trips: {stats['round_trips']} ({stats['round_trips'] / COHORT:.3f} per notification), {stats['bulk_operations']} status operations in {after.dispatcher.status_writes} bulk writes
+        """)
+
+        assert after.dispatcher.sent == 2 * COHORT
+        assert len(after.db.db.notifications.docs) == COHORT
+        assert stats["bulk_operations"] == 4 * COHORT  # every result written to both collections
+        assert stats["round_trips"] < COHORT / 100
+        assert COHORT / elapsed > 5 * serial_rate
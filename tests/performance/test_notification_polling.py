@@ -0,0 +1,272 @@
+"""
+Performance tests for inbox and unread-count polling
+"""
+import pytest
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+notification_service = import_service_module("notification-service", "services.notification_service")
+websocket = import_service_module("notification-service", "routes.websocket")
+models = import_service_module("notification-service", "models")
+
+USERS = 2000
+INBOX = 30  # stored notifications per user
+POLLS = 20000  # each poll reads the first inbox page and the stats summary
+PAGE = 20
+CONNECTED = 500  # users holding a WebSocket
+ROUND_TRIP = 0.001  # per MongoDB operation
+POOL_SIZE = 10  # connections in the driver pool
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$gte" in condition and value < condition["$gte"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, collection, docs):
+        self.collection = collection
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, limit):
+        self.docs = self.docs[:limit]
+        return self
+
+    async def to_list(self, length):
+        await self.collection._round_trip()
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeAggregation:
+    """Runs the $match + $group pipelines the notification database uses"""
+
+    def __init__(self, collection, pipeline):
+        self.collection = collection
+        self.pipeline = pipeline
+
+    async def to_list(self, length):
+        await self.collection._round_trip()
+        match, group = self.pipeline[0]["$match"], self.pipeline[1]["$group"]
+        rows = {}
+        for doc in self.collection._scan(match):
+            key = doc[group["_id"][1:]]
+            row = rows.setdefault(key, {"_id": key, **{name: 0 for name in group if name != "_id"}})
+            for name, accumulator in group.items():
+                if name == "_id":
+                    continue
+                value = accumulator["$sum"]
+                if isinstance(value, dict):  # {"$cond": [{"$eq": ["$status", "read"]}, 0, 1]}
+                    (field, expected), yes, no = value["$cond"][0]["$eq"], value["$cond"][1], value["$cond"][2]
+                    value = yes if doc[field[1:]] == expected else no
+                row[name] += value
+        return list(rows.values())
+
+
+class FakeCollection:
+    """Collection indexed by recipient that costs one pooled round trip per operation"""
+
+    def __init__(self, pool: asyncio.Semaphore, stats: dict):
+        self.pool = pool
+        self.stats = stats
+        self.docs = {}
+        self.by_recipient = {}
+
+    async def _round_trip(self):
+        async with self.pool:
+            self.stats["round_trips"] += 1
+            await asyncio.sleep(ROUND_TRIP)
+
+    def _scan(self, query):
+        recipients = query.get("recipient_id")
+        if isinstance(recipients, str):
+            candidates = self.by_recipient.get(recipients, {}).values()
+        elif isinstance(recipients, dict):
+            candidates = [doc for user in recipients["$in"] for doc in self.by_recipient.get(user, {}).values()]
+        else:
+            candidates = self.docs.values()
+        return [doc for doc in candidates if matches(doc, query)]
+
+    def add(self, doc):
+        self.docs[doc["_id"]] = doc
+        if "recipient_id" in doc:
+            self.by_recipient.setdefault(doc["recipient_id"], {})[doc["_id"]] = doc
+
+    async def insert_many(self, docs, ordered=True):
+        await self._round_trip()
+        for doc in docs:
+            self.add(doc)
+
+    async def find_one(self, query):
+        await self._round_trip()
+        return self.docs.get(query["_id"])
+
+    def find(self, query):
+        return FakeCursor(self, self._scan(query))
+
+    def aggregate(self, pipeline):
+        return FakeAggregation(self, pipeline)
+
+    async def count_documents(self, query):
+        await self._round_trip()
+        return len(self._scan(query))
+
+    async def update_one(self, query, update):
+        await self._round_trip()
+        doc = self.docs.get(query["_id"])
+        modified = doc is not None and matches(doc, query)
+        if modified:
+            doc.update(update["$set"])
+        return type("UpdateResult", (), {"modified_count": int(modified)})
+
+
+class FakeDB:
+    def __init__(self):
+        self.stats = {"round_trips": 0}
+        pool = asyncio.Semaphore(POOL_SIZE)
+        self.notifications = FakeCollection(pool, self.stats)
+        self.notification_outbox = FakeCollection(pool, self.stats)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send(self, frame):
+        self.sent.append(json.loads(frame["text"]))
+
+    async def close(self, code=1000):
+        pass
+
+
+def seeded_db():
+    db = FakeDB()
+    now = datetime.now(timezone.utc)
+    for u in range(USERS):
+        for i in range(INBOX):
+            db.notifications.add({
+                "_id": f"u{u}n{i}", "recipient_id": f"user{u}", "title": "Assignment due", "message": "Soon",
+                "type": "assignment_due", "priority": "medium", "channels": ["in_app"],
+                "status": "read" if i % 3 else "delivered", "created_at": now - timedelta(minutes=i), "updated_at": now
+            })
+    return db
+
+
+def service_with(db):
+    service = notification_service.NotificationService()
+    service.db = type(notification_service.notification_db)()
+    service.db.db = db
+    service.dispatcher.db = service.db
+    return service
+
+
+async def previous_poll(service, user_id):
+    """The polled endpoints before: an inbox query plus three count_documents scans"""
+    db = service.db.db.notifications
+    notifications = await service.db.get_user_notifications(user_id, PAGE)
+    query = {"recipient_id": user_id, "created_at": {"$gte": datetime.now(timezone.utc) - timedelta(days=30)}}
+    for extra in ({}, {"status": "delivered"}, {"status": "read"}):
+        await db.count_documents({**query, **extra})
+    return notifications
+
+
+async def cached_poll(service, user_id):
+    notifications = await service.get_user_notifications(user_id, PAGE)
+    await service.get_unread_counts(user_id)
+    await service.get_notification_stats(user_id)
+    return notifications
+
+
+async def run(service, poll, seed: int = 5):
+    """Polls from random users, with a new notification every 20 polls and a read every 50"""
+    rng = random.Random(seed)
+    latencies = []
+
+    async def one(i):
+        user_id = f"user{rng.randrange(USERS)}"
+        start = time.perf_counter()
+        await poll(service, user_id)
+        latencies.append(time.perf_counter() - start)
+        if i % 20 == 0:
+            await service.create_notification(models.NotificationCreate(
+                title="Grade available", message="Quiz 3", type=models.NotificationType.GRADE_AVAILABLE, recipient_id=user_id
+            ))
+        if i % 50 == 0:
+            await service.mark_as_read(f"u{user_id[4:]}n0", user_id)
+
+    start = time.perf_counter()
+    for batch in range(0, POLLS, 200):
+        await asyncio.gather(*(one(i) for i in range(batch, batch + 200)))
+    return time.perf_counter() - start, sorted(latencies), service.db.db.stats["round_trips"]
+
+
+class TestNotificationPollingPerformance:
+    """Inbox polling performance test cases"""
+
+    @pytest.mark.asyncio
+    async def test_inbox_and_stats_polling(self, monkeypatch):
+        """20k inbox + stats polls with writes mixed in: MongoDB every time vs Redis counters and inbox"""
+        logging.disable(logging.INFO)
+        server = FakeServer()
+        sockets = []
+        try:
+            manager = websocket.ConnectionManager(redis_client=aioredis.FakeRedis(server=server, decode_responses=True))
+            monkeypatch.setattr(notification_service, "websocket_manager", manager)
+            for u in range(CONNECTED):
+                sockets.append(FakeWebSocket())
+                await manager.connect(sockets[-1], f"user{u}")
+
+            before = await run(service_with(seeded_db()), previous_poll)
+
+            service = service_with(seeded_db())
+            service.inbox.redis_client = aioredis.FakeRedis(server=server, decode_responses=True)
+            after = await run(service, cached_poll)
+
+            # Every counter the cache holds must match the database afterwards
+            drift = await service.inbox.reconcile()
+            await asyncio.sleep(0.05)
+            await manager.close()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        pushes = sum(1 for ws in sockets for message in ws.sent if message["type"] == "unread_count")
+
+        def p(latencies, q):
+            return latencies[int(q * (len(latencies) - 1))] * 1e3
+
+        print(f"""
+Notification Polling ({POLLS} polls over {USERS} users, {INBOX} stored each, 1 create per 20 polls, 1 read per 50, {ROUND_TRIP * 1e3:.0f}ms round trip, pool of {POOL_SIZE}):
+- MongoDB every poll: {before[2]} MongoDB round trips ({before[2] / POLLS:.2f} per poll), {before[0]:.2f}s, p50 {p(before[1], 0.5):.1f}ms, p99 {p(before[1], 0.99):.1f}ms
+- Redis counters + inbox: {after[2]} MongoDB round trips ({after[2] / POLLS:.2f} per poll), {after[0]:.2f}s, p50 {p(after[1], 0.5):.1f}ms, p99 {p(after[1], 0.99):.1f}ms
+  (Redis is fakeredis running in this process, so the cached path's timings are mostly emulator CPU)
+- Inbox cache: {service.inbox.inbox_hits} hits, {service.inbox.inbox_misses} misses, {service.inbox.counter_loads} counter loads, {drift} counters off after the run
+- Unread deltas pushed to {CONNECTED} connected users: {pushes}
+        """)
+
+        assert drift == 0
+        assert pushes > 0
+        assert after[2] < before[2] / 3
@@ -0,0 +1,86 @@
+"""
+Performance tests for login throughput and event-loop latency during a login storm
+"""
+import pytest
+import asyncio
+import time
+from typing import List
+
+from tests.service_modules import import_service_module
+
+auth_utils = import_service_module("auth-service", "utils.auth_utils")
+PasswordHasher, PasswordHasherBusy = auth_utils.PasswordHasher, auth_utils.PasswordHasherBusy
+
+ROUNDS = 10
+LOGINS = 24
+TICK = 0.005
+
+
+async def ticker(stop: asyncio.Event) -> List[float]:
+    """Stand-in for non-login endpoints: how late does a 5ms timer fire?"""
+    delays = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        delays.append(time.perf_counter() - start - TICK)
+    return delays
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def storm(login) -> dict:
+    """Run LOGINS concurrent logins while measuring event-loop lag"""
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(ticker(stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(LOGINS)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    delays = await lag_task
+    return {
+        "rps": sum(result is True for result in results) / elapsed,
+        "rejected": sum(isinstance(result, PasswordHasherBusy) for result in results),
+        "p50": percentile(delays, 0.5),
+        "p99": percentile(delays, 0.99),
+        "max": max(delays),
+    }
+
+
+class TestLoginStorm:
+    """Password hashing offload test cases"""
+
+    @pytest.mark.asyncio
+    async def test_login_storm_keeps_event_loop_responsive(self):
+        """Offloaded bcrypt keeps other endpoints fast and sheds excess logins"""
+        hasher = PasswordHasher(rounds=ROUNDS, workers=4, max_pending=LOGINS)
+        hashed = hasher.scheme.hash("CorrectHorse1")
+
+        async def inline_login():
+            return hasher.scheme.verify("CorrectHorse1", hashed)
+
+        async def pooled_login():
+            return await hasher.verify("CorrectHorse1", hashed)
+
+        inline = await storm(inline_login)
+        pooled = await storm(pooled_login)
+
+        hasher.max_pending = 4
+        saturated = await storm(pooled_login)
+        hasher.shutdown()
+
+        print(f"""
+Login Storm ({LOGINS} concurrent logins, bcrypt rounds={ROUNDS}):
+- Inline on event loop: {inline['rps']:.1f} logins/s, other requests p50 {inline['p50'] * 1e3:.1f}ms p99 {inline['p99'] * 1e3:.1f}ms max {inline['max'] * 1e3:.1f}ms
+- Bounded pool (4 workers): {pooled['rps']:.1f} logins/s, other requests p50 {pooled['p50'] * 1e3:.1f}ms p99 {pooled['p99'] * 1e3:.1f}ms max {pooled['max'] * 1e3:.1f}ms
+- Pool with max_pending=4: {saturated['rejected']} of {LOGINS} logins rejected with 429, other requests p99 {saturated['p99'] * 1e3:.1f}ms
+        """)
+
+        assert pooled["rejected"] == 0
+        assert saturated["rejected"] == LOGINS - 4
+        assert pooled["max"] < inline["max"] / 2
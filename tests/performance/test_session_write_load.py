@@ -0,0 +1,76 @@
+"""
+Performance tests for Mongo write load from session activity tracking
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from tests.service_modules import import_service_module
+
+SessionActivityBuffer = import_service_module("auth-service", "database").SessionActivityBuffer
+
+SESSIONS = 50000
+REQUEST_INTERVAL = 10  # seconds between authenticated requests per learner
+WINDOW = 60  # simulated seconds
+FLUSH_INTERVAL = 30
+
+
+class CountingSessions:
+    """user_sessions stand-in counting round trips and documents written"""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.documents = 0
+
+    async def update_one(self, query, update):
+        self.round_trips += 1
+        self.documents += 1
+
+    async def bulk_write(self, ops, ordered=True):
+        self.round_trips += 1
+        self.documents += len(ops)
+
+
+def touches():
+    """(simulated second, session id) for every authenticated request in the window"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for second in range(WINDOW):
+        for session in range(second % REQUEST_INTERVAL, SESSIONS, REQUEST_INTERVAL):
+            yield second, f"session_{session}", start + timedelta(seconds=second)
+
+
+class TestSessionWriteLoad:
+    """Session write amplification test cases"""
+
+    @pytest.mark.asyncio
+    async def test_write_ops_with_50k_active_sessions(self):
+        """Write-behind turns per-request updates into a few bulk writes per interval"""
+        legacy = CountingSessions()
+        requests = 0
+        for _, session_id, now in touches():
+            await legacy.update_one(
+                {"_id": session_id, "is_active": True},
+                {"$set": {"last_activity": now, "expires_at": now + timedelta(minutes=480)}}
+            )
+            requests += 1
+
+        buffered = CountingSessions()
+        buffer = SessionActivityBuffer(flush_interval=FLUSH_INTERVAL, batch_size=1000)
+        next_flush = FLUSH_INTERVAL
+        for second, session_id, now in touches():
+            if second >= next_flush:
+                await buffer.flush(buffered)
+                next_flush += FLUSH_INTERVAL
+            buffer.touch(session_id, now)
+        await buffer.flush(buffered)
+
+        print(f"""
+Session Write Load ({SESSIONS} active sessions, 1 request per {REQUEST_INTERVAL}s, {WINDOW}s window):
+- Requests: {requests} ({requests / WINDOW:,.0f}/s)
+- update_one per request: {legacy.documents / WINDOW:,.0f} document writes/s, {legacy.round_trips / WINDOW:,.0f} Mongo round trips/s
+  (plus {2 * requests / WINDOW:,.0f} Redis session cache ops/s, now removed)
+- Write-behind ({FLUSH_INTERVAL}s flush, 1000/batch): {buffered.documents / WINDOW:,.0f} document writes/s, {buffered.round_trips / WINDOW:,.2f} Mongo round trips/s
+        """)
+
+        assert legacy.round_trips == requests
+        assert buffered.documents == SESSIONS * (WINDOW // FLUSH_INTERVAL)
+        assert buffered.round_trips == (SESSIONS // 1000) * (WINDOW // FLUSH_INTERVAL)
@@ -0,0 +1,119 @@
+"""
+Performance tests for notification template rendering
+"""
+import pytest
+import logging
+import random
+import time
+
+from tests.service_modules import import_service_module
+
+templates = import_service_module("notification-service", "utils.templates")
+notification_utils = import_service_module("notification-service", "utils.notification_utils")
+
+MESSAGES = 1_000_000
+LOCALES = ["en", "pt-BR", "es", "fr-CA", "de"]
+
+STORED = [
+    {
+        "name": "grade_available", "locale": "en",
+        "subject_template": "<b>{course}</b>: {assignment} graded",
+        "message_template": "<p>Hi {name},</p> your grade for {assignment} in {course} is {grade}. <a>Open {course}</a>"
+    },
+    {
+        "name": "grade_available", "locale": "pt",
+        "subject_template": "<b>{course}</b>: {assignment} corrigido",
+        "message_template": "<p>Olá {name},</p> sua nota em {assignment} de {course} é {grade}. <a>Abrir {course}</a>"
+    },
+    {
+        "name": "grade_available", "locale": "es",
+        "subject_template": "<b>{course}</b>: {assignment} calificado",
+        "message_template": "<p>Hola {name},</p> tu nota en {assignment} de {course} es {grade}. <a>Abrir {course}</a>"
+    }
+]
+
+
+def workload(seed: int = 11):
+    """Variables and a locale for each message; a few variables carry markup"""
+    rng = random.Random(seed)
+    names = [f"Student {i}" for i in range(500)] + ["<i>Mallory</i>"]
+    return [
+        ({
+            "name": rng.choice(names),
+            "course": f"CS{rng.randrange(100, 400)}",
+            "assignment": f"Quiz {rng.randrange(1, 12)}",
+            "grade": rng.choice(["A", "B+", "B", "C", "92/100"])
+        }, rng.choice(LOCALES))
+        for _ in range(MESSAGES)
+    ]
+
+
+def by_locale(locale):
+    """The stored variant the old code path would pick for a locale"""
+    language = locale.split("-")[0]
+    variants = {t["locale"]: t for t in STORED}
+    return variants.get(locale) or variants.get(language) or variants["en"]
+
+
+class TestTemplateRenderingPerformance:
+    """Template rendering performance test cases"""
+
+    @pytest.mark.asyncio
+    async def test_render_one_million_messages(self):
+        """1M localized messages: replace-and-sanitize per message vs compiled templates"""
+        messages = workload()
+
+        def replace_and_sanitize(variables, locale):
+            template = by_locale(locale)
+            return (
+                notification_utils.sanitize_notification_content(
+                    notification_utils.format_notification_message(template["subject_template"], variables)),
+                notification_utils.sanitize_notification_content(
+                    notification_utils.format_notification_message(template["message_template"], variables))
+            )
+
+        start = time.perf_counter()
+        for variables, locale in messages:
+            replace_and_sanitize(variables, locale)
+        before_time = time.perf_counter() - start
+
+        async def loader():
+            return STORED
+
+        limit = notification_utils.notification_service_settings.max_message_length
+        registry = templates.TemplateRegistry(loader, max_subject_length=limit, max_message_length=limit)
+        logging.disable(logging.INFO)  # no Redis here: version checks fail open
+        try:
+            start = time.perf_counter()
+            for variables, locale in messages:
+                await registry.render("grade_available", variables, locale)
+            after_time = time.perf_counter() - start
+
+            subject, message = await registry.get("grade_available", "en")
+            start = time.perf_counter()
+            for variables, _ in messages:
+                subject.render(variables)
+                message.render(variables)
+            compiled_time = time.perf_counter() - start
+
+            # Same output as before, checked outside the timed loops
+            sample = messages[:20000]
+            mismatches = 0
+            for variables, locale in sample:
+                if await registry.render("grade_available", variables, locale) != replace_and_sanitize(variables, locale):
+                    mismatches += 1
+        finally:
+            logging.disable(logging.NOTSET)
+
+        print(f"""
+Template Rendering ({MESSAGES} messages, subject + body, {len(LOCALES)} requested locales over {len(STORED)} stored variants):
+- Replace + sanitize per message: {before_time:.2f}s, {MESSAGES / before_time:,.0f} messages/s
+- Registry lookup + compiled render: {after_time:.2f}s, {MESSAGES / after_time:,.0f} messages/s
+- Compiled render alone: {compiled_time:.2f}s, {MESSAGES / compiled_time:,.0f} messages/s
+- Speedup: {before_time / after_time:.1f}x through the registry, {before_time / compiled_time:.1f}x for the render itself
+- Registry: {registry.loads} template load(s) for {registry.renders} renders, {mismatches} of {len(sample)} sampled messages differ from the old output
+        """)
+
+        assert mismatches == 0
+        assert registry.loads == 1
+        assert after_time < before_time
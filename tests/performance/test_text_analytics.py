@@ -0,0 +1,104 @@
+"""
+Performance tests for batch lesson text analytics
+"""
+import pytest
+import random
+import time
+
+from tests.service_modules import import_service_module
+
+text_analytics = import_service_module("ai-service", "utils.text_analytics")
+
+LESSONS = 10000
+STOP_WORDS = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by"}
+
+
+# The per-word functions ai_utils used before the batch engine
+def legacy_count_syllables(word):
+    word = word.lower()
+    count = 0
+    vowels = "aeiouy"
+    if word[0] in vowels:
+        count += 1
+    for i in range(1, len(word)):
+        if word[i] in vowels and word[i - 1] not in vowels:
+            count += 1
+    if word.endswith("e"):
+        count -= 1
+    return max(1, count)
+
+
+def legacy_extract_keywords(text, max_keywords=10):
+    words = text.lower().split()
+    filtered_words = [word for word in words if word not in STOP_WORDS and len(word) > 3]
+    word_count = {}
+    for word in filtered_words:
+        word_count[word] = word_count.get(word, 0) + 1
+    sorted_words = sorted(word_count.items(), key=lambda x: x[1], reverse=True)
+    return [word for word, count in sorted_words[:max_keywords]]
+
+
+def legacy_readability(text):
+    sentences = text.split('.')
+    words = text.split()
+    syllables = sum(legacy_count_syllables(word) for word in words)
+    if not sentences or not words:
+        return 0.0
+    score = 206.835 - 1.015 * (len(words) / len(sentences)) - 84.6 * (syllables / len(words))
+    return max(0.0, min(100.0, score))
+
+
+def lessons(seed: int = 3):
+    """Lessons of 150-400 words drawn from a shared technical vocabulary"""
+    rng = random.Random(seed)
+    stems = ["recurs", "hash", "sort", "graph", "tree", "queue", "stack", "heap", "array", "pointer", "loop",
+             "function", "variable", "algorithm", "complex", "memory", "search", "bucket", "node", "edge"]
+    vocabulary = [stem + suffix for stem in stems for suffix in ("", "s", "ing", "ed", "ion", "ity", "able")]
+    vocabulary += list(STOP_WORDS) * 4
+    texts = []
+    for _ in range(LESSONS):
+        sentences = []
+        for _ in range(rng.randint(10, 25)):
+            sentences.append(" ".join(rng.choices(vocabulary, k=rng.randint(8, 20))).capitalize() + ".")
+        texts.append(" ".join(sentences))
+    return texts
+
+
+class TestTextAnalyticsPerformance:
+    """Text analytics performance test cases"""
+
+    def test_ten_thousand_lessons(self):
+        """Per-lesson per-word functions vs one batched call over the corpus"""
+        texts = lessons()
+        words = sum(len(text.split()) for text in texts)
+
+        start = time.perf_counter()
+        for text in texts:
+            legacy_extract_keywords(text)
+            legacy_readability(text)
+            max(1, len(text.split()) // 200)
+        legacy = time.perf_counter() - start
+
+        engine = text_analytics.TextAnalytics()
+        start = time.perf_counter()
+        engine.add_documents({f"lesson{i}": text for i, text in enumerate(texts)})
+        index_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stats = engine.analyze(texts)
+        batched = time.perf_counter() - start
+
+        edits = {f"lesson{i}": texts[i] + " Revised with a worked example." for i in range(100)}
+        start = time.perf_counter()
+        engine.add_documents(edits)
+        refresh = time.perf_counter() - start
+
+        print(f"""
+Lesson Text Analytics ({LESSONS} lessons, {words / LESSONS:.0f} words each):
+- Per-word functions: {legacy:.2f}s, {LESSONS / legacy:,.0f} lessons/s
+- Batch engine:       {batched:.2f}s, {LESSONS / batched:,.0f} lessons/s ({legacy / batched:.1f}x), keywords ranked by TF-IDF
+- Corpus IDF index:   {index_build:.2f}s to build, {refresh * 1e3:.1f}ms to refresh 100 edited lessons
+        """)
+
+        assert len(stats.keywords) == LESSONS and all(stats.keywords)
+        assert batched < legacy / 2
@@ -0,0 +1,78 @@
+"""
+Performance tests for per-request tracing overhead
+"""
+import pytest
+import time
+
+from shared.common.tracing import (
+    Tracer, BatchSpanProcessor, InMemorySpanExporter, TracingMiddleware, SpanKind
+)
+import shared.common.tracing as tracing
+
+REQUESTS = 5000
+CHILD_SPANS = 3
+
+
+async def handler(scope, receive, send):
+    """Fake endpoint making one Mongo, one Redis and one HTTP call"""
+    for name in ("mongo.find_one", "redis.get", "HTTP GET")[:CHILD_SPANS]:
+        with tracing.tracer.span(name, SpanKind.CLIENT, {"db.system": "test"}):
+            pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def untraced_handler(scope, receive, send):
+    """Same endpoint without any tracing"""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def drive(app, requests: int = REQUESTS) -> float:
+    """Run requests through an ASGI app; returns mean seconds per request"""
+    scope = {"type": "http", "method": "GET", "path": "/courses/1", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+class TestTracingOverhead:
+    """Tracing overhead test cases"""
+
+    @pytest.mark.asyncio
+    async def test_per_request_overhead(self, monkeypatch):
+        """Tracing adds a bounded per-request cost, near zero when unsampled"""
+        exporter = InMemorySpanExporter()
+        processor = BatchSpanProcessor(exporter, max_queue_size=REQUESTS * 10, batch_size=REQUESTS * 10)
+        processor._thread = object()  # export synchronously via force_flush below
+
+        baseline = await drive(untraced_handler)
+
+        unsampled_tracer = Tracer(sample_ratio=0.0, processor=processor)
+        monkeypatch.setattr(tracing, "tracer", unsampled_tracer)
+        unsampled = await drive(TracingMiddleware(handler, unsampled_tracer))
+
+        sampled_tracer = Tracer(sample_ratio=1.0, processor=processor)
+        monkeypatch.setattr(tracing, "tracer", sampled_tracer)
+        sampled = await drive(TracingMiddleware(handler, sampled_tracer))
+        processor.force_flush()
+
+        print(f"""
+Tracing Overhead ({REQUESTS} requests, {CHILD_SPANS} child spans each):
+- Untraced: {baseline * 1e6:.1f}us/request
+- Unsampled: {unsampled * 1e6:.1f}us/request (+{(unsampled - baseline) * 1e6:.1f}us)
+- Sampled: {sampled * 1e6:.1f}us/request (+{(sampled - baseline) * 1e6:.1f}us)
+- Spans exported: {len(exporter.spans)}
+        """)
+
+        assert len(exporter.spans) == REQUESTS * (CHILD_SPANS + 1)
+        assert unsampled - baseline < 50e-6
+        assert sampled - baseline < 200e-6
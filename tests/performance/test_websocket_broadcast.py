@@ -0,0 +1,89 @@
+"""
+Performance tests for WebSocket broadcast with slow clients
+"""
+import pytest
+import asyncio
+import time
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+websocket = import_service_module("notification-service", "routes.websocket")
+
+CLIENTS = 10000
+SLOW_CLIENTS = 50
+SLOW_SEND = 0.02  # a client on a poor connection takes 20ms per frame
+
+
+class Client:
+    """WebSocket stand-in recording when the broadcast arrived"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received_at = None
+
+    async def accept(self):
+        pass
+
+    async def send(self, frame):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received_at = time.perf_counter()
+
+    async def close(self, code=1000):
+        pass
+
+
+def clients():
+    """Fast clients with slow ones spread among them"""
+    every = CLIENTS // SLOW_CLIENTS
+    return [Client(SLOW_SEND if i % every == 0 else 0.0) for i in range(CLIENTS)]
+
+
+async def wait_all(sockets, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while any(s.received_at is None for s in sockets) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+
+
+class TestBroadcastLatency:
+    """Broadcast latency test cases"""
+
+    @pytest.mark.asyncio
+    async def test_latency_to_last_client(self):
+        """Queued broadcast reaches fast clients without waiting on slow ones"""
+        # Before: one send awaited after another
+        sockets = clients()
+        frame = websocket.text_frame("announcement")
+        start = time.perf_counter()
+        for socket in sockets:
+            await socket.send(frame)
+        sequential_fast = max(s.received_at for s in sockets if not s.delay) - start
+        sequential_last = max(s.received_at for s in sockets) - start
+
+        # After: per-connection queues and writers
+        manager = websocket.ConnectionManager(redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True), node_id="a")
+        sockets = clients()
+        for i, socket in enumerate(sockets):
+            await manager.connect(socket, f"user-{i}")
+        await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await manager.broadcast("announcement")
+        enqueued = time.perf_counter() - start
+        await wait_all(sockets)
+        queued_fast = max(s.received_at for s in sockets if not s.delay) - start
+        queued_last = max(s.received_at for s in sockets) - start
+        await manager.close()
+
+        print(f"""
+WebSocket Broadcast ({CLIENTS} clients, {SLOW_CLIENTS} taking {SLOW_SEND * 1e3:.0f}ms per frame):
+- Sequential sends: last fast client {sequential_fast * 1e3:.0f}ms, last client {sequential_last * 1e3:.0f}ms
+- Queued writers: broadcast call {enqueued * 1e3:.1f}ms, last fast client {queued_fast * 1e3:.0f}ms, last client {queued_last * 1e3:.0f}ms
+        """)
+
+        # Sequential delivery has a floor of SLOW_CLIENTS * SLOW_SEND; queued delivery
+        # is CPU-bound, so leave it headroom for a loaded runner
+        assert queued_fast < sequential_fast / 2
+        assert queued_last < sequential_last
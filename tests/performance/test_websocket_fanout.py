@@ -0,0 +1,99 @@
+"""
+Load tests for cross-node WebSocket fan-out
+"""
+import pytest
+import asyncio
+import random
+import time
+
+import numpy as np
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+websocket = import_service_module("notification-service", "routes.websocket")
+
+NODES = 4
+CONNECTIONS = 50000
+USERS = 40000  # some users have a second tab, often on another node
+MESSAGES = 5000
+
+
+class TimedWebSocket:
+    """WebSocket stand-in recording delivery latency of timestamped messages"""
+
+    latencies = []
+
+    async def accept(self):
+        pass
+
+    async def send(self, frame):
+        TimedWebSocket.latencies.append(time.perf_counter() - float(frame["text"]))
+
+
+async def settle(expected: int, timeout: float = 60.0):
+    """Wait until `expected` deliveries have been recorded"""
+    deadline = time.perf_counter() + timeout
+    while len(TimedWebSocket.latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.005)
+
+
+class TestWebSocketFanout:
+    """WebSocket fan-out load test cases"""
+
+    @pytest.mark.asyncio
+    async def test_50k_connections_on_4_nodes(self):
+        """Targeted messages reach users on any node; a broadcast reaches every connection"""
+        rng = random.Random(3)
+        server = FakeServer()
+        nodes = [
+            websocket.ConnectionManager(redis_client=aioredis.FakeRedis(server=server, decode_responses=True), node_id=f"node-{i}")
+            for i in range(NODES)
+        ]
+        for manager in nodes:
+            await manager.bus.start()
+
+        start = time.perf_counter()
+        users = [f"user-{i % USERS}" for i in range(CONNECTIONS)]
+        for user_id in users:
+            await rng.choice(nodes).connect(TimedWebSocket(), user_id)
+        connect = time.perf_counter() - start
+        tabs = {user_id: sum(m.connection_count(user_id) for m in nodes) for user_id in set(users)}
+
+        # Targeted: each message sent from a random node to a random user
+        TimedWebSocket.latencies = []
+        targets = rng.sample(sorted(tabs), MESSAGES)
+        expected = sum(tabs[user_id] for user_id in targets)
+        start = time.perf_counter()
+        for user_id in targets:
+            await rng.choice(nodes).send_personal_message(repr(time.perf_counter()), user_id)
+        await settle(expected)
+        targeted = time.perf_counter() - start
+        targeted_latencies = np.array(TimedWebSocket.latencies)
+
+        # Broadcast from one node to all connections
+        TimedWebSocket.latencies = []
+        start = time.perf_counter()
+        await nodes[0].broadcast(repr(time.perf_counter()))
+        await settle(CONNECTIONS)
+        broadcast = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for manager in nodes:
+            await manager.bus.refresh_presence()
+        heartbeat = time.perf_counter() - start
+
+        for manager in nodes:
+            await manager.close()
+
+        p50, p99 = np.percentile(targeted_latencies, [50, 99]) * 1e3
+        print(f"""
+WebSocket Fan-out ({CONNECTIONS} connections, {USERS} users, {NODES} nodes, in-process Redis):
+- Connect + presence: {CONNECTIONS / connect:.0f} connections/s
+- Targeted: {MESSAGES} messages to {len(targeted_latencies)} connections in {targeted:.2f}s, latency p50 {p50:.2f}ms, p99 {p99:.2f}ms
+- Broadcast: {len(TimedWebSocket.latencies)} connections reached in {broadcast * 1e3:.0f}ms
+- Presence heartbeat for all nodes: {heartbeat * 1e3:.0f}ms
+        """)
+
+        assert len(targeted_latencies) == expected
+        assert len(TimedWebSocket.latencies) == CONNECTIONS
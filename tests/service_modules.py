@@ -0,0 +1,33 @@
+"""
+Import a service's app modules in tests
+
+Every service uses flat imports (`config`, `database`, `models`, ...),
+so two services' modules can't share sys.modules. This loads one
+service's module with its app directory first on the path and then
+restores the previous modules, leaving other services' tests unaffected.
+"""
+import importlib
+import sys
+from pathlib import Path
+from types import ModuleType
+
+SERVICES = Path(__file__).resolve().parents[1] / "services"
+APP_PACKAGES = ("config", "database", "models", "routes", "services", "utils", "middleware")
+
+
+def _app_modules():
+    return [name for name in sys.modules if name.split(".")[0] in APP_PACKAGES]
+
+
+def import_service_module(service: str, module: str) -> ModuleType:
+    """Import e.g. ("ai-service", "services.ai_service") in isolation"""
+    app = str(SERVICES / service / "app")
+    saved = {name: sys.modules.pop(name) for name in _app_modules()}
+    sys.path.insert(0, app)
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.remove(app)
+        for name in _app_modules():
+            del sys.modules[name]
+        sys.modules.update(saved)
@@ -0,0 +1,200 @@
+"""
+Unit tests for micro-batched AI request processing
+"""
+import pytest
+import asyncio
+
+from fakeredis import FakeServer, aioredis
+
+from shared.common.batching import MicroBatcher
+from shared.common.errors import RateLimitError
+from tests.service_modules import import_service_module
+
+ai_service = import_service_module("ai-service", "services.ai_service")
+text_analytics = import_service_module("ai-service", "utils.text_analytics")
+token_budget = import_service_module("ai-service", "utils.token_budget")
+AIRequestCreate = ai_service.AIRequestCreate
+
+
+class FakeCollection:
+    """Collection stand-in recording every write"""
+
+    def __init__(self):
+        self.docs = []
+        self.writes = 0
+
+    async def insert_many(self, docs, ordered=True):
+        self.writes += 1
+        self.docs.extend(docs)
+
+
+class FakeDB:
+    def __init__(self):
+        self.ai_requests = FakeCollection()
+        self.ai_results = FakeCollection()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """AI service writing to in-memory collections, without the result cache"""
+    monkeypatch.setattr(ai_service.ai_service_settings, "enable_caching", False)
+    service = ai_service.AIService()
+    service.db = type(ai_service.ai_db)()
+    service.db.db = FakeDB()
+    return service
+
+
+def analysis(text: str, user: str = "u1") -> AIRequestCreate:
+    return AIRequestCreate(user_id=user, request_type="analysis", input_text=text)
+
+
+def enhancement(text: str, user: str = "u1") -> AIRequestCreate:
+    return AIRequestCreate(user_id=user, request_type="enhancement", input_text=text)
+
+
+class TestMicroBatcher:
+    """Micro-batcher test cases"""
+
+    @pytest.mark.asyncio
+    async def test_items_in_one_window_share_a_batch(self):
+        """Concurrent submissions reach the handler together, results in order"""
+        batches = []
+
+        async def handler(items):
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(handler, window=0.01)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+        assert results == [0, 2, 4, 6, 8]
+        assert batches == [[0, 1, 2, 3, 4]]
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_before_the_window(self):
+        """Reaching max_batch starts a batch without waiting"""
+        batches = []
+
+        async def handler(items):
+            batches.append(len(items))
+            return items
+
+        batcher = MicroBatcher(handler, window=60, max_batch=3)
+        await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(6))), timeout=5)
+
+        assert batches == [3, 3]
+
+    @pytest.mark.asyncio
+    async def test_handler_error_reaches_every_caller(self):
+        """A failed batch fails each of its submissions"""
+        async def handler(items):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(handler, window=0.001)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_exception_result_reaches_only_its_caller(self):
+        """An exception returned in place of a result fails just that submission"""
+        async def handler(items):
+            return [ValueError(item) if item < 0 else item for item in items]
+
+        batcher = MicroBatcher(handler, window=0.001)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(-1), batcher.submit(2), return_exceptions=True)
+
+        assert results[0] == 1 and results[2] == 2
+        assert isinstance(results[1], ValueError)
+
+
+class TestAIBatching:
+    """Batched AI request test cases"""
+
+    @pytest.mark.asyncio
+    async def test_batch_deduplicates_and_writes_once(self, service):
+        """Identical inputs are scored once; each request still gets its own logged result"""
+        requests = [analysis("Recursion calls itself", f"u{i}") for i in range(4)] + [analysis("Graphs have edges " * 300)]
+        results = await service.process_batch(requests)
+
+        assert len({result.id for result in results}) == 5
+        assert [result.user_id for result in results[:4]] == ["u0", "u1", "u2", "u3"]
+        assert results[0].content == results[3].content
+        assert results[4].content["word_count"] == 900
+        assert results[4].content["estimated_reading_time"] == 4
+        assert results[4].content["key_topics"] == ["edges", "graphs", "have"]
+        assert service.db.db.ai_requests.writes == 1 and service.db.db.ai_results.writes == 1
+        assert {doc["request_id"] for doc in service.db.db.ai_results.docs} == {doc["_id"] for doc in service.db.db.ai_requests.docs}
+
+    @pytest.mark.asyncio
+    async def test_only_lessons_join_the_corpus(self, service, monkeypatch):
+        """Analysed text is indexed only when it is a lesson, one entry per lesson_id"""
+        corpus = text_analytics.TextAnalytics()
+        monkeypatch.setattr(ai_service, "text_analytics", corpus)
+
+        await service.process_batch([
+            analysis("Arbitrary pasted text"),
+            AIRequestCreate(user_id="u1", request_type="analysis", input_text="Heaps keep order", parameters={"lesson_id": "l1"})
+        ])
+        await service.process_batch([
+            AIRequestCreate(user_id="u1", request_type="analysis", input_text="Heaps keep the minimum on top", parameters={"lesson_id": "l1"})
+        ])
+
+        assert list(corpus.documents) == ["l1"]
+        assert corpus._df[corpus.vocabulary["heaps"]] == 1
+        assert corpus._df[corpus.vocabulary["arbitrary"]] == 0
+
+    def test_personalization_is_not_shared_across_users(self, service):
+        """Only personalization keys include the user"""
+        same = [AIRequestCreate(user_id=user, request_type="enhancement", input_text="x") for user in ("a", "b")]
+        personal = [AIRequestCreate(user_id=user, request_type="personalization", input_text="x") for user in ("a", "b")]
+
+        assert service._cache_key(same[0]).key == service._cache_key(same[1]).key
+        assert service._cache_key(personal[0]).key != service._cache_key(personal[1]).key
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_batched(self, service):
+        """process_ai_request callers arriving together share one write"""
+        results = await asyncio.gather(*(service.process_ai_request(analysis(f"text {i % 3}")) for i in range(20)))
+
+        assert len(results) == 20
+        assert service.db.db.ai_results.writes == 1
+        assert service.batcher.batches == 1
+
+    @pytest.mark.asyncio
+    async def test_over_budget_request_is_refused_alone(self, service, monkeypatch):
+        """Budgets are checked once per batch; only the caller over budget gets RateLimitError"""
+        budget = token_budget.TokenBudget(
+            user_daily_tokens=1000, redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True)
+        )
+        monkeypatch.setattr(ai_service, "token_budget", budget)
+        await budget.record([token_budget.Usage("spender", None, "gemini-1.5-flash", 990, 0)])
+
+        results = await asyncio.gather(
+            service.process_ai_request(enhancement("Recursion calls itself " * 10, "spender")),
+            service.process_ai_request(enhancement("Recursion calls itself " * 10, "u1")),
+            return_exceptions=True
+        )
+
+        assert isinstance(results[0], RateLimitError)
+        assert results[1].user_id == "u1"
+        assert service.batcher.batches == 1
+        assert [doc["user_id"] for doc in service.db.db.ai_requests.docs] == ["u1"]
+
+    @pytest.mark.asyncio
+    async def test_local_analysis_is_not_charged(self, service, monkeypatch):
+        """Analysis never calls the model, so it is neither budget-checked nor charged"""
+        budget = token_budget.TokenBudget(
+            user_daily_tokens=1000, redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True)
+        )
+        monkeypatch.setattr(ai_service, "token_budget", budget)
+        await budget.record([token_budget.Usage("spender", None, "gemini-1.5-flash", 1000, 0)])
+        recorded = budget.tokens_recorded
+
+        results = await service.process_batch([analysis("Recursion calls itself " * 10, "spender"), enhancement("Recursion", "u1")])
+
+        assert results[0].user_id == "spender"
+        assert budget.tokens_recorded > recorded
+        requests = {doc["request_type"]: doc for doc in service.db.db.ai_requests.docs}
+        assert requests["analysis"]["tokens_used"] == 0 and requests["analysis"]["cost"] == 0.0
+        assert requests["enhancement"]["tokens_used"] == budget.tokens_recorded - recorded
@@ -0,0 +1,107 @@
+"""
+Unit tests for buffered audit logging
+"""
+import pytest
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from tests.service_modules import import_service_module
+
+AuditLogBuffer = import_service_module("auth-service", "database").AuditLogBuffer
+
+
+class FakeAuditLogs:
+    """audit_logs stand-in recording insert_many batches"""
+
+    def __init__(self, fail: bool = False, reject: int = None):
+        self.batches = []
+        self.fail = fail
+        self.reject = reject
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail:
+            raise RuntimeError("primary stepped down")
+        if self.reject is not None:
+            raise BulkWriteError({
+                "nInserted": len(docs) - 2,
+                "writeErrors": [
+                    {"index": 0, "code": 11000, "errmsg": "duplicate key"},
+                    {"index": self.reject, "code": 121, "errmsg": "document failed validation"},
+                ],
+            })
+        self.batches.append((list(docs), ordered))
+
+
+def events(count: int):
+    return [{"_id": f"audit_{i}", "event_type": "login_success"} for i in range(count)]
+
+
+class TestAuditLogBuffer:
+    """Audit log buffer test cases"""
+
+    @pytest.mark.asyncio
+    async def test_flush_uses_unordered_batches(self):
+        """Pending events are written with insert_many(ordered=False) per batch"""
+        buffer = AuditLogBuffer(batch_size=1000)
+        buffer.batch_size = 4
+        for event in events(10):
+            buffer.pending.append(event)
+
+        audit_logs = FakeAuditLogs()
+        written = await buffer.flush(audit_logs)
+
+        assert written == 10
+        assert [len(batch) for batch, _ in audit_logs.batches] == [4, 4, 2]
+        assert all(ordered is False for _, ordered in audit_logs.batches)
+        assert buffer.pending == []
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_immediately(self, monkeypatch):
+        """Reaching batch_size schedules a flush without waiting for the interval"""
+        audit_logs = FakeAuditLogs()
+        buffer = AuditLogBuffer(flush_interval=3600, batch_size=5)
+
+        async def flush(collection=None):
+            return await AuditLogBuffer.flush(buffer, audit_logs)
+
+        monkeypatch.setattr(buffer, "flush", flush)
+        for event in events(5):
+            buffer.add(event)
+        await asyncio.sleep(0)
+
+        assert len(audit_logs.batches) == 1
+        assert buffer.pending == []
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_requeues_events(self):
+        """Events survive a failed write, ahead of newer ones"""
+        buffer = AuditLogBuffer()
+        buffer.pending.extend(events(3))
+
+        assert await buffer.flush(FakeAuditLogs(fail=True)) == 0
+        buffer.pending.append({"_id": "audit_new"})
+
+        audit_logs = FakeAuditLogs()
+        assert await buffer.flush(audit_logs) == 4
+        assert [doc["_id"] for doc in audit_logs.batches[0][0]] == ["audit_0", "audit_1", "audit_2", "audit_new"]
+
+    @pytest.mark.asyncio
+    async def test_duplicates_are_not_retried(self):
+        """Only non-duplicate write errors are requeued"""
+        buffer = AuditLogBuffer()
+        buffer.pending.extend(events(5))
+
+        written = await buffer.flush(FakeAuditLogs(reject=3))
+
+        assert written == 3
+        assert buffer.pending == [{"_id": "audit_3", "event_type": "login_success"}]
+
+    def test_overflow_drops_oldest(self):
+        """The buffer stays bounded when Mongo is unavailable"""
+        buffer = AuditLogBuffer(batch_size=1000, max_pending=3)
+        for event in events(5):
+            buffer.add(event)
+
+        assert [doc["_id"] for doc in buffer.pending] == ["audit_2", "audit_3", "audit_4"]
+        assert buffer.dropped == 2
@@ -0,0 +1,178 @@
+"""
+Unit tests for the AI course generation pipeline and job progress
+"""
+import pytest
+import asyncio
+import importlib.util
+import json
+from pathlib import Path
+
+from shared.common.jobs import JobQueue, JobWorker, current_job_id, report_progress
+import shared.common.jobs as jobs
+from shared.common.llm import LLMResponse
+from shared.models.models import GenerateCourseRequest
+
+_spec = importlib.util.spec_from_file_location(
+    "course_generation",
+    Path(__file__).resolve().parents[2] / "services" / "course-service" / "app" / "services" / "course_generation.py"
+)
+course_generation = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(course_generation)
+CourseGenerationPipeline = course_generation.CourseGenerationPipeline
+
+
+class ScriptedLLM:
+    """LLM stand-in answering outline, lesson and quiz prompts after a delay"""
+
+    def __init__(self, lessons: int, delay: float = 0.01, fail_on: str = None):
+        self.lessons = lessons
+        self.delay = delay
+        self.fail_on = fail_on
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_on and self.fail_on in prompt:
+                raise RuntimeError("model error")
+            if "course structure" in prompt:
+                self.calls.append("outline")
+                text = json.dumps({"title": "Generated", "lessons": [
+                    {"id": f"lesson_{i + 1}", "title": f"Lesson {i + 1}", "key_concepts": ["x"]} for i in range(self.lessons)
+                ]})
+            elif "quiz questions" in prompt:
+                lesson = prompt.split('lesson "')[1].split('"')[0]
+                self.calls.append(f"quiz:{lesson}")
+                text = json.dumps([{"question": f"About {lesson}?", "options": [{"text": "a", "is_correct": True}, {"text": "b"}]}])
+            else:
+                lesson = prompt.split(": ", 1)[1].split("\n")[0]
+                self.calls.append(f"lesson:{lesson}")
+                text = f"Content of {lesson}"
+            return LLMResponse(text, "scripted")
+        finally:
+            self.in_flight -= 1
+
+
+class FakeCourses:
+    """courses collection applying the $set/$push/$inc updates the pipeline uses"""
+
+    def __init__(self):
+        self.doc = None
+        self.snapshots = []
+
+    async def insert_one(self, doc):
+        self.doc = json.loads(json.dumps(doc, default=str))
+        return doc["_id"]
+
+    async def update_one(self, query, update):
+        for path, value in update.get("$set", {}).items():
+            target, key = self._resolve(path)
+            target[key] = json.loads(json.dumps(value, default=str))
+        for path, value in update.get("$inc", {}).items():
+            target, key = self._resolve(path)
+            target[key] += value
+        for path, value in update.get("$push", {}).items():
+            target, key = self._resolve(path)
+            target[key].extend(value["$each"])
+        self.snapshots.append(json.loads(json.dumps(self.doc)))
+        return True
+
+    def _resolve(self, path):
+        *parents, key = path.split(".")
+        target = self.doc
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        return target, int(key) if isinstance(target, list) else key
+
+
+def request(lessons: int) -> GenerateCourseRequest:
+    return GenerateCourseRequest(topic="Graphs", audience="students", difficulty="beginner", lessons_count=lessons)
+
+
+class TestCourseGenerationPipeline:
+    """Course generation pipeline test cases"""
+
+    @pytest.mark.asyncio
+    async def test_lessons_run_concurrently_within_bound(self):
+        """Lessons and quizzes overlap but never exceed the concurrency limit"""
+        llm, courses = ScriptedLLM(lessons=10), FakeCourses()
+        course = await CourseGenerationPipeline(courses, llm=llm, concurrency=3).run(request(10), "owner-1")
+
+        assert len(llm.calls) == 21
+        assert llm.max_in_flight == 3
+        assert [lesson.title for lesson in course.lessons] == [f"Lesson {i + 1}" for i in range(10)]
+        assert [q.question for q in course.quiz] == [f"About Lesson {i + 1}?" for i in range(10)]
+
+    @pytest.mark.asyncio
+    async def test_quiz_starts_before_all_lessons_finish(self):
+        """A lesson's quiz is generated while later lessons are still pending"""
+        llm = ScriptedLLM(lessons=6)
+        await CourseGenerationPipeline(FakeCourses(), llm=llm, concurrency=2).run(request(6), "owner-1")
+
+        first_quiz = llm.calls.index("quiz:Lesson 1")
+        last_lesson = llm.calls.index("lesson:Lesson 6")
+        assert first_quiz < last_lesson
+
+    @pytest.mark.asyncio
+    async def test_document_fills_in_progressively(self):
+        """Each lesson and quiz is persisted as it completes"""
+        courses = FakeCourses()
+        progress = []
+
+        async def on_progress(percent, **state):
+            progress.append((percent, state["lessons_done"], state["quizzes_done"]))
+
+        course = await CourseGenerationPipeline(courses, llm=ScriptedLLM(lessons=4), on_progress=on_progress).run(request(4), "owner-1", "course-1")
+
+        done_counts = [snap["generation"]["lessons_done"] for snap in courses.snapshots]
+        assert done_counts[0] == 1 and max(done_counts) == 4
+        assert courses.snapshots[0]["lessons"][1]["content"] == ""  # later lessons still placeholders
+        assert courses.doc["generation"]["status"] == "completed"
+        assert [q["question"] for q in courses.doc["quiz"]] == [f"About Lesson {i + 1}?" for i in range(4)]
+        assert course.id == courses.doc["_id"] == "course-1"
+        assert progress[0][0] < progress[-1][0] == 100.0
+
+    @pytest.mark.asyncio
+    async def test_lesson_failure_marks_course_failed(self):
+        """A failed lesson stops the pipeline and records the failure"""
+        courses = FakeCourses()
+        with pytest.raises(RuntimeError):
+            await CourseGenerationPipeline(courses, llm=ScriptedLLM(lessons=4, fail_on="Lesson 3:")).run(request(4), "owner-1")
+
+        assert courses.doc["generation"]["status"] == "failed"
+
+
+class TestJobProgress:
+    """Job progress reporting test cases"""
+
+    @pytest.mark.asyncio
+    async def test_watch_streams_progress_until_completion(self, monkeypatch):
+        """Watchers see each progress update and the final result"""
+        queue = JobQueue()
+        monkeypatch.setattr(jobs, "job_queue", queue)
+
+        async def work():
+            for step in (25.0, 50.0, 75.0):
+                await report_progress(step, stage=step)
+                await asyncio.sleep(0.01)
+            return "done"
+
+        worker = JobWorker(queue, {"work": work})
+        job_id = await queue.enqueue("work", work, max_retries=0)
+        job = await queue.dequeue()
+
+        async def collect():
+            return [state async for state in queue.watch(job_id)]
+
+        watcher = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        await worker._execute_job(job, 0)
+        states = await asyncio.wait_for(watcher, 1)
+
+        assert [s["progress"] for s in states] == [0.0, 25.0, 50.0, 75.0, 100.0]
+        assert states[-1]["status"] == "completed" and states[-1]["result"] == "done"
+        assert current_job_id.get() is None
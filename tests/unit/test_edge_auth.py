@@ -0,0 +1,141 @@
+"""
+Unit tests for shared JWT verification and the verified-principal cache
+"""
+import pytest
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from fastapi import FastAPI, Depends
+from starlette.testclient import TestClient
+
+import shared.common.auth as auth
+from shared.common.auth import (
+    AuthService, PrincipalCache, get_current_user,
+    sign_principal, verify_principal, PRINCIPAL_HEADER
+)
+from shared.common.revocation import TokenRevocationList
+from shared.config.config import settings
+
+
+class FakeUsers:
+    """users collection stand-in that counts lookups"""
+
+    def __init__(self):
+        self.calls = 0
+        self.docs = {"u1": {"_id": "u1", "role": "instructor", "email": "a@b.c", "name": "Ada"}}
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        return self.docs.get(query["_id"])
+
+
+class FakeDB:
+    def __init__(self):
+        self.users = FakeUsers()
+
+
+def make_token(sub: str = "u1", **claims) -> str:
+    now = datetime.now(timezone.utc)
+    payload = {"sub": sub, "role": "instructor", "type": "access", "iat": now, "exp": now + timedelta(minutes=5)}
+    payload.update(claims)
+    return jwt.encode(payload, settings.jwt_secret, algorithm="HS256")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Fresh principal cache and revocation list backed by fake stores"""
+    fake = FakeDB()
+    fake.revocations = TokenRevocationList(capacity=1000, error_rate=0.01)
+    fake.revocations.start = lambda: None
+
+    monkeypatch.setattr(auth, "get_database", lambda: fake)
+    monkeypatch.setattr(auth, "principal_cache", PrincipalCache(max_size=2, ttl_seconds=60))
+    monkeypatch.setattr(auth, "token_revocations", fake.revocations)
+    return fake
+
+
+class TestJWTVerification:
+    """Shared JWT verification test cases"""
+
+    @pytest.mark.asyncio
+    async def test_principal_cached_per_token(self, db):
+        """The user lookup runs once per (sub, iat), not once per request"""
+        token = make_token()
+        for _ in range(5):
+            principal = await AuthService.validate_jwt_token(token)
+
+        assert principal == {"id": "u1", "role": "instructor", "email": "a@b.c", "name": "Ada", "tenant_id": None}
+        assert db.users.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_rejects_bad_tokens(self, db):
+        """Bad signatures, expired tokens and unknown users are 401s"""
+        from fastapi import HTTPException
+
+        expired = make_token(exp=datetime.now(timezone.utc) - timedelta(seconds=1))
+        forged = jwt.encode({"sub": "u1"}, "not-the-secret", algorithm="HS256")
+        for token in (expired, forged, make_token(sub="ghost")):
+            with pytest.raises(HTTPException) as exc:
+                await AuthService.validate_jwt_token(token)
+            assert exc.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_revoked_session_rejected(self, db):
+        """A revoked session rejects tokens that were already cached"""
+        from fastapi import HTTPException
+
+        token = make_token(session_id="s1")
+        await AuthService.validate_jwt_token(token)
+
+        db.revocations.filter.add("s1")
+        db.revocations._remember("s1", time.time() + 60)
+        with pytest.raises(HTTPException) as exc:
+            await AuthService.validate_jwt_token(token)
+        assert exc.value.detail == "Token has been revoked"
+
+    def test_cache_is_bounded(self):
+        """The least recently used principal is evicted first"""
+        cache = PrincipalCache(max_size=2, ttl_seconds=60)
+        cache.set(("a", 1), {"id": "a"})
+        cache.set(("b", 1), {"id": "b"})
+        cache.get(("a", 1))
+        cache.set(("c", 1), {"id": "c"})
+
+        assert cache.get(("b", 1)) is None
+        assert cache.get(("a", 1)) == {"id": "a"}
+        cache.set(("d", 1), {"id": "d"}, ttl=-1)
+        assert cache.get(("d", 1)) is None
+
+
+class TestForwardedPrincipal:
+    """Gateway principal header test cases"""
+
+    def test_sign_and_verify(self):
+        """Signed principals round-trip; tampered or expired ones do not"""
+        value = sign_principal({"id": "u1", "role": "student"})
+        assert verify_principal(value) == {"id": "u1", "role": "student"}
+
+        signature = value.partition(".")[2]
+        forged = sign_principal({"id": "u1", "role": "admin"}).split(".")[0]
+        assert verify_principal(f"{forged}.{signature}") is None
+        assert verify_principal(sign_principal({"id": "u1"}, ttl_seconds=-5)) is None
+        assert verify_principal("garbage") is None
+
+    def test_dependency_prefers_forwarded_principal(self, db):
+        """Services trust the gateway header and skip JWT and database work"""
+        app = FastAPI()
+
+        @app.get("/me")
+        async def me(user=Depends(get_current_user)):
+            return user
+
+        client = TestClient(app)
+        forwarded = client.get("/me", headers={PRINCIPAL_HEADER: sign_principal({"id": "u1", "role": "student"})})
+        via_query = client.get("/me", params={"token": make_token()})
+        anonymous = client.get("/me")
+
+        assert forwarded.json() == {"id": "u1", "role": "student"}
+        assert via_query.json()["role"] == "instructor"
+        assert anonymous.status_code == 401
+        assert db.users.calls == 1
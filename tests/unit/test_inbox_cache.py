@@ -0,0 +1,157 @@
+"""
+Unit tests for the unread counters and inbox cache
+"""
+import pytest
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+inbox_cache = import_service_module("notification-service", "utils.inbox_cache")
+
+
+class FakeLoader:
+    """Counts from a dict of user -> list of statuses, recording each call"""
+
+    def __init__(self, inboxes):
+        self.inboxes = inboxes
+        self.calls = []
+        self.during_load = None
+
+    async def __call__(self, user_ids):
+        self.calls.append(list(user_ids))
+        if self.during_load is not None:
+            await self.during_load()
+        return {
+            user_id: {
+                "total": len(self.inboxes.get(user_id, [])),
+                "unread": sum(status != "read" for status in self.inboxes.get(user_id, []))
+            }
+            for user_id in user_ids
+        }
+
+
+@pytest.fixture
+def redis_client():
+    return aioredis.FakeRedis(server=FakeServer(), decode_responses=True)
+
+
+def cache(loader, redis_client, **options):
+    return inbox_cache.InboxCache(loader, redis_client=redis_client, **options)
+
+
+def notification(i, user="alice", status="pending"):
+    return {"_id": f"n{i}", "recipient_id": user, "title": f"Notification {i}", "status": status}
+
+
+class TestInboxCache:
+    """Inbox cache test cases"""
+
+    @pytest.mark.asyncio
+    async def test_counts_load_once_then_follow_deltas(self, redis_client):
+        """Test that counters load from the database on a miss and then move with deltas"""
+        loader = FakeLoader({"alice": ["read", "pending", "delivered"]})
+        c = cache(loader, redis_client)
+
+        assert await c.counts("alice") == {"total": 3, "unread": 2}
+        changed = await c.apply({"alice": (1, 1)})
+        assert changed["alice"] == {"total": 4, "unread": 3}
+        assert await c.mark_all_read("alice", 3) == {"total": 4, "unread": 0}
+        assert await c.counts("alice") == {"total": 4, "unread": 0}
+        assert len(loader.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_deltas_on_unloaded_counters_are_not_trusted(self, redis_client):
+        """Test that increments on a never-loaded hash report unknown and readers load instead"""
+        loader = FakeLoader({"bob": ["pending", "pending"]})
+        c = cache(loader, redis_client)
+
+        assert await c.apply({"bob": (1, 1)}) == {"bob": None}
+        assert await c.counts("bob") == {"total": 2, "unread": 2}
+        assert loader.calls == [["bob"]]
+
+    @pytest.mark.asyncio
+    async def test_inbox_is_capped_and_only_warm_lists_grow(self, redis_client):
+        """Test the inbox miss, fill, push and cap behaviour"""
+        c = cache(FakeLoader({}), redis_client, inbox_size=3)
+
+        assert await c.inbox("alice") is None
+        await c.push([notification(0)])
+        assert await c.inbox("alice") is None  # cold inboxes are not created by pushes
+
+        await c.fill("alice", [notification(2), notification(1)])
+        await c.push([notification(3), notification(4)])
+        assert [n["_id"] for n in await c.inbox("alice")] == ["n4", "n3", "n2"]
+
+        await c.invalidate(["alice"])
+        assert await c.inbox("alice") is None
+        assert c.inbox_hits == 1
+        assert c.inbox_misses == 3
+
+    @pytest.mark.asyncio
+    async def test_fill_after_a_concurrent_push_is_skipped(self, redis_client):
+        """Test that a list read before a notification was created doesn't hide it"""
+        c = cache(FakeLoader({}), redis_client)
+
+        version = await c.version("alice")
+        stale = [notification(1)]  # what the database returned before n2 was created
+        await c.push([notification(2)])  # cold inbox: LPUSHX adds nothing
+        await c.fill("alice", stale, version)
+        assert await c.inbox("alice") is None
+
+        version = await c.version("alice")
+        await c.fill("alice", [notification(2), notification(1)], version)
+        assert [n["_id"] for n in await c.inbox("alice")] == ["n2", "n1"]
+
+        version = await c.version("alice")
+        await c.invalidate(["alice"])
+        await c.fill("alice", [notification(2), notification(1)], version)
+        assert await c.inbox("alice") is None
+
+    @pytest.mark.asyncio
+    async def test_empty_inbox_is_a_hit_once_counted(self, redis_client):
+        """Test that a user known to have no notifications needs no database query"""
+        c = cache(FakeLoader({}), redis_client)
+        await c.counts("carol")
+        assert await c.inbox("carol") == []
+
+    @pytest.mark.asyncio
+    async def test_stats_are_cached_until_invalidated(self, redis_client):
+        """Test the stats summary cache"""
+        c = cache(FakeLoader({}), redis_client)
+        await c.set_stats("alice", {"total_sent": 4})
+        assert await c.stats("alice") == {"total_sent": 4}
+        await c.push([notification(1)])
+        assert await c.stats("alice") is None
+
+    @pytest.mark.asyncio
+    async def test_reconcile_fixes_drift(self, redis_client):
+        """Test that reconciliation rewrites counters that disagree with the database"""
+        inboxes = {"alice": ["pending", "read"], "bob": ["pending"]}
+        loader = FakeLoader(inboxes)
+        c = cache(loader, redis_client)
+        await c.counts("alice")
+        await c.counts("bob")
+
+        # A delta lost on the way to Redis
+        inboxes["alice"].append("pending")
+        assert await c.reconcile() == 1
+        assert await c.counts("alice") == {"total": 3, "unread": 2}
+        assert c.counters_corrected == 1
+
+    @pytest.mark.asyncio
+    async def test_reconcile_leaves_counters_that_move_during_the_load(self, redis_client):
+        """Test that a concurrent delta is not overwritten by a stale recount"""
+        inboxes = {"alice": ["pending"]}
+        loader = FakeLoader(inboxes)
+        c = cache(loader, redis_client)
+        await c.counts("alice")
+        inboxes["alice"].append("pending")
+
+        async def concurrent_create():
+            inboxes["alice"].append("pending")
+            await c.apply({"alice": (1, 1)})
+
+        loader.during_load = concurrent_create
+        assert await c.reconcile() == 0
+        assert await c.counts("alice") == {"total": 2, "unread": 2}
@@ -0,0 +1,147 @@
+"""
+Unit tests for the shared LLM response cache
+"""
+import pytest
+import asyncio
+
+from fakeredis import FakeServer, aioredis
+
+from shared.common.llm import LLMResponse
+from shared.common.llm_cache import LLMCache, SemanticIndex, make_key
+
+
+class StubLLM:
+    """LLM client stand-in that counts generations"""
+
+    model = "stub-model"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def generate(self, prompt, model=None, **config):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return LLMResponse(f"answer {self.calls}", model or self.model)
+
+    async def stream(self, prompt, model=None, **config):
+        self.calls += 1
+        for word in ("streamed ", "answer ", str(self.calls)):
+            yield word
+
+
+@pytest.fixture
+def cache():
+    """Cache on a private Redis"""
+    return LLMCache(ttl_seconds=60, local_entries=2, redis_client=aioredis.FakeRedis(server=FakeServer()))
+
+
+class TestCacheKeys:
+    """Cache key normalization test cases"""
+
+    def test_equivalent_params_share_a_key(self):
+        """Key order and whitespace don't change the key"""
+        a = make_key("t", {"content": "Intro  to\n graphs ", "level": "beginner"}, "m")
+        b = make_key("t", {"level": "beginner", "content": "Intro to graphs"}, "m")
+
+        assert a.key == b.key
+
+    def test_model_and_template_are_part_of_the_key(self):
+        """The same params under another model or template miss"""
+        params = {"content": "Intro to graphs"}
+
+        assert make_key("t", params, "m").key != make_key("t", params, "other").key
+        assert make_key("t", params, "m").key != make_key("u", params, "m").key
+
+
+class TestLLMCache:
+    """LLM cache test cases"""
+
+    @pytest.mark.asyncio
+    async def test_repeat_generation_is_served_from_cache(self, cache):
+        """A repeated request skips the model and reports the tier"""
+        llm = StubLLM()
+        first = await cache.generate("t", "prompt", {"topic": "graphs"}, llm=llm)
+        second = await cache.generate("t", "prompt", {"topic": " graphs"}, llm=llm)
+
+        assert llm.calls == 1
+        assert first.cached is None and second.cached == "local"
+        assert second.text == first.text
+        assert cache.stats()["hit_ratio"] == 0.5
+        assert cache.saved_tokens > 0
+
+    @pytest.mark.asyncio
+    async def test_local_tier_is_lru_bounded(self, cache):
+        """Entries evicted locally are still served by Redis"""
+        llm = StubLLM()
+        for topic in ("a", "b", "c"):
+            await cache.generate("t", "prompt", {"topic": topic}, llm=llm)
+        response = await cache.generate("t", "prompt", {"topic": "a"}, llm=llm)
+
+        assert len(cache._local) == 2
+        assert response.cached == "redis"
+        assert 0 < await cache.redis_client.ttl(make_key("t", {"topic": "a", "generation_config": {}}, "stub-model").key) <= 60
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_miss(self, cache):
+        """An entry past its TTL is generated again"""
+        llm = StubLLM()
+        await cache.generate("t", "prompt", {"topic": "a"}, llm=llm, ttl=1)
+        await cache.redis_client.flushall()
+        next(iter(cache._local.values()))["expires"] = 0
+
+        await cache.generate("t", "prompt", {"topic": "a"}, llm=llm)
+        assert llm.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_generation(self, cache):
+        """Identical requests in flight together call the model once"""
+        llm = StubLLM(delay=0.05)
+        responses = await asyncio.gather(*(cache.generate("t", "prompt", {"topic": "a"}, llm=llm) for _ in range(10)))
+
+        assert llm.calls == 1
+        assert {r.text for r in responses} == {"answer 1"}
+        assert cache.hits["inflight"] == 9
+
+    @pytest.mark.asyncio
+    async def test_semantic_tier_reuses_near_duplicates(self):
+        """A lightly edited text reuses the cached answer; other params still separate"""
+        cache = LLMCache(semantic=SemanticIndex(threshold=0.8), redis_client=aioredis.FakeRedis(server=FakeServer()))
+        llm = StubLLM()
+        text = "Recursion is when a function calls itself until it reaches a base case that stops the calls"
+        await cache.generate("t", "p", {"content": text, "level": "beginner"}, llm=llm, semantic_field="content")
+
+        near = await cache.generate("t", "p", {"content": text + " here", "level": "beginner"}, llm=llm, semantic_field="content")
+        other = await cache.generate("t", "p", {"content": text + " here", "level": "advanced"}, llm=llm, semantic_field="content")
+        unrelated = await cache.generate("t", "p", {"content": "Binary search halves a sorted range", "level": "beginner"}, llm=llm, semantic_field="content")
+
+        assert near.cached == "semantic"
+        assert other.cached is None and unrelated.cached is None
+        assert llm.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_invalidate_template(self, cache):
+        """Invalidation drops a template's entries from every tier"""
+        llm = StubLLM()
+        await cache.generate("t", "prompt", {"topic": "a"}, llm=llm)
+        await cache.generate("u", "prompt", {"topic": "a"}, llm=llm)
+
+        assert await cache.invalidate("t") == 1
+        await cache.generate("t", "prompt", {"topic": "a"}, llm=llm)
+        assert (await cache.generate("u", "prompt", {"topic": "a"}, llm=llm)).cached == "local"
+        assert llm.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_completed_streams_are_cached(self, cache):
+        """A finished stream is stored and replayed as one chunk; an abandoned one is not"""
+        llm = StubLLM()
+        partial = cache.stream("t", "prompt", {"topic": "a"}, llm=llm)
+        await partial.__anext__()
+        await partial.aclose()
+
+        first = [chunk async for chunk in cache.stream("t", "prompt", {"topic": "a"}, llm=llm)]
+        second = [chunk async for chunk in cache.stream("t", "prompt", {"topic": "a"}, llm=llm)]
+
+        assert first == ["streamed ", "answer ", "2"]
+        assert second == ["streamed answer 2"]
+        assert llm.calls == 2
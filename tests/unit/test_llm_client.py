@@ -0,0 +1,142 @@
+"""
+Unit tests for the shared async LLM client
+"""
+import pytest
+import asyncio
+
+from shared.common.errors import AIError, ServiceUnavailableError
+from shared.common.llm import LLMClient
+from tests.fake_llm import FakeLLMServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    """One fake LLM server for the module"""
+    with FakeLLMServer(latency=0.02) as server:
+        yield server
+
+
+@pytest.fixture
+def llm(server):
+    """Fake model reset between tests"""
+    server.llm.reset(latency=0.02)
+    return server.llm
+
+
+def make_client(server, **kwargs) -> LLMClient:
+    options = {"api_key": "test-key", "model": "fake-model", "base_url": server.base_url, "backoff_base": 0.01}
+    options.update(kwargs)
+    return LLMClient(**options)
+
+
+class TestLLMClient:
+    """LLM client test cases"""
+
+    @pytest.mark.asyncio
+    async def test_generate_returns_text(self, server, llm):
+        """A generation returns the model's text"""
+        client = make_client(server)
+        response = await client.generate("Explain recursion")
+        await client.close()
+
+        assert response.text == "[fake-model] Explain recursion"
+        assert response.attempts == 1
+        assert llm.prompts == ["Explain recursion"]
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self, server, llm):
+        """429 and 5xx replies are retried until one succeeds"""
+        llm.fail_status = [503, 429]
+        client = make_client(server, max_retries=2)
+        response = await client.generate("hello")
+        await client.close()
+
+        assert response.attempts == 3
+        assert client.retries == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_retries(self, server, llm):
+        """Persistent failures surface as a 503 once retries are spent"""
+        llm.fail_status = [503] * 3
+        client = make_client(server, max_retries=1)
+        with pytest.raises(ServiceUnavailableError):
+            await client.generate("hello")
+        await client.close()
+
+        assert llm.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self, server, llm):
+        """A 4xx other than 408/429 fails on the first attempt"""
+        llm.fail_status = [400]
+        client = make_client(server, max_retries=2)
+        with pytest.raises(AIError):
+            await client.generate("hello")
+        await client.close()
+
+        assert llm.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_timeout_is_retried(self, server, llm):
+        """A stalled attempt times out and the retry succeeds"""
+        llm.stall = 1.0
+        client = make_client(server, timeout=0.2, max_retries=1)
+        response = await client.generate("hello")
+        await client.close()
+
+        assert response.attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, server, llm):
+        """No more than max_concurrency generations reach the model at once"""
+        client = make_client(server, max_concurrency=4)
+        await asyncio.gather(*(client.generate(f"prompt {i}") for i in range(20)))
+        await client.close()
+
+        assert llm.calls == 20
+        assert llm.max_in_flight <= 4
+
+    @pytest.mark.asyncio
+    async def test_missing_key_fails_fast(self, server, llm):
+        """Without an API key nothing is sent"""
+        client = make_client(server, api_key="")
+        with pytest.raises(AIError):
+            await client.generate("hello")
+
+        assert llm.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_chunks(self, server, llm):
+        """A streamed generation arrives in pieces that join to the full text"""
+        llm.stream_chunks = 5
+        client = make_client(server)
+        chunks = [chunk async for chunk in client.stream("Explain recursion")]
+        await client.close()
+
+        assert len(chunks) == 5
+        assert "".join(chunks) == "[fake-model] Explain recursion"
+
+    @pytest.mark.asyncio
+    async def test_stream_retries_before_first_chunk(self, server, llm):
+        """A failed stream is retried while nothing has been yielded"""
+        llm.fail_status = [503]
+        client = make_client(server, max_retries=1)
+        chunks = [chunk async for chunk in client.stream("hello")]
+        await client.close()
+
+        assert "".join(chunks) == "[fake-model] hello"
+        assert llm.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_closing_stream_aborts_generation(self, server, llm):
+        """Closing the iterator early closes the upstream stream and frees the slot"""
+        llm.chunk_delay = 0.05
+        client = make_client(server)
+        stream = client.stream("a long answer " * 20)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.2)
+        await client.close()
+
+        assert llm.streams_aborted == 1 and llm.streams_completed == 0
+        assert client.in_flight == 0
@@ -0,0 +1,130 @@
+"""
+Unit tests for Redis-backed login throttling
+"""
+import pytest
+
+from fakeredis import FakeServer, aioredis
+import httpx
+from fastapi import FastAPI
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from tests.service_modules import import_service_module
+
+LoginThrottle = import_service_module("auth-service", "utils.login_throttle").LoginThrottle
+auth_routes = import_service_module("auth-service", "routes.auth")
+
+
+@pytest.fixture
+def throttle():
+    """Throttle on a private Redis with a controllable clock"""
+    throttle = LoginThrottle(
+        window_seconds=60,
+        max_email_failures=3,
+        max_ip_failures=5,
+        lockout_seconds=300,
+        redis_client=aioredis.FakeRedis(server=FakeServer())
+    )
+    throttle.clock = lambda: 1_000_040.0  # a third of the way into a window
+    return throttle
+
+
+class TestLoginThrottle:
+    """Login throttle test cases"""
+
+    @pytest.mark.asyncio
+    async def test_email_locks_once_at_limit(self, throttle):
+        """The limit-crossing attempt reports the new lock; later ones do not"""
+        results = [await throttle.record_failure("User@Example.com", "10.0.0.1") for _ in range(4)]
+
+        assert [r["attempts_remaining"] for r in results[:2]] == [2, 1]
+        assert not results[1]["locked"]
+        assert results[2]["locked"] and results[2]["newly_locked"] == ["email"]
+        assert results[3]["locked"] and results[3]["newly_locked"] == []
+        assert (await throttle.check("user@example.com"))["scope"] == "email"
+        ttl = await throttle.redis_client.ttl("auth:login:lock:email:user@example.com")
+        assert 0 < ttl <= 300
+
+    @pytest.mark.asyncio
+    async def test_ip_window_spans_emails(self, throttle):
+        """Spraying many emails from one address trips the IP limit"""
+        for i in range(5):
+            result = await throttle.record_failure(f"user{i}@example.com", "10.0.0.9")
+
+        assert result["newly_locked"] == ["ip"]
+        assert (await throttle.check("fresh@example.com", "10.0.0.9"))["scope"] == "ip"
+        assert not (await throttle.check("fresh@example.com", "10.0.0.10"))["locked"]
+
+    @pytest.mark.asyncio
+    async def test_previous_window_is_weighted(self, throttle):
+        """Failures from the previous window count by their remaining overlap"""
+        throttle.clock = lambda: 999_990.0
+        await throttle.record_failure("a@example.com")
+        await throttle.record_failure("a@example.com")
+
+        throttle.clock = lambda: 1_000_040.0  # 2/3 of the previous window still overlaps
+        assert await throttle.failures_for("a@example.com") == pytest.approx(2 * 2 / 3)
+
+        throttle.clock = lambda: 1_000_110.0
+        assert await throttle.failures_for("a@example.com") == 0
+
+    @pytest.mark.asyncio
+    async def test_clear_resets_email_window(self, throttle):
+        """A successful login forgets earlier failures for the email"""
+        await throttle.record_failure("a@example.com", "10.0.0.1")
+        await throttle.record_failure("a@example.com", "10.0.0.1")
+        await throttle.clear("a@example.com")
+
+        result = await throttle.record_failure("a@example.com", "10.0.0.1")
+        assert result["attempts_remaining"] == 2
+
+    @pytest.mark.asyncio
+    async def test_unavailable_redis_returns_none(self, throttle, monkeypatch):
+        """Callers fall back when Redis cannot be reached"""
+        async def no_client():
+            return None
+
+        monkeypatch.setattr(throttle, "_client", no_client)
+        assert await throttle.record_failure("a@example.com") is None
+        assert await throttle.check("a@example.com") is None
+
+
+class TestForwardedClientAddress:
+    """Client IP behind the gateway test cases"""
+
+    def login_app(self, monkeypatch, throttle, trusted_hosts):
+        """The login route behind the proxy-headers middleware, failing every attempt"""
+        async def authenticate_user(body, ip_address=None, user_agent=None):
+            await throttle.record_failure(body.email, ip_address)
+            raise auth_routes.AuthenticationError("Invalid email or password")
+
+        monkeypatch.setattr(auth_routes.AuthService, "authenticate_user", authenticate_user)
+        app = FastAPI()
+        app.include_router(auth_routes.router, prefix="/auth")
+        app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=trusted_hosts)
+        # Requests arrive from the gateway's address unless trusted_hosts says otherwise
+        transport = httpx.ASGITransport(app=app, client=("172.20.0.10", 40000))
+        return httpx.AsyncClient(transport=transport, base_url="http://auth-service")
+
+    @pytest.mark.asyncio
+    async def test_forwarded_clients_are_throttled_separately(self, throttle, monkeypatch):
+        """Failures from one client behind the gateway do not lock out another"""
+        client = self.login_app(monkeypatch, throttle, trusted_hosts="172.20.0.10")
+        for i in range(5):
+            response = await client.post("/auth/login", json={"email": f"user{i}@example.com", "password": "wrong"},
+                                         headers={"X-Forwarded-For": "203.0.113.5"})
+            assert response.status_code == 401
+
+        assert (await throttle.check("fresh@example.com", "203.0.113.5"))["scope"] == "ip"
+        assert not (await throttle.check("fresh@example.com", "198.51.100.7"))["locked"]
+        assert not (await throttle.check("fresh@example.com", "172.20.0.10"))["locked"]
+
+    @pytest.mark.asyncio
+    async def test_forwarded_header_ignored_from_untrusted_peers(self, throttle, monkeypatch):
+        """A peer that is not the configured gateway cannot pick its throttling key"""
+        client = self.login_app(monkeypatch, throttle, trusted_hosts="127.0.0.1")
+        for i in range(5):
+            await client.post("/auth/login", json={"email": f"user{i}@example.com", "password": "wrong"},
+                              headers={"X-Forwarded-For": f"198.51.100.{i}"})
+
+        assert (await throttle.check("fresh@example.com", "172.20.0.10"))["scope"] == "ip"
+        assert not (await throttle.check("fresh@example.com", "198.51.100.0"))["locked"]
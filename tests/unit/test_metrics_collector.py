@@ -0,0 +1,134 @@
+"""
+Unit tests for the shared metrics collector
+"""
+import pytest
+import random
+import threading
+from types import SimpleNamespace
+
+from shared.common.database import MongoMetricsListener
+from shared.common.monitoring import MetricsCollector, Histogram
+
+
+class TestHistogram:
+    """Test cases for the log-linear histogram"""
+
+    def test_quantiles_within_relative_error(self):
+        """Quantile estimates stay within the bucket resolution"""
+        rng = random.Random(42)
+        values = [rng.lognormvariate(-4, 1) for _ in range(50000)]
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.9, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert abs(histogram.quantile(q) - exact) / exact < 2 / Histogram.SUB_BUCKETS
+
+    def test_memory_bounded_by_range_not_samples(self):
+        """Bucket count does not grow with the number of samples"""
+        histogram = Histogram()
+        for i in range(200000):
+            histogram.record(0.001 + (i % 1000) * 0.001)
+
+        assert histogram.count == 200000
+        assert len(histogram.buckets) < 1000
+
+    def test_merge(self):
+        """Merged histograms match a histogram of the combined samples"""
+        left, right, combined = Histogram(), Histogram(), Histogram()
+        for i in range(1, 1001):
+            (left if i % 2 else right).record(i / 1000)
+            combined.record(i / 1000)
+
+        left.merge(right)
+
+        assert left.count == combined.count
+        assert left.buckets == combined.buckets
+        assert left.quantile(0.99) == combined.quantile(0.99)
+        assert left.min == combined.min and left.max == combined.max
+
+    def test_zero_and_empty(self):
+        """Zero values and empty histograms are handled"""
+        histogram = Histogram()
+        assert histogram.quantile(0.5) == 0.0
+
+        histogram.record(0)
+        histogram.record(0)
+        histogram.record(1.0)
+        assert histogram.quantile(0.5) == 0.0
+        assert histogram.summary()["max"] == 1.0
+
+
+class TestMetricsCollector:
+    """Test cases for MetricsCollector"""
+
+    @pytest.mark.asyncio
+    async def test_tagged_series_are_distinct(self):
+        """Different label sets produce different series"""
+        collector = MetricsCollector()
+        await collector.increment_counter("login_attempts", tags={"result": "success"})
+        await collector.increment_counter("login_attempts", tags={"result": "success"})
+        await collector.increment_counter("login_attempts", tags={"result": "invalid_password"})
+
+        summary = await collector.get_metrics_summary()
+
+        assert summary["counters"]['login_attempts{result="success"}'] == 2
+        assert summary["counters"]['login_attempts{result="invalid_password"}'] == 1
+
+    def test_label_sets_are_interned(self):
+        """Label order does not matter and keys are reused"""
+        collector = MetricsCollector()
+        first = collector.series_key("request_duration", {"method": "GET", "route": "/courses"})
+        second = collector.series_key("request_duration", {"route": "/courses", "method": "GET"})
+
+        assert first is second
+        assert collector.series[first] == ("request_duration", (("method", "GET"), ("route", "/courses")))
+
+    def test_series_cap(self):
+        """High-cardinality labels collapse into an overflow series"""
+        collector = MetricsCollector(max_series=10)
+        for i in range(100):
+            collector.counter_inc("requests_total", tags={"path": f"/courses/{i}"})
+
+        assert len(collector.series) == 11
+        assert collector.counters['requests_total{overflow="true"}'] == 90
+
+
+class TestMongoMetricsListener:
+    """Test cases for the pymongo event listener"""
+
+    def test_driver_thread_events_are_merged_on_collect(self):
+        """Events from many driver threads all land in the collector at scrape time"""
+        collector = MetricsCollector()
+        listener = MongoMetricsListener(collector)
+        address = ("mongo", 27017)
+        threads, per_thread = 8, 500
+
+        def driver(thread_id):
+            for i in range(per_thread):
+                request_id = thread_id * per_thread + i
+                listener.started(SimpleNamespace(request_id=request_id, command_name="find", command={"find": "courses"}))
+                listener.connection_check_out_started(SimpleNamespace(address=address))
+                listener.connection_checked_out(SimpleNamespace(address=address))
+                listener.succeeded(SimpleNamespace(request_id=request_id, command_name="find", duration_micros=1000))
+                listener.connection_checked_in(SimpleNamespace(address=address))
+
+        workers = [threading.Thread(target=driver, args=(t,)) for t in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert collector.histograms == {}
+        collector.collect()
+        collector.collect()
+
+        histogram = collector.histogram("mongodb_command_duration_seconds",
+                                        {"command": "find", "collection": "courses", "outcome": "ok"})
+        assert histogram.count == threads * per_thread
+        assert listener._pending == {}
+        for state in ("checked_out", "waiting"):
+            key = collector.series_key("mongodb_pool_connections", {"address": "mongo:27017", "state": state})
+            assert collector.gauges[key] == 0
@@ -0,0 +1,188 @@
+"""
+Unit tests for notification digests and precompiled templates
+"""
+import pytest
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+digest = import_service_module("notification-service", "services.digest")
+templates = import_service_module("notification-service", "utils.templates")
+models = import_service_module("notification-service", "models")
+
+
+class FakeTemplateStore:
+    def __init__(self, stored=None):
+        self.stored = stored or []
+        self.loads = 0
+
+    async def __call__(self):
+        self.loads += 1
+        return self.stored
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, notifications):
+        self.batches.append(notifications)
+
+    @property
+    def sent(self):
+        return [n for batch in self.batches for n in batch]
+
+
+def event(user="alice", title="Quiz 1 graded", type="grade_available", priority="medium", course="cs101", channels=("in_app",)):
+    return models.NotificationCreate(
+        title=title, message=title, type=type, priority=priority,
+        recipient_id=user, course_id=course, channels=list(channels)
+    )
+
+
+def coalescer(deliver, settings=None, stored_templates=None, **options):
+    async def settings_loader(user_ids):
+        return {user_id: (settings or {}).get(user_id, {}) for user_id in user_ids}
+
+    options.setdefault("redis_client", aioredis.FakeRedis(server=FakeServer(), decode_responses=True))
+    registry = templates.TemplateRegistry(FakeTemplateStore(stored_templates))
+    return digest.DigestCoalescer(settings_loader, deliver, registry, ["grade_available", "course_update"], **options)
+
+
+class TestTemplates:
+    """Precompiled template test cases"""
+
+    def test_render_matches_placeholder_replacement(self):
+        """Test that compiled templates render like format_notification_message"""
+        template = templates.CompiledTemplate("{count} new grades in {course}, {missing} stays")
+        assert template.render({"count": 3, "course": "CS101"}) == "3 new grades in CS101, {missing} stays"
+        assert templates.CompiledTemplate("plain").render({}) == "plain"
+
+    @pytest.mark.asyncio
+    async def test_stored_templates_override_defaults_and_reload_after_ttl(self, monkeypatch):
+        """Test that stored templates win over defaults and are compiled once per TTL"""
+        clock = [1000.0]
+        monkeypatch.setattr(templates.time, "monotonic", lambda: clock[0])
+        store = FakeTemplateStore([{"name": "welcome", "subject_template": "Hi {name}", "message_template": "Welcome, {name}"}])
+        registry = templates.TemplateRegistry(store, ttl=3600, redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True))
+        registry.register_default("welcome", "Hello", "Hello")
+        registry.register_default("bye", "Bye {name}", "Bye")
+
+        assert await registry.render("welcome", {"name": "Ada"}) == ("Hi Ada", "Welcome, Ada")
+        assert await registry.render("bye", {"name": "Ada"}) == ("Bye Ada", "Bye")
+        assert await registry.render("unknown", {}) is None
+        assert store.loads == 1
+
+        clock[0] += 3600
+        await registry.render("welcome", {"name": "Ada"})
+        assert store.loads == 2
+
+
+class TestDigestCoalescer:
+    """Digest coalescer test cases"""
+
+    @pytest.mark.asyncio
+    async def test_events_in_a_window_become_one_digest(self):
+        """Test that a user's events of one type are sent as one digest when the window ends"""
+        deliver = Recorder()
+        c = coalescer(deliver)
+        result = await c.add([event(title=f"Quiz {i} graded", channels=("in_app", "email") if i else ("in_app",)) for i in range(3)], now=1000)
+        assert result == {"immediate": 0, "deferred": 3}
+        assert await c.flush(now=1000 + 14 * 60) == 0
+
+        await c.add([event(title="Quiz 3 graded")], now=1000 + 60)
+        assert await c.flush(now=1000 + 15 * 60) == 1
+        (notification,) = deliver.sent
+        assert notification.title == "4 new grades are available"
+        assert "- Quiz 0 graded\n- Quiz 1 graded" in notification.message
+        assert [ch.value for ch in notification.channels] == ["in_app", "email"]
+        assert notification.course_id == "cs101"
+        assert notification.data["digest"] is True and notification.data["count"] == 4
+
+        # The bucket is gone
+        assert await c.flush(now=10 ** 6) == 0
+
+    @pytest.mark.asyncio
+    async def test_single_event_is_sent_unchanged(self):
+        """Test that a bucket with one event is sent as that event"""
+        deliver = Recorder()
+        c = coalescer(deliver)
+        await c.add([event(title="Quiz 9 graded")], now=0)
+        await c.flush(now=3600)
+        assert [n.title for n in deliver.sent] == ["Quiz 9 graded"]
+        assert "digest" not in deliver.sent[0].data
+
+    @pytest.mark.asyncio
+    async def test_high_priority_other_types_and_zero_windows_bypass(self):
+        """Test the events that are sent immediately"""
+        deliver = Recorder()
+        settings = {"bob": {"digest_windows": {"grade_available": 0}}, "carol": {"digest_enabled": False}}
+        c = coalescer(deliver, settings)
+        result = await c.add([
+            event(priority="high"),
+            event(priority="urgent"),
+            event(type="system_announcement"),
+            event(user="bob"),
+            event(user="bob", type="course_update", title="New lesson"),
+            event(user="carol"),
+            event()
+        ], now=0)
+        assert result == {"immediate": 5, "deferred": 2}
+        assert len(deliver.sent) == 5
+
+    @pytest.mark.asyncio
+    async def test_windows_come_from_user_settings(self):
+        """Test per-user and per-type windows"""
+        deliver = Recorder()
+        c = coalescer(deliver, {"alice": {"digest_window_minutes": 60, "digest_windows": {"course_update": 5}}})
+        await c.add([event(), event(), event(type="course_update"), event(type="course_update")], now=0)
+        assert await c.flush(now=5 * 60) == 1
+        assert deliver.sent[0].title == "2 updates in your courses"
+        assert await c.flush(now=60 * 60) == 1
+
+    @pytest.mark.asyncio
+    async def test_stored_digest_template_is_used(self):
+        """Test that a stored "<type>_digest" template replaces the built-in one"""
+        deliver = Recorder()
+        stored = [{"name": "grade_available_digest", "subject_template": "Grades ({count})", "message_template": "{titles}"}]
+        c = coalescer(deliver, stored_templates=stored)
+        await c.add([event(), event()], now=0)
+        await c.flush(now=3600)
+        assert deliver.sent[0].title == "Grades (2)"
+
+    @pytest.mark.asyncio
+    async def test_digest_is_rendered_in_the_users_locale(self):
+        """Test that each digest uses the template variant for its recipient's locale"""
+        deliver = Recorder()
+        stored = [{"name": "grade_available_digest", "locale": "pt", "subject_template": "{count} novas notas", "message_template": "{titles}"}]
+        c = coalescer(deliver, {"alice": {"locale": "pt-BR"}}, stored_templates=stored)
+        await c.add([event(), event(), event(user="bob"), event(user="bob")], now=0)
+        await c.flush(now=3600)
+        assert sorted(n.title for n in deliver.sent) == ["2 new grades are available", "2 novas notas"]
+
+    @pytest.mark.asyncio
+    async def test_failed_delivery_puts_events_back(self):
+        """Test that a digest whose delivery fails is flushed again later"""
+        calls = []
+
+        async def flaky(notifications):
+            calls.append(notifications)
+            if len(calls) == 1:
+                raise RuntimeError("database down")
+
+        c = coalescer(flaky)
+        await c.add([event(), event(), event()], now=0)
+        with pytest.raises(RuntimeError):
+            await c.flush(now=3600)
+        assert await c.flush(now=3600) == 1
+        assert calls[1][0].data["count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_without_redis_everything_is_immediate(self, monkeypatch):
+        """Test that the coalescer fails open"""
+        deliver = Recorder()
+        c = coalescer(deliver, redis_client=None)
+        monkeypatch.setattr(digest.cache_manager.redis, "redis_available", False)
+        assert await c.add([event(), event()], now=0) == {"immediate": 2, "deferred": 0}
+        assert len(deliver.sent) == 2
@@ -0,0 +1,236 @@
+"""
+Unit tests for the outbox-backed notification dispatcher
+"""
+import pytest
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from tests.service_modules import import_service_module
+
+dispatcher_module = import_service_module("notification-service", "services.dispatcher")
+
+
+class FakeDispatchDB:
+    """In-memory stand-in for the dispatcher's database methods"""
+
+    def __init__(self):
+        self.notifications = {}
+        self.outbox = {}
+        self.notification_ops = []
+        self.bulk_writes = 0
+
+    async def save_notifications(self, notifications, jobs):
+        for notification in notifications:
+            self.notifications[notification["_id"]] = notification
+        for job in jobs:
+            self.outbox[job["_id"]] = dict(job)
+
+    async def get_notifications_by_ids(self, notification_ids):
+        return [self.notifications[i] for i in notification_ids if i in self.notifications]
+
+    async def apply_delivery_updates(self, notification_ops, outbox_ops):
+        self.bulk_writes += 1
+        self.notification_ops.extend(notification_ops)
+        for op in outbox_ops:
+            job_id = op._filter["_id"]
+            if type(op).__name__ == "DeleteOne":
+                self.outbox.pop(job_id, None)
+            else:
+                self.outbox[job_id].update(op._doc["$set"])
+
+    async def claim_outbox_jobs(self, owner, now, lease_until, limit):
+        claimed = []
+        for job in self.outbox.values():
+            if job["status"] == "pending" and job["lease_until"] <= now and len(claimed) < limit:
+                job.update(owner=owner, lease_until=lease_until)
+                claimed.append(dict(job))
+        return claimed
+
+    async def renew_outbox_leases(self, owner, job_ids, lease_until):
+        for job_id in job_ids:
+            job = self.outbox.get(job_id)
+            if job is not None and job["owner"] == owner and job["status"] == "pending":
+                job["lease_until"] = lease_until
+
+
+def notification(i, channels=("in_app", "email")):
+    return {"_id": f"n{i}", "recipient_id": f"user{i}", "title": "Assignment due", "channels": list(channels)}
+
+
+def dispatcher(db, senders, **options):
+    options.setdefault("workers", {channel: 2 for channel in senders})
+    options.setdefault("batch_sizes", {channel: 10 for channel in senders})
+    options.setdefault("status_flush_interval", 0.01)
+    return dispatcher_module.NotificationDispatcher(db, senders, **options)
+
+
+def recording_sender(sent, errors=None):
+    async def send(batch):
+        sent.append([n["_id"] for n in batch])
+        return [(errors or {}).get(n["_id"]) for n in batch]
+    return send
+
+
+class TestNotificationDispatcher:
+    """Notification dispatcher test cases"""
+
+    @pytest.mark.asyncio
+    async def test_submit_delivers_in_batches_and_clears_outbox(self):
+        """Test that submitted notifications are sent per channel in batches and their jobs removed"""
+        db = FakeDispatchDB()
+        in_app, email = [], []
+        d = dispatcher(db, {"in_app": recording_sender(in_app), "email": recording_sender(email)}, insert_batch_size=25)
+        await d.start(poll=False)
+
+        await d.submit([notification(i) for i in range(60)])
+        assert len(db.notifications) == 60
+        await d.drain(timeout=2)
+        await d.stop()
+
+        assert sorted(n for batch in in_app for n in batch) == sorted(f"n{i}" for i in range(60))
+        assert sum(len(batch) for batch in email) == 60
+        assert max(len(batch) for batch in in_app) <= 10
+        assert len(in_app) < 60
+        assert db.outbox == {}
+        assert d.sent == 120
+        assert len(db.notification_ops) == 120
+        assert db.bulk_writes < 120
+
+    @pytest.mark.asyncio
+    async def test_failed_send_is_retried_then_marked_failed(self):
+        """Test that errors reschedule the job with backoff until attempts run out"""
+        db = FakeDispatchDB()
+        sent = []
+        d = dispatcher(db, {"sms": recording_sender(sent, {"n1": "gateway timeout"})}, max_attempts=2, retry_delay=60)
+        await d.start(poll=False)
+        await d.submit([notification(0, ["sms"]), notification(1, ["sms"])])
+        await d.drain(timeout=2)
+
+        job = db.outbox["n1:sms"]
+        assert "n0:sms" not in db.outbox
+        assert job["status"] == "pending"
+        assert job["attempts"] == 1
+        assert job["owner"] is None
+        assert job["lease_until"] > datetime.now(timezone.utc) + timedelta(seconds=50)
+
+        # Due now: the poll claims it again and the second failure is final
+        job["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        assert await d.recover() == 1
+        await d.drain(timeout=2)
+        await d.stop()
+        assert db.outbox["n1:sms"]["status"] == "failed"
+        assert db.outbox["n1:sms"]["attempts"] == 2
+        assert d.failed == 2
+
+    @pytest.mark.asyncio
+    async def test_recover_claims_only_expired_leases(self):
+        """Test that jobs left by another node are claimed once their lease has run out"""
+        db = FakeDispatchDB()
+        other = dispatcher(db, {"push": recording_sender([])})
+        # Never started: the jobs stay in the outbox, leased to the other node
+        await other.submit([notification(i, ["push"]) for i in range(5)])
+        db.outbox["n0:push"]["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.outbox["n1:push"]["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+        sent = []
+        d = dispatcher(db, {"push": recording_sender(sent)})
+        await d.start(poll=False)
+        assert await d.recover() == 2
+        await d.drain(timeout=2)
+        await d.stop()
+
+        assert sorted(n for batch in sent for n in batch) == ["n0", "n1"]
+        assert sorted(db.outbox) == ["n2:push", "n3:push", "n4:push"]
+
+    @pytest.mark.asyncio
+    async def test_jobs_held_past_their_lease_are_sent_once(self):
+        """Test that a backlog outliving its lease is renewed, and not queued again by this node's poll"""
+        db = FakeDispatchDB()
+        sent = []
+        release = asyncio.Event()
+
+        async def blocked(batch):
+            await release.wait()
+            return await recording_sender(sent)(batch)
+
+        d = dispatcher(db, {"email": blocked}, workers={"email": 1}, batch_sizes={"email": 2})
+        await d.start(poll=False)
+        await d.submit([notification(i, ["email"]) for i in range(6)])
+
+        # Leases run out while the jobs are still queued or being sent
+        for job in db.outbox.values():
+            job["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        assert await d.recover() == 6
+        assert await d.renew_leases() == 6
+        assert all(job["lease_until"] > datetime.now(timezone.utc) + timedelta(seconds=60) for job in db.outbox.values())
+        assert await d.recover() == 0
+
+        release.set()
+        await d.drain(timeout=2)
+        await d.stop()
+
+        assert sorted(n for batch in sent for n in batch) == [f"n{i}" for i in range(6)]
+        assert db.outbox == {}
+        assert await d.renew_leases() == 0
+
+    @pytest.mark.asyncio
+    async def test_stop_finishes_queued_work(self):
+        """Test that stop waits for queued jobs and writes their results"""
+        db = FakeDispatchDB()
+
+        async def slow(batch):
+            await asyncio.sleep(0.01)
+            return [None] * len(batch)
+
+        d = dispatcher(db, {"email": slow}, workers={"email": 1}, batch_sizes={"email": 5}, status_flush_interval=60)
+        await d.start(poll=False)
+        await d.submit([notification(i, ["email"]) for i in range(20)])
+        await d.stop(timeout=2)
+
+        assert db.outbox == {}
+        assert d.sent == 20
+        assert not d._tasks
+
+    @pytest.mark.asyncio
+    async def test_sender_exception_counts_as_error_for_whole_batch(self):
+        """Test that a sender raising marks every job in its batch for retry"""
+        db = FakeDispatchDB()
+
+        async def broken(batch):
+            raise RuntimeError("provider down")
+
+        d = dispatcher(db, {"email": broken}, max_attempts=3)
+        await d.start(poll=False)
+        await d.submit([notification(i, ["email"]) for i in range(4)])
+        await d.drain(timeout=2)
+        await d.stop()
+
+        assert len(db.outbox) == 4
+        assert all(job["last_error"] == "provider down" and job["attempts"] == 1 for job in db.outbox.values())
+
+    @pytest.mark.asyncio
+    async def test_flush_cancelled_mid_write_keeps_results(self):
+        """Test that results being written when the flusher is cancelled are written by the next flush"""
+        db = FakeDispatchDB()
+        d = dispatcher(db, {"email": recording_sender([])})
+        await d.submit([notification(i, ["email"]) for i in range(3)])
+        for i in range(3):
+            d.record(dispatcher_module.DispatchJob(f"n{i}:email", "email", db.notifications[f"n{i}"]), None)
+
+        write = db.apply_delivery_updates
+        started = asyncio.Event()
+
+        async def hanging_write(*args):
+            started.set()
+            await asyncio.Event().wait()
+
+        db.apply_delivery_updates = hanging_write
+        flushing = asyncio.ensure_future(d.flush())
+        await started.wait()
+        flushing.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flushing
+
+        db.apply_delivery_updates = write
+        assert await d.flush() == 3
+        assert db.outbox == {}
@@ -0,0 +1,118 @@
+"""
+Unit tests for the compiled notification template registry
+"""
+import pytest
+
+from fakeredis import FakeServer, aioredis
+
+from tests.service_modules import import_service_module
+
+templates = import_service_module("notification-service", "utils.templates")
+notification_utils = import_service_module("notification-service", "utils.notification_utils")
+
+
+class FakeTemplateStore:
+    def __init__(self, stored=None):
+        self.stored = stored or []
+        self.loads = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.loads += 1
+        if self.fail:
+            raise RuntimeError("database down")
+        return list(self.stored)
+
+
+def stored(name, subject, message, locale="en"):
+    return {"name": name, "locale": locale, "subject_template": subject, "message_template": message}
+
+
+class TestCompiledTemplate:
+    """Compiled template test cases"""
+
+    @pytest.mark.parametrize("source, variables", [
+        ("<b>Hello</b> {name}, see {link}", {"name": "Ada", "link": "https://x.test/a?b=1"}),
+        ("  {name} ", {"name": "  padded  "}),
+        ("Grade: {grade}", {"grade": "<script>alert(1)</script>A"}),
+        ("<p>{greeting}</p>", {}),
+        ("{a}<{b}", {"a": "1", "b": "i>2"}),
+        ("plain text", {"unused": 1}),
+    ])
+    def test_render_matches_format_then_sanitize(self, source, variables):
+        """Test that rendering equals format_notification_message followed by sanitize_notification_content"""
+        expected = notification_utils.sanitize_notification_content(
+            notification_utils.format_notification_message(source, variables)
+        )
+        limit = notification_utils.notification_service_settings.max_message_length
+        assert templates.CompiledTemplate(source, limit).render(variables) == expected
+
+    def test_long_output_is_truncated(self):
+        """Test that rendered text over the limit is cut with an ellipsis"""
+        template = templates.CompiledTemplate("Titles: {titles}", max_length=20)
+        assert template.render({"titles": "x" * 50}) == "Titles: " + "x" * 9 + "..."
+        assert template.render({"titles": "short"}) == "Titles: short"
+
+    def test_tags_are_removed_at_compile_time(self):
+        """Test that the template text is sanitized once"""
+        template = templates.CompiledTemplate("<h1>Due</h1> {title}")
+        assert template.parts == ["Due ", "title", ""]
+
+
+class TestTemplateRegistry:
+    """Template registry test cases"""
+
+    @pytest.mark.asyncio
+    async def test_locale_falls_back_to_language_then_default(self):
+        """Test the pt-BR -> pt -> en lookup, stored variants before built-in defaults"""
+        store = FakeTemplateStore([
+            stored("welcome", "Olá {name}", "Bem-vindo, {name}", locale="pt"),
+            stored("welcome", "Hi {name}", "Welcome, {name}")
+        ])
+        registry = templates.TemplateRegistry(store, redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True))
+        registry.register_default("welcome", "Hello", "Hello")
+        registry.register_default("bye", "Tchau", "Tchau", locale="pt")
+        registry.register_default("bye", "Bye", "Bye")
+
+        assert await registry.render("welcome", {"name": "Ana"}, "pt-BR") == ("Olá Ana", "Bem-vindo, Ana")
+        assert await registry.render("welcome", {"name": "Ann"}, "fr") == ("Hi Ann", "Welcome, Ann")
+        assert await registry.render("welcome", {"name": "Ann"}) == ("Hi Ann", "Welcome, Ann")
+        assert await registry.render("bye", {}, "pt-PT") == ("Tchau", "Tchau")
+        assert await registry.render("missing", {}, "pt") is None
+        assert store.loads == 1
+
+    @pytest.mark.asyncio
+    async def test_saving_on_one_replica_reloads_the_others(self):
+        """Test that invalidate() bumps the shared version other registries check"""
+        server = FakeServer()
+        store = FakeTemplateStore([stored("welcome", "Hi", "v1")])
+
+        def replica():
+            return templates.TemplateRegistry(
+                store, version_check_interval=0,
+                redis_client=aioredis.FakeRedis(server=server, decode_responses=True)
+            )
+
+        writer, reader = replica(), replica()
+        assert (await reader.render("welcome", {}))[1] == "v1"
+        assert (await reader.render("welcome", {}))[1] == "v1"
+        assert store.loads == 1
+
+        store.stored = [stored("welcome", "Hi", "v2")]
+        await writer.invalidate()
+        assert (await writer.render("welcome", {}))[1] == "v2"
+        assert (await reader.render("welcome", {}))[1] == "v2"
+        assert len(await reader.stored_templates()) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_reload_keeps_compiled_templates(self):
+        """Test that a storage failure keeps serving the last compiled set"""
+        store = FakeTemplateStore([stored("welcome", "Hi", "Welcome")])
+        registry = templates.TemplateRegistry(store, redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True))
+        assert await registry.render("welcome", {}) == ("Hi", "Welcome")
+
+        store.fail = True
+        await registry.invalidate()
+        assert await registry.render("welcome", {}) == ("Hi", "Welcome")
+        assert await registry.render("welcome", {}) == ("Hi", "Welcome")
+        assert store.loads == 2  # backs off instead of retrying on every render
@@ -0,0 +1,48 @@
+"""
+Unit tests for the auth service password hashing pool
+"""
+import pytest
+import asyncio
+
+from tests.service_modules import import_service_module
+
+auth_utils = import_service_module("auth-service", "utils.auth_utils")
+PasswordHasher, PasswordHasherBusy = auth_utils.PasswordHasher, auth_utils.PasswordHasherBusy
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=2, max_pending=2)
+    yield hasher
+    hasher.shutdown()
+
+
+class TestPasswordHasher:
+    """Password hasher test cases"""
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify(self, hasher):
+        """Hashes verify off the event loop; malformed hashes never match"""
+        hashed = await hasher.hash("CorrectHorse1")
+
+        assert await hasher.verify("CorrectHorse1", hashed)
+        assert not await hasher.verify("wrong", hashed)
+        assert not await hasher.verify("CorrectHorse1", "not-a-bcrypt-hash")
+        assert not await hasher.verify("CorrectHorse1", "")
+        assert hasher.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_saturated(self, hasher):
+        """Calls beyond max_pending fail fast instead of queueing"""
+        results = await asyncio.gather(*(hasher.hash("pw") for _ in range(5)), return_exceptions=True)
+
+        assert sum(isinstance(result, PasswordHasherBusy) for result in results) == 3
+        assert hasher.rejected == 3
+
+    def test_needs_rehash_on_cost_change(self, hasher):
+        """Hashes made with a different cost factor are flagged for upgrade"""
+        old = PasswordHasher(rounds=5).scheme.hash("pw")
+
+        assert hasher.needs_rehash(old)
+        assert not hasher.needs_rehash(hasher.scheme.hash("pw"))
+        assert not hasher.needs_rehash("garbage")
@@ -0,0 +1,161 @@
+"""
+Unit tests for Prometheus exposition and multi-process metrics aggregation
+"""
+import os
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from shared.common.metrics import (
+    MetricsCollector, render_prometheus, write_snapshot, retire_snapshot, aggregate_snapshots
+)
+from shared.common.monitoring import MetricsMiddleware
+
+
+class TestPrometheusExposition:
+    """Text exposition format test cases"""
+
+    def test_counters_and_gauges(self):
+        """Families get one TYPE line and labels are escaped"""
+        collector = MetricsCollector()
+        collector.counter_inc("jobs_enqueued", tags={"priority": 2})
+        collector.counter_inc("jobs_enqueued", tags={"priority": 2})
+        collector.gauge_set("queue.depth", 7, {"name": 'a"b\\c'})
+
+        output = render_prometheus(collector, {"service": "test"})
+
+        assert output.count("# TYPE jobs_enqueued counter") == 1
+        assert 'jobs_enqueued{priority="2",service="test"} 2' in output
+        assert "# TYPE queue_depth gauge" in output
+        assert 'queue_depth{name="a\\"b\\\\c",service="test"} 7' in output
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Histogram buckets follow `le` semantics and end with +Inf == _count"""
+        collector = MetricsCollector()
+        for value in (0.003, 0.02, 0.02, 0.3, 20.0):
+            collector.observe("http_request_duration_seconds", value, {"route": "/courses/{course_id}"})
+
+        output = render_prometheus(collector)
+        lines = {line.rsplit(" ", 1)[0]: line.rsplit(" ", 1)[1] for line in output.splitlines() if not line.startswith("#")}
+        prefix = 'http_request_duration_seconds_bucket{route="/courses/{course_id}",le='
+
+        assert lines[prefix + '"0.005"}'] == "1"
+        assert lines[prefix + '"0.025"}'] == "3"
+        assert lines[prefix + '"0.5"}'] == "4"
+        assert lines[prefix + '"10"}'] == "4"
+        assert lines[prefix + '"+Inf"}'] == "5"
+        assert lines['http_request_duration_seconds_count{route="/courses/{course_id}"}'] == "5"
+
+    def test_multiprocess_aggregation(self, tmp_path):
+        """Counters and histograms sum across workers; gauges are kept per pid"""
+        for pid, requests in ((101, 3), (102, 4)):
+            collector = MetricsCollector()
+            collector.counter_inc("requests_total", requests, {"route": "/health"})
+            collector.observe("db_query_duration_seconds", 0.01 * requests, {"operation": "find_one"})
+            collector.gauge_set("jobs_running", requests)
+            snapshot = collector.snapshot()
+            snapshot["pid"] = pid
+            write_snapshot(snapshot, str(tmp_path))
+
+        aggregated = aggregate_snapshots(str(tmp_path))
+        output = render_prometheus(aggregated)
+
+        assert len([name for name in os.listdir(tmp_path) if name.endswith(".json")]) == 2
+        assert 'requests_total{route="/health"} 7' in output
+        assert 'db_query_duration_seconds_count{operation="find_one"} 2' in output
+        assert 'jobs_running{pid="101"} 3' in output
+        assert 'jobs_running{pid="102"} 4' in output
+
+    def test_reused_pid_does_not_overwrite_an_exited_worker(self, tmp_path):
+        """A new worker with a dead worker's pid writes its own file"""
+        for requests in (5, 2):
+            collector = MetricsCollector()
+            collector.counter_inc("requests_total", requests)
+            snapshot = collector.snapshot()
+            snapshot["pid"] = 101
+            write_snapshot(snapshot, str(tmp_path))
+
+        assert "requests_total 7" in render_prometheus(aggregate_snapshots(str(tmp_path)))
+
+    def test_retired_workers_fold_into_retained_totals(self, tmp_path):
+        """An exiting worker's file is removed but its counters still count"""
+        exited, running = MetricsCollector(), MetricsCollector()
+        for collector, requests in ((exited, 5), (running, 2)):
+            collector.counter_inc("requests_total", requests)
+            collector.observe("db_query_duration_seconds", 0.01)
+            collector.gauge_set("jobs_running", requests)
+            write_snapshot(collector.snapshot(), str(tmp_path))
+
+        retire_snapshot(exited.snapshot(), str(tmp_path))
+        retire_snapshot(MetricsCollector().snapshot(), str(tmp_path))
+        output = render_prometheus(aggregate_snapshots(str(tmp_path)))
+
+        assert {name for name in os.listdir(tmp_path) if name.endswith(".json")} == {
+            "metrics-retained.json", f"metrics-{running.instance}.json"
+        }
+        assert "requests_total 7" in output
+        assert "db_query_duration_seconds_count 2" in output
+        assert 'jobs_running{pid="%d"} 2' % os.getpid() in output
+        assert output.count("jobs_running{") == 1
+
+    def test_stale_gauges_dropped(self, tmp_path):
+        """Gauges from workers that stopped reporting are not exposed"""
+        collector = MetricsCollector()
+        collector.counter_inc("requests_total")
+        collector.gauge_set("jobs_running", 1)
+        snapshot = collector.snapshot()
+        snapshot["timestamp"] -= 600
+        write_snapshot(snapshot, str(tmp_path))
+
+        output = render_prometheus(aggregate_snapshots(str(tmp_path), gauge_stale_after=60))
+
+        assert "requests_total 1" in output
+        assert "jobs_running" not in output
+
+
+class TestMetricsMiddleware:
+    """Request metrics middleware test cases"""
+
+    def test_route_template_labels(self):
+        """Requests are labelled by route template, not raw path"""
+        collector = MetricsCollector()
+        app = FastAPI()
+
+        @app.get("/courses/{course_id}")
+        async def get_course(course_id: str):
+            return {"id": course_id}
+
+        app.add_middleware(MetricsMiddleware, collector=collector)
+        client = TestClient(app)
+
+        for course_id in ("a", "b", "c"):
+            assert client.get(f"/courses/{course_id}").status_code == 200
+        assert client.get("/missing/1").status_code == 404
+
+        routed = collector.histogram("http_request_duration_seconds", {
+            "method": "GET", "route": "/courses/{course_id}", "status": 200
+        })
+        unmatched = collector.histogram("http_request_duration_seconds", {
+            "method": "GET", "route": "unmatched", "status": 404
+        })
+
+        assert routed.count == 3
+        assert unmatched.count == 1
+        assert len(collector.histograms) == 2
+
+    def test_worker_retires_its_snapshot_on_shutdown(self, tmp_path):
+        """Lifespan shutdown folds the worker's snapshot into the retained totals"""
+        collector = MetricsCollector()
+        app = FastAPI()
+
+        @app.get("/health")
+        async def health():
+            return {"status": "ok"}
+
+        app.add_middleware(MetricsMiddleware, collector=collector, multiproc_dir=str(tmp_path), snapshot_interval=0)
+        with TestClient(app) as client:
+            assert client.get("/health").status_code == 200
+
+        assert [name for name in os.listdir(tmp_path) if name.endswith(".json")] == ["metrics-retained.json"]
+        output = render_prometheus(aggregate_snapshots(str(tmp_path)))
+        assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"} 1' in output
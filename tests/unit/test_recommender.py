@@ -0,0 +1,83 @@
+"""
+Unit tests for the course recommendation index
+"""
+import pytest
+
+from tests.service_modules import import_service_module
+
+recommender = import_service_module("ai-service", "utils.recommender")
+CourseRecommender = recommender.CourseRecommender
+
+COURSES = [
+    {"_id": "py1", "title": "Python Basics", "description": "Variables, loops and functions in Python", "topic": "python", "difficulty": "beginner"},
+    {"_id": "py2", "title": "Python Data Structures", "description": "Lists, dictionaries and sets in Python", "topic": "python", "difficulty": "intermediate"},
+    {"_id": "py3", "title": "Advanced Python", "description": "Generators, decorators and metaclasses in Python", "topic": "python", "difficulty": "advanced"},
+    {"_id": "art1", "title": "Watercolor Painting", "description": "Brushes, pigments and washes", "topic": "art", "difficulty": "beginner"},
+    {"_id": "art2", "title": "Figure Drawing", "description": "Anatomy, gesture and proportion", "topic": "art", "difficulty": "intermediate"},
+]
+
+
+@pytest.fixture
+def index():
+    """Index over five courses where python learners move on to more python"""
+    index = CourseRecommender(max_courses=10, text_dimensions=128, tag_dimensions=32)
+    progress = [
+        {"user_id": "u1", "course_id": "py1", "completed": True},
+        {"user_id": "u1", "course_id": "py2", "completed": True},
+        {"user_id": "u2", "course_id": "py1", "completed": True},
+        {"user_id": "u2", "course_id": "py2", "overall_progress": 50},
+        {"user_id": "u3", "course_id": "art1", "completed": True},
+        {"user_id": "u3", "course_id": "art2", "completed": True},
+        {"user_id": "new", "course_id": "py1", "completed": True},
+    ]
+    index.load(COURSES, progress)
+    return index
+
+
+class TestCourseRecommender:
+    """Course recommendation index test cases"""
+
+    def test_recommends_related_unseen_courses(self, index):
+        """A python learner gets python courses they haven't taken, with the reason"""
+        results = index.recommend("new", k=2)
+
+        assert [r["course_id"] for r in results][0] == "py2"
+        assert "py1" not in {r["course_id"] for r in results}
+        assert results[0]["because_of"] == ["Python Basics"]
+
+    def test_topics_and_level_for_cold_start(self, index):
+        """Without history, topics pick the subject and the level picks among it"""
+        results = index.recommend("nobody", k=1, level="intermediate", topics=["art"])
+
+        assert results[0]["course_id"] == "art2"
+        assert results[0]["matched_topics"] == ["art"]
+
+    def test_incremental_updates_match_a_full_load(self, index):
+        """Course edits and progress updates give the same similarities as a rebuild"""
+        edited = {**COURSES[3], "description": "Brushes, pigments, washes and Python scripting", "topic": "python"}
+        index.upsert_courses([edited])
+        index.update_progress([{"user_id": "u1", "course_id": "art1", "overall_progress": 40}])
+
+        rebuilt = CourseRecommender(max_courses=10, text_dimensions=128, tag_dimensions=32)
+        rebuilt.load([*COURSES[:3], edited, COURSES[4]], [
+            {"user_id": u, "course_id": c, "completed": True}
+            for u, c in (("u1", "py1"), ("u1", "py2"), ("u2", "py1"), ("u3", "art1"), ("u3", "art2"), ("new", "py1"))
+        ] + [
+            {"user_id": "u2", "course_id": "py2", "overall_progress": 50},
+            {"user_id": "u1", "course_id": "art1", "overall_progress": 40}
+        ])
+
+        i = index.index["art1"]
+        assert index.similarity[i, :5] == pytest.approx(rebuilt.similarity[i, :5], abs=1e-5)
+
+    def test_unpublished_courses_are_dropped(self, index):
+        """Unpublishing a course removes it from results"""
+        index.upsert_courses([{**COURSES[1], "published": False}])
+
+        assert "py2" not in {r["course_id"] for r in index.recommend("new", k=4)}
+        assert index.size == 4
+
+    def test_precision_at_k(self, index):
+        """Held-out courses found in the top k count as hits"""
+        assert index.precision_at_k({"new": {"py2"}}, k=1) == 1.0
+        assert index.precision_at_k({"new": {"art2"}}, k=1) == 0.0
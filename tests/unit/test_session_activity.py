@@ -0,0 +1,60 @@
+"""
+Unit tests for write-behind session activity tracking
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from tests.service_modules import import_service_module
+
+SessionActivityBuffer = import_service_module("auth-service", "database").SessionActivityBuffer
+
+
+class FakeSessions:
+    """user_sessions stand-in recording bulk writes"""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("primary stepped down")
+        self.batches.append((ops, ordered))
+
+
+class TestSessionActivityBuffer:
+    """Session activity buffer test cases"""
+
+    @pytest.mark.asyncio
+    async def test_touches_coalesce_into_one_bulk_write(self):
+        """Repeated touches of a session become one $max update"""
+        buffer = SessionActivityBuffer(batch_size=2)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for second in range(10):
+            for session_id in ("s1", "s2", "s3"):
+                buffer.touch(session_id, start + timedelta(seconds=second))
+
+        sessions = FakeSessions()
+        written = await buffer.flush(sessions)
+
+        ops = [op for batch, _ in sessions.batches for op in batch]
+        assert written == 3
+        assert len(sessions.batches) == 2
+        assert all(ordered is False for _, ordered in sessions.batches)
+        assert ops[0]._filter == {"_id": "s1", "is_active": True}
+        assert ops[0]._doc["$max"]["last_activity"] == start + timedelta(seconds=9)
+        assert buffer.pending == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_touches(self):
+        """Touches survive a failed write without overwriting newer ones"""
+        buffer = SessionActivityBuffer()
+        old = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        buffer.touch("s1", old)
+        buffer.touch("s2", old)
+
+        assert await buffer.flush(FakeSessions(fail=True)) == 0
+        assert buffer.pending == {"s1": old, "s2": old}
+
+        buffer.discard("s2")
+        assert await buffer.flush(FakeSessions()) == 1
@@ -0,0 +1,80 @@
+"""
+Unit tests for the structured logging pipeline
+"""
+import pytest
+import logging
+
+from shared.common.logging import StructuredLogger, StructuredFormatter
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Capture records handed to the queue instead of writing them"""
+    logger = StructuredLogger("test-structured-logging")
+    records = []
+    monkeypatch.setattr(logger.logger.handlers[0], "emit", lambda record: records.append(record))
+    return logger, records
+
+
+class TestStructuredLogger:
+    """Structured logger test cases"""
+
+    def test_level_checked_before_extra_is_built(self, captured):
+        """Disabled levels never evaluate lazy extra"""
+        logger, records = captured
+        logger.logger.setLevel(logging.INFO)
+
+        logger.debug("skipped", extra=lambda: 1 / 0)
+        logger.info("kept", extra=lambda: {"course_id": "c1"})
+
+        assert len(records) == 1
+        assert records[0].structured_data["course_id"] == "c1"
+
+    def test_repeated_messages_are_rate_limited(self, captured):
+        """Identical messages beyond the window limit are suppressed and counted"""
+        logger, records = captured
+        logger.rate_limit = 5
+        logger.rate_window = 0.0
+
+        for _ in range(3):
+            logger.warning("Redis get failed")
+        assert len(records) == 3
+
+        logger.rate_window = 60.0
+        logger._windows.clear()
+        for _ in range(20):
+            logger.warning("Redis get failed")
+        logger.warning("Another message")
+
+        assert len(records) == 3 + 5 + 1
+
+        logger._windows[(logging.WARNING, "Redis get failed")][0] -= 61
+        logger.warning("Redis get failed")
+        assert records[-1].structured_data["suppressed_repeats"] == 15
+
+    def test_sampling(self, captured):
+        """Sampled levels emit roughly the configured share"""
+        logger, records = captured
+        logger.rate_limit = 0
+        logger.set_sampling("info", 0.2)
+
+        for _ in range(5000):
+            logger.info("sampled")
+        logger.error("never sampled")
+
+        assert 800 < len(records) - 1 < 1200
+        assert records[-1].structured_data["message"] == "never sampled"
+
+    def test_formatter_output(self, captured):
+        """Formatted lines are JSON with a timestamp taken from the record"""
+        import json
+
+        logger, records = captured
+        logger.info("formatted", extra={"count": 3}, correlation_id="abc")
+
+        line = json.loads(StructuredFormatter("test").format(records[0]))
+
+        assert line["message"] == "formatted"
+        assert line["correlation_id"] == "abc"
+        assert line["count"] == 3
+        assert "timestamp" in line
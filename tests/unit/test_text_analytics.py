@@ -0,0 +1,102 @@
+"""
+Unit tests for the batch text analytics engine
+"""
+import pytest
+import numpy as np
+
+from tests.service_modules import import_service_module
+
+text_analytics = import_service_module("ai-service", "utils.text_analytics")
+TextAnalytics = text_analytics.TextAnalytics
+
+
+def flesch(text: str) -> float:
+    """Reference Flesch reading ease computed word by word"""
+    words = text_analytics.tokenize(text)
+    sentences = max(1, sum(text.count(mark) for mark in ".!?"))
+    syllables = sum(text_analytics.count_syllables(word) for word in words)
+    score = 206.835 - 1.015 * (len(words) / sentences) - 84.6 * (syllables / len(words))
+    return max(0.0, min(100.0, score))
+
+
+LESSONS = [
+    "Recursion solves a problem by solving smaller copies of it. Every recursion needs a base case.",
+    "A hash table maps keys to buckets. Collisions share a bucket! Is the table resized?",
+    "Sorting algorithms order items. Merge sorting splits items and merges sorted halves.",
+    ""
+]
+
+
+class TestTextAnalytics:
+    """Text analytics test cases"""
+
+    def test_batch_matches_per_word_reference(self):
+        """Word counts and readability equal the word-by-word computation"""
+        stats = TextAnalytics().analyze(LESSONS)
+
+        for i, lesson in enumerate(LESSONS[:3]):
+            assert stats.word_counts[i] == len(lesson.split())
+            assert stats.readability[i] == pytest.approx(flesch(lesson))
+        assert stats.word_counts[3] == 0 and stats.readability[3] == 0.0 and stats.keywords[3] == []
+        assert list(stats.reading_minutes) == [1, 1, 1, 1]
+
+    def test_batch_equals_single_documents(self):
+        """A document's metrics don't depend on the rest of its batch"""
+        engine = TextAnalytics()
+        batch = engine.analyze(LESSONS)
+
+        for i, lesson in enumerate(LESSONS):
+            single = engine.analyze([lesson])
+            assert single.keywords[0] == batch.keywords[i]
+            assert single.readability[0] == batch.readability[i]
+
+    def test_keywords_skip_stop_words_and_favour_rare_terms(self):
+        """Terms common across the corpus rank below terms specific to the lesson"""
+        engine = TextAnalytics()
+        engine.add_documents({f"l{i}": f"Lesson {i} about data structures" for i in range(5)})
+
+        keywords = engine.analyze(["Data data data structures with heaps heaps"], max_keywords=2).keywords[0]
+
+        assert keywords == ["heaps", "data"]
+        assert "with" not in engine.analyze(["with with with words"]).keywords[0]
+
+    def test_incremental_corpus_matches_a_rebuild(self):
+        """Adding, replacing and removing documents leaves the same IDF as building from scratch"""
+        engine = TextAnalytics()
+        engine.add_documents({"a": LESSONS[0], "b": LESSONS[1]})
+        engine.add_documents({"b": LESSONS[2], "c": LESSONS[1]})
+        engine.remove_documents(["a"])
+
+        rebuilt = TextAnalytics()
+        rebuilt.add_documents({"b": LESSONS[2], "c": LESSONS[1]})
+
+        for term in rebuilt.vocabulary:
+            assert engine.idf()[engine.vocabulary[term]] == rebuilt.idf()[rebuilt.vocabulary[term]]
+        assert np.all(engine._df[:len(engine.terms)] >= 0)
+
+    def test_corpus_is_bounded(self):
+        """The oldest documents leave the corpus past max_documents"""
+        engine = TextAnalytics(max_documents=2)
+        engine.add_documents({"a": "alpha", "b": "beta", "c": "gamma"})
+
+        assert list(engine.documents) == ["b", "c"]
+        assert engine._df[engine.vocabulary["alpha"]] == 0
+
+    def test_vocabulary_is_pruned_to_corpus_terms(self):
+        """Words only ever analysed are dropped once the vocabulary passes max_terms"""
+        engine = TextAnalytics(max_terms=50)
+        engine.add_documents({"a": LESSONS[0], "b": LESSONS[1]})
+        for i in range(20):
+            engine.analyze([" ".join(f"word{i}x{j}" for j in range(10))])
+
+        assert len(engine.terms) <= 2 * engine.max_terms
+        assert "word0x0" not in engine.vocabulary
+        assert {engine.terms[t] for t in engine.documents["a"]} == set(text_analytics.tokenize(LESSONS[0]))
+
+        rebuilt = TextAnalytics()
+        rebuilt.add_documents({"a": LESSONS[0], "b": LESSONS[1]})
+        for term in rebuilt.vocabulary:
+            assert engine.idf()[engine.vocabulary[term]] == rebuilt.idf()[rebuilt.vocabulary[term]]
+
+        engine.remove_documents(["a"])
+        assert np.all(engine._df[:len(engine.terms)] >= 0)
@@ -0,0 +1,185 @@
+"""
+Unit tests for LLM token accounting and budgets
+"""
+import pytest
+
+import httpx
+from fakeredis import FakeServer, aioredis
+from fastapi import Depends, FastAPI
+
+from shared.common.auth import get_current_user
+from shared.common.errors import RateLimitError
+from shared.common.llm import LLMResponse
+from tests.service_modules import import_service_module
+
+token_budget = import_service_module("ai-service", "utils.token_budget")
+TokenBudget, Usage, MeteredLLM = token_budget.TokenBudget, token_budget.Usage, token_budget.MeteredLLM
+
+
+class StubLLM:
+    """LLM client stand-in that counts calls"""
+
+    model = "gemini-1.5-flash"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, model=None, **config):
+        self.calls += 1
+        return LLMResponse("a short answer", model or self.model)
+
+    async def stream(self, prompt, model=None, **config):
+        self.calls += 1
+        for word in ("one ", "two ", "three"):
+            yield word
+
+
+class FakeUsageCollection:
+    """ai_usage stand-in applying upserts by _id"""
+
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes += 1
+        for op in operations:
+            self.docs[op._filter["_id"]] = op._doc["$set"]
+
+
+@pytest.fixture
+def budget():
+    """Budgets of 100 tokens per user, 150 per tenant, on a private Redis"""
+    budget = TokenBudget(user_daily_tokens=100, tenant_daily_tokens=150, redis_client=aioredis.FakeRedis(server=FakeServer(), decode_responses=True))
+    budget.clock = lambda: 1_700_000_000
+    return budget
+
+
+class TestTokenizer:
+    """Local tokenizer test cases"""
+
+    def test_counts_words_not_characters(self):
+        """Common words count as one token each, long words as several"""
+        assert token_budget.count_tokens("the cat sat on the mat") == 6
+        assert token_budget.count_tokens("internationalization") > 1
+        assert token_budget.count_tokens("") == 0
+
+    def test_fit_prompt_trims_content_to_the_limit(self):
+        """Only the content is trimmed, and the whole prompt fits"""
+        content = "recursion explained " * 500
+        prompt, trimmed = token_budget.fit_prompt(lambda c: f"Summarize this lesson:\n{c}\nUse bullet points.", content, max_tokens=120)
+
+        assert token_budget.count_tokens(prompt) <= 120
+        assert content.startswith(trimmed) and len(trimmed) < len(content)
+        assert prompt.endswith("Use bullet points.")
+        assert token_budget.fit_prompt(lambda c: f"Say {c}", "hi", max_tokens=120) == ("Say hi", "hi")
+
+
+class TestTokenBudget:
+    """Token budget test cases"""
+
+    @pytest.mark.asyncio
+    async def test_budget_is_enforced_per_user_and_tenant(self, budget):
+        """A user is refused past their budget; the tenant total counts everyone"""
+        await budget.record([Usage("u1", "t1", "gemini-1.5-flash", 60, 30)])
+        await budget.check("u1", "t1", 10)
+
+        with pytest.raises(RateLimitError) as exc:
+            await budget.check("u1", "t1", 11)
+        assert exc.value.error_details["scope"] == "user"
+
+        await budget.record([Usage("u2", "t1", "gemini-1.5-flash", 40, 10)])
+        with pytest.raises(RateLimitError) as exc:
+            await budget.check("u3", "t1", 20)
+        assert exc.value.error_details["scope"] == "tenant"
+        await budget.check("u3", "t2", 20)
+
+    @pytest.mark.asyncio
+    async def test_batch_check_counts_earlier_calls(self, budget):
+        """Calls checked together share the budget; a refused call does not use it up"""
+        await budget.record([Usage("u1", "t1", "gemini-1.5-flash", 50, 0)])
+        errors = await budget.check_many([
+            ("u1", "t1", 40, None),
+            ("u1", "t1", 20, None),
+            ("u1", "t1", 10, None),
+            ("u2", "t1", 60, None)
+        ])
+
+        assert errors[0] is None and errors[2] is None
+        assert errors[1].error_details["scope"] == "user"
+        assert errors[3].error_details["scope"] == "tenant"
+
+    @pytest.mark.asyncio
+    async def test_tenant_cost_limit(self, budget):
+        """The tenant's daily dollar limit applies alongside tokens"""
+        budget.tenant_daily_cost = 0.001
+        budget.limits = {"user": 10 ** 9, "tenant": 10 ** 9}
+        await budget.record([Usage("u1", "t1", "gpt-4", 30, 0)])
+
+        with pytest.raises(RateLimitError) as exc:
+            await budget.check("u1", "t1", 10, "gpt-4")
+        assert exc.value.error_details["reason"] == "daily_cost_limit"
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_day_totals(self, budget):
+        """Changed counters are upserted once per flush and only when changed"""
+        collection = FakeUsageCollection()
+        budget.collection = collection
+        await budget.record([Usage("u1", "t1", "gemini-1.5-flash", 10, 5), Usage("u1", "t1", "gpt-4", 1, 1)])
+
+        assert await budget.flush() == 2
+        assert await budget.flush() == 0
+        user = collection.docs["user:u1:20231114"]
+        assert (user["tokens"], user["requests"], user["tokens_by_model"]) == (17, 2, {"gemini-1.5-flash": 15, "gpt-4": 2})
+        assert collection.docs["tenant:t1:20231114"]["cost"] == pytest.approx(token_budget.estimate_cost("gemini-1.5-flash", 10, 5) + token_budget.estimate_cost("gpt-4", 1, 1))
+
+        await budget.record([Usage("u1", None, "gpt-4", 3, 0)])
+        assert await budget.flush() == 1
+        assert collection.docs["user:u1:20231114"]["tokens"] == 20
+
+
+class TestMeteredLLM:
+    """Metered LLM client test cases"""
+
+    @pytest.mark.asyncio
+    async def test_over_budget_calls_never_reach_the_model(self, budget):
+        """The check runs before the call; finished calls are charged"""
+        llm = StubLLM()
+        metered = MeteredLLM(llm, budget)
+        token_budget.budget_subject.set(("u1", None))
+
+        await metered.generate("explain recursion")
+        assert (await budget.usage("user", "u1"))["tokens"] == token_budget.count_tokens("explain recursion") + token_budget.count_tokens("a short answer")
+
+        with pytest.raises(RateLimitError):
+            await metered.generate("word " * 200)
+        assert llm.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_abandoned_stream_is_charged_for_what_was_sent(self, budget):
+        """Closing a stream early records only the chunks produced"""
+        metered = MeteredLLM(StubLLM(), budget)
+        token_budget.budget_subject.set(("u1", None))
+
+        stream = metered.stream("hi")
+        await stream.__anext__()
+        await stream.aclose()
+
+        assert (await budget.usage("user", "u1"))["completion_tokens"] == token_budget.count_tokens("one ")
+
+    @pytest.mark.asyncio
+    async def test_route_dependency_sets_the_subject(self, budget):
+        """Model calls made by a route are charged to the authenticated user and tenant"""
+        metered = MeteredLLM(StubLLM(), budget)
+        app = FastAPI()
+        app.dependency_overrides[get_current_user] = lambda: {"id": "u9", "role": "student", "tenant_id": "t9"}
+
+        @app.post("/ask")
+        async def ask(user=Depends(token_budget.budgeted_user)):
+            return {"text": (await metered.generate("question")).text}
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            assert (await client.post("/ask")).json() == {"text": "a short answer"}
+
+        assert (await budget.usage("tenant", "t9"))["requests"] == 1
+        assert (await budget.usage("user", "u9"))["requests"] == 1
@@ -0,0 +1,117 @@
+"""
+Unit tests for the token revocation list
+"""
+import pytest
+import asyncio
+import time
+import uuid
+
+from fakeredis import FakeServer, aioredis
+
+from shared.common.auth import PrincipalCache
+from shared.common.revocation import BloomFilter, TokenRevocationList, REVOKED_KEY_PREFIX
+
+
+@pytest.fixture
+def services():
+    """Two services sharing one Redis, each with its own revocation list"""
+    server = FakeServer()
+    return [
+        TokenRevocationList(capacity=1000, error_rate=0.01, redis_client=aioredis.FakeRedis(server=server))
+        for _ in range(2)
+    ]
+
+
+async def wait_for(condition, timeout: float = 2.0) -> float:
+    """Poll until condition() is true; returns the elapsed seconds"""
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - start
+
+
+class TestBloomFilter:
+    """Bloom filter test cases"""
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        """Members are always found; non-members hit at about the target rate"""
+        bloom = BloomFilter(capacity=10000, error_rate=0.01)
+        members = [uuid.uuid4().hex for _ in range(10000)]
+        for member in members:
+            bloom.add(member)
+
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(50000))
+        rate = false_positives / 50000
+        print(f"\nBloom filter: {bloom.size // 8 // 1024}KiB, {bloom.hashes} hashes, false-positive rate {rate:.4f}")
+
+        assert all(member in bloom for member in members)
+        assert rate < 0.02
+
+
+class TestTokenRevocationList:
+    """Revocation list test cases"""
+
+    @pytest.mark.asyncio
+    async def test_revocation_propagates_to_other_services(self, services):
+        """A revocation in one service reaches another service's filter over pub/sub"""
+        issuer, verifier = services
+        verifier.start()
+        await wait_for(lambda: verifier._listener is not None and verifier.filter.count == 0)
+        await asyncio.sleep(0.05)
+
+        jti = uuid.uuid4().hex
+        await issuer.revoke(jti, time.time() + 60, "logout")
+        delay = await wait_for(lambda: jti in verifier.filter)
+        print(f"\nRevocation propagation delay: {delay * 1e3:.1f}ms")
+
+        assert await verifier.is_revoked({"jti": jti})
+        assert not await verifier.is_revoked({"jti": uuid.uuid4().hex, "session_id": "other"})
+        assert delay < 1.0
+        await verifier.stop()
+
+    @pytest.mark.asyncio
+    async def test_principal_invalidation_reaches_other_services(self, services):
+        """A role change in auth-service drops the user's cached principals everywhere"""
+        issuer, verifier = services
+        caches = [PrincipalCache(), PrincipalCache()]
+        for service, cache in zip(services, caches):
+            service.principal_listeners.append(cache.invalidate)
+            cache.set(("u1", 1), {"id": "u1", "role": "admin"})
+            cache.set(("u2", 1), {"id": "u2", "role": "student"})
+        verifier.start()
+        await wait_for(lambda: verifier._listener is not None)
+        await asyncio.sleep(0.05)
+
+        assert await issuer.invalidate_principal("u1")
+        await wait_for(lambda: caches[1].get(("u1", 1)) is None)
+
+        assert caches[0].get(("u1", 1)) is None
+        assert caches[1].get(("u2", 1)) == {"id": "u2", "role": "student"}
+        assert "u1" not in verifier.filter
+        await verifier.stop()
+
+    @pytest.mark.asyncio
+    async def test_existing_revocations_loaded_on_start(self, services):
+        """A service that starts later still sees earlier revocations, with their TTL"""
+        issuer, verifier = services
+        await issuer.revoke("session-1", time.time() + 30)
+
+        ttl = await issuer.redis_client.ttl(REVOKED_KEY_PREFIX + "session-1")
+        verifier.start()
+        await wait_for(lambda: "session-1" in verifier.filter)
+
+        assert 0 < ttl <= 30
+        assert await verifier.is_revoked({"session_id": "session-1"})
+        await verifier.stop()
+
+    @pytest.mark.asyncio
+    async def test_false_positive_confirmed_against_redis(self, services):
+        """Filter hits that are not in Redis are not treated as revoked"""
+        _, verifier = services
+        verifier.start = lambda: None
+        verifier.filter.add("never-revoked")
+
+        assert not await verifier.is_revoked({"jti": "never-revoked"})
+        assert verifier.false_positives == 1
@@ -0,0 +1,157 @@
+"""
+Unit tests for distributed tracing
+"""
+import pytest
+import httpx
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from shared.common.tracing import (
+    Tracer, BatchSpanProcessor, InMemorySpanExporter, TracingMiddleware, SpanKind,
+    parse_traceparent, inject_trace_headers, current_span, TracingTransport
+)
+import shared.common.tracing as tracing
+
+REMOTE_TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Route the global tracer to an in-memory exporter"""
+    exporter = InMemorySpanExporter()
+    monkeypatch.setattr(tracing.tracer, "processor", BatchSpanProcessor(exporter))
+    monkeypatch.setattr(tracing.tracer, "sample_ratio", 1.0)
+    monkeypatch.setattr(tracing.tracer, "_threshold", 1 << 64)
+    return exporter
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/courses/{course_id}")
+    async def get_course(course_id: str):
+        with tracing.tracer.span("mongo.find_one", SpanKind.CLIENT, {"db.collection": "courses"}):
+            headers = inject_trace_headers({})
+        return {"traceparent": headers["traceparent"]}
+
+    app.add_middleware(TracingMiddleware)
+    return app
+
+
+class TestTraceContext:
+    """W3C trace context test cases"""
+
+    def test_parse_traceparent(self):
+        """Valid headers parse; malformed or all-zero ids are rejected"""
+        assert parse_traceparent(REMOTE_TRACEPARENT) == (
+            "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True
+        )
+        assert parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00")[2] is False
+        assert parse_traceparent("gateway-generated") is None
+        assert parse_traceparent("00-" + "0" * 32 + "-b7ad6b7169203331-01") is None
+        assert parse_traceparent("00-xyz7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01") is None
+
+    def test_sampling_is_deterministic_per_trace(self):
+        """The sampling decision depends only on the trace id"""
+        tracer = Tracer(sample_ratio=0.25, processor=BatchSpanProcessor(InMemorySpanExporter()))
+        sampled = sum(tracer.start_span("op").sampled for _ in range(20000))
+
+        assert 0.2 < sampled / 20000 < 0.3
+
+
+class TestTracingMiddleware:
+    """Request tracing test cases"""
+
+    def test_continues_remote_trace(self, exporter):
+        """Server and child spans join the caller's trace and propagate downstream"""
+        client = TestClient(make_app())
+        response = client.get("/courses/42", headers={"traceparent": REMOTE_TRACEPARENT})
+        tracing.tracer.processor.force_flush()
+
+        server = next(span for span in exporter.spans if span.kind == SpanKind.SERVER)
+        child = next(span for span in exporter.spans if span.kind == SpanKind.CLIENT)
+
+        assert response.headers["x-trace-id"] == "0af7651916cd43dd8448eb211c80319c"
+        assert server.name == "GET /courses/{course_id}"
+        assert server.parent_id == "b7ad6b7169203331"
+        assert child.parent_id == server.span_id
+        assert child.trace_id == server.trace_id
+        assert response.json()["traceparent"] == f"00-{server.trace_id}-{child.span_id}-01"
+
+    def test_unsampled_trace_creates_no_child_spans(self, exporter):
+        """Unsampled requests keep their trace id but record nothing"""
+        client = TestClient(make_app())
+        response = client.get("/courses/42", headers={
+            "traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"
+        })
+        tracing.tracer.processor.force_flush()
+
+        assert exporter.spans == []
+        assert response.headers["x-trace-id"] == "0af7651916cd43dd8448eb211c80319c"
+        assert response.json()["traceparent"].endswith("-00")
+
+    def test_log_lines_share_trace_id(self, exporter, monkeypatch):
+        """Structured logs inside a span use the trace id as correlation id"""
+        from shared.common.logging import get_logger
+
+        logger = get_logger("test-tracing")
+        records = []
+        monkeypatch.setattr(logger.logger.handlers[0], "emit", lambda record: records.append(record.structured_data))
+
+        with tracing.tracer.span("job") as span:
+            logger.info("first")
+            logger.info("second")
+
+        assert current_span() is None
+        assert {record["correlation_id"] for record in records} == {span.trace_id}
+        assert records[0]["span_id"] == span.span_id
+
+
+class TestTracingTransport:
+    """Outgoing HTTP client span test cases"""
+
+    @pytest.mark.asyncio
+    async def test_client_span_propagates_and_records_status(self, exporter):
+        """The upstream sees the client span as parent"""
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers["traceparent"])
+            return httpx.Response(503)
+
+        async with httpx.AsyncClient(transport=TracingTransport(httpx.MockTransport(handler))) as client:
+            with tracing.tracer.span("job"):
+                await client.get("http://upstream/health")
+        tracing.tracer.processor.force_flush()
+
+        span = next(span for span in exporter.spans if span.kind == SpanKind.CLIENT)
+        assert seen == [span.traceparent]
+        assert span.attributes["http.status_code"] == 503
+        assert span.error == "HTTP 503"
+
+    @pytest.mark.asyncio
+    async def test_client_span_ends_on_transport_error(self, exporter):
+        """A connect error or timeout still ends and exports the span"""
+        def handler(request):
+            raise httpx.ConnectError("connection refused", request=request)
+
+        async with httpx.AsyncClient(transport=TracingTransport(httpx.MockTransport(handler))) as client:
+            with tracing.tracer.span("job"):
+                with pytest.raises(httpx.ConnectError):
+                    await client.get("http://upstream/health")
+        tracing.tracer.processor.force_flush()
+
+        span = next(span for span in exporter.spans if span.kind == SpanKind.CLIENT)
+        assert span.end_ns is not None
+        assert "connection refused" in span.error
+
+    @pytest.mark.asyncio
+    async def test_client_span_url_omits_query_string(self, exporter):
+        """Credentials in the query string stay out of exported spans"""
+        async with httpx.AsyncClient(transport=TracingTransport(httpx.MockTransport(lambda request: httpx.Response(200)))) as client:
+            with tracing.tracer.span("job"):
+                await client.get("http://upstream/v1/models", params={"key": "secret"})
+        tracing.tracer.processor.force_flush()
+
+        span = next(span for span in exporter.spans if span.kind == SpanKind.CLIENT)
+        assert span.attributes["http.url"] == "http://upstream/v1/models"
@@ -0,0 +1,265 @@
+"""
+Unit tests for cross-node WebSocket delivery
+"""
+import pytest
+import asyncio
+import time
+
+from fakeredis import FakeServer, aioredis
+
+from shared.common.cache import cache_manager
+from tests.service_modules import import_service_module
+
+websocket = import_service_module("notification-service", "routes.websocket")
+PRESENCE_PREFIX = "ws:presence:"
+
+
+class FakeWebSocket:
+    """WebSocket stand-in that records what it was sent; a blocked one never finishes a send"""
+
+    def __init__(self, broken: bool = False, blocked: bool = False):
+        self.sent = []
+        self.broken = broken
+        self.blocked = blocked
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send(self, frame):
+        if self.broken:
+            raise RuntimeError("connection closed")
+        if self.blocked:
+            await asyncio.Event().wait()
+        self.sent.append(frame["text"])
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    """Poll until condition() is true"""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.001)
+
+
+@pytest.fixture
+def redis_server():
+    return FakeServer()
+
+
+async def every_topic(user_id):
+    return {"course:42", "cohort:7"}
+
+
+def node(server, name, **options):
+    """A notification replica with its own Redis connection"""
+    options.setdefault("topic_access", every_topic)
+    return websocket.ConnectionManager(redis_client=aioredis.FakeRedis(server=server, decode_responses=True), node_id=name, **options)
+
+
+class TestConnectionManager:
+    """Connection manager and bus test cases"""
+
+    @pytest.mark.asyncio
+    async def test_user_keeps_every_connection(self, redis_server):
+        """A second tab adds a connection instead of replacing the first"""
+        manager = node(redis_server, "a")
+        tabs = [FakeWebSocket(), FakeWebSocket()]
+        connections = [await manager.connect(tab, "u1") for tab in tabs]
+
+        assert await manager.send_personal_message("hello", "u1") == 2
+        await wait_for(lambda: all(tab.sent == ["hello"] for tab in tabs))
+        assert await manager.bus.nodes_for("u1") == {"a": 2}
+
+        await manager.disconnect(connections[0])
+        assert manager.connection_count("u1") == 1
+        await manager.disconnect(connections[1])
+        assert not manager.is_user_connected("u1")
+        assert await manager.bus.nodes_for("u1") == {}
+
+    @pytest.mark.asyncio
+    async def test_join_during_leave_is_kept(self, redis_server):
+        """A connection opened while another one leaves still counts"""
+        manager = node(redis_server, "a")
+        await manager.bus.join("u1")
+        joins = [node(redis_server, "a").bus.join]
+        client = manager.bus.redis_client
+        pipeline = client.pipeline
+
+        def racing_pipeline(*args, **kwargs):
+            # The other tab joins right after leave() reads the count
+            pipe = pipeline(*args, **kwargs)
+            hget = pipe.hget
+
+            async def hget_then_join(*hget_args):
+                value = await hget(*hget_args)
+                if joins:
+                    await joins.pop()("u1")
+                return value
+
+            pipe.hget = hget_then_join
+            return pipe
+
+        client.pipeline = racing_pipeline
+        await manager.bus.leave("u1")
+
+        assert await manager.bus.nodes_for("u1") == {"a": 1}
+
+    @pytest.mark.asyncio
+    async def test_any_node_reaches_any_user(self, redis_server):
+        """A message sent on one node arrives on another node's connections"""
+        a, b = node(redis_server, "a"), node(redis_server, "b")
+        await a.bus.start()
+        await b.bus.start()
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        await a.connect(phone, "u1")
+        await b.connect(laptop, "u1")
+
+        assert await a.send_personal_message("graded", "u1") == 2
+        await wait_for(lambda: laptop.sent == ["graded"] and phone.sent == ["graded"])
+        assert await b.bus.is_online("u1") and not await b.bus.is_online("u2")
+
+        await a.close()
+        await b.close()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_reaches_every_node_once(self, redis_server):
+        """Broadcasts reach each connection once, skipping excluded users"""
+        a, b = node(redis_server, "a"), node(redis_server, "b")
+        await a.bus.start()
+        await b.bus.start()
+        sockets = {user: FakeWebSocket() for user in ("u1", "u2", "u3")}
+        await a.connect(sockets["u1"], "u1")
+        await b.connect(sockets["u2"], "u2")
+        await b.connect(sockets["u3"], "u3")
+
+        await a.broadcast("maintenance", exclude_user_ids=["u3"])
+        await wait_for(lambda: sockets["u2"].sent)
+        await asyncio.sleep(0.02)
+
+        assert sockets["u1"].sent == ["maintenance"] and sockets["u2"].sent == ["maintenance"]
+        assert sockets["u3"].sent == []
+        await a.close()
+        await b.close()
+
+    @pytest.mark.asyncio
+    async def test_stale_presence_is_dropped(self, redis_server):
+        """Presence left by a node that died is removed on the next send"""
+        a = node(redis_server, "a")
+        await a.bus.start()
+        await a.bus.redis_client.hset(PRESENCE_PREFIX + "u1", "dead-node", 1)
+
+        assert await a.send_personal_message("hello", "u1") == 0
+        assert await a.bus.nodes_for("u1") == {}
+        assert a.bus.stale_nodes_removed == 1
+        await a.bus.stop()
+
+    @pytest.mark.asyncio
+    async def test_broken_connections_are_removed(self, redis_server):
+        """A connection that fails to send is disconnected and leaves presence"""
+        manager = node(redis_server, "a")
+        await manager.connect(FakeWebSocket(broken=True), "u1")
+
+        await manager.send_personal_message("hello", "u1")
+        await wait_for(lambda: not manager.is_user_connected("u1"))
+        assert await manager.bus.nodes_for("u1") == {}
+
+    @pytest.mark.asyncio
+    async def test_local_delivery_without_redis(self, monkeypatch):
+        """With Redis unavailable, delivery falls back to this node"""
+        monkeypatch.setattr(cache_manager.redis, "redis_available", False)
+        manager = websocket.ConnectionManager(node_id="a")
+        tab = FakeWebSocket()
+        await manager.connect(tab, "u1")
+
+        assert await manager.send_personal_message("hello", "u1") == 1
+        await wait_for(lambda: tab.sent == ["hello"])
+        await manager.close()
+
+
+class TestBroadcastBackpressure:
+    """Per-connection queues, slow consumers and topics"""
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_delay_others(self, redis_server):
+        """A client that never reads doesn't hold up a broadcast, and loses its oldest frames"""
+        manager = node(redis_server, "a", max_queue=2)
+        stuck = FakeWebSocket(blocked=True)
+        fast = [FakeWebSocket() for _ in range(20)]
+        stuck_connection = await manager.connect(stuck, "stuck")
+        for i, socket in enumerate(fast):
+            await manager.connect(socket, f"u{i}")
+
+        for n in range(5):
+            await manager.broadcast(f"m{n}")
+        await wait_for(lambda: all(len(socket.sent) == 5 for socket in fast))
+
+        # One frame is in the blocked send, two are queued, the rest were dropped
+        assert [frame["text"] for frame in stuck_connection.queue._queue] == ["m3", "m4"]
+        assert stuck_connection.dropped == 2
+        assert manager.is_user_connected("stuck")
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_disconnect_policy_closes_slow_clients(self, redis_server):
+        """Under the disconnect policy a full queue closes the connection"""
+        manager = node(redis_server, "a", max_queue=1, slow_consumer_policy="disconnect")
+        stuck = FakeWebSocket(blocked=True)
+        await manager.connect(stuck, "stuck")
+
+        for n in range(3):
+            await manager.broadcast(f"m{n}")
+        await wait_for(lambda: stuck.close_code == 1013)
+
+        assert not manager.is_user_connected("stuck")
+        assert manager.slow_consumers_closed == 1
+
+    @pytest.mark.asyncio
+    async def test_topic_broadcast_reaches_subscribers_on_every_node(self, redis_server):
+        """A course broadcast reaches only that course's subscribers, on any node"""
+        a, b = node(redis_server, "a"), node(redis_server, "b")
+        await a.bus.start()
+        await b.bus.start()
+        sockets = {user: FakeWebSocket() for user in ("u1", "u2", "u3")}
+        c1 = await a.connect(sockets["u1"], "u1")
+        c2 = await b.connect(sockets["u2"], "u2")
+        await b.connect(sockets["u3"], "u3")
+
+        assert await a.subscribe(c1, ["course:42", "not-a-topic"]) == ["course:42"]
+        await b.subscribe(c2, ["course:42", "cohort:7"])
+        await a.broadcast("quiz posted", topic="course:42")
+        await wait_for(lambda: sockets["u2"].sent)
+        await asyncio.sleep(0.02)
+
+        assert sockets["u1"].sent == ["quiz posted"] and sockets["u2"].sent == ["quiz posted"]
+        assert sockets["u3"].sent == []
+
+        b.unsubscribe(c2, ["course:42"])
+        assert b.topics == {"cohort:7": {c2}}
+        await a.close()
+        await b.close()
+
+    @pytest.mark.asyncio
+    async def test_subscribe_only_to_member_topics(self, redis_server):
+        """Topics the user doesn't belong to are refused, and a failed lookup grants nothing"""
+        async def enrolled(user_id):
+            return {"course:1"} if user_id == "u1" else set()
+
+        manager = node(redis_server, "a", topic_access=enrolled)
+        c1 = await manager.connect(FakeWebSocket(), "u1")
+        c2 = await manager.connect(FakeWebSocket(), "u2")
+
+        assert await manager.subscribe(c1, ["course:1", "course:2", "cohort:7"]) == ["course:1"]
+        assert await manager.subscribe(c2, ["course:1"]) == []
+        assert manager.topics == {"course:1": {c1}}
+
+        async def unavailable(user_id):
+            raise RuntimeError("database down")
+
+        manager.topic_access = unavailable
+        assert await manager.subscribe(c2, ["course:1"]) == []
+        await manager.close()